@@ -1 +1,4 @@
- 
\ No newline at end of file
+"""Admin package"""
+from admin.service import AdminService
+from admin.bulk import BulkOperations
+from admin.payouts import PayoutPipeline
@@ -0,0 +1,362 @@
+"""Chunked, set-based bulk admin operations.
+
+Every operation walks its input in fixed-size chunks and commits once per
+chunk, so a cleanup of 100k games is a few hundred statements rather than
+hundreds of thousands of ORM round trips. With ``dry_run=True`` the same
+chunks are read and counted but nothing is written.
+"""
+import csv
+import logging
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import String, DateTime, bindparam, cast, func, insert, literal, select, update
+
+from extensions import db
+from live_events import game_status, publish_on_commit, transaction_status
+from models import User, Game, GameParticipant, Transaction
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Games an admin may cancel; completed games are settled and never touched,
+# and tournament tables are left to the tournament (see tournaments.py)
+OPEN_GAME_STATUSES = ('waiting', 'active', 'in_progress')
+
+# Columns a CSV may use to identify users, in order of preference
+USER_KEYS = ('telegram_id', 'user_id', 'username')
+
+
+class BulkResult:
+    """Running counters for one bulk operation, reported after each chunk"""
+
+    def __init__(self, operation, dry_run=False, total=None):
+        self.operation = operation
+        self.dry_run = dry_run
+        self.total = total
+        self.processed = 0
+        self.affected = 0
+        self.amount = Decimal('0')
+        self.errors = []
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def summary(self):
+        prefix = '[dry run] ' if self.dry_run else ''
+        total = f"/{self.total}" if self.total is not None else ''
+        return (
+            f"{prefix}{self.operation}: {self.processed}{total} processed, "
+            f"{self.affected} affected, amount {self.amount:,.2f}, "
+            f"{len(self.errors)} errors in {self.elapsed:.1f}s"
+        )
+
+    def __repr__(self):
+        return f'<BulkResult {self.summary()}>'
+
+
+def _chunks(rows, size):
+    """Split any iterable into lists of at most size items"""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _user_key_column(key):
+    if key not in USER_KEYS:
+        raise ValueError(f"Unknown user key: {key}")
+    return User.id if key == 'user_id' else getattr(User, key)
+
+
+def _coerce_key(key, value):
+    value = str(value).strip().lstrip('@')
+    return value if key == 'username' else int(value)
+
+
+def read_adjustments_csv(path):
+    """Read balance adjustments from a CSV file.
+
+    The header must have an ``amount`` column and one of ``telegram_id``,
+    ``user_id`` or ``username``; an optional ``reason`` column is kept per row.
+    Returns (key, rows) where rows are (line_no, user_key, amount, reason).
+    """
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        return parse_adjustments(f)
+
+
+def parse_adjustments(lines):
+    """Parse CSV lines (see read_adjustments_csv); bad lines raise ValueError"""
+    reader = csv.DictReader(lines)
+    fields = [name.strip().lower() for name in (reader.fieldnames or [])]
+    reader.fieldnames = fields
+    key = next((k for k in USER_KEYS if k in fields), None)
+    if key is None or 'amount' not in fields:
+        raise ValueError(f"CSV needs an amount column and one of: {', '.join(USER_KEYS)}")
+
+    rows = []
+    for line_no, record in enumerate(reader, start=2):
+        try:
+            amount = Decimal(record['amount'].strip())
+            rows.append((line_no, _coerce_key(key, record[key]), amount, (record.get('reason') or '').strip()))
+        except (InvalidOperation, ValueError, AttributeError):
+            raise ValueError(f"Line {line_no}: invalid {key} or amount")
+    return key, rows
+
+
+class BulkOperations:
+    """Bulk refunds, balance adjustments and bans for incident response"""
+
+    @staticmethod
+    def cancel_games(statuses=OPEN_GAME_STATUSES, created_before=None, created_after=None,
+                     game_ids=None, refund=True, dry_run=False, ref_prefix='admin_cancel',
+                     chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+        """Cancel open games matching a filter, refunding every stake by default.
+
+        Per chunk this is one select of game ids, (unless dry_run) one
+        UPDATE ... RETURNING marking the games still open cancelled, one
+        aggregate over their participants and, for those, a per-user refund
+        total, one executemany credit and one INSERT ... SELECT of refund
+        transactions.
+        """
+        statuses = [s for s in statuses if s in OPEN_GAME_STATUSES]
+        filters = [Game.status.in_(statuses), Game.tournament_id.is_(None)]
+        if created_before:
+            filters.append(Game.created_at < created_before)
+        if created_after:
+            filters.append(Game.created_at >= created_after)
+        if game_ids is not None:
+            filters.append(Game.id.in_(list(game_ids)))
+
+        operation = 'refund games' if refund else 'cancel games'
+        total = db.session.execute(select(func.count(Game.id)).where(*filters)).scalar()
+        result = BulkResult(operation, dry_run, total)
+
+        last_id = 0
+        while True:
+            ids = list(db.session.execute(
+                select(Game.id).where(*filters, Game.id > last_id)
+                .order_by(Game.id).limit(chunk_size).with_for_update()
+            ).scalars())
+            if not ids:
+                break
+            last_id = ids[-1]
+
+            try:
+                cancelled, seats, stakes = BulkOperations._cancel_chunk(ids, statuses, refund, dry_run, ref_prefix)
+                if dry_run:
+                    db.session.rollback()
+                else:
+                    db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+            result.processed += cancelled
+            result.affected += seats if refund else cancelled
+            result.amount += Decimal(str(stakes)) if refund else 0
+            if progress:
+                progress(result)
+
+        logger.info(result.summary())
+        return result
+
+    @staticmethod
+    def _cancel_chunk(ids, statuses, refund, dry_run, ref_prefix):
+        """Cancel one chunk of games and refund the ones cancelled; returns (games, seats, stakes)"""
+        now = datetime.utcnow()
+        if not dry_run:
+            # Cancel first and refund only what this statement cancelled, so a game
+            # settled since the select is neither cancelled nor refunded
+            games = Game.__table__
+            ids = list(db.session.execute(
+                update(games)
+                .where(games.c.id.in_(ids), games.c.status.in_(statuses))
+                .values(status='cancelled', completed_at=now)
+                .returning(games.c.id)
+            ).scalars())
+            if not ids:
+                return 0, 0, 0
+            publish_on_commit([game_status(game_id, 'cancelled') for game_id in ids])
+
+        seats, stakes = db.session.execute(
+            select(func.count(GameParticipant.id), func.coalesce(func.sum(Game.bet_amount), 0))
+            .select_from(GameParticipant)
+            .join(Game, Game.id == GameParticipant.game_id)
+            .where(GameParticipant.game_id.in_(ids))
+        ).one()
+        if dry_run:
+            return len(ids), seats, stakes
+
+        users = User.__table__
+        if refund and seats:
+            refunds = db.session.execute(
+                select(GameParticipant.user_id, func.sum(Game.bet_amount))
+                .join(Game, Game.id == GameParticipant.game_id)
+                .where(GameParticipant.game_id.in_(ids))
+                .group_by(GameParticipant.user_id)
+            ).all()
+            db.session.execute(
+                update(users)
+                .where(users.c.id == bindparam('b_user_id'))
+                .values(balance=users.c.balance + bindparam('b_refund')),
+                [{'b_user_id': user_id, 'b_refund': float(amount)} for user_id, amount in refunds]
+            )
+
+            tx_ref = (
+                literal(f'{ref_prefix}_') + cast(Game.id, String)
+                + literal('_') + cast(GameParticipant.user_id, String)
+            )
+            transactions = Transaction.__table__
+            tx_refs = db.session.execute(
+                insert(transactions).from_select(
+                    ['user_id', 'tx_ref', 'type', 'amount', 'status', 'created_at', 'completed_at'],
+                    select(
+                        GameParticipant.user_id, tx_ref, literal('refund'), Game.bet_amount,
+                        literal('completed'), literal(now, DateTime), literal(now, DateTime)
+                    )
+                    .join(Game, Game.id == GameParticipant.game_id)
+                    .where(GameParticipant.game_id.in_(ids))
+                )
+                .returning(transactions.c.tx_ref)
+            ).scalars()
+            publish_on_commit([transaction_status(ref, 'completed') for ref in tx_refs])
+        return len(ids), seats, stakes
+
+    @staticmethod
+    def adjust_balances(rows, key='telegram_id', reason='', allow_negative=False,
+                        dry_run=False, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+        """Apply (line_no, user_key, amount, reason) adjustments in chunks.
+
+        Rows for unknown users, or debits that would take a balance below
+        zero (unless allow_negative), are skipped and reported in errors.
+        Each applied row gets its own completed admin_credit/admin_debit
+        transaction; balances are updated once per user per chunk.
+        """
+        key_column = _user_key_column(key)
+        rows = list(rows)
+        result = BulkResult('adjust balances', dry_run, len(rows))
+        batch_id = uuid.uuid4().hex[:12]
+
+        for chunk in _chunks(rows, chunk_size):
+            try:
+                applied = BulkOperations._adjust_chunk(
+                    chunk, key_column, reason, allow_negative, dry_run, batch_id, result.errors
+                )
+                if dry_run:
+                    db.session.rollback()
+                else:
+                    db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+            result.processed += len(chunk)
+            result.affected += len(applied)
+            result.amount += sum((amount for _, _, amount, _ in applied), Decimal('0'))
+            if progress:
+                progress(result)
+
+        logger.info(f"{result.summary()} (batch {batch_id})")
+        return result
+
+    @staticmethod
+    def _adjust_chunk(chunk, key_column, reason, allow_negative, dry_run, batch_id, errors):
+        """Resolve, validate and apply one chunk; returns the rows applied"""
+        keys = {user_key for _, user_key, _, _ in chunk}
+        found = {
+            row[0]: (row[1], row[2])
+            for row in db.session.execute(
+                select(key_column, User.id, User.balance).where(key_column.in_(keys)).with_for_update()
+            )
+        }
+
+        per_user = defaultdict(list)
+        for row in chunk:
+            line_no, user_key, amount, _ = row
+            if user_key not in found:
+                errors.append(f"Line {line_no}: no user {user_key}")
+            elif amount == 0:
+                errors.append(f"Line {line_no}: zero amount")
+            else:
+                per_user[found[user_key][0]].append(row)
+
+        applied = []
+        deltas = []
+        for user_id, user_rows in per_user.items():
+            delta = sum((amount for _, _, amount, _ in user_rows), Decimal('0'))
+            balance = Decimal(str(found[user_rows[0][1]][1] or 0))
+            if balance + delta < 0 and not allow_negative:
+                errors.extend(f"Line {line_no}: would overdraw user {user_key}" for line_no, user_key, _, _ in user_rows)
+                continue
+            applied.extend((user_id, line_no, amount, row_reason) for line_no, _, amount, row_reason in user_rows)
+            deltas.append({'b_user_id': user_id, 'b_delta': float(delta)})
+
+        if dry_run or not deltas:
+            return applied
+
+        users = User.__table__
+        db.session.execute(
+            update(users)
+            .where(users.c.id == bindparam('b_user_id'))
+            .values(balance=users.c.balance + bindparam('b_delta')),
+            deltas
+        )
+
+        now = datetime.utcnow()
+        db.session.execute(insert(Transaction.__table__), [
+            {
+                'user_id': user_id,
+                'tx_ref': f"admin_adjust_{batch_id}_{line_no}",
+                'type': 'admin_credit' if amount > 0 else 'admin_debit',
+                'amount': amount,
+                'status': 'completed',
+                'created_at': now,
+                'completed_at': now,
+            }
+            for user_id, line_no, amount, _ in applied
+        ])
+        for user_id, line_no, amount, row_reason in applied:
+            logger.info(f"Admin adjustment {batch_id}:{line_no} user {user_id} {amount:+} ({row_reason or reason})")
+        return applied
+
+    @staticmethod
+    def set_banned(user_keys, banned=True, key='telegram_id', dry_run=False,
+                   chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+        """Ban or unban users in chunks; users already in that state are left alone"""
+        key_column = _user_key_column(key)
+        user_keys = list(user_keys)
+        result = BulkResult('ban users' if banned else 'unban users', dry_run, len(user_keys))
+        users = User.__table__
+
+        for chunk in _chunks(user_keys, chunk_size):
+            pending = (key_column.in_(chunk), User.is_banned.isnot(banned))
+            try:
+                if dry_run:
+                    affected = db.session.execute(select(func.count(User.id)).where(*pending)).scalar()
+                else:
+                    affected = db.session.execute(
+                        update(users).where(*pending).values(is_banned=banned)
+                    ).rowcount
+                    db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+            result.processed += len(chunk)
+            result.affected += affected
+            if progress:
+                progress(result)
+
+        logger.info(result.summary())
+        return result
@@ -0,0 +1,184 @@
+"""Streaming transaction export for accounting.
+
+Transactions created in a date range are read in id order with a
+server-side cursor (``stream_results`` plus ``yield_per``) and written out
+one batch at a time as CSV, JSONL or Parquet, so memory stays flat
+however many rows there are. Archived transactions (see archive.py) are
+merged in by id, so an export covers both tiers.
+
+Every export is resumable: rows come in id order, so the id of the last
+row received is a keyset cursor. Pass it back as ``after_id`` and the
+export continues right after it. The CLI does that by itself with
+``--resume``, reading the last id from the partial file.
+
+    GET /admin/api/transactions/export?format=csv&start=2026-01-01&end=2026-02-01[&after_id=123]
+    python admin_tool.py export_transactions csv 2026-01-01 2026-02-01 --out=jan.csv [--resume]
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from decimal import Decimal
+from heapq import merge
+
+from sqlalchemy import select
+
+from archive import ColdArchive, arrow_schema
+from extensions import db
+from models import Transaction
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # only needed for Parquet exports
+    pa = pq = None
+
+DEFAULT_BATCH_SIZE = 10000
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+transactions = Transaction.__table__
+COLUMNS = [column.name for column in transactions.columns]
+
+
+def parse_date(value):
+    """A YYYY-MM-DD or ISO timestamp argument"""
+    return datetime.fromisoformat(value)
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _text(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class _Sink(io.RawIOBase):
+    """File object that hands over what Parquet wrote so far"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data, self._chunks = b''.join(self._chunks), []
+        return data
+
+
+class TransactionExport:
+    """Transactions created in [start, end), in id order, after an optional keyset cursor"""
+
+    def __init__(self, start, end, after_id=None, batch_size=DEFAULT_BATCH_SIZE):
+        if start >= end:
+            raise ValueError("The export range is empty: start must be before end")
+        self.start = start
+        self.end = end
+        self.after_id = after_id
+        self.batch_size = batch_size
+        self.rows_written = 0
+        self.last_id = after_id
+
+    def _live_rows(self):
+        query = select(transactions).where(
+            transactions.c.created_at >= self.start,
+            transactions.c.created_at < self.end
+        ).order_by(transactions.c.id)
+        if self.after_id is not None:
+            query = query.where(transactions.c.id > self.after_id)
+        result = db.session.execute(
+            query, execution_options={'stream_results': True, 'yield_per': self.batch_size}
+        )
+        for batch in result.partitions():
+            for row in batch:
+                yield dict(row._mapping)
+
+    def rows(self):
+        """Every row in the range as a dict, live and archived merged by id"""
+        archived = ColdArchive.iter_transactions(self.start, self.end, self.after_id)
+        for row in merge(self._live_rows(), archived, key=lambda row: row['id']):
+            if row['id'] == self.last_id:
+                continue  # archived while the export ran: already sent from the live table
+            self.rows_written += 1
+            self.last_id = row['id']
+            yield row
+
+    def stream(self, fmt, header=True):
+        """The export as chunks of bytes, one per batch of rows"""
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        if fmt == 'parquet':
+            yield from self._parquet()
+            return
+
+        if fmt == 'csv' and header:
+            out = io.StringIO()
+            csv.writer(out).writerow(COLUMNS)
+            yield out.getvalue().encode()
+        for batch in _batches(self.rows(), self.batch_size):
+            out = io.StringIO()
+            if fmt == 'csv':
+                csv.writer(out).writerows([_text(row[column]) for column in COLUMNS] for row in batch)
+            else:
+                for row in batch:
+                    out.write(json.dumps({column: _text(row[column]) for column in COLUMNS}))
+                    out.write('\n')
+            yield out.getvalue().encode()
+
+    def _parquet(self):
+        if pa is None:
+            raise RuntimeError("Parquet exports need pyarrow: pip install pyarrow")
+        schema = arrow_schema(transactions)
+        sink = _Sink()
+        writer = pq.ParquetWriter(sink, schema, compression='zstd')
+        try:
+            for batch in _batches(self.rows(), self.batch_size):
+                writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+                yield sink.drain()
+        finally:
+            writer.close()
+        yield sink.drain()
+
+    def summary(self):
+        return f"{self.rows_written} transactions exported, last id {self.last_id}"
+
+
+def resume_point(path, fmt):
+    """Cut a partial CSV or JSONL export back to its last complete row and return that row's id"""
+    if fmt == 'parquet':
+        raise ValueError("Parquet exports can't be resumed in place, start a new file with --after")
+    last_line, complete = None, 0
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                break  # the interrupted row
+            last_line = line
+            complete += len(line)
+    with open(path, 'r+b') as f:
+        f.truncate(complete)
+    if last_line is None:
+        return None
+    if fmt == 'jsonl':
+        return json.loads(last_line)['id']
+    first_field = next(csv.reader([last_line.decode()]))[0]
+    return int(first_field) if first_field.isdigit() else None
@@ -0,0 +1,420 @@
+"""Batched withdrawal payouts.
+
+Admins approve pending withdrawal requests in bulk, by id or by rule
+(created before a date, an amount range, at most N requests). Approval
+runs in three phases:
+
+1. Claim: chunk by chunk, the selected requests move from ``pending`` to
+   ``processing`` with a compare-and-set UPDATE and are grouped into one
+   PayoutBatch per provider of at most that provider's batch size. Users
+   with a Capa wallet are paid through Capa; everyone else through a Chapa
+   bulk transfer to the wallet address or phone number they gave. A
+   request claimed by a concurrent approval is skipped, so nothing is
+   paid twice.
+2. Send: the batches go to their providers from a pool of ``concurrency``
+   threads, so at most that many provider requests are in flight. Workers
+   get plain dicts and never touch the session.
+3. Settle: as each batch returns, its requests are marked ``completed`` or
+   ``failed`` item by item, in one commit per batch. The amount was taken
+   from the balance when the request was made, so failed requests are
+   refunded and their withdrawal transactions marked failed.
+
+A provider call that raises or times out fails, and refunds, its whole
+batch. A batch left in ``sending`` means the process died mid-send; its
+requests stay ``processing`` for an admin to reconcile with the provider,
+since they may have been paid.
+
+    result = PayoutPipeline.approve(created_before=cutoff, max_amount=1000)
+    print(result.summary())  # ... 4980 paid ... 20 failed, 63.2 items/s
+"""
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import bindparam, func, select, update
+
+from capa_wallet import CapaWallet
+from chapa_integration import ChapaPayment
+from config import PAYOUT_BATCH_SIZE, PAYOUT_CONCURRENCY, PAYOUT_TIMEOUT, CHAPA_PAYOUT_BANK_CODE
+from extensions import db
+from models import User, Transaction, WithdrawalRequest, PayoutBatch
+from admin.bulk import BulkResult, DEFAULT_CHUNK_SIZE, _chunks
+
+logger = logging.getLogger(__name__)
+
+# Chapa takes at most 100 transfers per bulk request
+CHAPA_BULK_LIMIT = 100
+
+
+class PayoutResult(BulkResult):
+    """Running counters for a payout run; affected and amount count what was paid"""
+
+    def __init__(self, dry_run=False, total=None):
+        super().__init__('pay withdrawals', dry_run, total)
+        self.batches = 0
+        self.failed = 0
+        self.refunded = Decimal('0')
+        self.outcomes = []  # (item, paid, reference or error) per settled request
+
+    @property
+    def throughput(self):
+        """Settled requests per second"""
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return (
+            f"{super().summary()}; {self.batches} batches, {self.failed} failed and "
+            f"refunded {self.refunded:,.2f}, {self.throughput:.1f} items/s"
+        )
+
+
+class PayoutProvider:
+    """A payout rail: send(items, timeout) returns (batch reference, {withdrawal id: (paid, detail)})"""
+
+    def __init__(self, name, send, batch_size):
+        self.name = name
+        self.send = send
+        self.batch_size = batch_size
+
+    def __repr__(self):
+        return f'<PayoutProvider {self.name}>'
+
+
+def _send_capa(items, timeout):
+    success, message, results = CapaWallet().process_withdrawals([
+        {
+            'reference': item['reference'],
+            'wallet_id': item['wallet_id'],
+            'amount': item['amount'],
+            'destination': item['wallet_address'],
+        }
+        for item in items
+    ], timeout=timeout)
+    if not success:
+        return None, {item['id']: (False, message) for item in items}
+    return None, {
+        item['id']: results.get(item['reference'], (False, 'Missing from the provider response'))
+        for item in items
+    }
+
+
+def _send_chapa(items, timeout):
+    success, message, batch_reference = ChapaPayment().bulk_transfer(
+        f"RPS Arena payouts {items[0]['batch_id']}",
+        [
+            {
+                'account_name': item['account_name'],
+                'account_number': item['wallet_address'],
+                'amount': item['amount'],
+                'reference': item['reference'],
+                'bank_code': CHAPA_PAYOUT_BANK_CODE,
+            }
+            for item in items
+        ],
+        timeout=timeout
+    )
+    # Chapa accepts or rejects the whole batch
+    return batch_reference, {item['id']: (success, batch_reference if success else message) for item in items}
+
+
+PROVIDERS = {
+    'capa': PayoutProvider('capa', _send_capa, PAYOUT_BATCH_SIZE),
+    'chapa': PayoutProvider('chapa', _send_chapa, min(PAYOUT_BATCH_SIZE, CHAPA_BULK_LIMIT)),
+}
+
+
+def provider_for(wallet_id):
+    """Name of the provider that pays a user"""
+    return 'capa' if wallet_id else 'chapa'
+
+
+def _send(provider, items, timeout):
+    """Runs in a worker thread: one provider request for one batch"""
+    reference, outcomes = PROVIDERS[provider].send(items, timeout)
+    return reference, {
+        item['id']: outcomes.get(item['id'], (False, 'Missing from the provider response'))
+        for item in items
+    }
+
+
+def _refund(refunds):
+    """Credit each user the sum of their refunded amounts in one executemany"""
+    per_user = defaultdict(Decimal)
+    for user_id, amount in refunds:
+        per_user[user_id] += amount
+    users = User.__table__
+    db.session.execute(
+        update(users)
+        .where(users.c.id == bindparam('b_user_id'))
+        .values(balance=users.c.balance + bindparam('b_refund')),
+        [{'b_user_id': user_id, 'b_refund': float(amount)} for user_id, amount in per_user.items()]
+    )
+
+
+def _set_transaction_status(tx_refs, status, now):
+    """Move the pending withdrawal transactions of settled requests to status.
+
+    They are changed on the loaded objects rather than by a Core UPDATE so the
+    flush reaches the session listeners: the withdrawal_volume rollup and the
+    transaction:<tx_ref> live events.
+    """
+    if not tx_refs:
+        return
+    for transaction in db.session.execute(
+        select(Transaction)
+        .where(Transaction.tx_ref.in_(tx_refs), Transaction.status == 'pending')
+        .with_for_update()
+    ).scalars():
+        transaction.status = status
+        transaction.completed_at = now
+    db.session.flush()
+
+
+def _link_transactions(rows):
+    """Find the pending withdrawal transactions of requests that predate the tx_ref column"""
+    missing = [row for row in rows if not row.tx_ref]
+    if not missing:
+        return {}
+    linked = select(WithdrawalRequest.tx_ref).where(WithdrawalRequest.tx_ref.isnot(None))
+    candidates = defaultdict(list)
+    for user_id, tx_ref, amount in db.session.execute(
+        select(Transaction.user_id, Transaction.tx_ref, Transaction.amount)
+        .where(Transaction.user_id.in_({row.user_id for row in missing}),
+               Transaction.type == 'withdrawal', Transaction.status == 'pending',
+               Transaction.tx_ref.notin_(linked))
+        .order_by(Transaction.id)
+    ):
+        candidates[user_id, Decimal(str(amount))].append(tx_ref)
+
+    found = {}
+    for row in missing:
+        refs = candidates[row.user_id, Decimal(str(row.amount))]
+        if refs:
+            found[row.id] = refs.pop(0)
+    if found:
+        withdrawals = WithdrawalRequest.__table__
+        db.session.execute(
+            update(withdrawals).where(withdrawals.c.id == bindparam('b_id')).values(tx_ref=bindparam('b_tx_ref')),
+            [{'b_id': withdrawal_id, 'b_tx_ref': tx_ref} for withdrawal_id, tx_ref in found.items()]
+        )
+    return found
+
+
+class PayoutPipeline:
+    """Bulk approval, payout and rejection of withdrawal requests"""
+
+    @staticmethod
+    def select(withdrawal_ids=None, created_before=None, min_amount=None, max_amount=None, limit=None):
+        """Ids of the pending requests matching a rule, oldest first"""
+        filters = [WithdrawalRequest.status == 'pending']
+        if withdrawal_ids is not None:
+            filters.append(WithdrawalRequest.id.in_(list(withdrawal_ids)))
+        if created_before:
+            filters.append(WithdrawalRequest.created_at < created_before)
+        if min_amount is not None:
+            filters.append(WithdrawalRequest.amount >= float(min_amount))
+        if max_amount is not None:
+            filters.append(WithdrawalRequest.amount <= float(max_amount))
+        query = select(WithdrawalRequest.id).where(*filters).order_by(WithdrawalRequest.id)
+        if limit:
+            query = query.limit(limit)
+        return list(db.session.execute(query).scalars())
+
+    @staticmethod
+    def approve(withdrawal_ids=None, created_before=None, min_amount=None, max_amount=None, limit=None,
+                admin_id=None, dry_run=False, concurrency=PAYOUT_CONCURRENCY, timeout=PAYOUT_TIMEOUT,
+                chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+        """Approve and pay the pending requests matching a rule; see the module docstring"""
+        ids = PayoutPipeline.select(withdrawal_ids, created_before, min_amount, max_amount, limit)
+        result = PayoutResult(dry_run, len(ids))
+
+        if dry_run:
+            for chunk in _chunks(ids, chunk_size):
+                amount = db.session.execute(
+                    select(func.coalesce(func.sum(WithdrawalRequest.amount), 0))
+                    .where(WithdrawalRequest.id.in_(chunk))
+                ).scalar()
+                result.processed += len(chunk)
+                result.amount += Decimal(str(amount))
+            db.session.rollback()
+            return result
+
+        batches = []
+        for chunk in _chunks(ids, chunk_size):
+            try:
+                batches += PayoutPipeline._claim(chunk, admin_id, result.errors)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+        result.batches = len(batches)
+
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            futures = {
+                pool.submit(_send, provider, items, timeout): (batch_id, items)
+                for batch_id, provider, items in batches
+            }
+            for future in as_completed(futures):
+                batch_id, items = futures[future]
+                try:
+                    reference, outcomes = future.result()
+                except Exception as e:
+                    logger.error(f"Payout batch {batch_id} failed: {str(e)}")
+                    reference, outcomes = None, {item['id']: (False, f"Error: {str(e)}") for item in items}
+                try:
+                    PayoutPipeline._settle(batch_id, reference, items, outcomes, result)
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    raise
+                if progress:
+                    progress(result)
+
+        logger.info(result.summary())
+        return result
+
+    @staticmethod
+    def _claim(chunk, admin_id, errors):
+        """Move one chunk of requests to processing in per-provider batches; returns (batch id, provider, items)"""
+        rows = db.session.execute(
+            select(WithdrawalRequest.id, WithdrawalRequest.user_id, WithdrawalRequest.amount,
+                   WithdrawalRequest.wallet_address, WithdrawalRequest.tx_ref,
+                   User.wallet_id, User.telegram_id, User.full_name, User.username)
+            .join(User, User.id == WithdrawalRequest.user_id)
+            .where(WithdrawalRequest.id.in_(chunk), WithdrawalRequest.status == 'pending')
+            .order_by(WithdrawalRequest.id)
+            .with_for_update(of=WithdrawalRequest)
+        ).all()
+        linked = _link_transactions(rows)
+
+        by_provider = defaultdict(list)
+        for row in rows:
+            by_provider[provider_for(row.wallet_id)].append(row)
+
+        withdrawals = WithdrawalRequest.__table__
+        claimed = []
+        for provider, provider_rows in by_provider.items():
+            for group in _chunks(provider_rows, PROVIDERS[provider].batch_size):
+                batch = PayoutBatch(provider=provider, status='sending', created_by=admin_id)
+                db.session.add(batch)
+                db.session.flush()
+                db.session.execute(
+                    update(withdrawals)
+                    .where(withdrawals.c.id.in_([row.id for row in group]), withdrawals.c.status == 'pending')
+                    .values(status='processing', provider=provider, batch_id=batch.id)
+                )
+                # A concurrent approval may have claimed some of them first
+                taken = set(db.session.execute(
+                    select(withdrawals.c.id).where(withdrawals.c.batch_id == batch.id)
+                ).scalars())
+                errors.extend(f"Withdrawal {row.id}: no longer pending" for row in group if row.id not in taken)
+                items = [
+                    {
+                        'id': row.id,
+                        'batch_id': batch.id,
+                        'user_id': row.user_id,
+                        'telegram_id': row.telegram_id,
+                        'amount': Decimal(str(row.amount)),
+                        'wallet_address': row.wallet_address,
+                        'wallet_id': row.wallet_id,
+                        'account_name': row.full_name or row.username,
+                        'tx_ref': row.tx_ref or linked.get(row.id),
+                        'reference': f"WR_{row.id}",  # stable, so a provider can drop a resent item
+                    }
+                    for row in group if row.id in taken
+                ]
+                batch.item_count = len(items)
+                batch.total_amount = sum((item['amount'] for item in items), Decimal('0'))
+                if items:
+                    claimed.append((batch.id, provider, items))
+                else:
+                    db.session.delete(batch)
+        return claimed
+
+    @staticmethod
+    def _settle(batch_id, reference, items, outcomes, result):
+        """Record one batch's per-item outcomes, refunding the failures"""
+        now = datetime.utcnow()
+        paid = [item for item in items if outcomes[item['id']][0]]
+        failed = [item for item in items if not outcomes[item['id']][0]]
+        withdrawals = WithdrawalRequest.__table__
+
+        if paid:
+            db.session.execute(
+                update(withdrawals)
+                .where(withdrawals.c.id == bindparam('b_id'))
+                .values(status='completed', reference=bindparam('b_reference'), processed_at=now),
+                [{'b_id': item['id'], 'b_reference': str(outcomes[item['id']][1])[:100]} for item in paid]
+            )
+            _set_transaction_status([item['tx_ref'] for item in paid if item['tx_ref']], 'completed', now)
+        if failed:
+            db.session.execute(
+                update(withdrawals)
+                .where(withdrawals.c.id == bindparam('b_id'))
+                .values(status='failed', failure_reason=bindparam('b_reason'), processed_at=now),
+                [{'b_id': item['id'], 'b_reason': str(outcomes[item['id']][1])[:255]} for item in failed]
+            )
+            _refund([(item['user_id'], item['amount']) for item in failed])
+            _set_transaction_status([item['tx_ref'] for item in failed if item['tx_ref']], 'failed', now)
+
+        batches = PayoutBatch.__table__
+        db.session.execute(
+            update(batches).where(batches.c.id == batch_id).values(
+                status='completed' if not failed else 'partial' if paid else 'failed',
+                reference=reference, failed_count=len(failed), completed_at=now
+            )
+        )
+
+        result.processed += len(items)
+        result.affected += len(paid)
+        result.amount += sum((item['amount'] for item in paid), Decimal('0'))
+        result.failed += len(failed)
+        result.refunded += sum((item['amount'] for item in failed), Decimal('0'))
+        result.errors.extend(f"Withdrawal {item['id']}: {outcomes[item['id']][1]}" for item in failed)
+        result.outcomes.extend((item, *outcomes[item['id']]) for item in items)
+
+    @staticmethod
+    def reject(withdrawal_ids, reason='', chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+        """Reject pending requests and refund them; requests no longer pending are left alone"""
+        withdrawal_ids = list(withdrawal_ids)
+        result = BulkResult('reject withdrawals', total=len(withdrawal_ids))
+        withdrawals = WithdrawalRequest.__table__
+
+        for chunk in _chunks(withdrawal_ids, chunk_size):
+            try:
+                rows = db.session.execute(
+                    select(WithdrawalRequest.id, WithdrawalRequest.user_id, WithdrawalRequest.amount,
+                           WithdrawalRequest.tx_ref)
+                    .where(WithdrawalRequest.id.in_(chunk), WithdrawalRequest.status == 'pending')
+                    .with_for_update()
+                ).all()
+                linked = _link_transactions(rows)
+                now = datetime.utcnow()
+                # The rows are locked, so they are all still pending
+                rejected = rows
+                if rejected:
+                    db.session.execute(
+                        update(withdrawals)
+                        .where(withdrawals.c.id.in_([row.id for row in rejected]))
+                        .values(status='rejected', failure_reason=reason[:255] or None, processed_at=now)
+                    )
+                    _refund([(row.user_id, Decimal(str(row.amount))) for row in rejected])
+                    _set_transaction_status(
+                        [row.tx_ref or linked[row.id] for row in rejected if row.tx_ref or row.id in linked],
+                        'rejected', now
+                    )
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+            result.processed += len(chunk)
+            result.affected += len(rejected)
+            result.amount += sum((Decimal(str(row.amount)) for row in rejected), Decimal('0'))
+            if progress:
+                progress(result)
+
+        logger.info(result.summary())
+        return result
@@ -1,11 +1,22 @@
 """Admin panel routes and views"""
-from datetime import datetime, timedelta, timezone
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
 from functools import wraps
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
-from sqlalchemy import func
-from app import db
-from models import User, Game, GameParticipant, Transaction
+from flask import Blueprint, Response, render_template, request, redirect, url_for, flash, jsonify, abort, stream_with_context
+from extensions import db
+from models import User, Game, GameParticipant, Transaction, CollusionFlag, Tournament
 from payment_service import PaymentService
+from db_routing import read_only, read_only_view
+from stats_rollup import StatsRollup
+from pagination import decode_cursor, clamp_page_size
+from admin.service import AdminService
+from admin.bulk import BulkOperations, OPEN_GAME_STATUSES
+from admin.payouts import PayoutPipeline
+from archive import ColdArchive
+from admin.export import FORMATS, TransactionExport, parse_date
+from tournaments import TournamentService
+from config import TOURNAMENT_MAX_ENTRANTS
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -20,6 +31,36 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def bulk_json(result):
+    """Serialize a bulk operation result"""
+    return {
+        'status': 'success',
+        'dry_run': result.dry_run,
+        'total': result.total,
+        'processed': result.processed,
+        'affected': result.affected,
+        'amount': float(result.amount),
+        'errors': result.errors[:100],
+        'elapsed': round(result.elapsed, 3)
+    }
+
+def page_args():
+    """Read and validate the cursor/limit query parameters"""
+    cursor = request.args.get('cursor') or None
+    try:
+        decode_cursor(cursor)
+    except ValueError:
+        abort(400, description='Invalid cursor')
+    return cursor, clamp_page_size(request.args.get('limit'))
+
+def page_json(page, serialize):
+    """Serialize a Page for the listing APIs"""
+    return jsonify({
+        'status': 'success',
+        'data': [serialize(item) for item in page],
+        'next_cursor': page.next_cursor
+    })
+
 @admin_bp.route('/login')
 def login():
     """Admin login page"""
@@ -27,53 +68,56 @@ def login():
 
 @admin_bp.route('/dashboard')
 @admin_required
+@read_only_view
 def dashboard():
     """Admin dashboard with overview"""
-    # Get today's stats
-    today = datetime.now(timezone.utc).date()
-    today_start = datetime.combine(today, datetime.min.time().replace(tzinfo=timezone.utc))
+    # Totals come from the rollups; only live room state is queried directly
+    totals = StatsRollup.totals()
+    today = StatsRollup.day()
     
     stats = {
         'active_rooms': Game.query.filter(Game.status.in_(['waiting', 'ready', 'playing'])).count(),
-        'total_players': User.query.count(),
+        'total_players': totals['new_users'],
         'active_players': GameParticipant.query.join(Game).filter(
             Game.status.in_(['waiting', 'ready', 'playing'])
         ).distinct(GameParticipant.user_id).count(),
-        'total_bets_today': db.session.query(func.sum(Game.bet_amount)).filter(
-            Game.created_at >= today_start
-        ).scalar() or 0,
+        'total_bets_today': today.total_bets or 0,
         'pending_transactions': Transaction.query.filter_by(status='pending').count(),
         'failed_transactions': Transaction.query.filter_by(status='failed').count()
     }
     
-    # Get recent games
-    games = Game.query.order_by(Game.created_at.desc()).limit(10).all()
-    
-    # Get recent transactions
-    transactions = Transaction.query.order_by(Transaction.created_at.desc()).limit(10).all()
+    # Get recent games and transactions with their players loaded
+    games = AdminService.get_recent_games(10)
+    transactions = AdminService.get_recent_transactions(10)
     
     return render_template('admin/dashboard.html', stats=stats, games=games, transactions=transactions)
 
 @admin_bp.route('/rooms')
 @admin_required
+@read_only_view
 def rooms():
     """Game rooms management"""
-    rooms = Game.query.order_by(Game.created_at.desc()).all()
-    return render_template('admin/rooms.html', rooms=rooms)
+    cursor, limit = page_args()
+    page = AdminService.list_games(cursor, limit, status=request.args.get('status'))
+    return render_template('admin/rooms.html', rooms=page.items, page=page)
 
 @admin_bp.route('/room/<int:room_id>')
 @admin_required
 def room_detail(room_id):
     """Game room details"""
-    room = Game.query.get_or_404(room_id)
+    room = db.session.get(Game, room_id) or ColdArchive.get_game(room_id)
+    if room is None:
+        abort(404)
     return render_template('admin/room_detail.html', room=room)
 
 @admin_bp.route('/players')
 @admin_required
+@read_only_view
 def players():
     """Player management"""
-    players = User.query.all()
-    return render_template('admin/players.html', players=players)
+    cursor, limit = page_args()
+    page = AdminService.list_users(cursor, limit)
+    return render_template('admin/players.html', players=page.items, page=page)
 
 @admin_bp.route('/player/<int:player_id>')
 @admin_required
@@ -84,40 +128,191 @@ def player_detail(player_id):
 
 @admin_bp.route('/transactions')
 @admin_required
+@read_only_view
 def transactions():
     """Transaction management"""
-    transactions = Transaction.query.order_by(Transaction.created_at.desc()).all()
-    return render_template('admin/transactions.html', transactions=transactions)
+    cursor, limit = page_args()
+    page = AdminService.list_transactions(
+        cursor, limit,
+        status=request.args.get('status'),
+        tx_type=request.args.get('type')
+    )
+    return render_template('admin/transactions.html', transactions=page.items, page=page)
+
+@admin_bp.route('/api/rooms')
+@admin_required
+@read_only_view
+def api_rooms():
+    """API endpoint to page through game rooms"""
+    cursor, limit = page_args()
+    page = AdminService.list_games(cursor, limit, status=request.args.get('status'))
+    return page_json(page, lambda room: {
+        'id': room.id,
+        'status': room.status,
+        'bet_amount': float(room.bet_amount),
+        'created_at': room.created_at.isoformat() if room.created_at else None,
+        'players': [
+            {'user_id': p.user_id, 'username': p.user.username if p.user else None}
+            for p in room.participants
+        ]
+    })
+
+@admin_bp.route('/api/players')
+@admin_required
+@read_only_view
+def api_players():
+    """API endpoint to page through players"""
+    cursor, limit = page_args()
+    page = AdminService.list_users(cursor, limit)
+    return page_json(page, lambda player: {
+        'id': player.id,
+        'telegram_id': player.telegram_id,
+        'username': player.username,
+        'balance': float(player.balance or 0),
+        'is_admin': player.is_admin,
+        'created_at': player.created_at.isoformat() if player.created_at else None
+    })
+
+@admin_bp.route('/api/transactions')
+@admin_required
+@read_only_view
+def api_transactions():
+    """API endpoint to page through transactions"""
+    cursor, limit = page_args()
+    page = AdminService.list_transactions(
+        cursor, limit,
+        status=request.args.get('status'),
+        tx_type=request.args.get('type')
+    )
+    return page_json(page, lambda tx: {
+        'id': tx.id,
+        'tx_ref': tx.tx_ref,
+        'user_id': tx.user_id,
+        'username': tx.user.username if tx.user else None,
+        'type': tx.type,
+        'amount': float(tx.amount),
+        'status': tx.status,
+        'created_at': tx.created_at.isoformat() if tx.created_at else None
+    })
+
+@admin_bp.route('/api/transactions/export')
+@admin_required
+def api_export_transactions():
+    """Stream every transaction created in [start, end) as CSV, JSONL or Parquet"""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATS:
+        abort(400, description=f"format must be one of {', '.join(FORMATS)}")
+    try:
+        start = parse_date(request.args['start'])
+        end = parse_date(request.args['end'])
+        after_id = int(request.args['after_id']) if request.args.get('after_id') else None
+        export = TransactionExport(start, end, after_id)
+    except (KeyError, ValueError):
+        abort(400, description='start and end must be YYYY-MM-DD with start before end, after_id an integer')
+    
+    def generate():
+        # The read_only_view flag would be reset before the body streams
+        with read_only():
+            yield from export.stream(fmt, header=after_id is None)
+    
+    filename = f"transactions-{start:%Y%m%d}-{end:%Y%m%d}.{fmt}"
+    return Response(stream_with_context(generate()), mimetype=FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+@admin_bp.route('/api/collusion')
+@admin_required
+@read_only_view
+def api_collusion_flags():
+    """API endpoint to page through players flagged by the collusion monitor"""
+    cursor, limit = page_args()
+    page = AdminService.list_collusion_flags(cursor, limit, status=request.args.get('status', 'open'))
+    return page_json(page, lambda flag: {
+        'id': flag.id,
+        'kind': flag.kind,
+        'user_ids': [int(i) for i in flag.user_ids.split(',')],
+        'games': flag.games,
+        'score': flag.score,
+        'details': json.loads(flag.details) if flag.details else {},
+        'status': flag.status,
+        'created_at': flag.created_at.isoformat() if flag.created_at else None
+    })
+
+@admin_bp.route('/api/collusion/<int:flag_id>/review', methods=['POST'])
+@admin_required
+def api_review_collusion_flag(flag_id):
+    """API endpoint to confirm or dismiss a collusion flag"""
+    status = (request.get_json(silent=True) or {}).get('status')
+    if status not in ('confirmed', 'dismissed'):
+        abort(400, description='status must be confirmed or dismissed')
+    flag = CollusionFlag.query.get_or_404(flag_id)
+    flag.status = status
+    db.session.commit()
+    return jsonify({'status': 'success', 'message': f"Flag {flag_id} {status}"})
 
 @admin_bp.route('/api/room/<int:room_id>/close', methods=['POST'])
 @admin_required
 def api_close_room(room_id):
     """API endpoint to force-close a room"""
-    room = Game.query.get_or_404(room_id)
+    Game.query.get_or_404(room_id)
     
-    # Refund all participants
-    for participant in room.participants:
-        user = db.session.get(User, participant.user_id)
-        if user:
-            user.balance += room.bet_amount
-            
-            # Create refund transaction
-            transaction = Transaction(
-                user_id=user.id,
-                amount=room.bet_amount,
-                transaction_type='refund',
-                status='completed',
-                reference_id=f"admin_close_{room.id}",
-                completed_at=datetime.now(timezone.utc)
-            )
-            db.session.add(transaction)
-    
-    room.status = 'cancelled'
-    room.completed_at = datetime.now(timezone.utc)
-    db.session.commit()
+    if not AdminService.cancel_game(room_id):
+        return jsonify({'status': 'error', 'message': 'Room is not open'}), 400
     
     return jsonify({'status': 'success', 'message': 'Room closed successfully'})
 
+@admin_bp.route('/api/rooms/cancel', methods=['POST'])
+@admin_required
+def api_cancel_rooms():
+    """API endpoint to cancel open rooms in bulk, with optional dry run"""
+    data = request.get_json(silent=True) or {}
+    statuses = data.get('statuses') or OPEN_GAME_STATUSES
+    if not isinstance(statuses, (list, tuple)) or not all(isinstance(status, str) for status in statuses):
+        abort(400, description='statuses must be a list of game statuses')
+    try:
+        before = datetime.strptime(data['before'], '%Y-%m-%d') if data.get('before') else None
+        ids = [int(i) for i in data['ids']] if data.get('ids') is not None else None
+    except (TypeError, ValueError):
+        abort(400, description='before must be YYYY-MM-DD and ids a list of numbers')
+    
+    result = BulkOperations.cancel_games(
+        statuses=statuses,
+        created_before=before,
+        game_ids=ids,
+        refund=data.get('refund', True),
+        dry_run=data.get('dry_run', False)
+    )
+    return jsonify(bulk_json(result))
+
+@admin_bp.route('/api/withdrawals/payout', methods=['POST'])
+@admin_required
+def api_payout_withdrawals():
+    """API endpoint to approve and pay pending withdrawals in bulk, by ids or by rule"""
+    data = request.get_json(silent=True) or {}
+    try:
+        before = datetime.strptime(data['before'], '%Y-%m-%d') if data.get('before') else None
+        ids = [int(i) for i in data['ids']] if data.get('ids') is not None else None
+        min_amount = float(data['min_amount']) if data.get('min_amount') is not None else None
+        max_amount = float(data['max_amount']) if data.get('max_amount') is not None else None
+        limit = int(data['limit']) if data.get('limit') else None
+    except (TypeError, ValueError):
+        abort(400, description='before must be YYYY-MM-DD; ids, amounts and limit must be numbers')
+    
+    result = PayoutPipeline.approve(
+        withdrawal_ids=ids,
+        created_before=before,
+        min_amount=min_amount,
+        max_amount=max_amount,
+        limit=limit,
+        dry_run=data.get('dry_run', False)
+    )
+    return jsonify(dict(
+        bulk_json(result),
+        batches=result.batches,
+        failed=result.failed,
+        refunded=float(result.refunded),
+        throughput=round(result.throughput, 1)
+    ))
+
 @admin_bp.route('/api/player/<int:player_id>/ban', methods=['POST'])
 @admin_required
 def api_ban_player(player_id):
@@ -131,6 +326,78 @@ def api_ban_player(player_id):
         'message': f"Player {'banned' if player.is_banned else 'unbanned'} successfully"
     })
 
+@admin_bp.route('/api/players/ban', methods=['POST'])
+@admin_required
+def api_ban_players():
+    """API endpoint to ban or unban many players by user id"""
+    data = request.get_json(silent=True) or {}
+    try:
+        user_ids = [int(i) for i in data.get('ids', [])]
+    except (TypeError, ValueError):
+        abort(400, description='ids must be integers')
+    
+    result = BulkOperations.set_banned(
+        user_ids,
+        banned=data.get('banned', True),
+        key='user_id',
+        dry_run=data.get('dry_run', False)
+    )
+    return jsonify(bulk_json(result))
+
+@admin_bp.route('/api/tournaments', methods=['POST'])
+@admin_required
+def api_create_tournament():
+    """API endpoint to open a tournament for registration"""
+    data = request.get_json(silent=True) or {}
+    name = str(data.get('name') or '').strip()
+    try:
+        buy_in = Decimal(str(data.get('buy_in', 0)))
+        max_entrants = int(data['max_entrants']) if data.get('max_entrants') is not None else TOURNAMENT_MAX_ENTRANTS
+    except (TypeError, ValueError, InvalidOperation):
+        abort(400, description='buy_in and max_entrants must be numbers')
+    if not name or len(name) > 64:
+        abort(400, description='name is required (at most 64 characters)')
+    
+    tournament = TournamentService.create(name, buy_in, max_entrants=max_entrants)
+    if not tournament:
+        abort(400, description='buy_in must not be negative')
+    return jsonify({'status': 'success', 'id': tournament.id})
+
+@admin_bp.route('/api/tournament/<int:tournament_id>')
+@admin_required
+def api_tournament(tournament_id):
+    """API endpoint for a tournament and its standings"""
+    tournament = Tournament.query.get_or_404(tournament_id)
+    return jsonify({
+        'id': tournament.id,
+        'name': tournament.name,
+        'status': tournament.status,
+        'buy_in': float(tournament.buy_in),
+        'entrants': tournament.entrant_count,
+        'prize_pool': float(tournament.prize_pool),
+        'round': tournament.current_round,
+        'winner_id': tournament.winner_id,
+        'standings': TournamentService.standings(tournament_id)
+    })
+
+@admin_bp.route('/api/tournament/<int:tournament_id>/start', methods=['POST'])
+@admin_required
+def api_start_tournament(tournament_id):
+    """API endpoint to close registration and deal round 1"""
+    Tournament.query.get_or_404(tournament_id)
+    started, message = TournamentService.start(tournament_id)
+    return jsonify({'status': 'success' if started else 'error', 'message': message}), 200 if started else 400
+
+@admin_bp.route('/api/tournament/<int:tournament_id>/cancel', methods=['POST'])
+@admin_required
+def api_cancel_tournament(tournament_id):
+    """API endpoint to cancel a tournament that has not started and refund its buy-ins"""
+    tournament = Tournament.query.get_or_404(tournament_id)
+    if tournament.status != 'registering':
+        return jsonify({'status': 'error', 'message': 'Only tournaments still registering can be cancelled'}), 400
+    refunded = TournamentService.cancel(tournament_id)
+    return jsonify({'status': 'success', 'message': f"Tournament cancelled, {refunded} buy-ins refunded"})
+
 @admin_bp.route('/api/transaction/<int:transaction_id>/verify', methods=['POST'])
 @admin_required
 def api_verify_transaction(transaction_id):
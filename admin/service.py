@@ -0,0 +1,152 @@
+"""Admin service for dashboard stats and back-office operations"""
+import logging
+from decimal import Decimal
+from sqlalchemy.orm import joinedload, selectinload
+from models import User, Game, GameParticipant, Transaction, WithdrawalRequest, CollusionFlag
+from archive import ColdArchive
+from pagination import DEFAULT_PAGE_SIZE, keyset_paginate
+from stats_rollup import StatsRollup
+from user_search import UserSearchIndex
+from admin.bulk import BulkOperations
+from admin.payouts import PayoutPipeline
+
+logger = logging.getLogger(__name__)
+
+class AdminService:
+    """Service backing the admin dashboards and admin bot commands"""
+    
+    @staticmethod
+    def get_system_stats():
+        """Get system-wide statistics from the precomputed rollups"""
+        try:
+            totals = StatsRollup.totals()
+            last_24h = StatsRollup.last_hours(24)
+            today = StatsRollup.day()
+            
+            return {
+                'total_users': int(totals['new_users']),
+                'new_users_24h': int(last_24h['new_users']),
+                'total_games': int(totals['games_created']),
+                'games_24h': int(last_24h['games_created']),
+                'active_users_24h': today.active_users or 0,
+                'total_volume': float(totals['deposit_volume'] + totals['withdrawal_volume']),
+                'volume_24h': float(last_24h['deposit_volume'] + last_24h['withdrawal_volume']),
+                'pending_withdrawals': WithdrawalRequest.query.filter_by(status='pending').count()
+            }
+        except Exception as e:
+            logger.error(f"Error getting system stats: {str(e)}")
+            return None
+    
+    @staticmethod
+    def get_recent_users(limit=5):
+        """Get the most recently registered users, leaving out AI opponents"""
+        return User.query.filter(User.is_bot.is_(False)).order_by(User.id.desc()).limit(limit).all()
+    
+    @staticmethod
+    def search_user(query, limit=20):
+        """Search users by username, full name, email or Telegram ID"""
+        return UserSearchIndex.search(query, limit)
+    
+    @staticmethod
+    def get_recent_games(limit=5):
+        """Get the most recently created games"""
+        return AdminService.list_games(limit=limit).items
+    
+    @staticmethod
+    def get_recent_transactions(limit=10):
+        """Get the most recent transactions"""
+        return AdminService.list_transactions(limit=limit).items
+    
+    @staticmethod
+    def list_games(cursor=None, limit=DEFAULT_PAGE_SIZE, status=None):
+        """Page through games newest first, live and archived, with participants and their users loaded"""
+        query = Game.query.options(
+            selectinload(Game.participants).joinedload(GameParticipant.user)
+        )
+        if status:
+            query = query.filter(Game.status.in_(status) if isinstance(status, (list, tuple)) else Game.status == status)
+        page = keyset_paginate(query, Game.id, cursor, limit)
+        return ColdArchive.games_page(page, cursor, limit, status=status)
+    
+    @staticmethod
+    def list_users(cursor=None, limit=DEFAULT_PAGE_SIZE, newest_first=False):
+        """Page through users by id"""
+        return keyset_paginate(User.query, User.id, cursor, limit, descending=newest_first)
+    
+    @staticmethod
+    def list_transactions(cursor=None, limit=DEFAULT_PAGE_SIZE, status=None, tx_type=None, user_id=None):
+        """Page through transactions newest first, live and archived, with their users loaded"""
+        query = Transaction.query.options(joinedload(Transaction.user))
+        if status:
+            query = query.filter(Transaction.status == status)
+        if tx_type:
+            query = query.filter(Transaction.type == tx_type)
+        if user_id:
+            query = query.filter(Transaction.user_id == user_id)
+        page = keyset_paginate(query, Transaction.id, cursor, limit)
+        return ColdArchive.transactions_page(page, cursor, limit, status=status, tx_type=tx_type, user_id=user_id)
+    
+    @staticmethod
+    def get_pending_withdrawals(cursor=None, limit=DEFAULT_PAGE_SIZE):
+        """Page through pending withdrawal requests oldest first, with their users loaded"""
+        query = WithdrawalRequest.query.options(
+            joinedload(WithdrawalRequest.user)
+        ).filter(WithdrawalRequest.status == 'pending')
+        return keyset_paginate(query, WithdrawalRequest.id, cursor, limit, descending=False)
+    
+    @staticmethod
+    def list_collusion_flags(cursor=None, limit=DEFAULT_PAGE_SIZE, status='open'):
+        """Page through collusion flags newest first"""
+        query = CollusionFlag.query
+        if status:
+            query = query.filter(CollusionFlag.status == status)
+        return keyset_paginate(query, CollusionFlag.id, cursor, limit)
+    
+    @staticmethod
+    def adjust_balance(telegram_id, amount, reason=''):
+        """Credit or debit one user by Telegram ID; False if it was not applied"""
+        try:
+            result = BulkOperations.adjust_balances(
+                [(1, int(telegram_id), Decimal(str(amount)), reason)], reason=reason
+            )
+            return result.affected == 1
+        except Exception as e:
+            logger.error(f"Error adjusting balance for {telegram_id}: {str(e)}")
+            return False
+    
+    @staticmethod
+    def cancel_game(game_id, refund=True):
+        """Cancel one open game and refund its players; False if nothing was cancelled"""
+        try:
+            result = BulkOperations.cancel_games(game_ids=[game_id], refund=refund)
+            return result.processed == 1
+        except Exception as e:
+            logger.error(f"Error cancelling game {game_id}: {str(e)}")
+            return False
+    
+    @staticmethod
+    def approve_withdrawal(withdrawal_id, admin_id=None):
+        """Approve and pay one pending withdrawal; returns (success, message)"""
+        try:
+            result = PayoutPipeline.approve(withdrawal_ids=[withdrawal_id], admin_id=admin_id)
+            if result.affected:
+                return True, "Withdrawal approved and paid"
+            if result.failed:
+                return False, f"Payout failed and the amount was refunded: {result.errors[-1]}"
+            return False, "Withdrawal is not pending"
+        except Exception as e:
+            logger.error(f"Error approving withdrawal {withdrawal_id}: {str(e)}")
+            return False, "Failed to approve withdrawal"
+    
+    @staticmethod
+    def reject_withdrawal(withdrawal_id, admin_id=None, reason=''):
+        """Reject one pending withdrawal and refund it; returns (success, message)"""
+        try:
+            result = PayoutPipeline.reject([withdrawal_id], reason=reason)
+            if result.affected:
+                logger.info(f"Withdrawal {withdrawal_id} rejected by admin {admin_id}")
+                return True, "Withdrawal rejected and refunded"
+            return False, "Withdrawal is not pending"
+        except Exception as e:
+            logger.error(f"Error rejecting withdrawal {withdrawal_id}: {str(e)}")
+            return False, "Failed to reject withdrawal"
@@ -3,9 +3,10 @@ from telegram import Update
 from telegram.ext import ContextTypes
 from models import User, Transaction, WithdrawalRequest
 from extensions import db
+from balances import credit
 from payment_service import PaymentService
+from admin import AdminService, PayoutPipeline
 import logging
-from datetime import datetime
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -26,93 +27,69 @@ async def require_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return False
     return True
 
+def find_withdrawal_ids(refs):
+    """Resolve withdrawal ids or withdrawal transaction refs to pending request ids"""
+    ids = []
+    for ref in refs:
+        if ref.isdigit():
+            ids.append(int(ref))
+            continue
+        withdrawal = WithdrawalRequest.query.filter_by(tx_ref=ref, status='pending').first()
+        if not withdrawal:
+            # Requests made before tx_ref was recorded match on user and amount
+            transaction = Transaction.query.filter_by(tx_ref=ref).first()
+            withdrawal = transaction and WithdrawalRequest.query.filter_by(
+                user_id=transaction.user_id,
+                amount=transaction.amount,
+                status='pending',
+                tx_ref=None
+            ).first()
+        if withdrawal:
+            ids.append(withdrawal.id)
+    return ids
+
 async def handle_approve_withdrawal(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle withdrawal approval command"""
+    """Handle withdrawal approval command: /approve <id or tx_ref>..."""
     try:
         # Check admin status
         if not await require_admin(update, context):
             return
 
-        # Check if transaction ID is provided
+        # Check if transaction IDs are provided
         if not context.args:
-            await update.message.reply_text("Please provide a transaction ID.")
+            await update.message.reply_text("Please provide one or more withdrawal IDs or transaction references.")
             return
 
-        tx_ref = context.args[0]
-        
-        # Get transaction and withdrawal request
-        transaction = Transaction.query.filter_by(tx_ref=tx_ref).first()
-        if not transaction:
-            await update.message.reply_text("Transaction not found.")
-            return
-
-        withdrawal = WithdrawalRequest.query.filter_by(
-            user_id=transaction.user_id,
-            amount=transaction.amount,
-            status='pending'
-        ).first()
-        
-        if not withdrawal:
+        withdrawal_ids = find_withdrawal_ids(context.args)
+        if not withdrawal_ids:
             await update.message.reply_text("Withdrawal request not found.")
             return
 
-        # Process withdrawal
-        try:
-            # In test mode, auto-approve
-            if payment_service.TEST_MODE:
-                success = True
-            else:
-                # TODO: Implement actual fund transfer via Chapa or other payment provider
-                success = True  # Placeholder for actual transfer
-
-            if success:
-                # Update transaction status
-                transaction.status = 'completed'
-                withdrawal.status = 'completed'
-                withdrawal.processed_at = datetime.utcnow()
-                
-                # Get user for notification
-                user = User.query.get(transaction.user_id)
-                
-                db.session.commit()
-                
-                # Notify user
-                if user and user.telegram_id:
-                    await context.bot.send_message(
-                        chat_id=user.telegram_id,
-                        text=f"Your withdrawal of {transaction.amount} ETB has been approved and processed."
-                    )
-                
-                await update.message.reply_text(
-                    f"Withdrawal approved and processed successfully.\n"
-                    f"Amount: {transaction.amount} ETB\n"
-                    f"User: {user.username if user else 'Unknown'}"
-                )
+        # Pay them in per-provider batches; failed payouts are refunded
+        admin = User.query.filter_by(telegram_id=update.effective_user.id).first()
+        result = PayoutPipeline.approve(withdrawal_ids=withdrawal_ids, admin_id=admin.id if admin else None)
+
+        # Notify users
+        for item, paid, detail in result.outcomes:
+            if not item['telegram_id']:
+                continue
+            if paid:
+                text = f"Your withdrawal of {item['amount']} ETB has been approved and processed."
             else:
-                # If transfer fails, refund the user
-                user = User.query.get(transaction.user_id)
-                if user:
-                    user.balance += transaction.amount
-                
-                transaction.status = 'failed'
-                withdrawal.status = 'failed'
-                
-                db.session.commit()
-                
-                # Notify user
-                if user and user.telegram_id:
-                    await context.bot.send_message(
-                        chat_id=user.telegram_id,
-                        text=f"Your withdrawal of {transaction.amount} ETB has failed. "
-                             f"The amount has been refunded to your balance."
-                    )
-                
-                await update.message.reply_text("Withdrawal processing failed. User has been refunded.")
-                
-        except Exception as e:
-            db.session.rollback()
-            logger.error(f"Error processing withdrawal: {str(e)}")
-            await update.message.reply_text("Failed to process withdrawal.")
+                text = (f"Your withdrawal of {item['amount']} ETB has failed. "
+                        f"The amount has been refunded to your balance.")
+            try:
+                await context.bot.send_message(chat_id=item['telegram_id'], text=text)
+            except Exception as e:
+                logger.error(f"Error notifying user {item['user_id']}: {str(e)}")
+
+        message = (
+            f"Withdrawals approved: {result.affected} paid ({result.amount:,.2f} ETB), "
+            f"{result.failed} failed and refunded ({result.refunded:,.2f} ETB)."
+        )
+        if result.errors:
+            message += "\n" + "\n".join(result.errors[:10])
+        await update.message.reply_text(message)
 
     except Exception as e:
         logger.error(f"Error in approve withdrawal handler: {str(e)}")
@@ -152,7 +129,7 @@ async def handle_reject_withdrawal(update: Update, context: ContextTypes.DEFAULT
             # Refund the user
             user = User.query.get(transaction.user_id)
             if user:
-                user.balance += transaction.amount
+                credit(user.id, transaction.amount)
             
             # Update statuses
             transaction.status = 'rejected'
@@ -190,8 +167,13 @@ async def handle_pending_withdrawals(update: Update, context: ContextTypes.DEFAU
         if not await require_admin(update, context):
             return
 
-        # Get pending withdrawals
-        pending = WithdrawalRequest.query.filter_by(status='pending').all()
+        # Get one page of pending withdrawals (users are eager-loaded)
+        cursor = context.args[0] if context.args else None
+        try:
+            pending = AdminService.get_pending_withdrawals(cursor, limit=10)
+        except ValueError:
+            await update.message.reply_text("Invalid page cursor.")
+            return
         
         if not pending:
             await update.message.reply_text("No pending withdrawals.")
@@ -200,16 +182,18 @@ async def handle_pending_withdrawals(update: Update, context: ContextTypes.DEFAU
         # Format message
         message = "📋 Pending Withdrawals:\n\n"
         for w in pending:
-            user = User.query.get(w.user_id)
             message += (
                 f"ID: {w.id}\n"
-                f"User: {user.username if user else 'Unknown'}\n"
+                f"User: {w.user.username if w.user else 'Unknown'}\n"
                 f"Amount: {w.amount} ETB\n"
                 f"Wallet: {w.wallet_address}\n"
                 f"Date: {w.created_at.strftime('%Y-%m-%d %H:%M:%S')}\n"
                 f"To approve: /approve {w.id}\n"
                 f"To reject: /reject {w.id}\n\n"
             )
+        
+        if pending.has_more:
+            message += f"More: /pending {pending.next_cursor}"
 
         await update.message.reply_text(message)
 
@@ -6,6 +6,7 @@ Admin tool for managing the RPS Arena database
 import sys
 import os
 from datetime import datetime
+from decimal import Decimal, InvalidOperation
 
 # Ensure we're in the right directory
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -13,8 +14,15 @@ os.chdir(script_dir)
 
 # Import app and models
 from app import app, db
-from models import User, Game, GameParticipant, Transaction, Cooldown
+from models import User, Transaction, Cooldown
 from config import ADMIN_USERS
+from stats_rollup import StatsRollup
+from archive import ColdArchive
+from config import ARCHIVE_AFTER_DAYS, PAYOUT_CONCURRENCY
+from admin import AdminService
+from admin.bulk import BulkOperations, DEFAULT_CHUNK_SIZE, OPEN_GAME_STATUSES, read_adjustments_csv
+from admin.payouts import PayoutPipeline
+from admin.export import FORMATS, TransactionExport, resume_point, parse_date
 
 def help_message():
     """Print help message"""
@@ -29,29 +37,53 @@ def help_message():
     print("  add_admin <telegram_id> - Add user to admin list")
     print("  remove_admin <telegram_id> - Remove user from admin list")
     print("  reset_cooldowns <telegram_id> - Reset cooldowns for a user")
-    print("  clear_games          - Clear all waiting/active games")
+    print("  clear_games [--dry-run] [--no-refund] [--status=waiting,active] [--before=YYYY-MM-DD] [--after=YYYY-MM-DD]")
+    print("                       - Cancel open games in bulk and refund their bets")
     print("  give_balance <telegram_id> <amount> - Add balance to a user")
+    print("  adjust_balances <file.csv> [reason] [--dry-run] [--allow-negative]")
+    print("                       - Apply balance adjustments (columns: telegram_id|user_id|username, amount[, reason])")
+    print("  ban <telegram_id>... [--file=ids.txt] [--dry-run] - Ban users")
+    print("  unban <telegram_id>... [--file=ids.txt] [--dry-run] - Unban users")
     print("  set_debug <true/false> - Enable/disable debug mode")
     print("  create_user <telegram_id> <username> - Manually create a user")
+    print("  backfill_stats [start YYYY-MM-DD] [end YYYY-MM-DD] - Rebuild daily/hourly stats rollups")
+    print(f"  archive [days]       - Move settled games and transactions older than days (default {ARCHIVE_AFTER_DAYS})")
+    print("                         to Parquet files")
+    print("  export_transactions <csv|jsonl|parquet> <start YYYY-MM-DD> <end YYYY-MM-DD> [--out=path]")
+    print("                      [--after=id] [--resume] - Stream transactions in [start, end) to a file")
+    print("  payout_withdrawals [--ids=1,2] [--before=YYYY-MM-DD] [--min-amount=X] [--max-amount=Y] [--limit=N]")
+    print("                     [--concurrency=N] [--dry-run] - Approve and pay pending withdrawals in bulk")
+    print("  collusion_flags [--status=open|confirmed|dismissed|all] [--limit=N] - List players flagged for collusion")
     print()
 
-def list_users():
-    """List all users in the database"""
+def list_users(page_size=1000):
+    """List all users in the database, one keyset page at a time"""
     with app.app_context():
-        users = User.query.all()
+        page = AdminService.list_users(limit=page_size)
         
-        if not users:
+        if not page:
             print("No users found.")
             return
         
-        print(f"Found {len(users)} users:")
-        print()
         print(f"{'ID':<5} {'Telegram ID':<15} {'Username':<20} {'Balance':<10} {'Admin':<6} {'Games':<6}")
         print("-" * 70)
         
-        for user in users:
-            print(f"{user.id:<5} {user.telegram_id:<15} {user.username:<20} ${user.balance:<8.2f} "
-                  f"{'Yes' if user.is_admin else 'No':<6} {user.games_played:<6}")
+        count = 0
+        while True:
+            for user in page:
+                games = (user.wins or 0) + (user.losses or 0)
+                print(f"{user.id:<5} {str(user.telegram_id or '-'):<15} {user.username:<20} ${user.balance or 0:<8.2f} "
+                      f"{'Yes' if user.is_admin else 'No':<6} {games:<6}")
+            count += len(page)
+            
+            if not page.has_more:
+                break
+            # Drop the printed page from the session so memory stays flat
+            db.session.expunge_all()
+            page = AdminService.list_users(page.next_cursor, page_size)
+        
+        print()
+        print(f"Found {count} users.")
 
 def add_admin(telegram_id):
     """Add a user to the admin list in config.py"""
@@ -116,80 +148,125 @@ def reset_cooldowns(telegram_id):
     except ValueError:
         print(f"Error: Invalid Telegram ID: {telegram_id}")
 
-def clear_games():
-    """Clear all waiting or active games"""
+def split_flags(args):
+    """Split command arguments into positionals and --flag[=value] options"""
+    positional, flags = [], {}
+    for arg in args:
+        if arg.startswith('--'):
+            name, _, value = arg[2:].partition('=')
+            flags[name.replace('-', '_')] = value or True
+        else:
+            positional.append(arg)
+    return positional, flags
+
+def print_progress(result):
+    """Print a bulk operation's running counters"""
+    print(result.summary())
+
+def clear_games(*args):
+    """Cancel waiting/active games in bulk, refunding all bets unless --no-refund"""
+    _, flags = split_flags(args)
+    try:
+        before = datetime.strptime(flags['before'], '%Y-%m-%d') if 'before' in flags else None
+        after = datetime.strptime(flags['after'], '%Y-%m-%d') if 'after' in flags else None
+    except (TypeError, ValueError):
+        print("Error: Dates must be in YYYY-MM-DD format")
+        return
+    statuses = flags['status'].split(',') if isinstance(flags.get('status'), str) else OPEN_GAME_STATUSES
+    
     with app.app_context():
-        games = Game.query.filter(Game.status.in_(['waiting', 'active'])).all()
+        result = BulkOperations.cancel_games(
+            statuses=statuses,
+            created_before=before,
+            created_after=after,
+            refund=not flags.get('no_refund'),
+            dry_run=bool(flags.get('dry_run')),
+            chunk_size=int(flags.get('chunk', DEFAULT_CHUNK_SIZE)),
+            progress=print_progress
+        )
         
-        if not games:
+        if not result.processed:
             print("No waiting or active games found.")
             return
         
-        for game in games:
-            # Refund participants
-            for participant in GameParticipant.query.filter_by(game_id=game.id).all():
-                user = User.query.get(participant.user_id)
-                if user:
-                    user.balance += game.bet_amount
-                    
-                    # Create refund transaction
-                    transaction = Transaction(
-                        user_id=user.id,
-                        amount=game.bet_amount,
-                        transaction_type='refund',
-                        status='completed',
-                        reference_id=f"admin_cancel_{game.id}",
-                        created_at=datetime.utcnow(),
-                        completed_at=datetime.utcnow()
-                    )
-                    db.session.add(transaction)
-            
-            # Mark game as cancelled
-            game.status = 'cancelled'
-            game.completed_at = datetime.utcnow()
-        
-        db.session.commit()
-        print(f"Cleared {len(games)} games and refunded all bets.")
+        verb = "Would clear" if result.dry_run else "Cleared"
+        print(f"{verb} {result.processed} games and refund ${result.amount:,.2f} over {result.affected} bets.")
 
 def give_balance(telegram_id, amount):
     """Add balance to a user's account"""
     try:
         telegram_id = int(telegram_id)
-        amount = float(amount)
-        
-        if amount <= 0:
-            print("Error: Amount must be positive")
+        amount = Decimal(amount)
+    except (ValueError, InvalidOperation):
+        print(f"Error: Invalid arguments. Telegram ID must be an integer and amount must be a number.")
+        return
+    
+    if amount <= 0:
+        print("Error: Amount must be positive")
+        return
+    
+    with app.app_context():
+        user = User.query.filter_by(telegram_id=telegram_id).first()
+        if not user:
+            print(f"Error: No user found with Telegram ID {telegram_id}")
             return
         
-        with app.app_context():
-            user = User.query.filter_by(telegram_id=telegram_id).first()
-            if not user:
-                print(f"Error: No user found with Telegram ID {telegram_id}")
-                return
-            
-            # Add balance
-            old_balance = user.balance
-            user.balance += amount
-            
-            # Create transaction
-            transaction = Transaction(
-                user_id=user.id,
-                amount=amount,
-                transaction_type='admin_credit',
-                status='completed',
-                reference_id=f"admin_credit_{int(datetime.utcnow().timestamp())}",
-                created_at=datetime.utcnow(),
-                completed_at=datetime.utcnow()
-            )
-            db.session.add(transaction)
-            db.session.commit()
-            
-            print(f"Added ${amount:.2f} to {user.username}'s balance")
-            print(f"Old balance: ${old_balance:.2f}")
-            print(f"New balance: ${user.balance:.2f}")
+        old_balance = user.balance or 0
+        BulkOperations.adjust_balances([(1, telegram_id, amount, 'admin_tool give_balance')])
+        db.session.refresh(user)
         
-    except ValueError:
-        print(f"Error: Invalid arguments. Telegram ID must be an integer and amount must be a number.")
+        print(f"Added ${amount:.2f} to {user.username}'s balance")
+        print(f"Old balance: ${old_balance:.2f}")
+        print(f"New balance: ${user.balance:.2f}")
+
+def adjust_balances(path, *args):
+    """Apply balance adjustments from a CSV file"""
+    positional, flags = split_flags(args)
+    try:
+        key, rows = read_adjustments_csv(path)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return
+    
+    with app.app_context():
+        result = BulkOperations.adjust_balances(
+            rows,
+            key=key,
+            reason=' '.join(positional),
+            allow_negative=bool(flags.get('allow_negative')),
+            dry_run=bool(flags.get('dry_run')),
+            chunk_size=int(flags.get('chunk', DEFAULT_CHUNK_SIZE)),
+            progress=print_progress
+        )
+        
+        for error in result.errors:
+            print(f"Skipped: {error}")
+        print(result.summary())
+
+def set_banned(banned, *args):
+    """Ban or unban users by Telegram ID, given inline or with --file (one ID per line)"""
+    positional, flags = split_flags(args)
+    try:
+        telegram_ids = [int(arg) for arg in positional]
+        if isinstance(flags.get('file'), str):
+            with open(flags['file']) as f:
+                telegram_ids += [int(line) for line in f if line.strip()]
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return
+    
+    if not telegram_ids:
+        print("Error: No Telegram IDs given")
+        return
+    
+    with app.app_context():
+        result = BulkOperations.set_banned(
+            telegram_ids,
+            banned=banned,
+            dry_run=bool(flags.get('dry_run')),
+            progress=print_progress
+        )
+        print(result.summary())
 
 def set_debug(value):
     """Enable/disable debug mode by setting environment variable"""
@@ -252,6 +329,120 @@ def create_user(telegram_id, username):
     except ValueError:
         print(f"Error: Invalid Telegram ID: {telegram_id}")
 
+def backfill_stats(start=None, end=None):
+    """Rebuild the daily and hourly stats rollups from history"""
+    try:
+        start = datetime.strptime(start, '%Y-%m-%d') if start else None
+        end = datetime.strptime(end, '%Y-%m-%d') if end else None
+    except ValueError:
+        print("Error: Dates must be in YYYY-MM-DD format")
+        return
+    
+    def progress(chunk_start, chunk_end):
+        print(f"Rebuilt {chunk_start:%Y-%m-%d} to {chunk_end:%Y-%m-%d}")
+    
+    with app.app_context():
+        days = StatsRollup.backfill(start, end, progress=progress)
+        print(f"Backfilled stats for {days} days")
+
+def archive(days=None):
+    """Move old settled games and transactions to the cold archive"""
+    try:
+        days = int(days) if days else ARCHIVE_AFTER_DAYS
+    except ValueError:
+        print(f"Error: Invalid number of days: {days}")
+        return
+    
+    with app.app_context():
+        moved = ColdArchive.archive(older_than_days=days)
+        print(f"Archived {moved['games']} games and {moved['transactions']} transactions older than {days} days")
+
+def export_transactions(*args):
+    """Stream transactions created in [start, end) to a file, resuming a partial one with --resume"""
+    positional, flags = split_flags(args)
+    if len(positional) != 3 or positional[0] not in FORMATS:
+        print("Error: Usage: export_transactions <csv|jsonl|parquet> <start> <end> [--out=path] [--after=id] [--resume]")
+        return
+    fmt = positional[0]
+    try:
+        start, end = parse_date(positional[1]), parse_date(positional[2])
+        after_id = int(flags['after']) if flags.get('after') else None
+    except ValueError:
+        print("Error: Dates must be in YYYY-MM-DD format and --after an id")
+        return
+    path = flags.get('out') or f"transactions-{start:%Y%m%d}-{end:%Y%m%d}.{fmt}"
+    
+    mode = 'wb'
+    if flags.get('resume') and os.path.exists(path):
+        try:
+            after_id = resume_point(path, fmt)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return
+        mode = 'ab'
+        print(f"Resuming {path} after transaction {after_id}")
+    
+    try:
+        export = TransactionExport(start, end, after_id)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+    
+    with app.app_context(), open(path, mode) as out:
+        for chunk in export.stream(fmt, header=mode == 'wb'):
+            out.write(chunk)
+    print(f"{export.summary()} to {path}")
+
+def payout_withdrawals(*args):
+    """Approve and pay pending withdrawals by ids or rule, refunding failed payouts"""
+    _, flags = split_flags(args)
+    try:
+        ids = [int(i) for i in flags['ids'].split(',')] if flags.get('ids') else None
+        before = datetime.strptime(flags['before'], '%Y-%m-%d') if flags.get('before') else None
+        min_amount = float(flags['min_amount']) if flags.get('min_amount') else None
+        max_amount = float(flags['max_amount']) if flags.get('max_amount') else None
+        limit = int(flags['limit']) if flags.get('limit') else None
+        concurrency = int(flags.get('concurrency') or PAYOUT_CONCURRENCY)
+    except (AttributeError, ValueError):
+        print("Error: --ids, amounts, --limit and --concurrency must be numbers and --before YYYY-MM-DD")
+        return
+    
+    with app.app_context():
+        result = PayoutPipeline.approve(
+            withdrawal_ids=ids,
+            created_before=before,
+            min_amount=min_amount,
+            max_amount=max_amount,
+            limit=limit,
+            dry_run=bool(flags.get('dry_run')),
+            concurrency=concurrency,
+            progress=print_progress
+        )
+        print(result.summary())
+        for error in result.errors[:20]:
+            print(f"  {error}")
+
+def collusion_flags(*args):
+    """List collusion flags, newest first"""
+    _, flags = split_flags(args)
+    status = flags.get('status') or 'open'
+    try:
+        limit = int(flags.get('limit') or 50)
+    except ValueError:
+        print("Error: --limit must be a number")
+        return
+    
+    with app.app_context():
+        page = AdminService.list_collusion_flags(limit=limit, status=None if status == 'all' else status)
+        if not len(page):
+            print(f"No {status} collusion flags")
+            return
+        print(f"{'ID':<6} {'Kind':<8} {'Users':<24} {'Games':>6} {'Score':>6}  {'Status':<10} Created")
+        for flag in page:
+            print(f"{flag.id:<6} {flag.kind:<8} {flag.user_ids:<24} {flag.games:>6} {flag.score:>6.1f}  "
+                  f"{flag.status:<10} {flag.created_at:%Y-%m-%d %H:%M}")
+            print(f"       {flag.details}")
+
 if __name__ == "__main__":
     if len(sys.argv) < 2 or sys.argv[1] in ('-h', '--help', 'help'):
         help_message()
@@ -272,17 +463,38 @@ if __name__ == "__main__":
         reset_cooldowns(sys.argv[2])
     
     elif command == 'clear_games':
-        clear_games()
+        clear_games(*sys.argv[2:])
     
     elif command == 'give_balance' and len(sys.argv) >= 4:
         give_balance(sys.argv[2], sys.argv[3])
     
+    elif command == 'adjust_balances' and len(sys.argv) >= 3:
+        adjust_balances(*sys.argv[2:])
+    
+    elif command in ('ban', 'unban'):
+        set_banned(command == 'ban', *sys.argv[2:])
+    
     elif command == 'set_debug' and len(sys.argv) >= 3:
         set_debug(sys.argv[2])
     
     elif command == 'create_user' and len(sys.argv) >= 4:
         create_user(sys.argv[2], sys.argv[3])
     
+    elif command == 'backfill_stats':
+        backfill_stats(*sys.argv[2:4])
+    
+    elif command == 'archive':
+        archive(*sys.argv[2:3])
+    
+    elif command == 'export_transactions':
+        export_transactions(*sys.argv[2:])
+    
+    elif command == 'payout_withdrawals':
+        payout_withdrawals(*sys.argv[2:])
+    
+    elif command == 'collusion_flags':
+        collusion_flags(*sys.argv[2:])
+    
     else:
         print(f"Error: Unknown command or missing arguments: {command}")
         print()
@@ -0,0 +1,203 @@
+"""
+AI opponents for practice games (/simulate).
+
+The other seats at a simulated table are taken from a fixed pool of
+AI_POOL_SIZE system accounts. They are created once, flagged with
+User.is_bot and kept out of user counts, leaderboards and collusion
+checks. Their ids are cached in memory, so seating them costs no query,
+and their moves come from the in-memory AI strategy (see ai_strategy.py).
+
+A simulation is settled in one transaction: the stake is debited, any
+payout credited, and one row written. By default that row goes to
+simulated_games. With SIMULATION_PERSIST_GAMES it is a completed game in
+games, with its participants. Simulated games never count towards wins
+and losses.
+
+    result = SIMULATOR.play(user.id, bet_amount, 'rock')
+"""
+import logging
+import secrets
+import threading
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from ai_strategy import STRATEGY
+from balances import credit, debit
+from game import RPSGame
+from models import User, Game, GameParticipant, SimulatedGame
+from config import AI_POOL_SIZE, AI_OPPONENTS_PER_GAME, SIMULATION_PERSIST_GAMES
+
+logger = logging.getLogger(__name__)
+
+MOVES = ('rock', 'paper', 'scissors')
+AI_NAMES = ('Alpha', 'Beta', 'Gamma', 'Delta', 'Epsilon', 'Zeta', 'Eta', 'Theta')
+
+_random = secrets.SystemRandom()
+
+
+def winner_of(moves):
+    """The player whose move beats every other move, or None for a draw"""
+    for user_id, move in moves.items():
+        if all(RPSGame._is_winner(move, other) for other_id, other in moves.items() if other_id != user_id):
+            return user_id
+    return None
+
+
+class OpponentPool:
+    """The fixed set of bot accounts that fill simulated tables"""
+
+    def __init__(self, size=AI_POOL_SIZE):
+        self.size = min(size, len(AI_NAMES))
+        self._bots = None
+        self._lock = threading.Lock()
+
+    @property
+    def usernames(self):
+        return [f"🤖 AI-{name}" for name in AI_NAMES[:self.size]]
+
+    def bots(self):
+        """{user_id: username} of the pool, creating missing accounts on first use"""
+        if self._bots is None:
+            with self._lock:
+                if self._bots is None:
+                    self._bots = self._load()
+        return self._bots
+
+    def _existing(self):
+        return dict(db.session.execute(
+            select(User.username, User.id).where(User.username.in_(self.usernames))
+        ).all())
+
+    def _load(self):
+        existing = self._existing()
+        missing = [name for name in self.usernames if name not in existing]
+        if missing:
+            try:
+                db.session.execute(insert(User), [
+                    {'username': name, 'full_name': name, 'email': f"ai-{name.split('-')[-1].lower()}@bots.rps.local",
+                     'password': '!', 'balance': 0, 'is_bot': True}
+                    for name in missing
+                ])
+                db.session.commit()
+                logger.info(f"Created {len(missing)} AI opponent accounts")
+            except IntegrityError:
+                # Another process created them first
+                db.session.rollback()
+            existing = self._existing()
+        return {existing[name]: name for name in self.usernames}
+
+    def seat(self, count=AI_OPPONENTS_PER_GAME):
+        """Pick count distinct bots; returns [(user_id, username)]"""
+        bots = self.bots()
+        return [(bot_id, bots[bot_id]) for bot_id in _random.sample(list(bots), count)]
+
+    def is_bot(self, user_id):
+        return user_id in self.bots()
+
+    def clear(self):
+        """Forget the cached ids; they are looked up again on next use"""
+        with self._lock:
+            self._bots = None
+
+
+class SimulationResult:
+    """Outcome of one simulated game"""
+    __slots__ = ('move', 'opponents', 'winner_id', 'result', 'bet_amount', 'payout', 'game_id')
+
+    def __init__(self, move, opponents, winner_id, result, bet_amount, payout, game_id=None):
+        self.move = move
+        self.opponents = opponents  # [(username, move)]
+        self.winner_id = winner_id
+        self.result = result
+        self.bet_amount = bet_amount
+        self.payout = payout
+        self.game_id = game_id
+
+    @property
+    def net(self):
+        return self.payout - self.bet_amount
+
+
+class Simulator:
+    """Play and settle games against the AI pool"""
+
+    def __init__(self, pool=None, opponents=AI_OPPONENTS_PER_GAME, persist_games=SIMULATION_PERSIST_GAMES,
+                 strategy=None):
+        self.pool = pool or OpponentPool()
+        self.opponents = opponents
+        self.persist_games = persist_games
+        self.strategy = STRATEGY if strategy is None else strategy
+
+    def play(self, user_id, bet_amount, move, persist_games=None):
+        """Play one game and settle it in one transaction.
+
+        Returns a SimulationResult, or None if the balance doesn't cover the bet.
+        Raises ValueError for an unknown move or a bet outside the game limits.
+        """
+        if move not in MOVES:
+            raise ValueError(f"Unknown move: {move}")
+        bet_amount = Decimal(str(bet_amount))
+        if not bet_amount.is_finite() or bet_amount <= 0:
+            raise ValueError(f"Invalid bet amount: {bet_amount}")
+        valid, message = RPSGame.validate_bet_amount(bet_amount)
+        if not valid:
+            raise ValueError(message)
+        persist_games = self.persist_games if persist_games is None else persist_games
+
+        seats = self.pool.seat(self.opponents)
+        ai_moves = self.strategy.choose(user_id, len(seats))
+        moves = {user_id: move, **{bot_id: ai_move for (bot_id, _), ai_move in zip(seats, ai_moves)}}
+        winner_id = winner_of(moves)
+        if winner_id is None:
+            result, payout = 'draw', bet_amount
+        elif winner_id == user_id:
+            result, payout = 'win', bet_amount * len(moves)
+        else:
+            result, payout = 'lose', Decimal('0')
+        outcome = SimulationResult(move, [(name, moves[bot_id]) for bot_id, name in seats],
+                                   winner_id, result, bet_amount, payout)
+
+        try:
+            if not debit(user_id, bet_amount):
+                db.session.rollback()
+                return None
+            if payout:
+                credit(user_id, payout)
+            if persist_games:
+                outcome.game_id = self._record_game(user_id, bet_amount, moves, winner_id)
+            else:
+                db.session.add(SimulatedGame(
+                    user_id=user_id, bet_amount=bet_amount, move=move,
+                    opponent_moves=','.join(moves[bot_id] for bot_id, _ in seats),
+                    result=result, payout=payout
+                ))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        self.strategy.observe(user_id, move)
+        return outcome
+
+    @staticmethod
+    def _record_game(user_id, bet_amount, moves, winner_id):
+        game = Game(creator_id=user_id, bet_amount=bet_amount, status='in_progress',
+                    min_players=len(moves), max_players=len(moves))
+        db.session.add(game)
+        db.session.flush()
+        db.session.add_all(
+            GameParticipant(game_id=game.id, user_id=player_id, move=player_move,
+                            result='draw' if winner_id is None else 'win' if player_id == winner_id else 'lose')
+            for player_id, player_move in moves.items()
+        )
+        # Completed in the same flush as its participants, so settlement listeners see them
+        game.status = 'completed'
+        game.winner_id = winner_id
+        game.completed_at = datetime.utcnow()
+        return game.id
+
+
+SIMULATOR = Simulator()
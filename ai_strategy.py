@@ -0,0 +1,261 @@
+"""
+Move strategies for the AI opponents.
+
+A strategy picks the AI moves for a table and is told each player's move
+once the game is settled:
+
+    moves = STRATEGY.choose(user_id, seats=2)
+    ...
+    STRATEGY.observe(user_id, move)
+
+'random' plays uniformly. 'markov' keeps, per player, how often each move
+followed each move (a 3x3 transition count matrix) and their last move. It
+predicts the player's next move from the row of their last move, falling
+back to their overall move frequency, and plays what beats it. AI_DIFFICULTY
+is the share of games played that way; the rest are uniform random, so 0
+is the random strategy.
+
+Each player's state is 10 uint16s in one flat array('H') (20 bytes a
+player), with an LRU of AI_STRATEGY_CACHE_SIZE players mapping user ids to
+slots. With the LRU's index that is roughly 250 bytes a player, so about
+250 MB at the default million players; choose() and observe() take a few
+microseconds (benchmarks/ai_strategy.py).
+Counts are halved when one reaches MAX_COUNT, which keeps them in range and
+weighs recent habits more.
+
+States are loaded from ai_move_models on first use. Changed states are
+written back in batches of AI_STRATEGY_BATCH_SIZE with one upsert, and
+flush() writes the rest, e.g. at shutdown. A crash loses at most one batch
+of learning.
+"""
+import logging
+import random
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from extensions import db
+from models import AIMoveModel
+from config import AI_STRATEGY, AI_DIFFICULTY, AI_STRATEGY_CACHE_SIZE, AI_STRATEGY_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+MOVES = ('rock', 'paper', 'scissors')
+MOVE_INDEX = {move: index for index, move in enumerate(MOVES)}
+BEATEN_BY = (1, 2, 0)  # paper beats rock, scissors beat paper, rock beats scissors
+
+STATE_SIZE = 10  # 3x3 transition counts, then the last move
+LAST = 9
+NO_MOVE = 3
+MAX_COUNT = 255
+_EMPTY = array('H', [0] * LAST + [NO_MOVE])
+
+
+def _pack(state):
+    state = array('H', state)
+    if sys.byteorder == 'big':
+        state.byteswap()
+    return state.tobytes()
+
+
+def _unpack(data):
+    state = array('H')
+    state.frombytes(data)
+    if sys.byteorder == 'big':
+        state.byteswap()
+    return state
+
+
+def _upsert_models(connection, rows):
+    """Write {user_id: packed state} in one statement"""
+    table = AIMoveModel.__table__
+    now = datetime.utcnow()
+    params = [{'user_id': user_id, 'counts': data, 'updated_at': now} for user_id, data in rows.items()]
+    dialect = connection.dialect.name
+
+    if dialect in ('sqlite', 'postgresql'):
+        dialect_insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id],
+            set_={'counts': stmt.excluded.counts, 'updated_at': stmt.excluded.updated_at}
+        )
+        connection.execute(stmt, params)
+        return
+
+    for row in params:
+        result = connection.execute(
+            update(table).where(table.c.user_id == row['user_id'])
+            .values(counts=row['counts'], updated_at=row['updated_at'])
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(table).values(**row))
+
+
+class RandomStrategy:
+    """Uniform random moves"""
+    name = 'random'
+
+    def __init__(self, rng=None):
+        self.rng = rng or random.SystemRandom()
+
+    def choose(self, user_id, seats=1):
+        return [self.rng.choice(MOVES) for _ in range(seats)]
+
+    def observe(self, user_id, move):
+        pass
+
+    def flush(self):
+        return 0
+
+
+class MarkovStrategy(RandomStrategy):
+    """Plays against each player's predicted next move"""
+    name = 'markov'
+
+    def __init__(self, difficulty=AI_DIFFICULTY, max_users=AI_STRATEGY_CACHE_SIZE,
+                 batch_size=AI_STRATEGY_BATCH_SIZE, rng=None):
+        super().__init__(rng)
+        self.difficulty = difficulty
+        self.max_users = max_users
+        self.batch_size = batch_size
+        self._state = array('H')
+        self._slots = OrderedDict()
+        self._dirty = set()
+        self._evicted = {}
+        self._lock = threading.Lock()
+
+    def _load(self, user_id):
+        data = self._evicted.get(user_id)
+        if data is None:
+            data = db.session.execute(
+                select(AIMoveModel.counts).where(AIMoveModel.user_id == user_id)
+            ).scalar()
+        return _unpack(data) if data else _EMPTY
+
+    def _slot(self, user_id):
+        """The user's offset in the state array, loading it on a miss; call with the lock held"""
+        slot = self._slots.get(user_id)
+        if slot is not None:
+            self._slots.move_to_end(user_id)
+            return slot
+
+        state = self._load(user_id)
+        if len(self._slots) >= self.max_users:
+            evicted_id, slot = self._slots.popitem(last=False)
+            if evicted_id in self._dirty:
+                self._dirty.discard(evicted_id)
+                self._evicted[evicted_id] = _pack(self._state[slot:slot + STATE_SIZE])
+            self._state[slot:slot + STATE_SIZE] = state
+        else:
+            slot = len(self._state)
+            self._state.extend(state)
+        if self._evicted.pop(user_id, None) is not None:
+            self._dirty.add(user_id)  # reloaded before its pending write went out
+        self._slots[user_id] = slot
+        return slot
+
+    def _argmax(self, counts):
+        best = max(counts)
+        if not best:
+            return None
+        return self.rng.choice([move for move, count in enumerate(counts) if count == best])
+
+    def predict(self, user_id):
+        """The player's most likely next move, or None with nothing to go on"""
+        with self._lock:
+            slot = self._slot(user_id)
+            state = self._state
+            last = state[slot + LAST]
+            if last != NO_MOVE:
+                row = slot + last * 3
+                move = self._argmax(state[row:row + 3])
+                if move is not None:
+                    return MOVES[move]
+            move = self._argmax([state[slot + m] + state[slot + 3 + m] + state[slot + 6 + m] for m in range(3)])
+            return None if move is None else MOVES[move]
+
+    def choose(self, user_id, seats=1):
+        """AI moves for seats opponents of the player.
+
+        One seat plays what beats the prediction. Under the rule that the
+        winner must beat every other move, the others copy the prediction.
+        """
+        if self.rng.random() >= self.difficulty:
+            return super().choose(user_id, seats)
+        predicted = self.predict(user_id)
+        if predicted is None:
+            return super().choose(user_id, seats)
+        return [MOVES[BEATEN_BY[MOVE_INDEX[predicted]]]] + [predicted] * (seats - 1)
+
+    def observe(self, user_id, move):
+        """Count the player's move after their last one"""
+        index = MOVE_INDEX[move]
+        with self._lock:
+            slot = self._slot(user_id)
+            state = self._state
+            last = state[slot + LAST]
+            if last != NO_MOVE:
+                row = slot + last * 3
+                if state[row + index] >= MAX_COUNT:
+                    for cell in range(row, row + 3):
+                        state[cell] >>= 1
+                state[row + index] += 1
+            state[slot + LAST] = index
+            self._dirty.add(user_id)
+            due = len(self._dirty) + len(self._evicted) >= self.batch_size
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write every changed state in one upsert; returns how many"""
+        with self._lock:
+            rows = dict(self._evicted)
+            for user_id in self._dirty:
+                slot = self._slots[user_id]
+                rows[user_id] = _pack(self._state[slot:slot + STATE_SIZE])
+            self._evicted.clear()
+            self._dirty.clear()
+        if not rows:
+            return 0
+        try:
+            with db.engine.begin() as connection:
+                _upsert_models(connection, rows)
+        except Exception as e:
+            logger.error(f"Error saving AI move models: {e}")
+            with self._lock:
+                for user_id, data in rows.items():
+                    if user_id not in self._dirty:
+                        self._evicted.setdefault(user_id, data)
+            return 0
+        return len(rows)
+
+    def clear(self):
+        """Forget every in-memory state, without saving"""
+        with self._lock:
+            self._state = array('H')
+            self._slots.clear()
+            self._dirty.clear()
+            self._evicted.clear()
+
+    def __len__(self):
+        return len(self._slots)
+
+
+STRATEGIES = {strategy.name: strategy for strategy in (RandomStrategy, MarkovStrategy)}
+
+
+def get_strategy(name=AI_STRATEGY, **options):
+    """Build a strategy by name"""
+    try:
+        return STRATEGIES[name](**options)
+    except KeyError:
+        raise ValueError(f"Unknown AI strategy: {name}") from None
+
+
+STRATEGY = get_strategy()
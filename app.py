@@ -13,6 +13,17 @@ from admin.routes import admin_bp
 from webhooks import webhooks
 from dotenv import load_dotenv
 from config import Config
+from db_routing import configure_engine, configure_read_only_bind, enable_sqlite_wal, read_only_view
+from stats_rollup import StatsRollup, register_rollup_listeners
+from game_status import register_status_listeners
+from referrals import register_referral_listeners
+from collusion import register_collusion_listeners
+from live_events import register_live_listeners
+from user_search import UserSearchIndex
+from limits import LIMITS, register_limit_listeners
+from game import RPSGame
+import metrics
+import sql_profiler
 
 # Load environment variables
 load_dotenv()
@@ -25,7 +36,7 @@ logging.basicConfig(
 LOGGER = logging.getLogger(__name__)
 
 # Import models before init_db to avoid NameError
-from models import User, Room, RoomPlayer, Transaction, WithdrawalRequest, DailyStats, Cooldown
+from models import User, RoomPlayer, Transaction, WithdrawalRequest, DailyStats, Cooldown
 
 def init_db(app):
     """Initialize the database"""
@@ -40,8 +51,16 @@ def init_db(app):
         with app.app_context():
             # Create tables if they don't exist
             db.create_all()
+            UserSearchIndex.install()
+            db.session.commit()
             LOGGER.info("Created all tables")
             
+            # Reload the rolling deposit/withdrawal limit counters
+            LIMITS.recover()
+            
+            # Dashboards read the rollups; fill them once on a database that predates them
+            StatsRollup.backfill_if_empty()
+            
             # Test database connection
             db.session.execute(text('SELECT 1'))
             LOGGER.info("Database connection test successful")
@@ -80,8 +99,25 @@ def create_app(config_class=Config):
     app.config.from_object(config_class)
     
     # Initialize extensions
+    configure_engine(app)
+    configure_read_only_bind(app)
     db.init_app(app)
     migrate.init_app(app, db)
+    with app.app_context():
+        enable_sqlite_wal(db.engine)
+    register_rollup_listeners()
+    register_status_listeners()
+    register_referral_listeners()
+    register_collusion_listeners()
+    register_live_listeners()
+    register_limit_listeners()
+    metrics.init_app(app)
+    sql_profiler.init_app(app)
+    
+    def waiting_games():
+        with app.app_context():
+            return RPSGame.waiting_games_by_bet()
+    metrics.MATCHMAKING_WAITING.set_function(waiting_games)
     
     # Register blueprints
     app.register_blueprint(webhooks, url_prefix='/webhooks')
@@ -199,14 +235,13 @@ def withdraw():
     return render_template('withdraw.html')
 
 @app.route('/admin')
+@read_only_view
 def admin_dashboard():
-    # Get system stats
-    total_users = User.query.count()
-    total_games = Room.query.count()
-    total_volume = db.session.query(db.func.sum(Transaction.amount)).filter(
-        Transaction.status == 'completed',
-        Transaction.transaction_type.in_(['deposit', 'withdraw'])
-    ).scalar() or Decimal('0')
+    # Get system stats from the rollups
+    totals = StatsRollup.totals()
+    total_users = totals['new_users']
+    total_games = totals['games_created']
+    total_volume = totals['deposit_volume'] + totals['withdrawal_volume']
     
     # Get recent transactions
     recent_transactions = Transaction.query.order_by(Transaction.created_at.desc()).limit(10).all()
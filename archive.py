@@ -0,0 +1,450 @@
+"""
+Cold archival of settled games and transactions.
+
+Completed and cancelled games, with their participants, and settled
+transactions older than ARCHIVE_AFTER_DAYS move out of the live tables
+into zstd-compressed Parquet files, one per table, month and run:
+
+    ARCHIVE_DIR/games/2026-03/20261019T120000.parquet
+    ARCHIVE_DIR/transactions/2026-03/20261019T120000.parquet
+
+Rows are streamed out of the database with yield_per and written in
+record batches of ARCHIVE_BATCH_SIZE, so memory stays bounded however
+much is archived. A game's participants are nested in its row. Once a
+file is closed, one transaction registers it in archive_segments, leaves
+an archive_tombstones row per user with rows in it, and deletes the rows
+it holds. A crash before that commit leaves a file nothing reads.
+
+Reads keep their signatures: RPSGame.get_user_games,
+PaymentService.get_transactions and the admin game and transaction pages
+fill up from the archive when the live rows don't cover the request.
+Archived rows come back as transient model objects with ``archived``
+set. A user's reads only open the files their tombstones point at, and
+id pages only the segments whose id range can still make the page.
+The archived tables are AUTOINCREMENT on SQLite, so the ids of archived
+rows are never handed out again.
+
+pyarrow is needed to archive and to read archived rows; with nothing
+archived the read paths never touch it.
+
+    python admin_tool.py archive [days]
+"""
+import heapq
+import logging
+import os
+from array import array
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, delete, func, insert, select, types
+from sqlalchemy.orm.attributes import set_committed_value
+
+from extensions import db
+from models import User, Game, GameParticipant, Transaction, ArchiveSegment, ArchiveTombstone
+from pagination import Page, clamp_page_size, decode_cursor, encode_cursor
+from config import ARCHIVE_DIR, ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # only needed once something is archived
+    pa = pc = pq = None
+
+logger = logging.getLogger(__name__)
+
+SETTLED_GAME_STATUSES = ('completed', 'cancelled')
+SETTLED_TRANSACTION_STATUSES = ('completed', 'failed', 'cancelled', 'rejected')
+COMPRESSION = 'zstd'
+
+games = Game.__table__
+participants = GameParticipant.__table__
+transactions = Transaction.__table__
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("The archive needs pyarrow: pip install pyarrow")
+
+
+def _arrow_type(column):
+    kind = column.type
+    if isinstance(kind, types.Boolean):
+        return pa.bool_()
+    if isinstance(kind, types.Integer):
+        return pa.int64()
+    if isinstance(kind, types.Float):
+        return pa.float64()
+    if isinstance(kind, types.Numeric):
+        return pa.decimal128(kind.precision or 18, kind.scale or 2)
+    if isinstance(kind, types.DateTime):
+        return pa.timestamp('us')
+    return pa.string()
+
+
+def arrow_schema(table, extra=()):
+    """Arrow schema matching a table's columns"""
+    return pa.schema([pa.field(column.name, _arrow_type(column)) for column in table.columns] + list(extra))
+
+
+def _games_schema():
+    seat = pa.struct(list(arrow_schema(participants)))
+    return arrow_schema(games, [pa.field('participants', pa.list_(seat))])
+
+
+class _SegmentWriter:
+    """Streams one month of one table into a Parquet file, a record batch at a time"""
+
+    def __init__(self, table_name, month, path, schema, batch_size):
+        self.table_name = table_name
+        self.month = month
+        self.path = path
+        self.schema = schema
+        self.batch_size = batch_size
+        self.ids = array('q')
+        self.user_ids = set()
+        self.max_created_at = None
+        self._buffer = []
+        self._writer = None
+
+    def add(self, row, user_ids):
+        self._buffer.append(row)
+        self.ids.append(row['id'])
+        self.user_ids.update(user_ids)
+        created_at = row['created_at'] or row.get('completed_at')
+        if self.max_created_at is None or created_at > self.max_created_at:
+            self.max_created_at = created_at
+        if len(self._buffer) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        if self._writer is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._writer = pq.ParquetWriter(self.path, self.schema, compression=COMPRESSION)
+        self._writer.write_batch(pa.RecordBatch.from_pylist(self._buffer, schema=self.schema))
+        self._buffer = []
+
+    def close(self):
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def discard(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _game_rows(cutoff, batch_size):
+    """Archivable games, oldest id first, with their participants nested"""
+    result = db.session.execute(
+        select(games)
+        .where(games.c.status.in_(SETTLED_GAME_STATUSES),
+               func.coalesce(games.c.completed_at, games.c.created_at) < cutoff)
+        .order_by(games.c.id),
+        execution_options={'yield_per': batch_size}
+    )
+    for batch in result.partitions():
+        rows = [dict(row._mapping) for row in batch]
+        seats = defaultdict(list)
+        for seat in db.session.execute(
+            select(participants).where(participants.c.game_id.in_([row['id'] for row in rows]))
+        ).mappings():
+            seats[seat['game_id']].append(dict(seat))
+        for row in rows:
+            row['participants'] = seats[row['id']]
+            yield row, {seat['user_id'] for seat in row['participants']}
+
+
+def _transaction_rows(cutoff, batch_size):
+    result = db.session.execute(
+        select(transactions)
+        .where(transactions.c.status.in_(SETTLED_TRANSACTION_STATUSES), transactions.c.created_at < cutoff)
+        .order_by(transactions.c.id),
+        execution_options={'yield_per': batch_size}
+    )
+    for batch in result.partitions():
+        for row in batch:
+            row = dict(row._mapping)
+            yield row, (row['user_id'],)
+
+
+def _write_segments(table_name, rows, schema, directory, stamp, batch_size):
+    """Write rows into one file per month; returns the closed writers"""
+    writers = {}
+    try:
+        for row, user_ids in rows:
+            month = (row['created_at'] or row['completed_at']).strftime('%Y-%m')
+            writer = writers.get(month)
+            if writer is None:
+                path = os.path.join(directory, table_name, month, f"{stamp}.parquet")
+                writer = writers[month] = _SegmentWriter(table_name, month, path, schema, batch_size)
+            writer.add(row, user_ids)
+        for writer in writers.values():
+            writer.close()
+    except BaseException:
+        for writer in writers.values():
+            writer.discard()
+        raise
+    return list(writers.values())
+
+
+def _register(writer, deletes):
+    """Index one closed file and delete the rows it holds, in one transaction"""
+    try:
+        segment = ArchiveSegment(
+            table_name=writer.table_name, month=writer.month, path=writer.path,
+            row_count=len(writer.ids), min_id=min(writer.ids), max_id=max(writer.ids),
+            max_created_at=writer.max_created_at
+        )
+        db.session.add(segment)
+        db.session.flush()
+        db.session.execute(insert(ArchiveTombstone), [
+            {'user_id': user_id, 'segment_id': segment.id} for user_id in writer.user_ids
+        ])
+        for statement in deletes:
+            db.session.execute(statement, [{'row_id': row_id} for row_id in writer.ids])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        writer.discard()
+        raise
+
+
+def _scan(path, predicate=None):
+    """Rows of one archive file, read a record batch at a time"""
+    _require_pyarrow()
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=ARCHIVE_BATCH_SIZE):
+        if predicate is not None:
+            batch = batch.filter(predicate(batch))
+        yield from batch.to_pylist()
+
+
+def _with_player(user_id):
+    def predicate(batch):
+        seats = batch.column('participants')
+        hit = pc.equal(pc.list_flatten(seats).field('user_id'), user_id)
+        rows = pc.filter(pc.list_parent_indices(seats), hit)
+        return pc.is_in(pa.array(range(batch.num_rows), pa.int64()), value_set=rows.cast(pa.int64()))
+    return predicate
+
+
+def _columns_equal(**values):
+    def predicate(batch):
+        mask = None
+        for name, value in values.items():
+            if value is None:
+                continue
+            if name == 'id_below':
+                term = pc.less(batch.column('id'), value)
+            elif isinstance(value, (list, tuple)):
+                term = pc.is_in(batch.column(name), value_set=pa.array(value))
+            else:
+                term = pc.equal(batch.column(name), value)
+            mask = term if mask is None else pc.and_(mask, term)
+        return mask if mask is not None else pa.array([True] * batch.num_rows)
+    return predicate
+
+
+def _created_between(start, end, after_id=None):
+    def predicate(batch):
+        created_at = batch.column('created_at')
+        mask = pc.and_(pc.greater_equal(created_at, pa.scalar(start, pa.timestamp('us'))),
+                       pc.less(created_at, pa.scalar(end, pa.timestamp('us'))))
+        if after_id is not None:
+            mask = pc.and_(mask, pc.greater(batch.column('id'), after_id))
+        return mask
+    return predicate
+
+
+def _game(row):
+    seats = row.pop('participants') or []
+    game = Game(**row)
+    set_committed_value(game, 'participants', [GameParticipant(**seat) for seat in seats])
+    game.archived = True
+    return game
+
+
+def _transaction(row):
+    transaction = Transaction(**row)
+    transaction.archived = True
+    return transaction
+
+
+def _attach_users(pairs):
+    """Set obj.user for (obj, user_id) pairs of archived objects with one query"""
+    user_ids = {user_id for _, user_id in pairs}
+    users = {user.id: user for user in User.query.filter(User.id.in_(user_ids))} if user_ids else {}
+    for obj, user_id in pairs:
+        set_committed_value(obj, 'user', users.get(user_id))
+
+
+def _newest_first(obj):
+    return obj.created_at or datetime.min
+
+
+class ColdArchive:
+    """Moves settled rows to Parquet and reads them back next to the live ones"""
+
+    @staticmethod
+    def archive(older_than_days=ARCHIVE_AFTER_DAYS, now=None, directory=ARCHIVE_DIR,
+                batch_size=ARCHIVE_BATCH_SIZE):
+        """Archive settled games and transactions older than older_than_days; returns rows moved per table"""
+        _require_pyarrow()
+        now = now or datetime.utcnow()
+        cutoff = now - timedelta(days=older_than_days)
+        stamp = now.strftime('%Y%m%dT%H%M%S')
+        row_id = bindparam('row_id')
+
+        moved = {}
+        for table_name, rows, schema, deletes in (
+            ('games', _game_rows(cutoff, batch_size), _games_schema(),
+             [delete(participants).where(participants.c.game_id == row_id), delete(games).where(games.c.id == row_id)]),
+            ('transactions', _transaction_rows(cutoff, batch_size), arrow_schema(transactions),
+             [delete(transactions).where(transactions.c.id == row_id)]),
+        ):
+            writers = _write_segments(table_name, rows, schema, directory, stamp, batch_size)
+            db.session.rollback()  # end the streaming read before writing
+            for writer in writers:
+                _register(writer, deletes)
+            moved[table_name] = sum(len(writer.ids) for writer in writers)
+            logger.info(f"Archived {moved[table_name]} {table_name} older than {cutoff:%Y-%m-%d} "
+                        f"into {len(writers)} files")
+        return moved
+
+    @staticmethod
+    def _recent(table_name, user_id, live, limit, predicate, to_object):
+        segments = ArchiveSegment.query.join(
+            ArchiveTombstone, ArchiveTombstone.segment_id == ArchiveSegment.id
+        ).filter(
+            ArchiveSegment.table_name == table_name,
+            ArchiveTombstone.user_id == user_id
+        ).order_by(ArchiveSegment.max_created_at.desc()).all()
+
+        merged = list(live)
+        seen = {obj.id for obj in live}
+        for segment in segments:
+            # Segments come newest first: once the page is full and older than this one, it's done
+            if len(merged) >= limit and segment.max_created_at <= _newest_first(merged[limit - 1]):
+                break
+            for row in _scan(segment.path, predicate):
+                if row['id'] not in seen:
+                    seen.add(row['id'])
+                    merged.append(to_object(row))
+            merged = sorted(merged, key=_newest_first, reverse=True)[:limit]
+        return merged
+
+    @staticmethod
+    def user_games(user_id, live, limit):
+        """A user's newest games across tiers, given the live ones newest first"""
+        return ColdArchive._recent('games', user_id, live, limit, _with_player(user_id), _game)
+
+    @staticmethod
+    def user_transactions(user_id, live, limit):
+        """A user's newest transactions across tiers, given the live ones newest first"""
+        return ColdArchive._recent('transactions', user_id, live, limit,
+                                   _columns_equal(user_id=user_id), _transaction)
+
+    @staticmethod
+    def _page(table_name, page, cursor, limit, filters, to_object, user_id=None):
+        """Merge archived rows into a keyset page (newest id first) of live rows"""
+        limit = clamp_page_size(limit)
+        key = decode_cursor(cursor)
+        query = ArchiveSegment.query.filter(ArchiveSegment.table_name == table_name)
+        if user_id is not None:
+            query = query.join(
+                ArchiveTombstone, ArchiveTombstone.segment_id == ArchiveSegment.id
+            ).filter(ArchiveTombstone.user_id == user_id)
+        if key is not None:
+            query = query.filter(ArchiveSegment.min_id < key)
+        segments = query.order_by(ArchiveSegment.max_id.desc()).all()
+        if not segments:
+            return page
+        if len(page.items) == limit and page.items[-1].id > segments[0].max_id:
+            # The live rows fill the page, but archived ones still lie below it
+            return Page(page.items, page.next_cursor or encode_cursor(page.items[-1].id))
+
+        # Keep the limit + 1 highest archived ids below the cursor
+        predicate = _columns_equal(id_below=key, **filters)
+        seen = {obj.id for obj in page.items}
+        best = []
+        for segment in segments:
+            if len(best) > limit and segment.max_id < best[0][0]:
+                break
+            for row in _scan(segment.path, predicate):
+                if row['id'] in seen:
+                    continue
+                seen.add(row['id'])
+                if len(best) <= limit:
+                    heapq.heappush(best, (row['id'], row))
+                elif row['id'] > best[0][0]:
+                    heapq.heapreplace(best, (row['id'], row))
+
+        merged = sorted(page.items + [to_object(row) for _, row in best], key=lambda obj: obj.id, reverse=True)
+        has_more = page.has_more or len(merged) > limit
+        merged = merged[:limit]
+        return Page(merged, encode_cursor(merged[-1].id) if has_more and merged else None)
+
+    @staticmethod
+    def games_page(page, cursor=None, limit=None, status=None):
+        """AdminService.list_games page with archived games merged in"""
+        page = ColdArchive._page('games', page, cursor, limit, {'status': status}, _game)
+        _attach_users([
+            (seat, seat.user_id) for game in page.items if getattr(game, 'archived', False)
+            for seat in game.participants
+        ])
+        return page
+
+    @staticmethod
+    def transactions_page(page, cursor=None, limit=None, status=None, tx_type=None, user_id=None):
+        """AdminService.list_transactions page with archived transactions merged in"""
+        page = ColdArchive._page('transactions', page, cursor, limit,
+                                 {'status': status, 'type': tx_type, 'user_id': user_id}, _transaction,
+                                 user_id=user_id)
+        _attach_users([(tx, tx.user_id) for tx in page.items if getattr(tx, 'archived', False)])
+        return page
+
+    @staticmethod
+    def iter_transactions(start, end, after_id=None):
+        """Archived transaction rows created in [start, end) with id > after_id, in id order"""
+        query = ArchiveSegment.query.filter(
+            ArchiveSegment.table_name == 'transactions',
+            ArchiveSegment.month >= start.strftime('%Y-%m'),
+            ArchiveSegment.month <= (end - timedelta(microseconds=1)).strftime('%Y-%m')
+        )
+        if after_id is not None:
+            query = query.filter(ArchiveSegment.max_id > after_id)
+        predicate = _created_between(start, end, after_id)
+        # Each file is in id order, so a lazy merge keeps one batch per file in memory
+        return heapq.merge(*(_scan(segment.path, predicate) for segment in query.all()),
+                           key=lambda row: row['id'])
+
+    @staticmethod
+    def _find(table_name, row_id, to_object):
+        segments = ArchiveSegment.query.filter(
+            ArchiveSegment.table_name == table_name,
+            ArchiveSegment.min_id <= row_id,
+            ArchiveSegment.max_id >= row_id
+        )
+        for segment in segments:
+            for row in _scan(segment.path, _columns_equal(id=row_id)):
+                return to_object(row)
+        return None
+
+    @staticmethod
+    def get_game(game_id):
+        """An archived game with its participants and their users, or None"""
+        game = ColdArchive._find('games', game_id, _game)
+        if game is not None:
+            _attach_users([(seat, seat.user_id) for seat in game.participants])
+        return game
+
+    @staticmethod
+    def get_transaction(transaction_id):
+        """An archived transaction, or None"""
+        return ColdArchive._find('transactions', transaction_id, _transaction)
@@ -0,0 +1,48 @@
+"""
+Atomic balance changes.
+
+A debit is one conditional UPDATE, ``balance = balance - :x WHERE balance
+>= :x``, so two concurrent debits can neither both pass a stale balance
+check nor overwrite each other's result, on SQLite or Postgres. A credit
+is the matching ``balance = balance + :x``. Users already loaded in the
+session are refreshed from the statement, so callers can keep using them.
+
+Both take a positive amount and raise ValueError otherwise: a negative
+debit would pass the balance check and pay the user instead.
+"""
+from sqlalchemy import update
+
+from extensions import db
+from models import User
+
+
+def _positive(amount):
+    amount = float(amount)
+    # Written so NaN fails too
+    if not amount > 0:
+        raise ValueError(f"Balance changes must be positive, got {amount}")
+    return amount
+
+
+def debit(user_id, amount):
+    """Take amount from the user's balance; False, with nothing changed, when it doesn't cover it"""
+    amount = _positive(amount)
+    result = db.session.execute(
+        update(User)
+        .where(User.id == user_id, User.balance >= amount)
+        .values(balance=User.balance - amount),
+        execution_options={'synchronize_session': 'fetch'}
+    )
+    return result.rowcount == 1
+
+
+def credit(user_id, amount):
+    """Add amount to the user's balance; False if the user doesn't exist"""
+    amount = _positive(amount)
+    result = db.session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(balance=User.balance + amount),
+        execution_options={'synchronize_session': 'fetch'}
+    )
+    return result.rowcount == 1
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark the AI move strategies.
+
+Teaches the markov strategy --players players' moves, then times
+choose() and observe() on players already in memory, and prints
+microseconds per call and the memory held per player (state array plus
+LRU index). Each player's first use is one ai_move_models lookup, which
+is timed separately.
+
+Usage: python benchmarks/ai_strategy.py [--players N] [--moves M]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from ai_strategy import MOVES, MarkovStrategy, RandomStrategy
+from extensions import db
+
+
+def per_call(calls, func):
+    started = time.perf_counter()
+    for args in calls:
+        func(*args)
+    return (time.perf_counter() - started) / len(calls) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--players', type=int, default=100000)
+    parser.add_argument('--moves', type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            strategy = MarkovStrategy(difficulty=1.0, max_users=args.players, batch_size=args.players + 1)
+
+            tracemalloc.start()
+            started = time.perf_counter()
+            for user_id in range(1, args.players + 1):
+                strategy.observe(user_id, random.choice(MOVES))
+            load = (time.perf_counter() - started) / args.players * 1e6
+            memory, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            calls = [(random.randint(1, args.players), random.choice(MOVES)) for _ in range(args.moves)]
+            observe = per_call(calls, strategy.observe)
+            choose = per_call([(user_id, 2) for user_id, _ in calls], strategy.choose)
+            uniform = per_call([(user_id, 2) for user_id, _ in calls], RandomStrategy().choose)
+
+            started = time.perf_counter()
+            written = strategy.flush()
+            flush = time.perf_counter() - started
+
+    print(f"{args.players} players, {args.moves} moves")
+    print(f"first use (load)   us/call={load:7.2f}")
+    print(f"observe            us/call={observe:7.2f}")
+    print(f"choose (markov)    us/call={choose:7.2f}")
+    print(f"choose (random)    us/call={uniform:7.2f}")
+    print(f"memory             bytes/player={memory / args.players:6.0f}  "
+          f"projected for 1M={memory / args.players:.0f} MB")
+    print(f"flush              rows={written}  s={flush:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark concurrent balance debits and count lost updates.
+
+Every worker thread repeatedly takes 1 from a small pool of hot accounts,
+once with the old read-modify-write (``user.balance -= x`` in Python) and
+once with the atomic conditional UPDATE from balances.py. The final
+balances are compared with the number of debits that reported success:
+any difference is a lost update.
+
+Runs against a temporary SQLite file by default; pass a Postgres URL to
+run the same workload there.
+
+Usage: python benchmarks/balance_contention.py [--threads N] [--seconds S] [--accounts A]
+                                               [--database-url postgresql://...]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert
+
+from balances import debit
+from db_routing import configure_engine, enable_sqlite_wal
+from extensions import db
+from models import User
+
+START_BALANCE = 1_000_000
+
+
+def create_bench_app(database_url):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    if database_url.startswith('sqlite'):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'check_same_thread': False, 'timeout': 30}}
+    configure_engine(app)
+    db.init_app(app)
+    with app.app_context():
+        enable_sqlite_wal(db.engine)
+    return app
+
+
+def seed(app, accounts):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.execute(insert(User), [
+            {'username': f"hot{i}", 'full_name': f"Hot {i}", 'email': f"hot{i}@bench.local",
+             'password': 'x', 'balance': START_BALANCE}
+            for i in range(accounts)
+        ])
+        db.session.commit()
+        return [user.id for user in User.query]
+
+
+def read_modify_write(user_id):
+    """The pattern RPSGame.join_game and create_withdrawal used before"""
+    user = db.session.get(User, user_id)
+    if user.balance < 1:
+        return False
+    user.balance -= 1
+    return True
+
+
+def atomic(user_id):
+    return debit(user_id, 1)
+
+
+def worker(app, stop, user_ids, debit_fn, counts):
+    ok = errors = 0
+    with app.app_context():
+        while not stop.is_set():
+            try:
+                if debit_fn(random.choice(user_ids)):
+                    db.session.commit()
+                    ok += 1
+                else:
+                    db.session.rollback()
+            except Exception:
+                db.session.rollback()
+                errors += 1
+        db.session.remove()
+    counts.append((ok, errors))
+
+
+def run(app, user_ids, threads, seconds, debit_fn):
+    """Hammer the accounts and return (debits/s, reported debits, actual debits, errors)"""
+    stop = threading.Event()
+    counts = []
+    pool = [threading.Thread(target=worker, args=(app, stop, user_ids, debit_fn, counts)) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in pool:
+        t.join()
+
+    reported = sum(ok for ok, _ in counts)
+    errors = sum(e for _, e in counts)
+    with app.app_context():
+        actual = sum(START_BALANCE - user.balance for user in User.query.filter(User.id.in_(user_ids)))
+        db.session.remove()
+    return reported / seconds, reported, int(actual), errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--accounts', type=int, default=4, help='hot accounts shared by all threads')
+    parser.add_argument('--database-url', help='defaults to a temporary SQLite file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_bench_app(args.database_url or f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        print(f"{args.threads} threads on {args.accounts} accounts, {args.seconds:.0f}s per run "
+              f"({app.config['SQLALCHEMY_DATABASE_URI'].split(':')[0]})")
+        for label, debit_fn in (('read-modify-write', read_modify_write), ('atomic UPDATE', atomic)):
+            user_ids = seed(app, args.accounts)
+            rate, reported, actual, errors = run(app, user_ids, args.threads, args.seconds, debit_fn)
+            print(f"{label:<18} debits/s={rate:9.1f}  reported={reported:8d}  applied={actual:8d}  "
+                  f"lost={reported - actual:6d}  errors={errors}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,12 @@
+"""Benchmarks for command cooldown lookups"""
+
+import random
+
+from models import Cooldown
+
+
+def bench_get_active_cooldown(benchmark, app_ctx, bench_db):
+    rng = random.Random(0)
+    users = bench_db['users']
+
+    benchmark(lambda: Cooldown.get_active_cooldown(rng.randint(1, users), 'join_game'))
@@ -0,0 +1,65 @@
+"""Benchmarks for RPSGame matchmaking, moves and status reads"""
+
+import random
+
+from sqlalchemy import insert
+
+from extensions import db
+from game import RPSGame
+from models import Game, GameParticipant
+
+ROUNDS = 200
+
+
+def _insert_game(seats, status='waiting', bet_amount=10):
+    """Insert a game whose seats are (user_id, move) pairs, bypassing RPSGame"""
+    game_id = db.session.execute(insert(Game).values(
+        creator_id=seats[0][0], bet_amount=bet_amount, status=status, min_players=3, max_players=3
+    )).inserted_primary_key[0]
+    db.session.execute(insert(GameParticipant), [
+        {'game_id': game_id, 'user_id': user_id, 'move': move} for user_id, move in seats
+    ])
+    db.session.commit()
+    return game_id
+
+
+def bench_find_or_create_game(benchmark, app_ctx, user_ids):
+    def setup():
+        return (next(user_ids),), {'bet_amount': 10}
+
+    game, message = benchmark.pedantic(RPSGame.find_or_create_game, setup=setup, rounds=ROUNDS)
+    assert game, message
+
+
+def bench_join_game(benchmark, app_ctx, user_ids):
+    def setup():
+        game_id = _insert_game([(next(user_ids), None)])
+        return (game_id, next(user_ids)), {}
+
+    assert benchmark.pedantic(RPSGame.join_game, setup=setup, rounds=ROUNDS)
+
+
+def bench_make_choice(benchmark, app_ctx, user_ids):
+    """First move of a full game"""
+    def setup():
+        seats = [(next(user_ids), None) for _ in range(3)]
+        return (_insert_game(seats, status='in_progress'), seats[0][0], 'rock'), {}
+
+    assert benchmark.pedantic(RPSGame.make_choice, setup=setup, rounds=ROUNDS)
+
+
+def bench_make_choice_settles_game(benchmark, app_ctx, user_ids):
+    """Last move of a game, which also settles it"""
+    def setup():
+        seats = [(next(user_ids), 'scissors'), (next(user_ids), 'scissors'), (next(user_ids), None)]
+        return (_insert_game(seats, status='in_progress'), seats[2][0], 'rock'), {}
+
+    assert benchmark.pedantic(RPSGame.make_choice, setup=setup, rounds=ROUNDS)
+
+
+def bench_get_game_status(benchmark, app_ctx, bench_db):
+    rng = random.Random(0)
+    settled = bench_db['games'] // 2
+
+    status = benchmark(lambda: RPSGame.get_game_status(rng.randint(1, settled), user_id=1))
+    assert status['is_completed']
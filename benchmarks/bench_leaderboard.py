@@ -0,0 +1,41 @@
+"""Benchmarks for the leaderboard queries of the web app and test_bot.py"""
+
+import os
+import sqlite3
+
+import pytest
+
+import test_bot
+from utils import get_leaderboard
+
+
+@pytest.fixture(scope='module')
+def test_bot_db(bench_db, tmp_path_factory):
+    """test_bot.py keeps its own schema in ./rps_game.db; seed it with the same user count"""
+    workdir = tmp_path_factory.mktemp('test_bot')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        test_bot.init_db()
+        conn = sqlite3.connect('rps_game.db')
+        conn.execute(f"""
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < {bench_db['users']})
+            INSERT INTO users (user_id, username, balance, total_games, games_won, total_earnings)
+            SELECT 100000000 + n, 'bench_user_' || n, 100, total_games, abs(random()) % (total_games + 1),
+                   abs(random()) % 100000 / 10.0
+            FROM (SELECT n, abs(random()) % 400 AS total_games FROM seq)
+        """)
+        conn.commit()
+        conn.close()
+        yield workdir
+    finally:
+        os.chdir(cwd)
+
+
+def bench_web_leaderboard(benchmark, app_ctx):
+    assert len(benchmark(get_leaderboard, 20)) == 20
+
+
+@pytest.mark.parametrize('order_by', ['earnings', 'wins'])
+def bench_test_bot_leaderboard(benchmark, test_bot_db, order_by):
+    assert len(benchmark(test_bot.get_leaderboard, order_by, 10)) == 10
@@ -0,0 +1,38 @@
+"""Benchmarks for the PaymentService deposit path (test mode, no gateway calls)"""
+
+import itertools
+import uuid
+
+from sqlalchemy import insert
+
+from extensions import db
+from models import Transaction
+from payment_service import PaymentService
+
+ROUNDS = 200
+
+
+def bench_create_deposit(benchmark, app_ctx, user_ids):
+    service = PaymentService()
+
+    def setup():
+        return (next(user_ids), 100), {}
+
+    ok, result = benchmark.pedantic(service.create_deposit, setup=setup, rounds=ROUNDS)
+    assert ok, result
+
+
+def bench_process_transaction(benchmark, app_ctx, user_ids):
+    service = PaymentService()
+    run = uuid.uuid4().hex[:8]
+    refs = (f"BENCH_PENDING_{run}_{i}" for i in itertools.count())
+
+    def setup():
+        tx_ref = next(refs)
+        db.session.execute(insert(Transaction).values(
+            user_id=next(user_ids), tx_ref=tx_ref, type='deposit', amount=100, status='pending'
+        ))
+        db.session.commit()
+        return (tx_ref, 'completed'), {}
+
+    assert benchmark.pedantic(service.process_transaction, setup=setup, rounds=ROUNDS)
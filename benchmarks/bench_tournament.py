@@ -0,0 +1,33 @@
+"""Benchmarks for dealing tournament rounds"""
+
+import random
+
+from sqlalchemy import insert
+
+from extensions import db
+from models import TournamentEntry
+from tournaments import TournamentService, pair
+
+PLAYERS = 3000  # 1000 tables
+
+
+def bench_pair_round(benchmark):
+    rng = random.Random(0)
+    tables = benchmark(pair, range(PLAYERS), rng=rng)
+    assert len(tables) == PLAYERS // 3
+
+
+def bench_start_tournament(benchmark, app_ctx, bench_db):
+    """Close registration and insert round 1 for PLAYERS entrants"""
+    players = min(PLAYERS, bench_db['users'])
+
+    def setup():
+        tournament = TournamentService.create('bench', buy_in=0, max_entrants=None)
+        db.session.execute(insert(TournamentEntry), [
+            {'tournament_id': tournament.id, 'user_id': user_id} for user_id in range(1, players + 1)
+        ])
+        db.session.commit()
+        return (tournament.id,), {'rng': random.Random(0)}
+
+    started, message = benchmark.pedantic(TournamentService.start, setup=setup, rounds=20)
+    assert started, message
@@ -0,0 +1,94 @@
+"""
+Fixtures for the pytest-benchmark suite.
+
+Every run works against one SQLite database seeded with production-like
+volumes (100k users, 1M games, 5M transactions by default). Results are
+autosaved as JSON under .benchmarks/ (see pytest.ini), so runs on two
+commits can be compared:
+
+    pytest benchmarks/                                # seed, run, save
+    pytest benchmarks/ --bench-db /tmp/bench.db       # keep the seeded file for later runs
+    pytest benchmarks/ --bench-db /tmp/bench.db --benchmark-compare --benchmark-compare-fail=median:25%
+    pytest benchmarks/ --bench-scale 0.01             # quick run at 1% volume
+"""
+
+import itertools
+import os
+import sys
+
+import pytest
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from flask import Flask
+
+from db_routing import configure_read_only_bind, enable_sqlite_wal
+from extensions import db
+from stats_rollup import register_rollup_listeners
+import seed
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('bench-data')
+    group.addoption('--bench-db', help='seeded SQLite file to reuse (seeded on first use)')
+    group.addoption('--bench-scale', type=float, default=1.0,
+                    help='fraction of the default volumes to seed (default 1.0)')
+
+
+@pytest.fixture(scope='session')
+def bench_db(request, tmp_path_factory):
+    """Path and volumes of the seeded database"""
+    scale = request.config.getoption('--bench-scale')
+    volumes = {
+        'users': max(100, int(seed.USERS * scale)),
+        'games': max(1000, int(seed.GAMES * scale)),
+        'transactions': max(1000, int(seed.TRANSACTIONS * scale)),
+    }
+    path = request.config.getoption('--bench-db') or str(tmp_path_factory.mktemp('bench') / 'bench.db')
+
+    if os.path.exists(path):
+        existing = seed.seeded_volumes(path)
+        if existing == volumes:
+            return {'path': path, **volumes}
+        raise pytest.UsageError(f"{path} exists but was not seeded with {volumes} (found {existing})")
+
+    app = _bench_app(path)
+    with app.app_context():
+        db.create_all()
+        db.engine.dispose()
+    seed.seed_database(path, **volumes)
+    return {'path': path, **volumes}
+
+
+def _bench_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{path}"
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 30}}
+    configure_read_only_bind(app)
+    db.init_app(app)
+    with app.app_context():
+        enable_sqlite_wal(db.engine)
+    return app
+
+
+@pytest.fixture(scope='session')
+def bench_app(bench_db):
+    """App bound to the seeded database, with the same session listeners as production"""
+    app = _bench_app(bench_db['path'])
+    register_rollup_listeners()
+    return app
+
+
+@pytest.fixture
+def app_ctx(bench_app):
+    with bench_app.app_context():
+        yield bench_app
+        db.session.remove()
+
+
+@pytest.fixture(scope='session')
+def user_ids(bench_db):
+    """Endless round-robin over seeded user ids, so mutating benchmarks touch fresh rows"""
+    return itertools.cycle(range(1, bench_db['users'] + 1))
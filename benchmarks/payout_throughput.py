@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark clearing a backlog of pending withdrawals.
+
+Seeds --requests pending withdrawal requests and pays them through
+PayoutPipeline against a simulated provider: each call costs --latency
+seconds plus --per-item seconds per item, and --fail-rate of the items
+are declined (and refunded). The first run pays one request per call, one
+call at a time, the way single approvals did; the others batch
+--batch-size items per call with increasing concurrency.
+
+Usage: python benchmarks/payout_throughput.py [--requests N] [--batch-size B] [--concurrency 1,4,8]
+                                              [--latency S] [--per-item S] [--fail-rate F]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert
+
+from admin import payouts
+from admin.payouts import PayoutPipeline, PayoutProvider
+from db_routing import enable_sqlite_wal
+from extensions import db
+from models import User, Transaction, WithdrawalRequest
+
+
+def simulated_provider(args, batch_size):
+    def send(items, timeout):
+        time.sleep(args.latency + args.per_item * len(items))
+        return None, {item['id']: (random.random() >= args.fail_rate, 'simulated') for item in items}
+    return PayoutProvider('chapa', send, batch_size)
+
+
+def seed(requests):
+    db.drop_all()
+    db.create_all()
+    db.session.execute(insert(User), [
+        {'username': f"payee{i}", 'full_name': f"Payee {i}", 'email': f"payee{i}@bench.local",
+         'password': 'x', 'balance': 0}
+        for i in range(100)
+    ])
+    user_ids = [user.id for user in User.query]
+    rows = [(random.choice(user_ids), f"WD_bench_{n}", random.randint(50, 5000)) for n in range(requests)]
+    db.session.execute(insert(Transaction), [
+        {'user_id': user_id, 'tx_ref': tx_ref, 'type': 'withdrawal', 'amount': amount, 'status': 'pending'}
+        for user_id, tx_ref, amount in rows
+    ])
+    db.session.execute(insert(WithdrawalRequest), [
+        {'user_id': user_id, 'tx_ref': tx_ref, 'amount': amount, 'wallet_address': '0911000000', 'status': 'pending'}
+        for user_id, tx_ref, amount in rows
+    ])
+    db.session.commit()
+
+
+def run(app, args, batch_size, concurrency):
+    with app.app_context():
+        seed(args.requests)
+        payouts.PROVIDERS['chapa'] = simulated_provider(args, batch_size)
+        return PayoutPipeline.approve(concurrency=concurrency)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--concurrency', default='1,4,8', help='comma-separated worker counts to compare')
+    parser.add_argument('--latency', type=float, default=0.5, help='seconds per provider call')
+    parser.add_argument('--per-item', type=float, default=0.002, help='extra seconds per item in a call')
+    parser.add_argument('--fail-rate', type=float, default=0.01)
+    parser.add_argument('--one-by-one', type=int, default=200,
+                        help='requests to time for the one-call-per-request baseline (0 to skip)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        db.init_app(app)
+        with app.app_context():
+            enable_sqlite_wal(db.engine)
+
+        print(f"{args.requests} requests, {args.latency}s + {args.per_item}s/item per call, "
+              f"{args.fail_rate:.0%} declined")
+        if args.one_by_one:
+            requests, args.requests = args.requests, args.one_by_one
+            result = run(app, args, 1, 1)
+            args.requests = requests
+            print(f"one by one     items/s={result.throughput:8.1f}  "
+                  f"({args.requests / result.throughput / 60:.1f} min for the backlog)")
+        for concurrency in (int(n) for n in args.concurrency.split(',')):
+            result = run(app, args, args.batch_size, concurrency)
+            print(f"batch={args.batch_size:<4} workers={concurrency:<3} items/s={result.throughput:8.1f}  "
+                  f"elapsed={result.elapsed:6.1f}s  paid={result.affected}  refunded={result.failed}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Benchmark game-write latency while the admin dashboard is being hammered.
+
+Runs the same workload twice against a temporary SQLite database: once with
+the dashboard aggregates on the primary engine and once routed through the
+read-only engine, then prints write latency percentiles for each run.
+
+Usage: python benchmarks/read_replica_contention.py [--readers N] [--seconds S]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import func, insert
+
+from db_routing import configure_read_only_bind, enable_sqlite_wal, read_only
+from extensions import db
+from models import User, Game, GameParticipant, Transaction
+
+
+def create_bench_app(db_path):
+    """Create a minimal app bound to a file-backed SQLite database"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{db_path}"
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'check_same_thread': False, 'timeout': 30}}
+    configure_read_only_bind(app)
+    db.init_app(app)
+    with app.app_context():
+        enable_sqlite_wal(db.engine)
+    return app
+
+
+def seed(app, users, games):
+    """Seed users, completed games and transactions"""
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(User), [
+            {'username': f"user{i}", 'full_name': f"User {i}", 'email': f"user{i}@bench.local",
+             'password': 'x', 'balance': 1000.0, 'telegram_id': i}
+            for i in range(1, users + 1)
+        ])
+        db.session.execute(insert(Game), [
+            {'creator_id': random.randint(1, users), 'bet_amount': 10, 'status': 'completed',
+             'created_at': datetime.utcnow()}
+            for _ in range(games)
+        ])
+        db.session.execute(insert(Transaction), [
+            {'user_id': random.randint(1, users), 'tx_ref': f"BENCH_{i}", 'type': 'deposit',
+             'amount': 100, 'status': 'completed', 'created_at': datetime.utcnow()}
+            for i in range(games)
+        ])
+        db.session.commit()
+
+
+def dashboard_queries():
+    """The aggregates the admin dashboards run on every page view"""
+    User.query.count()
+    Game.query.filter(Game.status.in_(['waiting', 'in_progress'])).count()
+    db.session.query(func.sum(Game.bet_amount)).scalar()
+    db.session.query(func.sum(Transaction.amount)).filter(Transaction.status == 'completed').scalar()
+    Transaction.query.filter_by(status='pending').count()
+
+
+def hammer_dashboard(app, stop, use_replica):
+    """Run dashboard queries in a loop until stopped"""
+    with app.app_context():
+        while not stop.is_set():
+            if use_replica:
+                with read_only():
+                    dashboard_queries()
+            else:
+                dashboard_queries()
+            db.session.remove()
+
+
+def game_writer(app, stop, users, latencies):
+    """Create games and debit players, recording commit latency"""
+    with app.app_context():
+        while not stop.is_set():
+            started = time.perf_counter()
+            user = db.session.get(User, random.randint(1, users))
+            game = Game(creator_id=user.id, bet_amount=10, status='waiting')
+            db.session.add(game)
+            db.session.flush()
+            db.session.add(GameParticipant(game_id=game.id, user_id=user.id))
+            user.balance -= 10
+            db.session.commit()
+            latencies.append(time.perf_counter() - started)
+
+
+def run(app, readers, seconds, users, use_replica):
+    """Run one contention round and return write latencies"""
+    stop = threading.Event()
+    latencies = []
+    threads = [threading.Thread(target=hammer_dashboard, args=(app, stop, use_replica)) for _ in range(readers)]
+    threads.append(threading.Thread(target=game_writer, args=(app, stop, users, latencies)))
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return latencies
+
+
+def report(label, latencies, seconds):
+    """Print write throughput and latency percentiles"""
+    if not latencies:
+        print(f"{label:<10} no writes completed")
+        return
+    q = statistics.quantiles(latencies, n=100)
+    print(f"{label:<10} writes/s={len(latencies) / seconds:8.1f}  "
+          f"p50={q[49] * 1000:7.2f}ms  p95={q[94] * 1000:7.2f}ms  p99={q[98] * 1000:7.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--games', type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_bench_app(os.path.join(tmp, 'bench.db'))
+        seed(app, args.users, args.games)
+
+        print(f"{args.readers} dashboard readers, {args.seconds:.0f}s per run")
+        for label, use_replica in (('primary', False), ('read-only', True)):
+            latencies = run(app, args.readers, args.seconds, args.users, use_replica)
+            report(label, latencies, args.seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Seed a SQLite database with production-like volumes for the benchmarks.
+
+Rows are generated inside SQLite with recursive CTEs, so 5M transactions
+take seconds rather than the minutes an ORM or executemany insert would.
+The volumes are recorded in a bench_seed table so a seeded file can be
+reused across runs (and across commits, for comparable numbers).
+"""
+
+import sqlite3
+
+USERS = 100_000
+GAMES = 1_000_000
+TRANSACTIONS = 5_000_000
+WAITING_GAMES = 200  # newest games still waiting for players
+IN_PROGRESS_GAMES = 200  # next newest, full but waiting for moves
+COOLDOWN_COMMANDS = ('join_game', 'deposit')
+
+SEED_VERSION = 1
+HISTORY_SECONDS = 365 * 24 * 3600
+
+
+def _seq(count):
+    return f"WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < {int(count)}) "
+
+
+def _ago(seconds_sql):
+    return f"strftime('%Y-%m-%d %H:%M:%f', 'now', '-' || ({seconds_sql}) || ' seconds')"
+
+
+def seeded_volumes(path):
+    """Volumes a database file was seeded with, or None if it wasn't"""
+    conn = sqlite3.connect(path)
+    try:
+        row = conn.execute('SELECT version, users, games, transactions FROM bench_seed').fetchone()
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        conn.close()
+    if not row or row[0] != SEED_VERSION:
+        return None
+    return {'users': row[1], 'games': row[2], 'transactions': row[3]}
+
+
+def seed_database(path, users=USERS, games=GAMES, transactions=TRANSACTIONS):
+    """Fill the (already created) schema at path; returns the volumes used"""
+    waiting = min(WAITING_GAMES, games // 4)
+    in_progress = min(IN_PROGRESS_GAMES, games // 4)
+    settled = games - waiting - in_progress
+
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('BEGIN')
+
+    conn.execute(_seq(users) + f"""
+        INSERT INTO users (id, telegram_id, username, full_name, email, password, subscription_plan,
+                           balance, wins, losses, created_at, is_admin, is_banned)
+        SELECT n, 100000000 + n, 'bench_user_' || n, 'Bench User ' || n, 'bench_user_' || n || '@bench.local',
+               'x', 'basic', 100 + abs(random()) % 5000, abs(random()) % 200, abs(random()) % 200,
+               {_ago(f'abs(random()) % {HISTORY_SECONDS}')}, 0, 0
+        FROM seq
+    """)
+
+    # Games are numbered oldest first: settled history, then in-progress, then waiting
+    conn.execute(_seq(games) + f"""
+        INSERT INTO games (id, creator_id, bet_amount, status, min_players, max_players,
+                           winner_id, created_at, completed_at)
+        SELECT n, creator_id, bet_amount,
+               CASE WHEN n <= {settled} THEN 'completed'
+                    WHEN n <= {settled + in_progress} THEN 'in_progress'
+                    ELSE 'waiting' END,
+               3, 3,
+               CASE WHEN n <= {settled} AND n % 9 != 0 THEN creator_id END,
+               {_ago(f'({games} - n) * {HISTORY_SECONDS} / {games} + 60')},
+               CASE WHEN n <= {settled} THEN {_ago(f'({games} - n) * {HISTORY_SECONDS} / {games}')} END
+        FROM (
+            SELECT n, 1 + abs(random()) % {users} AS creator_id,
+                   CASE abs(random()) % 4 WHEN 0 THEN 10 WHEN 1 THEN 20 WHEN 2 THEN 50 ELSE 100 END AS bet_amount
+            FROM seq
+        )
+    """)
+
+    # Three seats per game (one or two for waiting games); seat 0 is the creator and,
+    # when there is a winner, plays rock against two scissors
+    conn.execute(f"""
+        INSERT INTO game_participants (game_id, user_id, move, result, created_at)
+        SELECT g.id,
+               CASE WHEN s.seat = 0 THEN g.creator_id ELSE 1 + abs(random()) % {users} END,
+               CASE WHEN g.status != 'completed' THEN NULL
+                    WHEN g.winner_id IS NULL THEN 'paper'
+                    WHEN s.seat = 0 THEN 'rock' ELSE 'scissors' END,
+               CASE WHEN g.status != 'completed' THEN NULL
+                    WHEN g.winner_id IS NULL THEN 'draw'
+                    WHEN s.seat = 0 THEN 'win' ELSE 'lose' END,
+               g.created_at
+        FROM games g
+        JOIN (SELECT 0 AS seat UNION ALL SELECT 1 UNION ALL SELECT 2) s
+          ON g.status != 'waiting' OR s.seat <= g.id % 2
+        ORDER BY g.id, s.seat
+    """)
+
+    conn.execute(_seq(transactions) + f"""
+        INSERT INTO transactions (user_id, tx_ref, type, amount, status, created_at, completed_at)
+        SELECT user_id, 'BENCH_' || n, type, amount, status, created_at,
+               CASE WHEN status = 'completed' THEN created_at END
+        FROM (
+            SELECT n, 1 + abs(random()) % {users} AS user_id,
+                   CASE WHEN abs(random()) % 100 < 70 THEN 'deposit'
+                        WHEN abs(random()) % 100 < 80 THEN 'withdrawal' ELSE 'refund' END AS type,
+                   10 + abs(random()) % 990 AS amount,
+                   CASE WHEN abs(random()) % 100 < 90 THEN 'completed'
+                        WHEN abs(random()) % 100 < 70 THEN 'pending' ELSE 'failed' END AS status,
+                   {_ago(f'({transactions} - n) * {HISTORY_SECONDS} / {transactions}')} AS created_at
+            FROM seq
+        )
+    """)
+
+    # One cooldown row per user and command; about one in twenty is still active
+    for command in COOLDOWN_COMMANDS:
+        conn.execute(_seq(users) + f"""
+            INSERT INTO cooldowns (user_id, command_name, expires_at, created_at)
+            SELECT n, '{command}',
+                   CASE WHEN abs(random()) % 20 = 0
+                        THEN strftime('%Y-%m-%d %H:%M:%f', 'now', '+1 hour')
+                        ELSE {_ago(f'60 + abs(random()) % {HISTORY_SECONDS}')} END,
+                   {_ago(f'abs(random()) % {HISTORY_SECONDS}')}
+            FROM seq
+        """)
+
+    conn.execute('CREATE TABLE bench_seed (version INTEGER, users INTEGER, games INTEGER, transactions INTEGER)')
+    conn.execute('INSERT INTO bench_seed VALUES (?, ?, ?, ?)', (SEED_VERSION, users, games, transactions))
+    conn.execute('COMMIT')
+    conn.close()
+    return {'users': users, 'games': games, 'transactions': transactions}
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Benchmark aggregate write throughput against the number of shards.
+
+Each worker process (one per app server or bot worker in production)
+repeatedly picks a random user and, through the sharded session, records
+a deposit: a Transaction row plus a balance credit, committed on the
+user's shard. SQLite lets one writer per file at a time, so with one
+shard every commit waits in line for the file lock; with N shards N
+commits can be in flight. Workers are processes so the comparison
+measures the files, not the GIL; it needs as many cores as workers.
+
+A --cross-shard fraction of the operations are game joins between users
+on different shards, which go through the two-phase commit coordinator.
+
+Usage: python benchmarks/shard_scaling.py [--shards 1,2,4,8] [--workers N] [--seconds S]
+                                          [--users U] [--cross-shard F] [--synchronous full]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, update
+
+from models import User, Transaction
+from sharding import ShardSet, ShardedGames
+
+
+def open_shards(directory, count, synchronous):
+    shards = ShardSet([f"sqlite:///{os.path.join(directory, f'shard{n}.db')}" for n in range(count)],
+                      f"sqlite:///{os.path.join(directory, 'coordinator.db')}")
+    for engine in (*shards.engines.values(), shards.coordinator):
+        @event.listens_for(engine, 'connect')
+        def _set_synchronous(dbapi_connection, connection_record):
+            dbapi_connection.execute(f'PRAGMA synchronous = {synchronous}')
+    return shards
+
+
+def seed(shards, users):
+    with shards.session() as session:
+        created = [User(username=f"bench{n}", full_name=f"Bench {n}", email=f"bench{n}@bench.local",
+                        password='x', balance=1_000_000) for n in range(users)]
+        session.add_all(created)
+        session.commit()
+        return [user.id for user in created]
+
+
+def deposit(shards, user_id, n):
+    with shards.session() as session:
+        session.add(Transaction(user_id=user_id, tx_ref=f"bench-{os.getpid()}-{n}",
+                                type='deposit', amount=1, status='completed'))
+        session.execute(update(User).where(User.id == user_id).values(balance=User.balance + 1))
+        session.commit()
+
+
+def worker(directory, count, args, user_ids, start, results):
+    shards = open_shards(directory, count, args.synchronous)
+    games = ShardedGames(shards)
+    done = cross = errors = 0
+    start.wait()
+    deadline = time.monotonic() + args.seconds
+    while time.monotonic() < deadline:
+        try:
+            if args.cross_shard and random.random() < args.cross_shard:
+                creator, joiner = random.sample(user_ids, 2)
+                game_id = games.create_game(creator, 1)
+                games.join_game(game_id, joiner)
+                cross += 1
+            else:
+                deposit(shards, random.choice(user_ids), done)
+            done += 1
+        except Exception:
+            errors += 1
+    results.put((done, cross, errors))
+
+
+def run(count, args):
+    """Run the workers against count shards; returns (writes/s, cross-shard joins, errors)"""
+    with tempfile.TemporaryDirectory() as tmp:
+        shards = open_shards(tmp, count, args.synchronous)
+        shards.create_all()
+        user_ids = seed(shards, args.users)
+        for engine in (*shards.engines.values(), shards.coordinator):
+            engine.dispose()
+
+        start = multiprocessing.Event()
+        results = multiprocessing.Queue()
+        pool = [multiprocessing.Process(target=worker, args=(tmp, count, args, user_ids, start, results))
+                for _ in range(args.workers)]
+        for p in pool:
+            p.start()
+        start.set()
+        counts = [results.get() for _ in pool]
+        for p in pool:
+            p.join()
+
+    done = sum(d for d, _, _ in counts)
+    return done / args.seconds, sum(c for _, c, _ in counts), sum(e for _, _, e in counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--shards', default='1,2,4,8', help='comma-separated shard counts to compare')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--cross-shard', type=float, default=0.0, help='fraction of operations that are game joins')
+    parser.add_argument('--synchronous', default='full', choices=['off', 'normal', 'full'],
+                        help='SQLite synchronous pragma; full syncs every commit like a durable deployment')
+    args = parser.parse_args()
+
+    print(f"{args.workers} workers, {args.users} users, {args.seconds:.0f}s per run, "
+          f"synchronous={args.synchronous}, cross-shard={args.cross_shard:.0%}")
+    baseline = None
+    for count in (int(n) for n in args.shards.split(',')):
+        rate, cross, errors = run(count, args)
+        baseline = baseline or rate
+        print(f"shards={count:<3} writes/s={rate:9.1f}  speedup={rate / baseline:5.2f}x  "
+              f"cross-shard={cross:7d}  errors={errors}")
+
+
+if __name__ == '__main__':
+    main()
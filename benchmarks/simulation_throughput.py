@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark /simulate: practice games against AI opponents.
+
+Plays --games simulations for --players users three ways:
+
+- legacy: what simulate_rps used to do, two new AI users, a game and its
+  participants per simulation, over four commits
+- pool: the AI pool, one simulated_games row, one commit
+- pool+games: the AI pool, with the game and participants kept in games
+
+and prints simulations per second and how many users rows each left
+behind. The rollup and collusion listeners are registered as in the app.
+
+Usage: python benchmarks/simulation_throughput.py [--games N] [--players P]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert
+
+from ai_opponents import MOVES, OpponentPool, Simulator, winner_of
+from balances import credit, debit
+from collusion import register_collusion_listeners
+from db_routing import enable_sqlite_wal
+from extensions import db
+from models import User, Game, GameParticipant
+from stats_rollup import register_rollup_listeners
+
+
+def seed(players):
+    db.drop_all()
+    db.create_all()
+    db.session.execute(insert(User), [
+        {'username': f"player{i}", 'full_name': f"Player {i}", 'email': f"player{i}@bench.local",
+         'password': 'x', 'balance': 1_000_000}
+        for i in range(players)
+    ])
+    db.session.commit()
+    return [user.id for user in User.query]
+
+
+def legacy_simulation(user_id, bet_amount, move):
+    bots = []
+    for _ in range(2):
+        tag = random.getrandbits(48)
+        bot = User(telegram_id=tag, username=f"🤖 AI-{tag}", full_name='AI', email=f"{tag}@ai.local",
+                   password='x', balance=1_000_000)
+        db.session.add(bot)
+        bots.append(bot)
+    db.session.commit()
+
+    game = Game(creator_id=user_id, bet_amount=bet_amount, status='in_progress')
+    db.session.add(game)
+    db.session.commit()
+
+    debit(user_id, bet_amount)
+    moves = {user_id: move, **{bot.id: random.choice(MOVES) for bot in bots}}
+    participants = [GameParticipant(game_id=game.id, user_id=player_id, move=player_move)
+                    for player_id, player_move in moves.items()]
+    db.session.add_all(participants)
+    db.session.commit()
+
+    winner_id = winner_of(moves)
+    for participant in participants:
+        participant.result = 'draw' if winner_id is None else 'win' if participant.user_id == winner_id else 'lose'
+    if winner_id is None:
+        credit(user_id, bet_amount)
+    elif winner_id == user_id:
+        credit(user_id, bet_amount * 3)
+    game.status = 'completed'
+    game.winner_id = winner_id
+    db.session.commit()
+
+
+def run(app, args, mode):
+    with app.app_context():
+        user_ids = seed(args.players)
+        simulator = Simulator(OpponentPool(), persist_games=mode == 'pool+games')
+        play = legacy_simulation if mode == 'legacy' else simulator.play
+
+        started = time.perf_counter()
+        for _ in range(args.games):
+            play(random.choice(user_ids), 10, random.choice(MOVES))
+        elapsed = time.perf_counter() - started
+        return args.games / elapsed, User.query.count() - args.players
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--games', type=int, default=2000)
+    parser.add_argument('--players', type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        db.init_app(app)
+        with app.app_context():
+            enable_sqlite_wal(db.engine)
+            register_rollup_listeners()
+            register_collusion_listeners()
+
+        print(f"{args.games} simulations by {args.players} players")
+        for mode in ('legacy', 'pool', 'pool+games'):
+            rate, bot_rows = run(app, args, mode)
+            print(f"{mode:<11} sims/s={rate:8.1f}  AI users created={bot_rows}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark admin user search against a large users table.
+
+Seeds a temporary SQLite database (1M users by default), builds the FTS5
+trigram index and times exact, prefix, substring, typo and Telegram ID
+searches through UserSearchIndex.search.
+
+Usage: python benchmarks/user_search.py [--users N] [--queries N]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import string
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert
+
+from extensions import db
+from models import User
+from user_search import UserSearchIndex
+
+FIRST_NAMES = ['Abebe', 'Almaz', 'Dawit', 'Hana', 'Kebede', 'Meron', 'Selam', 'Tesfaye', 'Yonas', 'Liya']
+LAST_NAMES = ['Bekele', 'Girma', 'Haile', 'Mengistu', 'Tadesse', 'Wolde', 'Alemu', 'Desta', 'Kassa', 'Tekle']
+
+
+def random_username(rng):
+    return ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 9))) + str(rng.randint(0, 999))
+
+
+def seed(users, rng):
+    """Insert users in batches, then index them in one rebuild"""
+    batch = []
+    usernames = []
+    for i in range(1, users + 1):
+        username = f"{random_username(rng)}_{i}"
+        usernames.append(username)
+        batch.append({
+            'username': username,
+            'full_name': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            'email': f"{username}@example.com",
+            'password': 'x',
+            'telegram_id': 100000000 + i,
+        })
+        if len(batch) == 50000:
+            db.session.execute(insert(User), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(User), batch)
+    UserSearchIndex.install()
+    UserSearchIndex.rebuild()
+    db.session.commit()
+    return usernames
+
+
+def make_queries(usernames, count, rng):
+    """A mix of the searches admins actually type"""
+    queries = []
+    for _ in range(count):
+        name = rng.choice(usernames)
+        kind = rng.choice(['exact', 'prefix', 'substring', 'typo', 'telegram_id'])
+        if kind == 'exact':
+            queries.append((kind, name))
+        elif kind == 'prefix':
+            queries.append((kind, name[:5]))
+        elif kind == 'substring':
+            queries.append((kind, name[2:8]))
+        elif kind == 'typo':
+            i = rng.randrange(len(name))
+            queries.append((kind, name[:i] + rng.choice(string.ascii_lowercase) + name[i + 1:]))
+        else:
+            queries.append((kind, str(100000000 + rng.randint(1, len(usernames)))))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'search.db')}"
+        db.init_app(app)
+
+        with app.app_context():
+            db.create_all()
+            started = time.perf_counter()
+            usernames = seed(args.users, rng)
+            print(f"Seeded and indexed {args.users} users in {time.perf_counter() - started:.1f}s")
+
+            timings = {}
+            for kind, query in make_queries(usernames, args.queries, rng):
+                started = time.perf_counter()
+                UserSearchIndex.search(query)
+                timings.setdefault(kind, []).append(time.perf_counter() - started)
+                db.session.expunge_all()
+
+            for kind, samples in sorted(timings.items()):
+                q = statistics.quantiles(samples, n=100)
+                print(f"{kind:<12} n={len(samples):<5} p50={q[49] * 1000:6.2f}ms  "
+                      f"p95={q[94] * 1000:6.2f}ms  p99={q[98] * 1000:6.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
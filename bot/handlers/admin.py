@@ -3,6 +3,7 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from models import User, Transaction, WithdrawalRequest
 from extensions import db
+from balances import credit
 from payment_service import PaymentService
 from services.user import UserService
 import logging
@@ -95,7 +96,7 @@ async def handle_approve(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 # If transfer fails, refund the user
                 user = User.query.get(transaction.user_id)
                 if user:
-                    user.balance += transaction.amount
+                    credit(user.id, transaction.amount)
                 
                 transaction.status = 'failed'
                 withdrawal.status = 'failed'
@@ -155,7 +156,7 @@ async def handle_reject(update: Update, context: ContextTypes.DEFAULT_TYPE):
             # Refund the user
             user = User.query.get(transaction.user_id)
             if user:
-                user.balance += transaction.amount
+                credit(user.id, transaction.amount)
             
             # Update statuses
             transaction.status = 'rejected'
@@ -1,6 +1,6 @@
 """Deposit command handler for the bot"""
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ContextTypes, ConversationHandler
+from telegram.ext import ContextTypes, ConversationHandler, CommandHandler, MessageHandler, filters
 from models import User, Transaction
 from extensions import db
 from payment_service import PaymentService
@@ -169,5 +169,7 @@ def get_deposit_handler():
         states={
             WAITING_AMOUNT: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_deposit_amount)]
         },
-        fallbacks=[CommandHandler("cancel", lambda u, c: ConversationHandler.END)]
+        fallbacks=[CommandHandler("cancel", lambda u, c: ConversationHandler.END)],
+        name='deposit',
+        persistent=True
     ) 
\ No newline at end of file
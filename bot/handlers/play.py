@@ -8,6 +8,7 @@ from datetime import datetime
 import random
 import logging
 from config import GAME_ENTRY_FEE, MIN_PLAYERS, MAX_PLAYERS
+from jobs import JobQueue, send_notification
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -16,6 +17,11 @@ logger = logging.getLogger(__name__)
 # Initialize user service
 user_service = UserService()
 
+# Result notifications are sent from this queue once get_play_handler has
+# attached it to the application; until then end_game sends them inline
+JOBS = JobQueue('play')
+JOBS.register('notify', send_notification, concurrency=8)
+
 # Game states
 WAITING_PLAYERS = 1
 WAITING_MOVE = 2
@@ -310,17 +316,15 @@ async def end_game(update: Update, context: ContextTypes.DEFAULT_TYPE, game_id:
         # Create result message
         result_message = create_result_message(game, participants, moves, winner_id, reward)
 
-        # Notify all players
-        for participant in participants:
-            user = User.query.get(participant.user_id)
+        # Notify all players from the job queue so the move callback returns now;
+        # a queue that isn't running would only hold them
+        players = User.query.filter(User.id.in_([p.user_id for p in participants])).all()
+        for user in players:
             if user.telegram_id:
-                try:
-                    await context.bot.send_message(
-                        chat_id=user.telegram_id,
-                        text=result_message
-                    )
-                except Exception as e:
-                    logger.error(f"Error notifying player {user.id}: {str(e)}")
+                if JOBS.running:
+                    JOBS.enqueue('notify', {'chat_id': user.telegram_id, 'text': result_message})
+                else:
+                    await context.bot.send_message(chat_id=user.telegram_id, text=result_message)
 
         return ConversationHandler.END
 
@@ -372,8 +376,10 @@ def create_result_message(game, participants, moves, winner_id, reward):
         
     return message
 
-def get_play_handler():
-    """Get play conversation handler"""
+def get_play_handler(application=None):
+    """Get play conversation handler; pass the application to send results from JOBS"""
+    if application is not None:
+        JOBS.attach(application)
     return ConversationHandler(
         entry_points=[CommandHandler("play", handle_play)],
         states={
@@ -1,9 +1,10 @@
 """Withdrawal command handler for the bot"""
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ContextTypes, ConversationHandler
+from telegram.ext import ContextTypes, ConversationHandler, CommandHandler, MessageHandler, filters
 from models import User, Transaction, WithdrawalRequest
 from extensions import db
 from payment_service import PaymentService
+from limits import LIMITS
 from config import MIN_WITHDRAW_AMOUNT, MAX_WITHDRAW_AMOUNT
 import logging
 
@@ -120,6 +121,12 @@ async def request_wallet(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return ConversationHandler.END
 
+        # Check the rolling daily limit before asking for the wallet
+        allowed, message = LIMITS.check(db_user.id, 'withdrawal', amount)
+        if not allowed:
+            await update.message.reply_text(f"❌ {message}")
+            return ConversationHandler.END
+
         await update.message.reply_text(
             "💳 Please enter your wallet address or phone number:"
         )
@@ -163,6 +170,7 @@ async def handle_wallet(update: Update, context: ContextTypes.DEFAULT_TYPE):
             user_id=db_user.id,
             amount=amount,
             wallet_address=wallet,
+            tx_ref=result['reference'],
             status='pending'
         )
         db.session.add(withdrawal)
@@ -218,5 +226,7 @@ def get_withdraw_handler():
                 MessageHandler(filters.TEXT & ~filters.COMMAND, handle_wallet)
             ]
         },
-        fallbacks=[CommandHandler("cancel", lambda u, c: ConversationHandler.END)]
+        fallbacks=[CommandHandler("cancel", lambda u, c: ConversationHandler.END)],
+        name='withdraw',
+        persistent=True
     ) 
\ No newline at end of file
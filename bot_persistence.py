@@ -0,0 +1,285 @@
+"""
+Restart-safe bot state for python-telegram-bot.
+
+SQLitePersistence keeps user_data, chat_data, bot_data, callback data and
+ConversationHandler states in memory and logs changes to one SQLite file,
+so an in-flight registration, deposit or withdrawal survives a restart.
+
+PTB hands the persistence its changes every update_interval seconds.
+Those calls only touch memory; changes are coalesced per key and written
+flush_delay later as one transaction, so a burst of updates costs one
+write however many users it touched. Every snapshot_every deltas (and on
+shutdown) the whole state is written as one snapshot and the log before
+it is dropped, so a restart loads one snapshot plus a short delta log.
+
+    persistence = SQLitePersistence(BOT_STATE_DB)
+    application = Application.builder().token(TOKEN).persistence(persistence).build()
+    ConversationHandler(..., name='registration', persistent=True)
+"""
+import asyncio
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+from copy import deepcopy
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+BOT_STATE_DB = os.getenv('BOT_STATE_DB', 'bot_state.db')
+BOT_STATE_UPDATE_INTERVAL = float(os.getenv('BOT_STATE_UPDATE_INTERVAL', '10'))
+DEFAULT_FLUSH_DELAY = 1.0
+DEFAULT_SNAPSHOT_EVERY = 5000
+
+
+def _empty_state():
+    return {'user_data': {}, 'chat_data': {}, 'bot_data': {}, 'callback_data': None, 'conversations': {}}
+
+
+def _conversation_key(name, key):
+    return json.dumps([name, list(key)])
+
+
+def apply_delta(state, kind, key, value):
+    """Replay one logged change; a None value removes the entry"""
+    if kind in ('user_data', 'chat_data'):
+        if value is None:
+            state[kind].pop(int(key), None)
+        else:
+            state[kind][int(key)] = value
+    elif kind == 'conversations':
+        name, conversation = json.loads(key)
+        states = state['conversations'].setdefault(name, {})
+        if value is None:
+            states.pop(tuple(conversation), None)
+        else:
+            states[tuple(conversation)] = value
+    else:
+        state[kind] = value
+
+
+class StateLog:
+    """Latest snapshot plus the deltas written after it, in one SQLite file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    upto_seq INTEGER NOT NULL,
+                    data BLOB NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS deltas (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    data BLOB
+                )
+            ''')
+            self._conn = conn
+        return self._conn
+
+    def load(self):
+        """State as of the last write, and how many deltas were replayed on top of the snapshot"""
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute('SELECT upto_seq, data FROM snapshots ORDER BY id DESC LIMIT 1').fetchone()
+            upto_seq, state = (row[0], pickle.loads(row[1])) if row else (0, _empty_state())
+            deltas = conn.execute(
+                'SELECT kind, key, data FROM deltas WHERE seq > ? ORDER BY seq', (upto_seq,)
+            ).fetchall()
+        for kind, key, data in deltas:
+            apply_delta(state, kind, key, pickle.loads(data) if data is not None else None)
+        return state, len(deltas)
+
+    def append(self, records):
+        """Write (kind, key, pickled value or None) records in one transaction"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.executemany('INSERT INTO deltas (kind, key, data) VALUES (?, ?, ?)', records)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    def snapshot(self, data):
+        """Store a pickled full state and drop everything it supersedes"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                upto_seq = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM deltas').fetchone()[0]
+                snapshot_id = conn.execute(
+                    'INSERT INTO snapshots (upto_seq, data) VALUES (?, ?)', (upto_seq, data)
+                ).lastrowid
+                conn.execute('DELETE FROM deltas WHERE seq <= ?', (upto_seq,))
+                conn.execute('DELETE FROM snapshots WHERE id < ?', (snapshot_id,))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class SQLitePersistence(BasePersistence):
+    """BasePersistence over a StateLog with batched, coalesced writes"""
+
+    def __init__(self, path=BOT_STATE_DB, store_data=None, update_interval=BOT_STATE_UPDATE_INTERVAL,
+                 flush_delay=DEFAULT_FLUSH_DELAY, snapshot_every=DEFAULT_SNAPSHOT_EVERY):
+        super().__init__(store_data=store_data or PersistenceInput(), update_interval=update_interval)
+        self.log = StateLog(path)
+        self.flush_delay = flush_delay
+        self.snapshot_every = snapshot_every
+        self._state = None
+        self._since_snapshot = 0
+        self._pending = {}
+        self._flush_handle = None
+        self._flush_task = None
+        self._write_lock = None
+
+    @property
+    def state(self):
+        if self._state is None:
+            self._state, self._since_snapshot = self.log.load()
+            logger.info(
+                f"Loaded bot state: {len(self._state['user_data'])} users, "
+                f"{sum(len(s) for s in self._state['conversations'].values())} conversations, "
+                f"{self._since_snapshot} deltas replayed"
+            )
+        return self._state
+
+    def _record(self, kind, key, value):
+        self._pending[(kind, key)] = value
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # written by the next flush()
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.flush_delay, self._start_flush)
+
+    def _start_flush(self):
+        self._flush_handle = None
+        self._flush_task = asyncio.ensure_future(self._write_pending())
+
+    async def _write_pending(self, snapshot=False):
+        if self._write_lock is None:
+            self._write_lock = asyncio.Lock()
+        async with self._write_lock:
+            batch, self._pending = self._pending, {}
+            if batch:
+                records = [
+                    (kind, key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL) if value is not None else None)
+                    for (kind, key), value in batch.items()
+                ]
+                try:
+                    await asyncio.to_thread(self.log.append, records)
+                except Exception as e:
+                    logger.error(f"Error writing bot state ({len(records)} changes kept for retry): {e}")
+                    self._pending = {**batch, **self._pending}
+                    return
+                self._since_snapshot += len(records)
+
+            if self._state is not None and (snapshot or self._since_snapshot >= self.snapshot_every):
+                # Pickled here, on the loop, so the state cannot change underneath it
+                data = pickle.dumps(self._state, pickle.HIGHEST_PROTOCOL)
+                await asyncio.to_thread(self.log.snapshot, data)
+                self._since_snapshot = 0
+
+    async def get_user_data(self):
+        return deepcopy(self.state['user_data'])
+
+    async def get_chat_data(self):
+        return deepcopy(self.state['chat_data'])
+
+    async def get_bot_data(self):
+        return deepcopy(self.state['bot_data'])
+
+    async def get_callback_data(self):
+        return deepcopy(self.state['callback_data'])
+
+    async def get_conversations(self, name):
+        return dict(self.state['conversations'].get(name, {}))
+
+    async def update_user_data(self, user_id, data):
+        if self.state['user_data'].get(user_id) == data:
+            return
+        self.state['user_data'][user_id] = data
+        self._record('user_data', str(user_id), data)
+
+    async def update_chat_data(self, chat_id, data):
+        if self.state['chat_data'].get(chat_id) == data:
+            return
+        self.state['chat_data'][chat_id] = data
+        self._record('chat_data', str(chat_id), data)
+
+    async def update_bot_data(self, data):
+        if self.state['bot_data'] == data:
+            return
+        self.state['bot_data'] = data
+        self._record('bot_data', '', data)
+
+    async def update_callback_data(self, data):
+        if self.state['callback_data'] == data:
+            return
+        self.state['callback_data'] = data
+        self._record('callback_data', '', data)
+
+    async def update_conversation(self, name, key, new_state):
+        states = self.state['conversations'].setdefault(name, {})
+        if states.get(key) == new_state:
+            return
+        if new_state is None:
+            states.pop(key, None)
+        else:
+            states[key] = new_state
+        self._record('conversations', _conversation_key(name, key), new_state)
+
+    async def drop_user_data(self, user_id):
+        if self.state['user_data'].pop(user_id, None) is not None:
+            self._record('user_data', str(user_id), None)
+
+    async def drop_chat_data(self, chat_id):
+        if self.state['chat_data'].pop(chat_id, None) is not None:
+            self._record('chat_data', str(chat_id), None)
+
+    # The in-memory state is the only copy in use, so there is nothing to refresh
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def flush(self):
+        """Write pending changes and a fresh snapshot, so the next start reads a single row"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._flush_task is not None:
+            await self._flush_task
+            self._flush_task = None
+        await self._write_pending(snapshot=True)
+        self.log.close()
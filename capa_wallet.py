@@ -9,6 +9,7 @@ import time
 import logging
 import requests
 from datetime import datetime
+from metrics import track_gateway
 from config import (
     CAPA_API_URL,
     CAPA_API_KEY,
@@ -39,6 +40,7 @@ class CapaWallet:
             "Content-Type": "application/json"
         }
 
+    @track_gateway('capa', 'create_wallet')
     def create_wallet(self, user_id: str, email: str) -> Tuple[bool, str, Optional[Dict]]:
         """Create a new Capa wallet for a user"""
         try:
@@ -65,6 +67,7 @@ class CapaWallet:
             LOGGER.error(f"Error creating wallet: {str(e)}")
             return False, f"Error: {str(e)}", None
 
+    @track_gateway('capa', 'balance')
     def get_wallet_balance(self, wallet_id: str) -> Tuple[bool, str, Optional[float]]:
         """Get wallet balance"""
         try:
@@ -84,6 +87,7 @@ class CapaWallet:
             LOGGER.error(f"Error getting wallet balance: {str(e)}")
             return False, f"Error: {str(e)}", None
 
+    @track_gateway('capa', 'initialize_deposit')
     def initialize_deposit(
         self,
         wallet_id: str,
@@ -118,6 +122,7 @@ class CapaWallet:
             LOGGER.error(f"Error initializing deposit: {str(e)}")
             return False, f"Error: {str(e)}", None
 
+    @track_gateway('capa', 'withdrawal')
     def process_withdrawal(
         self,
         wallet_id: str,
@@ -153,6 +158,62 @@ class CapaWallet:
             LOGGER.error(f"Error processing withdrawal: {str(e)}")
             return False, f"Error: {str(e)}", None
 
+    @track_gateway('capa', 'withdrawal_batch')
+    def process_withdrawals(
+        self,
+        items: list,
+        timeout: int = 60
+    ) -> Tuple[bool, str, Optional[Dict[str, Tuple[bool, str]]]]:
+        """Pay out many withdrawals in one request.
+
+        items are dicts with reference, wallet_id, amount and destination;
+        the result maps each reference to (paid, provider reference or error).
+        """
+        if not self.api_key or not self.secret_key:
+            # Mock response for testing
+            return True, "Mock batch processed", {
+                item["reference"]: (True, f"mock_{item['reference']}") for item in items
+            }
+        
+        try:
+            payload = {
+                "currency": CURRENCY,
+                "withdrawals": [
+                    {
+                        "reference": item["reference"],
+                        "wallet_id": item["wallet_id"],
+                        "amount": str(item["amount"]),
+                        "destination": item["destination"]
+                    }
+                    for item in items
+                ]
+            }
+            
+            response = requests.post(
+                f"{self.base_url}/withdrawals/batch",
+                json=payload,
+                headers=self.headers,
+                timeout=timeout
+            )
+            
+            if response.status_code == 200:
+                data = response.json()
+                if data.get("status") == "success":
+                    return True, "Batch processed", {
+                        result["reference"]: (
+                            result.get("status") == "success",
+                            result.get("transfer_reference") or result.get("message", "Failed")
+                        )
+                        for result in data["data"]["items"]
+                    }
+            
+            return False, f"Failed to process withdrawal batch: {response.status_code}", None
+
+        except Exception as e:
+            LOGGER.error(f"Error processing withdrawal batch: {str(e)}")
+            return False, f"Error: {str(e)}", None
+
+    @track_gateway('capa', 'verify')
     def verify_transaction(self, tx_ref: str) -> Tuple[bool, str, Optional[Dict]]:
         """Verify a transaction status"""
         try:
@@ -172,6 +233,7 @@ class CapaWallet:
             LOGGER.error(f"Error verifying transaction: {str(e)}")
             return False, f"Error: {str(e)}", None
 
+    @track_gateway('capa', 'history')
     def get_transaction_history(
         self,
         wallet_id: str,
@@ -204,6 +266,7 @@ class CapaWallet:
             return False, f"Error: {str(e)}", None
 
     @staticmethod
+    @track_gateway('capa', 'payment_link')
     def generate_payment_link(amount, user_id, description=None):
         """
         Generate a payment link for user to deposit funds
@@ -266,6 +329,7 @@ class CapaWallet:
             return False, f"Payment service unavailable: {str(e)}"
     
     @staticmethod
+    @track_gateway('capa', 'verify_payment')
     def verify_payment(payment_id):
         """
         Verify a payment status
@@ -2,6 +2,7 @@
 import requests
 import logging
 from typing import Dict, Tuple, Optional
+from metrics import track_gateway
 from config import (
     CHAPA_SECRET_KEY,
     CHAPA_API_URL,
@@ -25,6 +26,7 @@ class ChapaPayment:
         }
         logger.info(f"Initialized Chapa payment with {'test' if TEST_MODE else 'live'} mode")
 
+    @track_gateway('chapa', 'initialize')
     def initialize_payment(
         self,
         amount: float,
@@ -75,6 +77,7 @@ class ChapaPayment:
             logger.error(f"Error initializing payment: {str(e)}")
             return False, f"Error: {str(e)}", None
 
+    @track_gateway('chapa', 'verify')
     def verify_payment(self, tx_ref: str) -> Tuple[bool, str, Dict]:
         """Verify a payment transaction"""
         try:
@@ -99,4 +102,47 @@ class ChapaPayment:
 
         except Exception as e:
             logger.error(f"Error verifying payment: {str(e)}")
-            return False, f"Error: {str(e)}", {} 
\ No newline at end of file
+            return False, f"Error: {str(e)}", {}
+
+    @track_gateway('chapa', 'bulk_transfer')
+    def bulk_transfer(
+        self,
+        title: str,
+        transfers: list,
+        timeout: int = 60
+    ) -> Tuple[bool, str, Optional[str]]:
+        """Queue many transfers in one Chapa bulk transfer.
+
+        transfers are dicts with account_name, account_number, amount,
+        reference and bank_code. Chapa accepts or rejects the whole batch;
+        returns the batch id on success.
+        """
+        try:
+            payload = {
+                "title": title,
+                "currency": CURRENCY,
+                "bulk_data": [dict(transfer, amount=str(transfer["amount"])) for transfer in transfers]
+            }
+            
+            logger.info(f"Queueing bulk transfer {title} of {len(transfers)} items")
+            response = requests.post(
+                f"{self.base_url}/bulk-transfers",
+                json=payload,
+                headers=self.headers,
+                timeout=timeout
+            )
+            
+            if response.status_code == 200:
+                data = response.json()
+                if data.get("status") == "success":
+                    return True, "Bulk transfer queued", str(data["data"]["id"])
+                error_msg = data.get("message", "Unknown error")
+                logger.error(f"Chapa bulk transfer failed: {error_msg}")
+                return False, f"Bulk transfer failed: {error_msg}", None
+            
+            logger.error(f"Chapa API error: {response.status_code} - {response.text}")
+            return False, f"Bulk transfer failed: {response.text}", None
+
+        except Exception as e:
+            logger.error(f"Error queueing bulk transfer: {str(e)}")
+            return False, f"Error: {str(e)}", None
@@ -7,7 +7,9 @@ import json
 import logging
 
 from app import db
-from models import User, Transaction
+from balances import credit
+from models import Transaction
+from metrics import track_gateway
 from config import (
     CHAPA_SECRET_KEY,
     CHAPA_API_URL,
@@ -23,6 +25,7 @@ class ChapaPayment:
     """Handle Chapa payment operations"""
     
     @staticmethod
+    @track_gateway('chapa', 'initialize')
     def initialize_payment(
         user_id: int,
         amount: float,
@@ -120,6 +123,7 @@ class ChapaPayment:
             return False, f"Error initializing payment: {str(e)}", None
     
     @staticmethod
+    @track_gateway('chapa', 'verify')
     def verify_payment(reference: str) -> Tuple[bool, str, Optional[Dict]]:
         """Verify a payment transaction
         
@@ -160,8 +164,7 @@ class ChapaPayment:
                     transaction.payment_data = json.dumps(payment_data)
                     
                     # Update user balance
-                    user = User.query.get(transaction.user_id)
-                    user.balance += transaction.amount
+                    credit(transaction.user_id, transaction.amount)
                     
                     db.session.commit()
                     
@@ -4,8 +4,9 @@ from telegram.ext import ContextTypes, ConversationHandler
 from models import User, Transaction
 from extensions import db
 from services.transaction import TransactionService
-import random
+from ai_strategy import STRATEGY
 import logging
+import uuid
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -30,6 +31,14 @@ WINNING_COMBOS = {
     SCISSORS: PAPER
 }
 
+# Move names used by the AI strategy
+MOVE_NAMES = {
+    ROCK: 'rock',
+    PAPER: 'paper',
+    SCISSORS: 'scissors'
+}
+CHOICES = {name: choice for choice, name in MOVE_NAMES.items()}
+
 async def handle_play(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /play command"""
     try:
@@ -161,8 +170,8 @@ async def handle_choice(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user = update.effective_user
         db_user = User.query.filter_by(telegram_id=user.id).first()
 
-        # Generate bot's choice
-        bot_choice = random.choice([ROCK, PAPER, SCISSORS])
+        # Generate bot's choice from the player's history
+        bot_choice = CHOICES[STRATEGY.choose(db_user.id)[0]]
 
         # Determine winner
         result = determine_winner(choice, bot_choice)
@@ -188,6 +197,7 @@ async def handle_choice(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         db.session.add(transaction)
         db.session.commit()
+        STRATEGY.observe(db_user.id, MOVE_NAMES[choice])
 
         # Send result
         await query.edit_message_text(
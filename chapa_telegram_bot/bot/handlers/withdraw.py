@@ -3,7 +3,8 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 from models import User, Transaction, WithdrawalRequest
 from extensions import db
-from services.transaction import TransactionService
+from services.transaction import TransactionService, DAILY_WITHDRAW_LIMIT
+from limits import LIMITS
 import logging
 
 # Configure logging
@@ -105,6 +106,12 @@ async def request_wallet(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return ConversationHandler.END
 
+        # Check the rolling daily limit before asking for the wallet
+        allowed, message = LIMITS.check(db_user.id, 'withdrawal', amount, limit=DAILY_WITHDRAW_LIMIT)
+        if not allowed:
+            await update.message.reply_text(f"❌ {message}")
+            return ConversationHandler.END
+
         await update.message.reply_text(
             "💳 Please enter your wallet address or phone number:"
         )
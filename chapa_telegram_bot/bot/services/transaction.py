@@ -1,7 +1,7 @@
 """Transaction service for handling deposits and withdrawals"""
 from models import User, Transaction, WithdrawalRequest
 from extensions import db
-from datetime import datetime
+from limits import LIMITS
 import uuid
 import logging
 
@@ -9,6 +9,8 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+DAILY_WITHDRAW_LIMIT = 50000  # This bot's own cap in ETB, above the web app's DAILY_WITHDRAW_LIMIT
+
 class TransactionService:
     """Service for handling transactions"""
     
@@ -16,7 +18,6 @@ class TransactionService:
         """Initialize transaction service"""
         self.min_amount = 10  # Minimum transaction amount in ETB
         self.max_amount = 10000  # Maximum transaction amount in ETB
-        self.daily_limit = 50000  # Daily withdrawal limit in ETB
 
     def _generate_tx_ref(self) -> str:
         """Generate unique transaction reference"""
@@ -34,20 +35,6 @@ class TransactionService:
         except ValueError:
             return False, "Invalid amount format"
 
-    def _check_daily_limit(self, user_id: int, amount: float) -> tuple[bool, str]:
-        """Check if user has exceeded daily withdrawal limit"""
-        today = datetime.utcnow().date()
-        daily_total = db.session.query(db.func.sum(Transaction.amount))\
-            .filter(
-                Transaction.user_id == user_id,
-                Transaction.type == 'withdrawal',
-                db.func.date(Transaction.created_at) == today
-            ).scalar() or 0
-
-        if daily_total + amount > self.daily_limit:
-            return False, f"Daily withdrawal limit exceeded. Remaining: {self.daily_limit - daily_total} ETB"
-        return True, ""
-
     def create_deposit(self, user_id: int, amount: float) -> tuple[bool, dict]:
         """Create a new deposit transaction"""
         try:
@@ -61,6 +48,11 @@ class TransactionService:
             if not user:
                 return False, "User not found"
 
+            # Check daily limit
+            valid, message = LIMITS.check(user_id, 'deposit', amount)
+            if not valid:
+                return False, message
+
             # Create transaction
             tx_ref = self._generate_tx_ref()
             transaction = Transaction(
@@ -71,6 +63,7 @@ class TransactionService:
                 status='pending'
             )
             db.session.add(transaction)
+            LIMITS.record_transaction(transaction)
             db.session.commit()
 
             return True, {
@@ -92,8 +85,8 @@ class TransactionService:
             if not valid:
                 return False, message
 
-            # Get user
-            user = User.query.get(user_id)
+            # Get user, locked so this user's withdrawals are checked and recorded one at a time
+            user = User.query.filter_by(id=user_id).with_for_update().first()
             if not user:
                 return False, "User not found"
 
@@ -102,7 +95,7 @@ class TransactionService:
                 return False, "Insufficient balance"
 
             # Check daily limit
-            valid, message = self._check_daily_limit(user_id, amount)
+            valid, message = LIMITS.check(user_id, 'withdrawal', amount, limit=DAILY_WITHDRAW_LIMIT)
             if not valid:
                 return False, message
 
@@ -122,9 +115,11 @@ class TransactionService:
                 user_id=user_id,
                 amount=float(amount),
                 wallet_address=wallet,
+                tx_ref=tx_ref,
                 status='pending'
             )
             db.session.add(withdrawal)
+            LIMITS.record_transaction(transaction)
 
             # Deduct balance
             user.balance -= float(amount)
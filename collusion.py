@@ -0,0 +1,363 @@
+"""
+Streaming collusion and anomaly detection on settled games.
+
+Colluders join the same 3-player tables and split their moves so one of
+them takes the pot more often than chance allows. Every settled game is
+fed to COLLUSION once its transaction commits, and the checks only read
+counters kept in memory: each game costs the same however much history
+there is, and game_participants is never rescanned.
+
+- pairs: a count-min sketch holds, for every two players who shared a
+  table, how often they did, how often their moves differed, and how
+  often one of them won a decided game against what chance would give
+- players: an LRU of per-player games, wins against the 1/n expected,
+  and rock/paper/scissors counts
+
+A pair is suspicious once it has shared COLLUSION_MIN_GAMES tables, those
+are at least COLLUSION_PAIR_SHARE of either player's games, and either its
+joint wins are COLLUSION_Z_SCORE standard deviations above chance or it
+split moves COLLUSION_SPLIT_RATE of the time. Suspicious pairs are joined
+into clusters. A player whose own win rate is that far above chance is
+flagged alone. Flags are stored in collusion_flags for admins to review
+(GET /admin/api/collusion, admin_tool.py collusion_flags).
+
+Counters live in each process and start empty, so each process covers the
+games it settles.
+"""
+import json
+import logging
+import math
+import threading
+from array import array
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect, insert, select
+
+from extensions import db
+from models import User, Game, GameParticipant, CollusionFlag
+from config import (
+    COLLUSION_MIN_GAMES, COLLUSION_PAIR_SHARE, COLLUSION_Z_SCORE, COLLUSION_SPLIT_RATE,
+    COLLUSION_SKETCH_WIDTH, COLLUSION_SKETCH_DEPTH, COLLUSION_MAX_PLAYERS
+)
+
+logger = logging.getLogger(__name__)
+
+MOVES = ('rock', 'paper', 'scissors')
+
+# Counters kept per pair: tables shared, different moves, decided games,
+# games one of them won, and the expected wins and their variance
+PAIR_FIELDS = ('together', 'split', 'decided', 'won', 'expected', 'variance')
+
+
+def z_score(observed, expected, variance):
+    """Standard deviations observed is above expected; 0 without variance"""
+    return (observed - expected) / math.sqrt(variance) if variance > 0 else 0.0
+
+
+def chi_square(counts):
+    """Pearson's chi-square of move counts against an even split"""
+    total = sum(counts)
+    if not total:
+        return 0.0
+    expected = total / len(counts)
+    return sum((count - expected) ** 2 for count in counts) / expected
+
+
+class CountMinSketch:
+    """Approximate counters per key in fixed memory; estimates are never too low.
+
+    Each key maps to one cell per row and each cell holds len(fields)
+    counters. A key's estimate is, per field, the smallest of its cells.
+    """
+
+    def __init__(self, width=COLLUSION_SKETCH_WIDTH, depth=COLLUSION_SKETCH_DEPTH, fields=1):
+        self.width = width
+        self.depth = depth
+        self.fields = fields
+        self.rows = [array('d', bytes(8 * width * fields)) for _ in range(depth)]
+
+    def _offsets(self, key):
+        return [(hash((row, key)) % self.width) * self.fields for row in range(self.depth)]
+
+    def _estimate(self, offsets):
+        return tuple(
+            min(row[offset + field] for row, offset in zip(self.rows, offsets))
+            for field in range(self.fields)
+        )
+
+    def add(self, key, deltas):
+        """Add one delta per field to key's counters; returns its new estimate"""
+        offsets = self._offsets(key)
+        for row, offset in zip(self.rows, offsets):
+            for field, delta in enumerate(deltas):
+                row[offset + field] += delta
+        return self._estimate(offsets)
+
+    def estimate(self, key):
+        return self._estimate(self._offsets(key))
+
+
+class _Player:
+    """One player's running totals"""
+    __slots__ = ('games', 'decided', 'wins', 'expected', 'variance', 'moves')
+
+    def __init__(self):
+        self.games = self.decided = self.wins = 0
+        self.expected = self.variance = 0.0
+        self.moves = array('I', [0] * len(MOVES))
+
+
+class _Clusters:
+    """Players joined by suspicious pairs (union-find)"""
+
+    def __init__(self):
+        self.parent = {}
+        self.members = {}
+
+    def find(self, user_id):
+        root = user_id
+        while self.parent.get(root, root) != root:
+            root = self.parent[root]
+        while user_id != root:
+            self.parent[user_id], user_id = root, self.parent.get(user_id, user_id)
+        return root
+
+    def union(self, a, b):
+        """Join a's and b's clusters; returns the members of the result"""
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return self.members.setdefault(root_a, {root_a})
+        members_a = self.members.pop(root_a, {root_a})
+        members_b = self.members.pop(root_b, {root_b})
+        if len(members_a) < len(members_b):
+            root_a, root_b, members_a, members_b = root_b, root_a, members_b, members_a
+        self.parent[root_b] = root_a
+        members_a |= members_b
+        self.members[root_a] = members_a
+        return members_a
+
+
+class Finding:
+    """A cluster or player that crossed a threshold"""
+    __slots__ = ('kind', 'user_ids', 'games', 'score', 'details')
+
+    def __init__(self, kind, user_ids, games, score, details):
+        self.kind = kind
+        self.user_ids = sorted(user_ids)
+        self.games = int(games)
+        self.score = round(score, 2)
+        self.details = details
+
+    def __repr__(self):
+        return f"Finding({self.kind}, users={self.user_ids}, games={self.games}, score={self.score})"
+
+
+class CollusionMonitor:
+    """Incremental pair, win-rate and move statistics over settled games"""
+
+    def __init__(self, width=COLLUSION_SKETCH_WIDTH, depth=COLLUSION_SKETCH_DEPTH,
+                 max_players=COLLUSION_MAX_PLAYERS, min_games=COLLUSION_MIN_GAMES,
+                 pair_share=COLLUSION_PAIR_SHARE, z_threshold=COLLUSION_Z_SCORE,
+                 split_rate=COLLUSION_SPLIT_RATE):
+        self.pairs = CountMinSketch(width, depth, len(PAIR_FIELDS))
+        self.players = OrderedDict()
+        self.max_players = max_players
+        self.min_games = min_games
+        self.pair_share = pair_share
+        self.z_threshold = z_threshold
+        self.split_rate = split_rate
+        self.clusters = _Clusters()
+        self.flagged_clusters = set()
+        self.flagged_players = set()
+        self.games = 0
+        self._lock = threading.Lock()
+
+    def _player(self, user_id):
+        player = self.players.get(user_id)
+        if player is None:
+            player = self.players[user_id] = _Player()
+            while len(self.players) > self.max_players:
+                self.players.popitem(last=False)
+        else:
+            self.players.move_to_end(user_id)
+        return player
+
+    def observe(self, moves, winner_id=None):
+        """Count one settled game, given {user_id: move}; returns the findings it raised"""
+        with self._lock:
+            self.games += 1
+            seats = len(moves)
+            decided = winner_id is not None
+            findings = []
+
+            for user_id, move in moves.items():
+                player = self._player(user_id)
+                player.games += 1
+                if move in MOVES:
+                    player.moves[MOVES.index(move)] += 1
+                if decided:
+                    chance = 1 / seats
+                    player.decided += 1
+                    player.wins += user_id == winner_id
+                    player.expected += chance
+                    player.variance += chance * (1 - chance)
+                    findings.extend(self._check_player(user_id, player))
+
+            user_ids = sorted(moves)
+            chance = 2 / seats if decided else 0.0
+            for i, a in enumerate(user_ids):
+                for b in user_ids[i + 1:]:
+                    counts = self.pairs.add((a, b), (
+                        1, moves[a] != moves[b], decided, winner_id in (a, b),
+                        chance, chance * (1 - chance)
+                    ))
+                    findings.extend(self._check_pair(a, b, dict(zip(PAIR_FIELDS, counts))))
+            return findings
+
+    def _check_player(self, user_id, player):
+        if player.decided < self.min_games or user_id in self.flagged_players:
+            return []
+        score = z_score(player.wins, player.expected, player.variance)
+        if score < self.z_threshold:
+            return []
+        self.flagged_players.add(user_id)
+        return [Finding('player', [user_id], player.games, score, {
+            'wins': player.wins,
+            'decided': player.decided,
+            'expected_wins': round(player.expected, 1),
+            'moves': dict(zip(MOVES, player.moves)),
+            'move_chi_square': round(chi_square(player.moves), 1)
+        })]
+
+    def _check_pair(self, a, b, counts):
+        together = counts['together']
+        if together < self.min_games:
+            return []
+        share = min(together / min(self.players[a].games, self.players[b].games), 1.0)
+        split_rate = counts['split'] / together
+        score = z_score(counts['won'], counts['expected'], counts['variance'])
+        if share < self.pair_share or (score < self.z_threshold and split_rate < self.split_rate):
+            return []
+
+        members = frozenset(self.clusters.union(a, b))
+        if members in self.flagged_clusters:
+            return []
+        self.flagged_clusters.add(members)
+        return [Finding('cluster', members, together, score, {
+            'pair': [a, b],
+            'together': int(together),
+            'share': round(share, 2),
+            'split_rate': round(split_rate, 2),
+            'pair_wins': int(counts['won']),
+            'expected_pair_wins': round(counts['expected'], 1)
+        })]
+
+    def pair_stats(self, a, b):
+        """Estimated counters for two players (never too low)"""
+        with self._lock:
+            return dict(zip(PAIR_FIELDS, self.pairs.estimate((min(a, b), max(a, b)))))
+
+    def player_stats(self, user_id):
+        """Running totals for one player, or None if not tracked"""
+        with self._lock:
+            player = self.players.get(user_id)
+            if player is None:
+                return None
+            return {
+                'games': player.games,
+                'decided': player.decided,
+                'wins': player.wins,
+                'win_score': round(z_score(player.wins, player.expected, player.variance), 2),
+                'moves': dict(zip(MOVES, player.moves)),
+                'move_chi_square': round(chi_square(player.moves), 1)
+            }
+
+    def feed(self, games):
+        """Observe settled games, (moves, winner_id) each, and store what they raised"""
+        findings = []
+        for moves, winner_id in games:
+            findings.extend(self.observe(moves, winner_id))
+        if findings:
+            save_findings(findings)
+        return findings
+
+
+def save_findings(findings):
+    """Store findings as open collusion flags, skipping ones already open; returns how many"""
+    saved = 0
+    try:
+        with db.engine.begin() as connection:
+            for finding in findings:
+                user_ids = ','.join(str(user_id) for user_id in finding.user_ids)
+                if connection.execute(
+                    select(CollusionFlag.id).where(CollusionFlag.kind == finding.kind,
+                                                   CollusionFlag.user_ids == user_ids,
+                                                   CollusionFlag.status == 'open')
+                ).first():
+                    continue
+                connection.execute(insert(CollusionFlag).values(
+                    kind=finding.kind, user_ids=user_ids, games=finding.games, score=finding.score,
+                    details=json.dumps(finding.details), status='open'
+                ))
+                logger.warning(f"Possible collusion flagged for review: {finding}")
+                saved += 1
+    except Exception as e:
+        # Detection must never break a game commit
+        logger.error(f"Error saving collusion flags: {e}")
+    return saved
+
+
+def _settled_games(session):
+    """(moves, winner_id) for every game this flush settles"""
+    settled = [obj for obj in session.new if isinstance(obj, Game) and obj.status == 'completed']
+    settled += [
+        obj for obj in session.dirty
+        if isinstance(obj, Game) and 'completed' in (inspect(obj).attrs.status.history.added or ())
+    ]
+    if not settled:
+        return []
+
+    moves = {game.id: {} for game in settled}
+    for game_id, user_id, move in session.connection().execute(
+        select(GameParticipant.game_id, GameParticipant.user_id, GameParticipant.move)
+        .join(User, User.id == GameParticipant.user_id)
+        .where(GameParticipant.game_id.in_(list(moves)), User.is_bot.is_(False))
+    ):
+        moves[game_id][user_id] = move
+    # AI opponents are left out, so practice games have no pairs to count
+    return [(moves[game.id], game.winner_id) for game in settled if len(moves[game.id]) > 1]
+
+
+def _after_flush(session, flush_context):
+    try:
+        games = _settled_games(session)
+        if games:
+            session.info.setdefault('collusion_games', []).extend(games)
+    except Exception as e:
+        logger.error(f"Error collecting games for collusion detection: {e}")
+
+
+def _after_commit(session):
+    games = session.info.pop('collusion_games', None)
+    if games:
+        COLLUSION.feed(games)
+
+
+def _after_soft_rollback(session, previous_transaction):
+    session.info.pop('collusion_games', None)
+
+
+def register_collusion_listeners(session=None):
+    """Feed games settled by the given session (db.session by default) to COLLUSION on commit"""
+    session = session or db.session
+    listeners = (
+        ('after_flush', _after_flush),
+        ('after_commit', _after_commit),
+        ('after_soft_rollback', _after_soft_rollback),
+    )
+    for name, listener in listeners:
+        if not event.contains(session, name, listener):
+            event.listen(session, name, listener)
+
+
+COLLUSION = CollusionMonitor()
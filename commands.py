@@ -4,6 +4,7 @@ from telegram.ext import ContextTypes
 from payment_service import PaymentService
 from models import User, Transaction, WithdrawalRequest
 from extensions import db
+from balances import debit
 import logging
 from datetime import datetime
 
@@ -100,12 +101,16 @@ async def handle_withdrawal(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 user_id=user_id,
                 amount=amount,
                 wallet_address=wallet_address,
+                tx_ref=tx_ref,
                 status='pending'
             )
             db.session.add(withdrawal)
             
-            # Update user balance
-            user.balance -= amount
+            # Update user balance: one conditional UPDATE, so a concurrent withdrawal can't spend it too
+            if not debit(user.id, amount):
+                db.session.rollback()
+                await update.message.reply_text("Insufficient balance.")
+                return
             
             db.session.commit()
             
@@ -36,9 +36,66 @@ MIN_WITHDRAW_AMOUNT = 20.0
 MAX_WITHDRAW_AMOUNT = 5000.0
 PLATFORM_FEE_PERCENT = 2.0
 
-# Daily limits
+# Daily limits, over any rolling 24 hours (see limits.py)
 DAILY_DEPOSIT_LIMIT = 5000.0
 DAILY_WITHDRAW_LIMIT = 10000.0
+LIMITS_RELOAD_SECONDS = int(os.getenv('LIMITS_RELOAD_SECONDS', '60'))  # pick up other processes' amounts
+LIMITS_CACHE_SIZE = int(os.getenv('LIMITS_CACHE_SIZE', '100000'))  # user windows kept in memory
+DEPOSIT_CHECKOUT_MINUTES = int(os.getenv('DEPOSIT_CHECKOUT_MINUTES', '60'))  # pending deposits are then abandoned
+
+# Referral bonus: paid to the referrer once the referred user has deposited
+# and played REFERRAL_MIN_GAMES settled games
+REFERRAL_BONUS_AMOUNT = 20.0
+REFERRAL_MIN_GAMES = 3
+REFERRAL_REQUIRE_DEPOSIT = True
+REFERRAL_PAYOUT_INTERVAL = int(os.getenv('REFERRAL_PAYOUT_INTERVAL', '600'))  # seconds
+
+# Tournaments: knockout rounds of TOURNAMENT_TABLE_SIZE-player tables. The pot
+# (buy-ins less PLATFORM_FEE_PERCENT) is split by TOURNAMENT_PRIZE_SPLIT: the
+# first share to the champion, the second shared by the other finalists
+TOURNAMENT_TABLE_SIZE = 3
+TOURNAMENT_MIN_ENTRANTS = 3
+TOURNAMENT_MAX_ENTRANTS = 10000
+TOURNAMENT_PRIZE_SPLIT = (70.0, 30.0)  # percent
+
+# Cold archival: settled games and transactions older than ARCHIVE_AFTER_DAYS
+# move to monthly Parquet files under ARCHIVE_DIR (see archive.py)
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', 'archive')
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '180'))
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', '5000'))  # rows per record batch
+
+# Withdrawal payouts: approved requests go to each provider in bulk requests of
+# up to PAYOUT_BATCH_SIZE items, PAYOUT_CONCURRENCY requests at a time (see admin/payouts.py)
+PAYOUT_BATCH_SIZE = int(os.getenv('PAYOUT_BATCH_SIZE', '500'))
+PAYOUT_CONCURRENCY = int(os.getenv('PAYOUT_CONCURRENCY', '4'))
+PAYOUT_TIMEOUT = int(os.getenv('PAYOUT_TIMEOUT', '60'))  # seconds per provider request
+CHAPA_PAYOUT_BANK_CODE = os.getenv('CHAPA_PAYOUT_BANK_CODE', '')  # Chapa bank code for wallet_address payouts
+
+# Collusion detection: a pair who shared COLLUSION_MIN_GAMES tables, at least COLLUSION_PAIR_SHARE
+# of either one's games, is flagged when their joint wins are COLLUSION_Z_SCORE standard deviations
+# above chance or they play different moves COLLUSION_SPLIT_RATE of the time (see collusion.py)
+COLLUSION_MIN_GAMES = int(os.getenv('COLLUSION_MIN_GAMES', '20'))
+COLLUSION_PAIR_SHARE = float(os.getenv('COLLUSION_PAIR_SHARE', '0.5'))
+COLLUSION_Z_SCORE = float(os.getenv('COLLUSION_Z_SCORE', '3.0'))
+COLLUSION_SPLIT_RATE = float(os.getenv('COLLUSION_SPLIT_RATE', '0.95'))
+COLLUSION_SKETCH_WIDTH = 1 << 15  # cells per sketch row
+COLLUSION_SKETCH_DEPTH = 4
+COLLUSION_MAX_PLAYERS = 100000  # per-player stats kept in memory
+
+# AI opponents for /simulate: AI_OPPONENTS_PER_GAME seats are taken from a fixed pool of
+# AI_POOL_SIZE bot accounts. Simulated games are kept in simulated_games unless
+# SIMULATION_PERSIST_GAMES (see ai_opponents.py)
+AI_POOL_SIZE = 4
+AI_OPPONENTS_PER_GAME = 2
+SIMULATION_PERSIST_GAMES = os.getenv('SIMULATION_PERSIST_GAMES', 'False').lower() == 'true'
+
+# AI move strategy (see ai_strategy.py): 'markov' predicts each player's next move from
+# their past move-to-move transitions and 'random' plays uniformly. AI_DIFFICULTY is the
+# share of games the prediction is played; the rest are uniform random
+AI_STRATEGY = os.getenv('AI_STRATEGY', 'markov')
+AI_DIFFICULTY = float(os.getenv('AI_DIFFICULTY', '0.5'))
+AI_STRATEGY_CACHE_SIZE = 1000000  # players' move models kept in memory
+AI_STRATEGY_BATCH_SIZE = 500  # changed models written per batch
 
 # Chapa payment integration
 CHAPA_SECRET_KEY = os.getenv('CHAPA_SECRET_KEY', 'CHASECK_TEST-kydKbZsYn929T2WcSmjNaNXj3TBdVCLG')
@@ -46,6 +103,8 @@ CHAPA_API_URL = os.getenv('CHAPA_API_URL', 'https://api.chapa.co/v1')
 CURRENCY = 'ETB'
 PAYMENT_TITLE = 'RPS Game Deposit'
 PAYMENT_DESCRIPTION = 'Deposit funds to play Rock Paper Scissors'
+# Shown when a banned user (User.is_banned) tries to play, deposit or withdraw
+BANNED_MESSAGE = 'Your account has been suspended. Contact support if you think this is a mistake.'
 # Get base URL from environment or use a default
 BASE_URL = os.getenv('BASE_URL', 'http://localhost:5000')
 PAYMENT_SUCCESS_URL = f"{BASE_URL}/payment/success"
@@ -112,6 +171,27 @@ GAME_TIMEOUT = 60  # seconds
 # Fallback to 2-player mode if 3rd player doesn't join after X minutes
 FALLBACK_TO_TWO_PLAYER = 5
 
+# Game status cache: unfinished games are reloaded after this many seconds to pick up
+# moves made by other processes; completed games stay cached until evicted
+GAME_STATUS_CACHE_TTL = float(os.getenv('GAME_STATUS_CACHE_TTL', '5'))
+GAME_STATUS_CACHE_SIZE = 10000
+
+# Public page cache (see page_cache.py): the leaderboard and index are fresh for
+# PAGE_CACHE_TTL seconds, then served stale for up to PAGE_CACHE_STALE more while they
+# are rendered again; completed game results never change and stay cached until evicted
+PAGE_CACHE_TTL = float(os.getenv('PAGE_CACHE_TTL', '10'))
+PAGE_CACHE_STALE = float(os.getenv('PAGE_CACHE_STALE', '60'))
+PAGE_CACHE_SIZE = 5000
+PAGE_CACHE_IMMUTABLE_MAX_AGE = 31536000  # one year, for browsers and proxies
+
+# Live updates (see live_events.py): server-sent events for games and transactions.
+# A connection whose queue fills up is dropped as too slow; the browser reconnects
+LIVE_MAX_SUBSCRIBERS = int(os.getenv('LIVE_MAX_SUBSCRIBERS', '5000'))
+LIVE_MAX_CHANNELS = 20  # games and transactions one connection may follow
+LIVE_QUEUE_SIZE = 64  # events buffered per connection
+LIVE_HEARTBEAT = 15  # seconds between keep-alive comments on an idle connection
+LIVE_HISTORY_SIZE = 10000  # channels whose last event is replayed to new subscribers
+
 # Capa Wallet settings
 CAPA_API_URL = os.environ.get("CAPA_API_URL", "https://api.capawallet.com/v1")
 CAPA_API_KEY = os.environ.get("CAPA_API_KEY", "")
@@ -197,9 +277,25 @@ class Config:
     # Database settings
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///rps_game.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_ENGINE_OPTIONS = {
-        'connect_args': {'check_same_thread': False}  # Required for SQLite
-    }
+    
+    # Engine options are derived from the URL's dialect (see db_routing.engine_options);
+    # the pool settings only apply to Postgres
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '10'))  # seconds to wait for a connection
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))  # seconds
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '15000'))
+    DB_LOCK_TIMEOUT_MS = int(os.getenv('DB_LOCK_TIMEOUT_MS', '5000'))
+    
+    # Read-only engine for admin/reporting queries. Set to a replica DSN on
+    # Postgres; on SQLite a mode=ro URI on the same file is used when unset.
+    READ_REPLICA_URL = os.getenv('READ_REPLICA_URL')
+    
+    # Serve Prometheus-style metrics at /metrics (see metrics.py)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'false').lower() == 'true'
+    
+    # Log repeated query shapes (N+1) per request; development and CI only (see sql_profiler.py)
+    SQL_PROFILE = os.getenv('SQL_PROFILE', 'false').lower() == 'true'
     
     # Payment settings
     TEST_MODE = True
@@ -0,0 +1,180 @@
+"""Read-only engine routing for admin and reporting queries"""
+import logging
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+# Key of the read-only engine in app.extensions
+READ_ONLY_BIND = 'readonly'
+
+
+def read_only_url(database_url, replica_url=None):
+    """Build the URL of the read-only engine for a primary database URL.
+
+    An explicit replica DSN (e.g. a Postgres streaming replica) always wins.
+    File-backed SQLite databases get a ``mode=ro`` URI on the same file;
+    in-memory SQLite and Postgres without a replica return None.
+    """
+    if replica_url:
+        return replica_url
+
+    url = make_url(database_url)
+    if not url.drivername.startswith('sqlite'):
+        return None
+    if not url.database or url.database == ':memory:':
+        return None
+
+    database = url.database
+    if not database.startswith('file:'):
+        database = f"file:{database}"
+    query = dict(url.query)
+    query.update({'mode': 'ro', 'uri': 'true'})
+    return url.set(database=database, query=query).render_as_string(hide_password=False)
+
+
+def engine_options(database_url, pool_size=10, max_overflow=20, pool_timeout=10, pool_recycle=1800,
+                   statement_timeout_ms=15000, lock_timeout_ms=5000):
+    """Engine options for the dialect of database_url.
+
+    SQLite connections are shared between the bots' threads. Postgres gets
+    a bounded QueuePool that hands out the most recently used connection,
+    checks it before use and recycles it before proxy idle timeouts, plus
+    server-side statement and lock timeouts so a stuck row lock fails fast
+    instead of holding a pool slot.
+    """
+    url = make_url(database_url)
+    if url.get_backend_name() == 'sqlite':
+        return {'connect_args': {'check_same_thread': False}}
+    if url.get_backend_name() == 'postgresql':
+        return {
+            'poolclass': QueuePool,
+            'pool_size': pool_size,
+            'max_overflow': max_overflow,
+            'pool_timeout': pool_timeout,
+            'pool_recycle': pool_recycle,
+            'pool_pre_ping': True,
+            'pool_use_lifo': True,
+            'connect_args': {
+                'application_name': 'rps',
+                'options': f"-c statement_timeout={statement_timeout_ms} -c lock_timeout={lock_timeout_ms}",
+            },
+        }
+    return {}
+
+
+def configure_engine(app):
+    """Fill in SQLALCHEMY_ENGINE_OPTIONS for the configured database (call before db.init_app)"""
+    options = engine_options(
+        app.config['SQLALCHEMY_DATABASE_URI'],
+        pool_size=app.config.get('DB_POOL_SIZE', 10),
+        max_overflow=app.config.get('DB_MAX_OVERFLOW', 20),
+        pool_timeout=app.config.get('DB_POOL_TIMEOUT', 10),
+        pool_recycle=app.config.get('DB_POOL_RECYCLE', 1800),
+        statement_timeout_ms=app.config.get('DB_STATEMENT_TIMEOUT_MS', 15000),
+        lock_timeout_ms=app.config.get('DB_LOCK_TIMEOUT_MS', 5000),
+    )
+    # Explicit options win over the derived ones
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+
+class ReadOnlyEngine:
+    """An app's read-only engine, built from its primary engine on first use.
+
+    It is kept on the app rather than in SQLALCHEMY_BINDS: a bind key adds
+    a metadata to the shared db, and every other app using db would then
+    fail in create_all() for lack of that bind.
+    """
+
+    def __init__(self, replica_url=None):
+        self.replica_url = replica_url
+        self.engine = None
+        self._resolved = False
+        self._lock = threading.Lock()
+
+    def get(self, primary):
+        """The read-only engine for primary (the app's db.engine), or None without one"""
+        if not self._resolved:
+            with self._lock:
+                if not self._resolved:
+                    # The primary URL has SQLite paths already resolved against the instance folder
+                    url = read_only_url(primary.url.render_as_string(hide_password=False), self.replica_url)
+                    if url:
+                        self.engine = create_engine(url, **engine_options(url))
+                        logger.info("Read-only database configured for reporting queries")
+                    else:
+                        logger.info("No read-only database configured, reads use the primary engine")
+                    self._resolved = True
+        return self.engine
+
+
+def configure_read_only_bind(app):
+    """Give the app a read-only engine for reporting queries (before or after db.init_app)"""
+    app.extensions[READ_ONLY_BIND] = ReadOnlyEngine(app.config.get('READ_REPLICA_URL'))
+
+
+def read_only_engine(db):
+    """The current app's read-only engine, or None if it has none"""
+    engine = current_app.extensions.get(READ_ONLY_BIND)
+    return engine.get(db.engine) if engine is not None else None
+
+
+def enable_sqlite_wal(engine):
+    """Put a file-backed SQLite primary in WAL mode so readers don't block writers"""
+    if engine.dialect.name != 'sqlite' or not engine.url.database or engine.url.database == ':memory:':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode = WAL')
+        cursor.execute('PRAGMA synchronous = NORMAL')
+        cursor.close()
+
+
+def _read_only_requested():
+    """Check whether the current app context asked for read-only routing"""
+    return has_app_context() and g.get('db_read_only', False)
+
+
+class RoutingSession(Session):
+    """Session that sends reads to the read-only engine when requested.
+
+    Flushes always go to the primary engine so a read-only view that
+    happens to write still works, it just doesn't get the benefit.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and _read_only_requested():
+            engine = read_only_engine(self._db)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@contextmanager
+def read_only():
+    """Route queries issued inside the block to the read-only engine"""
+    previous = g.get('db_read_only', False)
+    g.db_read_only = True
+    try:
+        yield
+    finally:
+        g.db_read_only = previous
+
+
+def read_only_view(f):
+    """Decorator to mark a view as read-only so it queries the replica"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        with read_only():
+            return f(*args, **kwargs)
+    return decorated_function
@@ -1,7 +1,8 @@
 """Flask extensions module"""
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from db_routing import RoutingSession
 
 # Create extension instances
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
@@ -1,12 +1,16 @@
 from datetime import datetime
-from sqlalchemy import and_, or_, func
+from sqlalchemy import and_, or_, func, select, exists, update
 from extensions import db
+import game_status
+import tournaments
+from archive import ColdArchive
+from balances import debit, credit
 from models import User, Game, GameParticipant, Transaction
 from config import (
     BET_AMOUNT_DEFAULT, FIXED_BET_AMOUNTS,
     MIN_DEPOSIT_AMOUNT as MIN_BET_AMOUNT,
     MAX_DEPOSIT_AMOUNT as MAX_BET_AMOUNT,
-    PLATFORM_FEE_PERCENT, LOGGER
+    PLATFORM_FEE_PERCENT, LOGGER, BANNED_MESSAGE
 )
 
 class RPSGame:
@@ -29,6 +33,12 @@ class RPSGame:
             user.balance = minimum_required
             db.session.commit()
 
+    @staticmethod
+    def can_play(user_id):
+        """Whether the user exists and is not banned"""
+        user = db.session.get(User, user_id)
+        return user is not None and not user.is_banned
+
     @staticmethod
     def validate_bet_amount(amount):
         """Validate bet amount is within allowed range"""
@@ -41,6 +51,9 @@ class RPSGame:
     @staticmethod
     def create_game(creator_id, bet_amount, min_players=3, max_players=3):
         """Create a new game and add creator as first participant"""
+        if not RPSGame.can_play(creator_id):
+            return None
+            
         # Ensure creator has enough balance in test mode
         RPSGame.ensure_test_balance(creator_id)
         
@@ -54,6 +67,11 @@ class RPSGame:
         if not creator:
             return None
             
+        # Take the bet first: one conditional UPDATE, so a concurrent bet can't spend it too
+        if not debit(creator_id, bet_amount):
+            db.session.rollback()
+            return None
+            
         # Create new game
         game = Game(
             creator_id=creator_id,
@@ -72,15 +90,15 @@ class RPSGame:
         )
         db.session.add(participant)
         
-        # Deduct bet amount from creator's balance
-        creator.balance -= bet_amount
-        
         db.session.commit()
         return game
 
     @staticmethod
     def join_game(game_id, user_id):
         """Allow a user to join an existing game"""
+        if not RPSGame.can_play(user_id):
+            return False
+            
         # Ensure user has enough balance in test mode
         RPSGame.ensure_test_balance(user_id)
         
@@ -96,17 +114,27 @@ class RPSGame:
         if not user:
             return False
             
+        # Take the bet first. The conditional UPDATE can't overdraw, and it
+        # starts the write transaction, so on SQLite the checks below can't be
+        # stale; on Postgres the game row lock serializes joiners instead.
+        if not debit(user_id, game.bet_amount):
+            db.session.rollback()
+            return False
+        game = db.session.execute(
+            select(Game).where(Game.id == game_id).with_for_update()
+            .execution_options(populate_existing=True)
+        ).scalar_one()
+            
         # Check if user is already in game
         existing = GameParticipant.query.filter_by(
             game_id=game_id, 
             user_id=user_id
         ).first()
-        if existing:
-            return False
             
         # Check if game is full
         current_players = GameParticipant.query.filter_by(game_id=game_id).count()
-        if current_players >= game.max_players:
+        if existing or game.status != 'waiting' or current_players >= game.max_players:
+            db.session.rollback()
             return False
             
         # Add user as participant
@@ -116,9 +144,6 @@ class RPSGame:
         )
         db.session.add(participant)
         
-        # Deduct bet amount from user's balance
-        user.balance -= game.bet_amount
-        
         # Update game status if max players reached
         if current_players + 1 >= game.max_players:
             game.status = 'in_progress'
@@ -144,17 +169,19 @@ class RPSGame:
         if not participant:
             return False
             
-        if participant.choice:
+        if participant.move:
             return False
             
-        participant.choice = choice
+        participant.move = choice
         db.session.commit()
         
         # Check if all players have made choices
         all_participants = GameParticipant.query.filter_by(game_id=game_id).all()
         
-        if all(p.choice for p in all_participants):
-            RPSGame._determine_winner(game)
+        # Of concurrent final moves only the one that settles the game moves the tournament on
+        if all(p.move for p in all_participants) and RPSGame._determine_winner(game):
+            if game.tournament_id:
+                tournaments.TournamentService.table_settled(game)
             
         return True
 
@@ -165,39 +192,64 @@ class RPSGame:
 
     @staticmethod
     def _determine_winner(game):
-        """Determine winner based on choices"""
+        """Determine winner based on choices and pay out; False if the game was already settled"""
+        # Claim the game first: one conditional UPDATE, so of concurrent final moves
+        # only one pays the pot (the ORM update below still publishes the change)
+        claimed = db.session.execute(
+            update(Game)
+            .where(Game.id == game.id, Game.status == 'in_progress')
+            .values(status='completed'),
+            execution_options={'synchronize_session': False}
+        ).rowcount
+        if claimed != 1:
+            db.session.rollback()
+            return False
+
         participants = GameParticipant.query.filter_by(game_id=game.id).all()
-        choices = {p.choice: p.user_id for p in participants}
-        
-        winner_id = None
-        
-        # Find winner using classic RPS rules
-        if 'rock' in choices and 'scissors' in choices:
-            winner_id = choices['rock']
-        elif 'scissors' in choices and 'paper' in choices:
-            winner_id = choices['scissors']
-        elif 'paper' in choices and 'rock' in choices:
-            winner_id = choices['paper']
+        winner_id, results = RPSGame.outcomes([(p.user_id, p.move) for p in participants], game.bet_amount)
             
         # Update game status
         game.status = 'completed'
+        game.winner_id = winner_id
         game.completed_at = datetime.utcnow()
         
-        # Update winner stats if there is one
-        if winner_id:
-            winner = db.session.get(User, winner_id)
-            winner.games_won += 1
-            winner.balance += game.bet_amount * (len(participants) - 1)
-            
-        # Update all participants' games played count
-        for p in participants:
+        # Balances and counters are updated in SQL, so concurrent games can't lose each other's changes
+        for p, (_, result, payout) in zip(participants, results):
+            p.result = result
             user = db.session.get(User, p.user_id)
-            user.games_played += 1
-            if p.user_id != winner_id:
-                user.balance -= game.bet_amount
+            if result == 'win':
+                user.wins = User.wins + 1
+            elif result == 'lose':
+                user.losses = User.losses + 1
+            if payout:
+                credit(p.user_id, payout)
                 
         db.session.commit()
-        return winner_id
+        return True
+
+    @staticmethod
+    def outcomes(moves, bet_amount):
+        """Settle (user_id, move) pairs: returns (winner_id, [(user_id, result, payout)])
+
+        A player wins only if their move beats every other move. Bets were
+        taken on join: the winner gets the pot, a draw refunds everyone.
+        """
+        winner_id = None
+        for user_id, move in moves:
+            if all(RPSGame._is_winner(move, other) for other_id, other in moves if other_id != user_id):
+                winner_id = user_id
+                break
+
+        bet_amount = float(bet_amount)
+        results = []
+        for user_id, _ in moves:
+            if winner_id is None:
+                results.append((user_id, 'draw', bet_amount))
+            elif user_id == winner_id:
+                results.append((user_id, 'win', bet_amount * len(moves)))
+            else:
+                results.append((user_id, 'lose', 0))
+        return winner_id, results
 
     @staticmethod
     def _is_winner(choice1, choice2):
@@ -251,7 +303,8 @@ class RPSGame:
             Game.created_at.desc()
         ).limit(limit).all()
         
-        return games
+        # Older settled games live in the archive
+        return ColdArchive.user_games(user_id, games, limit)
     
     @staticmethod
     def get_game_details(game_id):
@@ -298,7 +351,7 @@ class RPSGame:
             for participant in game.participants:
                 user = User.query.get(participant.user_id)
                 if user:
-                    user.balance += game.bet_amount
+                    credit(user.id, game.bet_amount)
                     
                     # Create refund transaction
                     transaction = Transaction(
@@ -354,92 +407,65 @@ class RPSGame:
         user = User.query.get(user_id)
         if not user:
             return None, "User not found."
+        if user.is_banned:
+            return None, BANNED_MESSAGE
         
         if user.balance < bet_amount:
             return None, f"Insufficient balance. You need {bet_amount} coins to play."
         
         try:
-            # First try to find an existing game with exactly the same bet amount
-            available_games = Game.query.filter(
-                Game.status == 'waiting',
-                Game.bet_amount == bet_amount
-            ).all()
-            
-            # Find games that aren't full
-            joinable_games = []
-            for game in available_games:
-                participant_count = db.session.query(func.count(GameParticipant.id)).filter_by(game_id=game.id).scalar()
-                if participant_count < 3:
-                    joinable_games.append((game, participant_count))
+            # Top up test balances now: it commits, which would drop the row lock below
+            RPSGame.ensure_test_balance(user_id)
             
-            if joinable_games:
-                # Sort by most filled games first to fill games faster
-                joinable_games.sort(key=lambda x: x[1], reverse=True)
-                game = joinable_games[0][0]
-                success, message = RPSGame.join_game(game.id, user_id)
-                if success:
+            # Most filled joinable game with exactly the same bet amount. SKIP LOCKED
+            # sends concurrent joiners to different games instead of queueing them
+            # on one row (Postgres; SQLite ignores it and join_game re-checks).
+            seated = (
+                select(func.count(GameParticipant.id))
+                .where(GameParticipant.game_id == Game.id)
+                .scalar_subquery()
+            )
+            already_in = exists().where(GameParticipant.game_id == Game.id, GameParticipant.user_id == user_id)
+            for _ in range(3):
+                game = db.session.execute(
+                    select(Game)
+                    .where(Game.status == 'waiting', Game.bet_amount == bet_amount,
+                           seated < Game.max_players, ~already_in)
+                    .order_by(seated.desc(), Game.id)
+                    .limit(1)
+                    .with_for_update(skip_locked=True, of=Game)
+                ).scalar_one_or_none()
+                if game is None:
+                    break
+                if RPSGame.join_game(game.id, user_id):
                     return game, "Joined existing game"
-                return None, message
+            else:
+                return None, "Could not join the game. Please try again."
             
             # No suitable game found, create a new one
-            game, message = RPSGame.create_game(bet_amount, user_id)
+            game = RPSGame.create_game(user_id, bet_amount)
             if game:
                 return game, "Created new room"
-            return None, message
+            return None, "Could not create a game. Please try again."
         
         except Exception as e:
             db.session.rollback()
             LOGGER.error(f"Error finding/creating game: {e}")
             return False, "Error finding or creating game. Please try again."
 
+    @staticmethod
+    def waiting_games_by_bet():
+        """Count games waiting for players per bet amount (the matchmaking queue depth)"""
+        rows = db.session.query(Game.bet_amount, func.count(Game.id)).filter(
+            Game.status == 'waiting'
+        ).group_by(Game.bet_amount).all()
+        return {(f"{float(bet_amount):g}",): count for bet_amount, count in rows}
+
     @staticmethod
     def get_game_status(game_id, user_id=None):
-        """Get detailed game status including player choices and results"""
-        game = Game.query.get(game_id)
-        if not game:
-            return None
-        
-        participants = GameParticipant.query.filter_by(game_id=game_id).all()
-        total_players = len(participants)
-        players_ready = len([p for p in participants if p.choice is not None])
-        
-        status_info = {
-            'game_id': game.id,
-            'status': game.status,
-            'bet_amount': float(game.bet_amount),
-            'total_players': total_players,
-            'players_ready': players_ready,
-            'is_completed': game.status == 'completed',
-            'players': []
-        }
-        
-        # Add player information
-        for p in participants:
-            player = User.query.get(p.user_id)
-            player_info = {
-                'user_id': player.id,
-                'username': player.username,
-                'has_chosen': p.choice is not None
-            }
-            
-            # Only show choices if game is completed or if it's the current player
-            if game.status == 'completed' or (user_id and p.user_id == user_id):
-                player_info['choice'] = p.choice
-            
-            if game.status == 'completed':
-                player_info['is_winner'] = game.winner_id == p.user_id
-            
-            status_info['players'].append(player_info)
-        
-        if game.status == 'completed':
-            if game.winner_id:
-                winner = User.query.get(game.winner_id)
-                status_info['winner'] = {
-                    'user_id': winner.id,
-                    'username': winner.username,
-                    'winnings': float(game.bet_amount * 3)
-                }
-            else:
-                status_info['winner'] = None
-        
-        return status_info
+        """Get detailed game status including player choices and results.
+
+        Served from the game status read model: one joined query, or none
+        when the snapshot is cached.
+        """
+        return game_status.get_game_status(game_id, user_id)
@@ -0,0 +1,291 @@
+"""
+Game status read model.
+
+A snapshot of a game (status, bet, winner and each participant's
+username and move) is loaded with one joined query and kept in an
+in-process LRU cache. Flushes that touch a Game or GameParticipant drop
+the affected snapshots, again after commit or rollback so a snapshot read
+mid-transaction never outlives it. Writers in other processes (the other
+bots, the web app) are covered by a short TTL on unfinished games;
+completed and cancelled games never change and stay cached until evicted.
+
+Visibility rules are applied per viewer when the snapshot is rendered,
+so one cached snapshot serves every player of the game.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import aliased
+
+from extensions import db
+from models import User, Game, GameParticipant
+from config import GAME_STATUS_CACHE_TTL, GAME_STATUS_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+FINAL_STATUSES = ('completed', 'cancelled')
+
+
+class PlayerView:
+    """One participant in a snapshot"""
+    __slots__ = ('user_id', 'username', 'move')
+
+    def __init__(self, user_id, username, move):
+        self.user_id = user_id
+        self.username = username
+        self.move = move
+
+    @property
+    def has_chosen(self):
+        return self.move is not None
+
+
+class GameSnapshot:
+    """Immutable view of a game and its participants at load time"""
+    __slots__ = ('game_id', 'status', 'bet_amount', 'winner_id', 'players', 'loaded_at')
+
+    def __init__(self, game_id, status, bet_amount, winner_id, players):
+        self.game_id = game_id
+        self.status = status
+        self.bet_amount = float(bet_amount)
+        self.winner_id = winner_id
+        self.players = tuple(players)
+        self.loaded_at = time.monotonic()
+
+    @property
+    def is_completed(self):
+        return self.status == 'completed'
+
+    @property
+    def players_ready(self):
+        return sum(1 for p in self.players if p.has_chosen)
+
+    def player(self, user_id):
+        for p in self.players:
+            if p.user_id == user_id:
+                return p
+        return None
+
+    def is_fresh(self, ttl):
+        return self.status in FINAL_STATUSES or time.monotonic() - self.loaded_at < ttl
+
+    def to_dict(self, user_id=None):
+        """Status as seen by user_id: moves stay hidden until the game completes, except the viewer's own"""
+        status_info = {
+            'game_id': self.game_id,
+            'status': self.status,
+            'bet_amount': self.bet_amount,
+            'total_players': len(self.players),
+            'players_ready': self.players_ready,
+            'is_completed': self.is_completed,
+            'players': []
+        }
+
+        for p in self.players:
+            player_info = {
+                'user_id': p.user_id,
+                'username': p.username,
+                'has_chosen': p.has_chosen
+            }
+            if self.is_completed or (user_id and p.user_id == user_id):
+                player_info['choice'] = p.move
+            if self.is_completed:
+                player_info['is_winner'] = self.winner_id == p.user_id
+            status_info['players'].append(player_info)
+
+        if self.is_completed:
+            winner = self.player(self.winner_id) if self.winner_id else None
+            status_info['winner'] = {
+                'user_id': winner.user_id,
+                'username': winner.username,
+                'winnings': self.bet_amount * len(self.players)
+            } if winner else None
+
+        return status_info
+
+
+def _snapshots(rows):
+    """Build snapshots from (game, participant, username) rows ordered by game"""
+    snapshots = []
+    current = None
+    players = []
+    for game_id, status, bet_amount, winner_id, user_id, move, username in rows:
+        if current is None or current[0] != game_id:
+            if current is not None:
+                snapshots.append(GameSnapshot(*current, players))
+            current = (game_id, status, bet_amount, winner_id)
+            players = []
+        if user_id is not None:
+            players.append(PlayerView(user_id, username, move))
+    if current is not None:
+        snapshots.append(GameSnapshot(*current, players))
+    return snapshots
+
+
+def _columns(participant=GameParticipant):
+    return (Game.id, Game.status, Game.bet_amount, Game.winner_id,
+            participant.user_id, participant.move, User.username)
+
+
+def load_snapshot(game_id):
+    """Load one game with its participants and usernames in a single query"""
+    rows = db.session.execute(
+        select(*_columns())
+        .select_from(Game)
+        .outerjoin(GameParticipant, GameParticipant.game_id == Game.id)
+        .outerjoin(User, User.id == GameParticipant.user_id)
+        .where(Game.id == game_id)
+        .order_by(GameParticipant.id)
+    )
+    snapshots = _snapshots(rows)
+    return snapshots[0] if snapshots else None
+
+
+def load_active_snapshot(user_id, statuses):
+    """Load the user's oldest game in one of statuses, with all participants, in a single query"""
+    mine = aliased(GameParticipant)
+    rows = db.session.execute(
+        select(*_columns())
+        .select_from(mine)
+        .join(Game, Game.id == mine.game_id)
+        .join(GameParticipant, GameParticipant.game_id == Game.id)
+        .join(User, User.id == GameParticipant.user_id)
+        .where(mine.user_id == user_id, Game.status.in_(statuses))
+        .order_by(Game.id, GameParticipant.id)
+    )
+    snapshots = _snapshots(rows)
+    return snapshots[0] if snapshots else None
+
+
+class GameStatusCache:
+    """LRU of game snapshots plus a user -> active game index"""
+
+    def __init__(self, ttl=GAME_STATUS_CACHE_TTL, max_size=GAME_STATUS_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._games = OrderedDict()
+        self._active_game = {}
+        self._lock = threading.Lock()
+
+    def _cached(self, game_id):
+        with self._lock:
+            snapshot = self._games.get(game_id)
+            if snapshot is not None and snapshot.is_fresh(self.ttl):
+                self._games.move_to_end(game_id)
+                self.hits += 1
+                return snapshot
+            self.misses += 1
+            return None
+
+    def _store(self, snapshot):
+        with self._lock:
+            self._games[snapshot.game_id] = snapshot
+            self._games.move_to_end(snapshot.game_id)
+            while len(self._games) > self.max_size:
+                self._games.popitem(last=False)
+
+    def get(self, game_id):
+        """Snapshot of a game: no query on a hit, one on a miss"""
+        snapshot = self._cached(game_id)
+        if snapshot is None:
+            snapshot = load_snapshot(game_id)
+            if snapshot is not None:
+                self._store(snapshot)
+        return snapshot
+
+    def get_active(self, user_id, statuses):
+        """Snapshot of the user's game in one of statuses: at most one query"""
+        game_id = self._active_game.get(user_id)
+        if game_id is not None:
+            snapshot = self._cached(game_id)
+            if snapshot is not None and snapshot.status in statuses and snapshot.player(user_id):
+                return snapshot
+
+        snapshot = load_active_snapshot(user_id, statuses)
+        if snapshot is None:
+            self._active_game.pop(user_id, None)
+            return None
+        self._store(snapshot)
+        for p in snapshot.players:
+            self._active_game[p.user_id] = snapshot.game_id
+        return snapshot
+
+    def invalidate(self, game_ids=None, user_ids=()):
+        """Drop snapshots for game_ids (everything when None) and the users' active game index"""
+        with self._lock:
+            if game_ids is None:
+                self._games.clear()
+                self._active_game.clear()
+                return
+            for game_id in game_ids:
+                self._games.pop(game_id, None)
+            for user_id in user_ids:
+                self._active_game.pop(user_id, None)
+
+
+CACHE = GameStatusCache()
+
+
+def get_game_status(game_id, user_id=None):
+    """Game status dict as seen by user_id, or None if the game doesn't exist"""
+    snapshot = CACHE.get(game_id)
+    return snapshot.to_dict(user_id) if snapshot else None
+
+
+def _touched(session):
+    """Game ids and user ids affected by the pending flush"""
+    game_ids, user_ids = set(), set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Game):
+            game_ids.add(obj.id)
+        elif isinstance(obj, GameParticipant):
+            game_ids.add(obj.game_id)
+            user_ids.add(obj.user_id)
+    game_ids.discard(None)
+    return game_ids, user_ids
+
+
+def _after_flush(session, flush_context):
+    game_ids, user_ids = _touched(session)
+    if not game_ids and not user_ids:
+        return
+    CACHE.invalidate(game_ids, user_ids)
+    pending = session.info.setdefault('game_status_touched', (set(), set()))
+    pending[0].update(game_ids)
+    pending[1].update(user_ids)
+
+
+def _after_commit(session):
+    # A concurrent reader may have cached the pre-commit state between flush and commit
+    pending = session.info.pop('game_status_touched', None)
+    if pending:
+        CACHE.invalidate(*pending)
+
+
+def _after_soft_rollback(session, previous_transaction):
+    _after_commit(session)
+
+
+def _after_bulk(update_context):
+    if update_context.mapper.class_ in (Game, GameParticipant):
+        CACHE.invalidate()
+
+
+def register_status_listeners(session=None):
+    """Invalidate cached snapshots on every flush of the given session (db.session by default)"""
+    session = session or db.session
+    listeners = (
+        ('after_flush', _after_flush),
+        ('after_commit', _after_commit),
+        ('after_soft_rollback', _after_soft_rollback),
+        ('after_bulk_update', _after_bulk),
+        ('after_bulk_delete', _after_bulk),
+    )
+    for name, listener in listeners:
+        if not event.contains(session, name, listener):
+            event.listen(session, name, listener)
@@ -0,0 +1,392 @@
+"""
+In-process async job queue for deferred side effects.
+
+Bot handlers settle a game in their own transaction, enqueue the slow
+parts (messages to every player, result animations, ...) and return.
+Each job type has its own pool of workers, so a burst of animations
+cannot hold up plain notifications. A job that raises is retried with
+exponential backoff and dead-lettered after max_attempts.
+
+Jobs live in memory by default and are lost on restart. Set JOB_QUEUE_DB
+to a SQLite file to make them durable: pending jobs are reloaded when the
+bot starts (delivery is at least once) and dead letters stay in the file
+for inspection and retry_dead(). Several bots can share one file; each
+queue only sees its own jobs.
+
+    JOBS = JobQueue('run_bot')
+    JOBS.register('notify', send_notification, concurrency=8)
+    JOBS.attach(application)              # start/stop with the bot
+    JOBS.enqueue('notify', {'chat_id': 42, 'text': 'You won!'})
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUE_DB = os.getenv('JOB_QUEUE_DB')
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_BACKOFF = 1.0
+
+
+class Job:
+    """One unit of deferred work"""
+    __slots__ = ('id', 'type', 'payload', 'attempts', 'run_at', 'last_error')
+
+    def __init__(self, id, type, payload, attempts=0, run_at=0.0, last_error=None):
+        self.id = id
+        self.type = type
+        self.payload = payload
+        self.attempts = attempts
+        self.run_at = run_at
+        self.last_error = last_error
+
+    def __repr__(self):
+        return f"<Job {self.id} {self.type} attempts={self.attempts}>"
+
+
+class MemoryJobStore:
+    """Keeps nothing across restarts; dead letters are held in memory"""
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self._dead = {}
+
+    def add(self, job_type, payload, run_at):
+        return next(self._ids)
+
+    def load(self):
+        return []
+
+    def retry(self, job):
+        pass
+
+    def done(self, job):
+        pass
+
+    def dead(self, job):
+        self._dead[job.id] = job
+
+    def dead_letters(self):
+        return list(self._dead.values())
+
+    def revive(self):
+        jobs = list(self._dead.values())
+        self._dead.clear()
+        return jobs
+
+
+class SQLiteJobStore:
+    """Durable jobs in one SQLite table, shared by queue name"""
+
+    def __init__(self, path, queue='default'):
+        self.path = path
+        self.queue = queue
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    queue TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    run_at REAL NOT NULL,
+                    last_error TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_jobs_queue_status ON jobs (queue, status, id)')
+            self._conn = conn
+        return self._conn
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._connection().execute(sql, params)
+
+    def _jobs(self, status):
+        with self._lock:
+            rows = self._connection().execute(
+                'SELECT id, type, payload, attempts, run_at, last_error FROM jobs '
+                'WHERE queue = ? AND status = ? ORDER BY id',
+                (self.queue, status)
+            ).fetchall()
+        return [Job(id, type, json.loads(payload), attempts, run_at, last_error)
+                for id, type, payload, attempts, run_at, last_error in rows]
+
+    def add(self, job_type, payload, run_at):
+        cursor = self._execute(
+            'INSERT INTO jobs (queue, type, payload, run_at) VALUES (?, ?, ?, ?)',
+            (self.queue, job_type, json.dumps(payload), run_at)
+        )
+        return cursor.lastrowid
+
+    def load(self):
+        return self._jobs('pending')
+
+    def retry(self, job):
+        self._execute(
+            'UPDATE jobs SET attempts = ?, run_at = ?, last_error = ? WHERE id = ?',
+            (job.attempts, job.run_at, job.last_error, job.id)
+        )
+
+    def done(self, job):
+        self._execute('DELETE FROM jobs WHERE id = ?', (job.id,))
+
+    def dead(self, job):
+        self._execute(
+            "UPDATE jobs SET status = 'dead', attempts = ?, last_error = ? WHERE id = ?",
+            (job.attempts, job.last_error, job.id)
+        )
+
+    def dead_letters(self):
+        return self._jobs('dead')
+
+    def revive(self):
+        jobs = self._jobs('dead')
+        self._execute(
+            "UPDATE jobs SET status = 'pending', attempts = 0 WHERE queue = ? AND status = 'dead'",
+            (self.queue,)
+        )
+        return jobs
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class _JobType:
+    __slots__ = ('handler', 'concurrency', 'max_attempts', 'backoff')
+
+    def __init__(self, handler, concurrency, max_attempts, backoff):
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+
+
+class JobQueue:
+    """Per-type worker pools with retries and dead-lettering.
+
+    Handlers are coroutines called as ``handler(bot, payload)``; payloads
+    must be JSON-serializable so durable mode can store them.
+    """
+
+    def __init__(self, name, store=None):
+        self.name = name
+        if store is None:
+            store = SQLiteJobStore(JOB_QUEUE_DB, name) if JOB_QUEUE_DB else MemoryJobStore()
+        self.store = store
+        self.bot = None
+        self._types = {}
+        self._queues = {}
+        self._workers = []
+        self._pending = []
+        self._periodic = []
+        self._outstanding = 0
+        self._idle = None
+        self._loop = None
+
+    def register(self, job_type, handler, concurrency=DEFAULT_CONCURRENCY,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS, backoff=DEFAULT_BACKOFF):
+        """Run handler for jobs of job_type, at most concurrency at a time"""
+        if self._loop is not None:
+            raise RuntimeError(f"Register job types before starting queue {self.name}")
+        self._types[job_type] = _JobType(handler, concurrency, max_attempts, backoff)
+        return handler
+
+    def handler(self, job_type, **options):
+        """Decorator form of register()"""
+        def decorator(fn):
+            return self.register(job_type, fn, **options)
+        return decorator
+
+    def every(self, job_type, interval, payload=None):
+        """Enqueue job_type every interval seconds while the queue runs (not stored, so no duplicates on restart)"""
+        if job_type not in self._types:
+            raise ValueError(f"Unknown job type {job_type!r} for queue {self.name}")
+        self._periodic.append((job_type, interval, payload))
+
+    async def _every(self, job_type, interval, payload):
+        while True:
+            await asyncio.sleep(interval)
+            self.enqueue(job_type, payload)
+
+    @property
+    def running(self):
+        return self._loop is not None
+
+    def enqueue(self, job_type, payload=None, delay=0):
+        """Queue a job and return it immediately; safe to call from other threads"""
+        if job_type not in self._types:
+            raise ValueError(f"Unknown job type {job_type!r} for queue {self.name}")
+        payload = payload or {}
+        run_at = time.time() + delay
+        job = Job(self.store.add(job_type, payload, run_at), job_type, payload, run_at=run_at)
+        self._submit(job)
+        return job
+
+    def _submit(self, job):
+        loop = self._loop
+        if loop is None:
+            self._pending.append(job)
+            return
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        if current is loop:
+            self._schedule(job)
+        else:
+            loop.call_soon_threadsafe(self._schedule, job)
+
+    def _schedule(self, job):
+        self._outstanding += 1
+        self._idle.clear()
+        delay = job.run_at - time.time()
+        if delay > 0:
+            self._loop.call_later(delay, self._queues[job.type].put_nowait, job)
+        else:
+            self._queues[job.type].put_nowait(job)
+
+    def _settled(self):
+        self._outstanding -= 1
+        if self._outstanding == 0:
+            self._idle.set()
+
+    async def _worker(self, job_type):
+        queue = self._queues[job_type]
+        spec = self._types[job_type]
+        while True:
+            job = await queue.get()
+            started = time.perf_counter()
+            try:
+                await spec.handler(self.bot, job.payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._failed(job, spec, e)
+            else:
+                self.store.done(job)
+                metrics.JOBS.inc(type=job_type, outcome='done')
+                self._settled()
+            finally:
+                metrics.JOB_LATENCY.observe(time.perf_counter() - started, type=job_type)
+                queue.task_done()
+
+    def _failed(self, job, spec, error):
+        job.attempts += 1
+        job.last_error = f"{type(error).__name__}: {error}"
+        if job.attempts >= spec.max_attempts:
+            logger.error(f"Job {job.type} #{job.id} dead-lettered after {job.attempts} attempts: {job.last_error}")
+            self.store.dead(job)
+            metrics.JOBS.inc(type=job.type, outcome='dead')
+            self._settled()
+            return
+        delay = spec.backoff * 2 ** (job.attempts - 1)
+        logger.warning(f"Job {job.type} #{job.id} failed ({job.last_error}), retrying in {delay:.1f}s")
+        job.run_at = time.time() + delay
+        self.store.retry(job)
+        metrics.JOBS.inc(type=job.type, outcome='retry')
+        self._schedule(job)
+        self._settled()
+
+    async def start(self, bot=None):
+        """Start the workers on the running loop and resume stored and early jobs"""
+        if self._loop is not None:
+            return
+        self.bot = bot
+        self._loop = asyncio.get_running_loop()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        for job_type, spec in self._types.items():
+            self._queues[job_type] = asyncio.Queue()
+            for _ in range(spec.concurrency):
+                self._workers.append(asyncio.create_task(self._worker(job_type)))
+        for job_type, interval, payload in self._periodic:
+            self._workers.append(asyncio.create_task(self._every(job_type, interval, payload)))
+
+        # Jobs enqueued before start are already in a durable store; keep one copy
+        early = {job.id for job in self._pending}
+        resumed = [job for job in self.store.load() if job.id not in early]
+        for job in resumed + self._pending:
+            if job.type not in self._types:
+                logger.error(f"Dropping stored job #{job.id}: no handler for {job.type!r}")
+                continue
+            self._schedule(job)
+        self._pending = []
+        if resumed:
+            logger.info(f"Resumed {len(resumed)} stored jobs for queue {self.name}")
+
+    async def join(self):
+        """Wait until every queued job has finished or been dead-lettered"""
+        if self._idle is not None:
+            await self._idle.wait()
+
+    async def stop(self, timeout=10):
+        """Let queued jobs finish for up to timeout seconds, then cancel the workers"""
+        if self._loop is None:
+            return
+        try:
+            await asyncio.wait_for(self.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Queue {self.name} stopped with {self._outstanding} jobs unfinished")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queues = {}
+        self._loop = None
+
+    def attach(self, application):
+        """Start with a PTB Application (post_init) and drain on shutdown"""
+        post_init = application.post_init
+        post_shutdown = application.post_shutdown
+
+        async def start(app):
+            await self.start(app.bot)
+            if post_init:
+                await post_init(app)
+
+        async def stop(app):
+            await self.stop()
+            if post_shutdown:
+                await post_shutdown(app)
+
+        application.post_init = start
+        application.post_shutdown = stop
+        return application
+
+    def dead_letters(self):
+        return self.store.dead_letters()
+
+    def retry_dead(self):
+        """Give every dead-lettered job a fresh set of attempts"""
+        jobs = self.store.revive()
+        for job in jobs:
+            job.attempts = 0
+            job.run_at = time.time()
+            self._submit(job)
+        return len(jobs)
+
+
+async def send_notification(bot, payload):
+    """'notify' job: payload holds bot.send_message keyword arguments"""
+    await bot.send_message(**payload)
@@ -0,0 +1,292 @@
+"""
+Rolling 24-hour deposit and withdrawal limits.
+
+DAILY_DEPOSIT_LIMIT and DAILY_WITHDRAW_LIMIT cap what a user may deposit
+or withdraw in any 24 hours. Amounts are counted in per-minute buckets:
+in memory each user and kind has a deque of (minute, amount) buckets and
+their running total, so a check is the total less whatever buckets just
+aged out of the window. That is O(1) amortised, with no query.
+
+Counters are written through to limit_buckets, one row per user, kind
+and minute, in the caller's transaction. The in-memory total moves when
+that transaction commits, and a rollback leaves both untouched.
+
+A deposit or withdrawal counts from the moment it is started. When its
+Transaction later moves to failed, rejected or cancelled (a provider error,
+an admin rejection, a payout refund, an abandoned checkout) the amount is
+released again at the minute it was recorded; the flush listener installed
+by register_limit_listeners() does that for every path that changes the
+status, and counts it back if a late callback still completes it.
+
+Windows are loaded from limit_buckets on first use, which is one indexed
+query. So counters survive a restart, and recover() warms every active
+window at startup. The bots and the web app write the same table, so a
+window is reloaded once it is LIMITS_RELOAD_SECONDS old. prune() drops
+buckets that have left the window.
+
+    allowed, message = LIMITS.check(user_id, 'deposit', amount)
+    minute = LIMITS.record(user_id, 'deposit', amount)  # before commit
+    LIMITS.release(user_id, 'deposit', amount, minute)  # if it fell through
+
+    LIMITS.record_transaction(transaction)  # counted at its created_at minute
+
+check() then record() is not atomic, so the limit is a soft cap: requests
+checked at the same moment, before either commits, can all pass and together
+go over it.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from sqlalchemy import delete, event, insert, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from extensions import db
+from models import LimitBucket, Transaction
+from config import DAILY_DEPOSIT_LIMIT, DAILY_WITHDRAW_LIMIT, LIMITS_RELOAD_SECONDS, LIMITS_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+WINDOW_MINUTES = 24 * 60
+DAILY_LIMITS = {'deposit': DAILY_DEPOSIT_LIMIT, 'withdrawal': DAILY_WITHDRAW_LIMIT}
+RELEASED_STATUSES = ('failed', 'rejected', 'cancelled')
+
+
+def _minute(timestamp):
+    return int(timestamp // 60)
+
+
+def _upsert_bucket(connection, user_id, kind, minute, amount):
+    """Add amount to one bucket row, creating it if needed"""
+    table = LimitBucket.__table__
+    key = {'user_id': user_id, 'kind': kind, 'minute': minute}
+    dialect = connection.dialect.name
+
+    if dialect in ('sqlite', 'postgresql'):
+        dialect_insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = dialect_insert(table).values(amount=amount, **key)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.kind, table.c.minute],
+            set_={'amount': table.c.amount + stmt.excluded.amount}
+        )
+        connection.execute(stmt)
+        return
+
+    result = connection.execute(
+        update(table)
+        .where(*(table.c[name] == value for name, value in key.items()))
+        .values(amount=table.c.amount + amount)
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(table).values(amount=amount, **key))
+
+
+class _Window:
+    """One user's buckets for one kind over the last 24 hours, oldest first"""
+    __slots__ = ('buckets', 'total', 'loaded_at')
+
+    def __init__(self, buckets, loaded_at):
+        self.buckets = deque(buckets)
+        self.total = sum((amount for _, amount in self.buckets), Decimal('0'))
+        self.loaded_at = loaded_at
+
+    def expire(self, minute):
+        start = minute - WINDOW_MINUTES
+        while self.buckets and self.buckets[0][0] <= start:
+            self.total -= self.buckets.popleft()[1]
+
+    def add(self, minute, amount):
+        for bucket in reversed(self.buckets):
+            if bucket[0] == minute:
+                bucket[1] += amount
+                self.total += amount
+                return
+            if bucket[0] < minute:
+                break
+        if self.buckets and minute <= self.buckets[-1][0]:
+            # Committed out of order: counting it in the newest bucket keeps it a little longer, never shorter
+            self.buckets[-1][1] += amount
+        else:
+            self.buckets.append([minute, amount])
+        self.total += amount
+
+
+def _after_commit(session):
+    for counters, user_id, kind, minute, amount in session.info.pop('limit_counts', ()):
+        counters._add(user_id, kind, minute, amount)
+
+
+def _after_soft_rollback(session, previous_transaction):
+    session.info.pop('limit_counts', None)
+
+
+def _after_flush(session, flush_context):
+    """Release transactions this flush moves to a failed status, and recount any that come back"""
+    for obj in session.dirty:
+        if not isinstance(obj, Transaction) or obj.type not in DAILY_LIMITS:
+            continue
+        history = inspect(obj).attrs.status.history
+        added, deleted = set(history.added or ()), set(history.deleted or ())
+        if added & set(RELEASED_STATUSES) and not deleted & set(RELEASED_STATUSES):
+            LIMITS.release_transaction(obj, session)
+        elif 'completed' in added and deleted & set(RELEASED_STATUSES):
+            LIMITS.release_transaction(obj, session, recount=True)
+
+
+def _status_set(target, value, oldvalue, initiator):
+    """Nothing to do; listening with active_history loads the old status so the flush sees where it came from"""
+
+
+def register_limit_listeners(session=None):
+    """Release the limits of failed transactions on every flush of the given session (db.session by default)"""
+    session = session or db.session
+    if not event.contains(Transaction.status, 'set', _status_set):
+        event.listen(Transaction.status, 'set', _status_set, active_history=True)
+    if not event.contains(session, 'after_flush', _after_flush):
+        event.listen(session, 'after_flush', _after_flush)
+
+
+class LimitCounters:
+    """Per-user rolling 24-hour totals of deposits and withdrawals"""
+
+    def __init__(self, limits=None, reload_seconds=LIMITS_RELOAD_SECONDS, max_size=LIMITS_CACHE_SIZE,
+                 clock=time.time):
+        self.limits = dict(DAILY_LIMITS if limits is None else limits)
+        self.reload_seconds = reload_seconds
+        self.max_size = max_size
+        self.clock = clock
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, key, now):
+        with self._lock:
+            window = self._windows.get(key)
+            if window is not None and now - window.loaded_at <= self.reload_seconds:
+                self._windows.move_to_end(key)
+                return window
+            return None
+
+    def _store(self, key, window):
+        with self._lock:
+            self._windows[key] = window
+            self._windows.move_to_end(key)
+            while len(self._windows) > self.max_size:
+                self._windows.popitem(last=False)
+
+    def _load(self, user_id, kind, now):
+        rows = db.session.execute(
+            select(LimitBucket.minute, LimitBucket.amount)
+            .where(LimitBucket.user_id == user_id, LimitBucket.kind == kind,
+                   LimitBucket.minute > _minute(now) - WINDOW_MINUTES)
+            .order_by(LimitBucket.minute)
+        ).all()
+        return _Window([[minute, Decimal(str(amount))] for minute, amount in rows], now)
+
+    def _window(self, user_id, kind):
+        now = self.clock()
+        key = (user_id, kind)
+        window = self._cached(key, now)
+        if window is None:
+            window = self._load(user_id, kind, now)
+            self._store(key, window)
+        with self._lock:
+            window.expire(_minute(now))
+        return window
+
+    def _add(self, user_id, kind, minute, amount):
+        with self._lock:
+            window = self._windows.get((user_id, kind))
+            if window is not None:
+                window.add(minute, amount)
+
+    def used(self, user_id, kind):
+        """Amount of kind the user has moved in the last 24 hours"""
+        return self._window(user_id, kind).total
+
+    def remaining(self, user_id, kind):
+        """How much more of kind the user may move right now"""
+        return max(Decimal(str(self.limits[kind])) - self.used(user_id, kind), Decimal('0'))
+
+    def check(self, user_id, kind, amount, limit=None):
+        """Whether amount fits under the user's rolling limit, or the given one; returns (allowed, message)"""
+        limit = Decimal(str(self.limits[kind] if limit is None else limit))
+        used = self.used(user_id, kind)
+        if used + Decimal(str(amount)) > limit:
+            return False, (
+                f"Daily {kind} limit of {limit:,.2f} ETB exceeded. "
+                f"Remaining: {max(limit - used, Decimal('0')):,.2f} ETB"
+            )
+        return True, ""
+
+    def record(self, user_id, kind, amount, minute=None, session=None):
+        """Count amount against the user's limit in the current transaction; returns its minute"""
+        session = session or db.session
+        minute = _minute(self.clock()) if minute is None else minute
+        amount = Decimal(str(amount))
+        _upsert_bucket(session.connection(), user_id, kind, minute, amount)
+        session.info.setdefault('limit_counts', []).append((self, user_id, kind, minute, amount))
+        for name, listener in (('after_commit', _after_commit), ('after_soft_rollback', _after_soft_rollback)):
+            if not event.contains(session, name, listener):
+                event.listen(session, name, listener)
+        return minute
+
+    def release(self, user_id, kind, amount, minute, session=None):
+        """Take back an amount recorded at minute, for a deposit or withdrawal that fell through"""
+        self.record(user_id, kind, -Decimal(str(amount)), minute, session)
+
+    def _transaction_minute(self, transaction):
+        if transaction.created_at is None:
+            transaction.created_at = datetime.fromtimestamp(self.clock(), timezone.utc).replace(tzinfo=None)
+        return _minute(transaction.created_at.replace(tzinfo=timezone.utc).timestamp())
+
+    def record_transaction(self, transaction, session=None):
+        """Count a new deposit or withdrawal Transaction at its created_at minute"""
+        return self.record(transaction.user_id, transaction.type, transaction.amount,
+                           self._transaction_minute(transaction), session)
+
+    def release_transaction(self, transaction, session=None, recount=False):
+        """Release a failed Transaction at the minute it was started, or count it again with recount.
+
+        Returns False when it started before the current window and no longer counts anyway.
+        """
+        minute = self._transaction_minute(transaction)
+        if minute <= _minute(self.clock()) - WINDOW_MINUTES:
+            return False
+        amount = Decimal(str(transaction.amount))
+        self.record(transaction.user_id, transaction.type, amount if recount else -amount, minute, session)
+        return True
+
+    def recover(self):
+        """Load every window with activity in the last 24 hours, e.g. at startup; returns how many"""
+        now = self.clock()
+        self.prune()
+        buckets = {}
+        for user_id, kind, minute, amount in db.session.execute(
+            select(LimitBucket.user_id, LimitBucket.kind, LimitBucket.minute, LimitBucket.amount)
+            .where(LimitBucket.minute > _minute(now) - WINDOW_MINUTES)
+            .order_by(LimitBucket.minute)
+        ):
+            buckets.setdefault((user_id, kind), []).append([minute, Decimal(str(amount))])
+        for key, rows in buckets.items():
+            self._store(key, _Window(rows, now))
+        logger.info(f"Recovered {len(buckets)} limit windows")
+        return len(buckets)
+
+    def prune(self):
+        """Delete buckets older than the window; returns how many"""
+        deleted = db.session.execute(
+            delete(LimitBucket).where(LimitBucket.minute <= _minute(self.clock()) - WINDOW_MINUTES)
+        ).rowcount
+        db.session.commit()
+        return deleted
+
+    def clear(self):
+        """Forget every in-memory window; they reload from limit_buckets"""
+        with self._lock:
+            self._windows.clear()
+
+
+LIMITS = LimitCounters()
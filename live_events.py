@@ -0,0 +1,261 @@
+"""
+Live game and transaction updates for the web UI (server-sent events).
+
+Browsers open one EventSource on /events for the games and transactions
+they show, instead of polling pages and status endpoints:
+
+    const source = new EventSource('/events?game=42&transaction=TX-ABC');
+
+Changes made through the ORM are taken from the session as they are
+flushed and published to BROKER once their transaction commits, so the
+paths that settle a game or update a payment on loaded objects (RPSGame,
+the simulator, the webhooks, payouts) feed it without calling it. A Core
+statement never reaches the flush, so the set-based paths (bulk cancel,
+tournament tables, prizes and refunds) queue their events with
+publish_on_commit. Rolled back changes are never sent.
+
+- game:<id> gets 'joined' and 'move' events (who moved, never the move)
+  and 'status' events with the winner once the game completes
+- transaction:<tx_ref> gets 'status' events
+
+Each connection is a subscription with a small queue. Waiting on it
+holds no database session, and an idle connection only gets a keep-alive
+comment every LIVE_HEARTBEAT seconds, so thousands can stay open under a
+threaded or gevent worker. The last event of each channel is kept and
+replayed to new subscribers that haven't seen it (Last-Event-ID), which
+covers changes made between rendering a page and connecting.
+
+The broker lives in each process and only sees that process's commits.
+"""
+import itertools
+import json
+import logging
+import queue
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect
+
+from extensions import db
+from models import Game, GameParticipant, Transaction
+from config import LIVE_MAX_SUBSCRIBERS, LIVE_QUEUE_SIZE, LIVE_HEARTBEAT, LIVE_HISTORY_SIZE
+
+logger = logging.getLogger(__name__)
+
+RETRY_MS = 3000  # how soon browsers reconnect after the stream ends
+
+
+def game_channel(game_id):
+    return f"game:{game_id}"
+
+
+def transaction_channel(tx_ref):
+    return f"transaction:{tx_ref}"
+
+
+class Event:
+    """One published event, encoded once for every subscriber"""
+    __slots__ = ('id', 'channel', 'text')
+
+    def __init__(self, event_id, channel, name, data):
+        self.id = event_id
+        self.channel = channel
+        self.text = f"id: {event_id}\nevent: {name}\ndata: {json.dumps({'channel': channel, **data})}\n\n"
+
+
+class Subscription:
+    """One open stream: the channels it follows and its pending events"""
+    __slots__ = ('channels', 'queue', 'closed')
+
+    def __init__(self, channels, queue_size):
+        self.channels = tuple(channels)
+        self.queue = queue.Queue(queue_size)
+        self.closed = False
+
+
+class Broker:
+    """In-process publish/subscribe of events by channel"""
+
+    def __init__(self, max_subscribers=LIVE_MAX_SUBSCRIBERS, queue_size=LIVE_QUEUE_SIZE,
+                 history_size=LIVE_HISTORY_SIZE):
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self.history_size = history_size
+        self.published = 0
+        self.dropped = 0
+        self._ids = itertools.count(1)
+        self._channels = {}
+        self._last = OrderedDict()
+        self._subscribers = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self, channels):
+        """A Subscription to channels, or None when LIVE_MAX_SUBSCRIBERS are open"""
+        subscription = Subscription(channels, self.queue_size)
+        with self._lock:
+            if self._subscribers >= self.max_subscribers:
+                return None
+            self._subscribers += 1
+            for channel in subscription.channels:
+                self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._detach(subscription)
+
+    def _detach(self, subscription):
+        """Remove a subscription from its channels; call with the lock held"""
+        if subscription.closed:
+            return
+        subscription.closed = True
+        self._subscribers -= 1
+        for channel in subscription.channels:
+            subscribers = self._channels.get(channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[channel]
+
+    def publish(self, channel, name, data):
+        """Send an event to the channel's subscribers; returns how many got it"""
+        with self._lock:
+            item = Event(next(self._ids), channel, name, data)
+            self.published += 1
+            self._last[channel] = item
+            self._last.move_to_end(channel)
+            while len(self._last) > self.history_size:
+                self._last.popitem(last=False)
+
+            delivered = 0
+            for subscription in list(self._channels.get(channel, ())):
+                try:
+                    subscription.queue.put_nowait(item)
+                    delivered += 1
+                except queue.Full:
+                    # Too slow to keep up: drop it, the browser reconnects and is replayed the latest
+                    self.dropped += 1
+                    self._detach(subscription)
+            return delivered
+
+    def last_events(self, channels, after=0):
+        """The latest event of each channel newer than event id after, oldest first"""
+        with self._lock:
+            events = [self._last.get(channel) for channel in channels]
+        return sorted((item for item in events if item is not None and item.id > after), key=lambda item: item.id)
+
+    def stream(self, subscription, last_event_id=0, heartbeat=LIVE_HEARTBEAT):
+        """The text/event-stream body of a subscription; unsubscribes when the client goes away"""
+        sent = last_event_id
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            for item in self.last_events(subscription.channels, sent):
+                sent = item.id
+                yield item.text
+            while not subscription.closed:
+                try:
+                    item = subscription.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if item.id > sent:
+                    sent = item.id
+                    yield item.text
+        finally:
+            self.unsubscribe(subscription)
+
+    def __len__(self):
+        return self._subscribers
+
+
+BROKER = Broker()
+
+
+def _added(obj, attribute):
+    """The value attribute was changed to in this flush, or None if unchanged"""
+    added = getattr(inspect(obj).attrs, attribute).history.added
+    return added[0] if added else None
+
+
+def _collect(session):
+    """(channel, name, data) for every change in the pending flush, in a stable order"""
+    events = []
+    for obj in session.new:
+        if isinstance(obj, GameParticipant):
+            events.append((game_channel(obj.game_id), 'joined', {'game_id': obj.game_id, 'user_id': obj.user_id}))
+            if obj.move:
+                events.append((game_channel(obj.game_id), 'move', {'game_id': obj.game_id, 'user_id': obj.user_id}))
+        elif isinstance(obj, Game):
+            events.append(game_status(obj.id, obj.status or 'waiting', obj.winner_id))
+        elif isinstance(obj, Transaction):
+            events.append(transaction_status(obj.tx_ref, obj.status))
+
+    for obj in session.dirty:
+        if isinstance(obj, GameParticipant) and _added(obj, 'move'):
+            events.append((game_channel(obj.game_id), 'move', {'game_id': obj.game_id, 'user_id': obj.user_id}))
+        elif isinstance(obj, Game) and _added(obj, 'status'):
+            events.append(game_status(obj.id, obj.status, obj.winner_id))
+        elif isinstance(obj, Transaction) and _added(obj, 'status'):
+            events.append(transaction_status(obj.tx_ref, obj.status))
+    # Joins and moves before the status change they lead to
+    events.sort(key=lambda item: item[1] == 'status')
+    return events
+
+
+def game_status(game_id, status, winner_id=None):
+    """The (channel, name, data) of a game status change"""
+    return game_channel(game_id), 'status', {'game_id': game_id, 'status': status, 'winner_id': winner_id}
+
+
+def transaction_status(tx_ref, status):
+    """The (channel, name, data) of a transaction status change"""
+    return transaction_channel(tx_ref), 'status', {'tx_ref': tx_ref, 'status': status}
+
+
+def publish_on_commit(events, session=None):
+    """Publish (channel, name, data) events with the session's next commit.
+
+    For changes made by Core statements, which the flush never sees. Does
+    nothing unless register_live_listeners covers the session.
+    """
+    session = session or db.session
+    if events and event.contains(session, 'after_commit', _after_commit):
+        session.info.setdefault('live_events', []).extend(events)
+
+
+def _after_flush(session, flush_context):
+    try:
+        events = _collect(session)
+        if events:
+            session.info.setdefault('live_events', []).extend(events)
+    except Exception as e:
+        logger.error(f"Error collecting live events: {e}")
+
+
+def _after_commit(session):
+    events = session.info.pop('live_events', None)
+    if not events:
+        return
+    try:
+        for channel, name, data in events:
+            BROKER.publish(channel, name, data)
+    except Exception as e:
+        # Live updates must never break a commit
+        logger.error(f"Error publishing live events: {e}")
+
+
+def _after_soft_rollback(session, previous_transaction):
+    session.info.pop('live_events', None)
+
+
+def register_live_listeners(session=None):
+    """Publish game and transaction changes committed by the given session (db.session by default)"""
+    session = session or db.session
+    listeners = (
+        ('after_flush', _after_flush),
+        ('after_commit', _after_commit),
+        ('after_soft_rollback', _after_soft_rollback),
+    )
+    for name, listener in listeners:
+        if not event.contains(session, name, listener):
+            event.listen(session, name, listener)
@@ -0,0 +1,7 @@
+"""End-to-end load testing of the Telegram bot front ends.
+
+A fake Bot API server (fake_telegram) stands in for api.telegram.org and
+Chapa, virtual players (players) script whole sessions against it, and
+report turns the recorded traffic into throughput, handler latency and
+SQLite lock-wait numbers. Run with ``python -m loadtest <target>``.
+"""
@@ -0,0 +1,52 @@
+"""
+Load test a bot front end against a local fake Telegram Bot API.
+
+Usage: python -m loadtest test_bot --players 60 --rounds 3 [--json report.json]
+       python -m loadtest run_bot --players 30
+"""
+import argparse
+import json
+import logging
+import sys
+
+from loadtest.report import format_report
+from loadtest.runner import TARGETS, run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('target', choices=sorted(TARGETS))
+    parser.add_argument('--players', type=int, default=30, help='virtual players (test_bot: use a multiple of 3)')
+    parser.add_argument('--rounds', type=int, default=3, help='games (or rooms) per player')
+    parser.add_argument('--ramp', type=float, default=5.0, help='seconds over which players join')
+    parser.add_argument('--timeout', type=float, default=15.0, help='seconds to wait for each reply')
+    parser.add_argument('--workdir', help='directory for the bot database and log (default: a temp dir)')
+    parser.add_argument('--no-lock-probe', action='store_true', help='skip sampling SQLite write-lock waits')
+    parser.add_argument('--json', help='also write the report as JSON to this path')
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+
+    try:
+        report = run(
+            args.target,
+            players=args.players,
+            rounds=args.rounds,
+            ramp=args.ramp,
+            timeout=args.timeout,
+            workdir=args.workdir,
+            probe_locks=not args.no_lock_probe
+        )
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    print(format_report(report))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,322 @@
+"""Local stand-in for the Telegram Bot API (and Chapa in test mode).
+
+The bot under test long-polls ``getUpdates`` here exactly as it would
+against api.telegram.org. Updates are injected by virtual players, and
+every outgoing call (sendMessage, editMessageText, ...) is recorded so
+players can wait for replies and the report can time handlers.
+"""
+import itertools
+import json
+import logging
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'LoadTest', 'username': 'loadtest_bot'}
+
+# Calls that put something in front of a user and so end a handler's turn
+REPLY_METHODS = frozenset({
+    'sendMessage', 'editMessageText', 'editMessageCaption', 'editMessageReplyMarkup',
+    'sendPhoto', 'sendAnimation', 'sendDocument', 'sendDice'
+})
+
+_MULTIPART_FIELD = re.compile(rb'name="([^"]+)"\r\n(?:[^\r\n]+\r\n)*\r\n(.*?)\r\n--', re.S)
+
+
+class BotCall:
+    """One Bot API request made by the bot under test"""
+
+    __slots__ = ('method', 'params', 'chat_id', 'at', 'message')
+
+    def __init__(self, method, params, chat_id, at, message=None):
+        self.method = method
+        self.params = params
+        self.chat_id = chat_id
+        self.at = at
+        self.message = message
+
+    @property
+    def text(self):
+        return self.params.get('text') or self.params.get('caption') or ''
+
+    def buttons(self):
+        """Callback data of every inline button, in keyboard order"""
+        markup = self.params.get('reply_markup') or {}
+        return [
+            button['callback_data']
+            for row in markup.get('inline_keyboard', [])
+            for button in row if 'callback_data' in button
+        ]
+
+    def __repr__(self):
+        return f'<BotCall {self.method} chat={self.chat_id} {self.text[:40]!r}>'
+
+
+class _PendingUpdate:
+    __slots__ = ('update_id', 'chat_id', 'label', 'injected_at', 'delivered_at')
+
+    def __init__(self, update_id, chat_id, label):
+        self.update_id = update_id
+        self.chat_id = chat_id
+        self.label = label
+        self.injected_at = time.perf_counter()
+        self.delivered_at = None
+
+
+class FakeTelegramServer:
+    """Threaded HTTP server implementing the Bot API subset the bots use.
+
+    ``on_handled(label, seconds)`` is called with the time between the bot
+    receiving an update via getUpdates and its first reply in that chat.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, on_handled=None):
+        self.on_handled = on_handled
+        self._updates = deque()
+        self._pending = defaultdict(deque)
+        self._inbox = defaultdict(list)
+        self._last_message = {}
+        self._lock = threading.Condition()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self.calls = defaultdict(int)
+        self.unhandled = 0
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                server._dispatch(self)
+
+            def do_POST(self):
+                server._dispatch(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def bot_api_url(self):
+        """Value for TELEGRAM_API_URL (PTB appends the token and method)"""
+        return f"{self.url}/bot"
+
+    @property
+    def chapa_api_url(self):
+        """Value for CHAPA_API_URL; every payment succeeds"""
+        return f"{self.url}/chapa/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='fake-telegram', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        with self._lock:
+            self._lock.notify_all()
+
+    # -- injecting traffic -------------------------------------------------
+
+    def send_text(self, user, text):
+        """Queue a text message (commands get a bot_command entity)"""
+        message = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': user['id'], 'type': 'private', 'first_name': user['first_name']},
+            'from': user,
+            'text': text,
+        }
+        if text.startswith('/'):
+            command = text.split()[0]
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+            label = command
+        else:
+            label = 'text'
+        return self._inject({'message': message}, user['id'], label)
+
+    def press_button(self, user, data, message=None):
+        """Queue a callback query as if the user pressed an inline button"""
+        with self._lock:
+            message = message or self._last_message.get(user['id']) or {
+                'message_id': next(self._message_ids),
+                'date': int(time.time()),
+                'chat': {'id': user['id'], 'type': 'private'},
+                'from': BOT_USER,
+                'text': '',
+            }
+        label = 'cb:' + re.sub(r'[_:].*$', '', data)
+        return self._inject({
+            'callback_query': {
+                'id': str(next(self._message_ids)),
+                'from': user,
+                'chat_instance': str(user['id']),
+                'data': data,
+                'message': message,
+            }
+        }, user['id'], label)
+
+    def _inject(self, payload, chat_id, label):
+        with self._lock:
+            update_id = next(self._update_ids)
+            self._updates.append(dict(payload, update_id=update_id))
+            self._pending[chat_id].append(_PendingUpdate(update_id, chat_id, label))
+            self._lock.notify_all()
+        return update_id
+
+    # -- observing the bot -------------------------------------------------
+
+    def wait_for(self, chat_id, predicate=None, timeout=10.0):
+        """Pop the first reply in a chat matching predicate, or None on timeout"""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while True:
+                inbox = self._inbox[chat_id]
+                for i, call in enumerate(inbox):
+                    if predicate is None or predicate(call):
+                        return inbox.pop(i)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._lock.wait(remaining)
+
+    def drain(self, chat_id):
+        """Forget replies a player no longer cares about"""
+        with self._lock:
+            self._inbox[chat_id].clear()
+
+    def abandon(self, chat_id):
+        """Count updates the bot never answered and stop waiting on them"""
+        with self._lock:
+            self.unhandled += len(self._pending[chat_id])
+            self._pending[chat_id].clear()
+
+    # -- HTTP --------------------------------------------------------------
+
+    def _dispatch(self, request):
+        path = urlparse(request.path).path
+        length = int(request.headers.get('Content-Length') or 0)
+        body = request.rfile.read(length) if length else b''
+        params = self._parse_params(request.headers.get('Content-Type', ''), body, request.path)
+
+        if path.startswith('/chapa/'):
+            result = self._chapa(path, params)
+        else:
+            method = path.rsplit('/', 1)[-1]
+            result = {'ok': True, 'result': self._bot_method(method, params)}
+
+        payload = json.dumps(result).encode()
+        request.send_response(200)
+        request.send_header('Content-Type', 'application/json')
+        request.send_header('Content-Length', str(len(payload)))
+        request.end_headers()
+        request.wfile.write(payload)
+
+    @staticmethod
+    def _parse_params(content_type, body, raw_path):
+        if content_type.startswith('application/json'):
+            return json.loads(body or b'{}')
+        if content_type.startswith('multipart/form-data'):
+            fields = {name.decode(): value for name, value in _MULTIPART_FIELD.findall(body)}
+            params = {k: v.decode(errors='replace') for k, v in fields.items() if len(v) < 65536}
+        else:
+            query = parse_qs(urlparse(raw_path).query)
+            query.update(parse_qs(body.decode()))
+            params = {k: v[-1] for k, v in query.items()}
+        for key, value in params.items():
+            if value[:1] in ('{', '['):
+                try:
+                    params[key] = json.loads(value)
+                except ValueError:
+                    pass
+        return params
+
+    def _bot_method(self, method, params):
+        with self._lock:
+            self.calls[method] += 1
+        if method == 'getUpdates':
+            return self._get_updates(params)
+        if method == 'getMe':
+            return BOT_USER
+        if method in REPLY_METHODS:
+            return self._record_reply(method, params)
+        return True
+
+    def _get_updates(self, params):
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        timeout = min(float(params.get('timeout') or 0), 10.0)
+        deadline = time.monotonic() + timeout
+
+        with self._lock:
+            while self._updates and self._updates[0]['update_id'] < offset:
+                self._updates.popleft()
+            while not self._updates and time.monotonic() < deadline:
+                self._lock.wait(deadline - time.monotonic())
+            batch = list(itertools.islice(self._updates, limit))
+
+            now = time.perf_counter()
+            delivered = {u['update_id'] for u in batch}
+            for pending in self._pending.values():
+                for item in pending:
+                    if item.update_id in delivered and item.delivered_at is None:
+                        item.delivered_at = now
+        return batch
+
+    def _record_reply(self, method, params):
+        now = time.perf_counter()
+        try:
+            chat_id = int(params.get('chat_id'))
+        except (TypeError, ValueError):
+            chat_id = None
+        message_id = int(params.get('message_id') or next(self._message_ids))
+        message = {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id or 0, 'type': 'private'},
+            'from': BOT_USER,
+            'text': params.get('text') or params.get('caption') or '',
+        }
+        if params.get('reply_markup'):
+            message['reply_markup'] = params['reply_markup']
+
+        handled = None
+        with self._lock:
+            pending = self._pending.get(chat_id)
+            if pending and pending[0].delivered_at is not None:
+                handled = pending.popleft()
+            self._inbox[chat_id].append(BotCall(method, params, chat_id, now, message))
+            if params.get('reply_markup'):
+                self._last_message[chat_id] = message
+            self._lock.notify_all()
+
+        if handled and self.on_handled:
+            self.on_handled(handled.label, now - handled.delivered_at)
+        return message
+
+    def _chapa(self, path, params):
+        """Chapa test mode: initialize hands back a checkout URL, verify always succeeds"""
+        with self._lock:
+            self.calls['chapa:verify' if '/verify/' in path else 'chapa:initialize'] += 1
+        if path.endswith('/transaction/initialize'):
+            return {
+                'status': 'success',
+                'data': {'checkout_url': f"{self.url}/checkout/{params.get('tx_ref', '')}"}
+            }
+        tx_ref = path.rsplit('/', 1)[-1]
+        return {'status': 'success', 'data': {'tx_ref': tx_ref, 'status': 'success'}}
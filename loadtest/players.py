@@ -0,0 +1,154 @@
+"""Scripted virtual players for the two bot front ends"""
+import random
+import threading
+from collections import Counter
+
+
+class ScenarioStats:
+    """Thread-safe counters of what players managed to do"""
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, name, n=1):
+        with self._lock:
+            self._counts[name] += n
+
+    def as_dict(self):
+        with self._lock:
+            return dict(sorted(self._counts.items()))
+
+
+class VirtualPlayer:
+    """One Telegram user driving the bot through the fake API"""
+
+    def __init__(self, server, index, stats, timeout=15.0, seed=None):
+        self.server = server
+        self.stats = stats
+        self.timeout = timeout
+        self.rng = random.Random(seed if seed is not None else index)
+        self.username = f"lt_player_{index}"
+        self.user = {
+            'id': 10_000_000 + index,
+            'is_bot': False,
+            'first_name': f"Player{index}",
+            'username': self.username,
+        }
+
+    @property
+    def chat_id(self):
+        return self.user['id']
+
+    def say(self, text, expect=None, timeout=None):
+        """Send a message and wait for the reply that matches expect"""
+        self.server.send_text(self.user, text)
+        return self._reply(expect, timeout)
+
+    def press(self, data, expect=None, timeout=None):
+        """Press an inline button and wait for the reply that matches expect"""
+        self.server.press_button(self.user, data)
+        return self._reply(expect, timeout)
+
+    def wait(self, expect, timeout=None):
+        """Wait for a message the bot sends on its own (e.g. a game starting)"""
+        return self.server.wait_for(self.chat_id, expect, timeout or self.timeout)
+
+    def _reply(self, expect, timeout):
+        reply = self.server.wait_for(self.chat_id, expect, timeout or self.timeout)
+        if reply is None:
+            self.server.abandon(self.chat_id)
+            self.stats.add('timeouts')
+        elif reply.text.startswith('❌'):
+            self.stats.add('error_replies')
+        return reply
+
+
+def _text(*needles):
+    return lambda call: any(needle in call.text for needle in needles)
+
+
+def _button(prefix):
+    return lambda call: any(data.startswith(prefix) for data in call.buttons())
+
+
+def _first_button(call, prefix):
+    return next((data for data in call.buttons() if data.startswith(prefix)), None)
+
+
+def play_run_bot(player, rounds):
+    """run_bot.py: register, deposit through the test bank flow, create rooms.
+
+    run_bot.py does not register join/move handlers, so rooms are created
+    and cancelled and the leaderboard is read as the per-round load.
+    """
+    player.say('/start')
+    player.say(f"Load Test {player.user['first_name']}")
+    player.say(f"{player.username}@loadtest.local")
+    if not player.say(player.username, expect=_button('confirm_registration')):
+        return
+    reply = player.press('confirm_registration', expect=_text('Account Created', '❌'))
+    if not reply or 'Account Created' not in reply.text:
+        return
+    player.stats.add('accounts')
+
+    player.press('deposit', expect=_button('quick_deposit_'))
+    reply = player.press('quick_deposit_100', expect=_button('verify_'))
+    if reply:
+        reply = player.press(_first_button(reply, 'verify_'), expect=_text('Payment Successful', '❌'))
+        if reply and 'Payment Successful' in reply.text:
+            player.stats.add('deposits')
+
+    for _ in range(rounds):
+        reply = player.press('create_room', expect=_text('Room Created', '❌'))
+        if reply and 'Room Created' in reply.text:
+            player.stats.add('rooms_created')
+            cancel = _first_button(reply, 'cancel_room_')
+            if cancel:
+                player.press(cancel)
+        player.press('leaderboard')
+        player.server.drain(player.chat_id)
+
+
+def play_test_bot(player, rounds, bet=10, game_timeout=60.0):
+    """test_bot.py: create an account, deposit via (fake) Chapa, then play rounds.
+
+    Players are matched three at a time by bet amount, so use a player
+    count that is a multiple of three or the last table never starts.
+    """
+    reply = player.say('/create_account', expect=_text('Account created', 'already', '❌'))
+    if not reply:
+        return
+    player.stats.add('accounts')
+
+    reply = player.say('/deposit 100', expect=lambda c: _button('verify_')(c) or c.text.startswith('❌'))
+    if reply and reply.buttons():
+        reply = player.press(_first_button(reply, 'verify_'), expect=_text('Payment confirmed', 'already', '❌', '⏳'))
+        if reply and 'confirmed' in reply.text:
+            player.stats.add('deposits')
+
+    for _ in range(rounds):
+        reply = player.say(f'/join_game {bet}', expect=_text("You've joined", 'New game created', 'Game is starting', '❌'))
+        if not reply or reply.text.startswith('❌'):
+            continue
+        player.stats.add('games_joined')
+
+        if 'Game is starting' not in reply.text and not player.wait(_text('Game is starting'), game_timeout):
+            player.stats.add('tables_not_filled')
+            continue
+
+        move = player.rng.choice(('rock', 'paper', 'scissors'))
+        reply = player.say(f'/{move}', expect=_text('You chose', '❌'))
+        if not reply or reply.text.startswith('❌'):
+            continue
+        player.stats.add('moves')
+
+        if player.wait(_text('Game Results'), game_timeout):
+            player.stats.add('results_seen')
+        player.server.drain(player.chat_id)
+
+
+SCENARIOS = {
+    'run_bot': play_run_bot,
+    'test_bot': play_test_bot,
+}
@@ -0,0 +1,133 @@
+"""Latency recording, SQLite lock probing and the load test report"""
+import json
+import sqlite3
+import statistics
+import threading
+import time
+from collections import defaultdict
+
+
+def percentiles(samples):
+    """p50/p95/p99/max of a list of seconds, in milliseconds"""
+    if not samples:
+        return {'p50': None, 'p95': None, 'p99': None, 'max': None}
+    ordered = sorted(samples)
+    if len(ordered) == 1:
+        q = [ordered[0]] * 99
+    else:
+        q = statistics.quantiles(ordered, n=100, method='inclusive')
+    return {
+        'p50': round(q[49] * 1000, 2),
+        'p95': round(q[94] * 1000, 2),
+        'p99': round(q[98] * 1000, 2),
+        'max': round(ordered[-1] * 1000, 2),
+    }
+
+
+class LatencyRecorder:
+    """Thread-safe per-handler latency samples"""
+
+    def __init__(self):
+        self._samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(self, label, seconds):
+        with self._lock:
+            self._samples[label].append(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {label: list(samples) for label, samples in self._samples.items()}
+
+
+class LockProbe(threading.Thread):
+    """Samples how long it takes to get SQLite's write lock while the bot runs.
+
+    Every interval it opens the bot's database and times ``BEGIN IMMEDIATE``,
+    which waits for any writer to finish, then rolls back straight away.
+    The distribution is the lock wait a new writer would see.
+    """
+
+    def __init__(self, path, interval=0.05, timeout=30.0):
+        super().__init__(name='lock-probe', daemon=True)
+        self.path = path
+        self.interval = interval
+        self.timeout = timeout
+        self.waits = []
+        self.failures = 0
+        self._halt = threading.Event()
+
+    def run(self):
+        while not self._halt.wait(self.interval):
+            try:
+                conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            except sqlite3.Error:
+                continue
+            try:
+                started = time.perf_counter()
+                conn.execute('BEGIN IMMEDIATE')
+                self.waits.append(time.perf_counter() - started)
+                conn.execute('ROLLBACK')
+            except sqlite3.OperationalError:
+                self.failures += 1
+            finally:
+                conn.close()
+
+    def stop(self):
+        self._halt.set()
+        self.join(timeout=self.timeout + 1)
+
+
+def build_report(target, players, elapsed, latencies, server, scenario_stats, probe=None, bot_log=''):
+    """Collect everything a run measured into one JSON-serializable dict"""
+    handled = sum(len(samples) for samples in latencies.values())
+    all_samples = [s for samples in latencies.values() for s in samples]
+    report = {
+        'target': target,
+        'players': players,
+        'elapsed_s': round(elapsed, 2),
+        'updates_handled': handled,
+        'updates_unanswered': server.unhandled,
+        'throughput_per_s': round(handled / elapsed, 2) if elapsed else None,
+        'latency_ms': percentiles(all_samples),
+        'handlers': {
+            label: dict(count=len(samples), **percentiles(samples))
+            for label, samples in sorted(latencies.items())
+        },
+        'bot_api_calls': dict(sorted(server.calls.items())),
+        'scenario': scenario_stats,
+        'database_locked_errors': bot_log.count('database is locked'),
+    }
+    if probe is not None:
+        report['lock_wait_ms'] = dict(
+            samples=len(probe.waits),
+            timeouts=probe.failures,
+            over_10ms=sum(1 for w in probe.waits if w > 0.010),
+            **percentiles(probe.waits)
+        )
+    return report
+
+
+def format_report(report):
+    """Human-readable summary of build_report output"""
+    lat = report['latency_ms']
+    lines = [
+        f"Target: {report['target']}  players: {report['players']}  elapsed: {report['elapsed_s']}s",
+        f"Updates handled: {report['updates_handled']}  unanswered: {report['updates_unanswered']}  "
+        f"throughput: {report['throughput_per_s']}/s",
+        f"Handler latency: p50={lat['p50']}ms p95={lat['p95']}ms p99={lat['p99']}ms max={lat['max']}ms",
+        '',
+        f"{'handler':<20} {'count':>6} {'p50':>9} {'p95':>9} {'p99':>9}",
+    ]
+    for label, stats in report['handlers'].items():
+        lines.append(f"{label:<20} {stats['count']:>6} {stats['p50']:>9} {stats['p95']:>9} {stats['p99']:>9}")
+    lines.append('')
+    if 'lock_wait_ms' in report:
+        lock = report['lock_wait_ms']
+        lines.append(
+            f"DB lock wait: p50={lock['p50']}ms p95={lock['p95']}ms p99={lock['p99']}ms max={lock['max']}ms "
+            f"({lock['over_10ms']}/{lock['samples']} over 10ms, {lock['timeouts']} timeouts)"
+        )
+    lines.append(f"'database is locked' errors in bot log: {report['database_locked_errors']}")
+    lines.append(f"Scenario: {json.dumps(report['scenario'])}")
+    return '\n'.join(lines)
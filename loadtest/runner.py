@@ -0,0 +1,110 @@
+"""Start a bot front end against the fake API and drive it with virtual players"""
+import logging
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from loadtest.fake_telegram import FakeTelegramServer
+from loadtest.players import SCENARIOS, ScenarioStats, VirtualPlayer
+from loadtest.report import LatencyRecorder, LockProbe, build_report
+
+logger = logging.getLogger(__name__)
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Script and SQLite file (relative to the bot's working directory) per front end
+TARGETS = {
+    'run_bot': ('run_bot.py', 'loadtest.db'),
+    'test_bot': ('test_bot.py', 'rps_game.db'),
+}
+
+
+def _bot_env(target, server, workdir):
+    env = dict(os.environ)
+    env.update({
+        'BOT_TOKEN': '123456:LOADTEST',
+        'TELEGRAM_API_URL': server.bot_api_url,
+        'CHAPA_API_URL': server.chapa_api_url,
+        'CHAPA_SECRET_KEY': 'CHASECK_TEST-loadtest',
+        'PYTHONUNBUFFERED': '1',
+    })
+    if target == 'run_bot':
+        env['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, TARGETS[target][1])}"
+    return env
+
+
+def _wait_until_polling(server, process, timeout):
+    """Block until the bot's first getUpdates, or fail if it died"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.calls.get('getUpdates'):
+            return
+        if process.poll() is not None:
+            raise RuntimeError(f"Bot exited with code {process.returncode} before polling")
+        time.sleep(0.1)
+    raise RuntimeError(f"Bot did not start polling within {timeout}s")
+
+
+def run(target, players=30, rounds=3, ramp=5.0, timeout=15.0, startup_timeout=60.0,
+        workdir=None, probe_locks=True):
+    """Run one load test and return the report dict"""
+    if target not in TARGETS:
+        raise ValueError(f"Unknown target {target}, expected one of {', '.join(TARGETS)}")
+    script, db_file = TARGETS[target]
+    workdir = workdir or tempfile.mkdtemp(prefix=f'loadtest_{target}_')
+    log_path = os.path.join(workdir, 'bot.out')
+
+    latencies = LatencyRecorder()
+    server = FakeTelegramServer(on_handled=latencies.record).start()
+    stats = ScenarioStats()
+    probe = None
+
+    with open(log_path, 'w') as log:
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(REPO_DIR, script)],
+            cwd=workdir, env=_bot_env(target, server, workdir),
+            stdout=log, stderr=subprocess.STDOUT
+        )
+    try:
+        _wait_until_polling(server, process, startup_timeout)
+        logger.info(f"{target} is polling, starting {players} players")
+
+        db_path = os.path.join(workdir, db_file)
+        if probe_locks and os.path.exists(db_path):
+            probe = LockProbe(db_path)
+            probe.start()
+
+        scenario = SCENARIOS[target]
+        threads = []
+        started = time.perf_counter()
+        for i in range(players):
+            player = VirtualPlayer(server, i, stats, timeout=timeout)
+            thread = threading.Thread(target=scenario, args=(player, rounds), name=f'player-{i}', daemon=True)
+            thread.start()
+            threads.append(thread)
+            if ramp and players > 1:
+                time.sleep(ramp / players)
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        if probe:
+            probe.stop()
+        if process.poll() is None:
+            process.send_signal(signal.SIGINT)
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        server.stop()
+
+    with open(log_path, errors='replace') as f:
+        bot_log = f.read()
+
+    report = build_report(target, players, elapsed, latencies.snapshot(), server, stats.as_dict(), probe, bot_log)
+    report['workdir'] = workdir
+    return report
@@ -6,7 +6,9 @@ import os
 import asyncio
 from datetime import datetime, timedelta
 from config import GAME_TIMEOUT, LOGGER
-from models import Game, GameParticipant, User, Transaction
+from models import Game, GameParticipant
+from admin.bulk import BulkOperations
+from payment_service import PaymentService
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
@@ -46,6 +48,9 @@ def maintenance_thread_func():
                 
                 # Start games with 2 players if they've been waiting too long
                 check_waiting_games()
+
+                # Cancel abandoned checkouts so they stop counting against daily limits
+                PaymentService.expire_abandoned_deposits()
                 
                 logger.debug("Maintenance tasks completed")
         except Exception as e:
@@ -58,37 +63,15 @@ def cleanup_stale_games():
     """Clean up games that have been waiting too long"""
     cutoff_time = datetime.utcnow() - timedelta(minutes=GAME_TIMEOUT)
     
-    stale_games = Game.query.filter(
-        Game.status == 'waiting',
-        Game.created_at < cutoff_time
-    ).all()
-    
-    for game in stale_games:
-        # Refund all participants
-        for participant in GameParticipant.query.filter_by(game_id=game.id).all():
-            user = User.query.get(participant.user_id)
-            if user:
-                user.balance += game.bet_amount
-                
-                # Create refund transaction
-                transaction = Transaction(
-                    user_id=user.id,
-                    amount=game.bet_amount,
-                    transaction_type='refund',
-                    status='completed',
-                    reference_id=f"timeout_{game.id}",
-                    created_at=datetime.utcnow(),
-                    completed_at=datetime.utcnow()
-                )
-                db.session.add(transaction)
-        
-        # Mark game as cancelled
-        game.status = 'cancelled'
-        game.completed_at = datetime.utcnow()
+    # Refund and cancel in set-based chunks rather than per participant
+    result = BulkOperations.cancel_games(
+        statuses=('waiting',),
+        created_before=cutoff_time,
+        ref_prefix='timeout'
+    )
     
-    if stale_games:
-        logger.info(f"Cleaned up {len(stale_games)} stale games")
-        db.session.commit()
+    if result.processed:
+        logger.info(f"Cleaned up {result.processed} stale games")
 
 def check_waiting_games():
     """Check for games with exactly 2 players waiting for too long"""
@@ -0,0 +1,507 @@
+"""
+Prometheus-style metrics for the web app, the webhook API and the bots.
+
+Metrics are off unless METRICS_ENABLED is true. When off, no hooks are
+installed and every instrument returns on its first line, so call sites
+can stay in hot paths. Output uses the Prometheus text format (0.0.4),
+served at /metrics by init_app() and, for bot processes, by serve().
+"""
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv('METRICS_ENABLED', 'false').lower() == 'true'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250, 500)
+
+# Statement counter of the Flask request or bot update being handled
+_unit_queries = ContextVar('metrics_unit_queries', default=None)
+
+
+def enable(flag=True):
+    """Switch collection on or off at runtime (e.g. from app config or tests)"""
+    global ENABLED
+    ENABLED = flag
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Registry:
+    """Holds metrics and renders them in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def value(self, **labels):
+        """Current value for a label set (None if never observed)"""
+        return self._values.get(self._key(labels))
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """Monotonic count, e.g. errors or settled games (rate() gives per second)"""
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if not ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """Point-in-time value, set directly or computed by a function at scrape time"""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self._function = None
+
+    def set(self, value, **labels):
+        if not ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, function):
+        """Compute the gauge on every scrape.
+
+        The function returns a number, or for labelled gauges a dict of
+        label-value tuples to numbers. Errors are logged and the last
+        values kept, so a failing collector never breaks /metrics.
+        """
+        self._function = function
+
+    def render(self):
+        if self._function is not None and ENABLED:
+            try:
+                result = self._function()
+                values = result if isinstance(result, dict) else {(): result}
+                with self._lock:
+                    self._values = {tuple(str(v) for v in key): value for key, value in values.items()}
+            except Exception as e:
+                logger.warning(f"Gauge {self.name} collector failed: {e}")
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """Distribution of observations in cumulative buckets, plus sum and count"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        if not ENABLED:
+            return
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # One slot per bucket plus +Inf, then sum
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        state = self._values.get(self._key(labels))
+        return sum(state[:-1]) if state else 0
+
+    def render(self):
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        lines = []
+        for key, state in items:
+            cumulative = 0
+            for bound, hits in zip(self.buckets + (float('inf'),), state[:-1]):
+                cumulative += hits
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+# -- Instruments -----------------------------------------------------------
+
+HTTP_LATENCY = Histogram(
+    'rps_http_request_seconds', 'Flask request latency',
+    ('app', 'endpoint', 'method', 'status')
+)
+HANDLER_LATENCY = Histogram(
+    'rps_bot_handler_seconds', 'Bot handler latency per command or callback pattern',
+    ('bot', 'handler')
+)
+HANDLER_ERRORS = Counter(
+    'rps_bot_handler_errors_total', 'Bot handlers that raised',
+    ('bot', 'handler')
+)
+DB_QUERIES = Counter(
+    'rps_db_queries_total', 'SQL statements executed',
+    ('operation',)
+)
+DB_QUERY_LATENCY = Histogram(
+    'rps_db_query_seconds', 'SQL statement duration (SQLAlchemy engines only)',
+    ('operation',), buckets=QUERY_BUCKETS
+)
+DB_QUERIES_PER_UNIT = Histogram(
+    'rps_db_queries_per_unit', 'SQL statements per Flask request or bot update',
+    ('scope',), buckets=COUNT_BUCKETS
+)
+GATEWAY_LATENCY = Histogram(
+    'rps_payment_gateway_seconds', 'Payment gateway call latency',
+    ('provider', 'operation')
+)
+GATEWAY_ERRORS = Counter(
+    'rps_payment_gateway_errors_total', 'Payment gateway calls that raised or reported failure',
+    ('provider', 'operation')
+)
+MATCHMAKING_WAITING = Gauge(
+    'rps_matchmaking_waiting_games', 'Games waiting for players, by bet amount',
+    ('bet_amount',)
+)
+GAMES_SETTLED = Counter(
+    'rps_games_settled_total', 'Games settled; rate() gives games settled per second'
+)
+JOBS = Counter(
+    'rps_jobs_total', 'Background jobs run, by outcome (done, retry, dead)',
+    ('type', 'outcome')
+)
+JOB_LATENCY = Histogram(
+    'rps_job_seconds', 'Background job run time',
+    ('type',)
+)
+
+
+# -- Database statements ---------------------------------------------------
+
+_OPERATIONS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE')
+_hooks_installed = False
+
+
+def _operation(statement):
+    head = statement.lstrip()[:6].upper()
+    return head if head in _OPERATIONS else 'OTHER'
+
+
+def _count_statement(operation):
+    DB_QUERIES.inc(operation=operation)
+    counter = _unit_queries.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if ENABLED:
+        conn.info['metrics_started'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop('metrics_started', None)
+    if started is None:
+        return
+    operation = _operation(statement)
+    DB_QUERY_LATENCY.observe(time.perf_counter() - started, operation=operation)
+    _count_statement(operation)
+
+
+def install_sqlalchemy_hooks():
+    """Time every statement on every SQLAlchemy engine (idempotent)"""
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    _hooks_installed = True
+
+
+def _trace_sqlite(statement):
+    _count_statement(_operation(statement))
+
+
+def trace_connection(conn):
+    """Count statements on a raw sqlite3 connection (no timings are available)"""
+    if ENABLED:
+        conn.set_trace_callback(_trace_sqlite)
+    return conn
+
+
+@contextmanager
+def track_queries(scope):
+    """Count the statements run inside the block as one request or update"""
+    if not ENABLED:
+        yield
+        return
+    counter = [0]
+    token = _unit_queries.set(counter)
+    try:
+        yield
+    finally:
+        _unit_queries.reset(token)
+        DB_QUERIES_PER_UNIT.observe(counter[0], scope=scope)
+
+
+# -- Payment gateways ------------------------------------------------------
+
+class _GatewayCall:
+    __slots__ = ('ok',)
+
+    def __init__(self):
+        self.ok = True
+
+
+@contextmanager
+def gateway_call(provider, operation):
+    """Time a gateway call; set ``call.ok = False`` to count a failed response"""
+    call = _GatewayCall()
+    if not ENABLED:
+        yield call
+        return
+    start = time.perf_counter()
+    try:
+        yield call
+    except Exception:
+        call.ok = False
+        raise
+    finally:
+        GATEWAY_LATENCY.observe(time.perf_counter() - start, provider=provider, operation=operation)
+        if not call.ok:
+            GATEWAY_ERRORS.inc(provider=provider, operation=operation)
+
+
+def track_gateway(provider, operation):
+    """Decorate a gateway method returning ``(success, ...)``; a falsy success counts as an error"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with gateway_call(provider, operation) as call:
+                result = func(*args, **kwargs)
+                call.ok = bool(result[0]) if isinstance(result, tuple) and result else bool(result)
+                return result
+        return wrapper
+    return decorator
+
+
+# -- Flask -----------------------------------------------------------------
+
+def init_app(app, name='web'):
+    """Record request latency and per-request query counts and serve /metrics"""
+    if not app.config.get('METRICS_ENABLED', ENABLED):
+        return
+    from flask import Response, g, request
+
+    enable()
+    install_sqlalchemy_hooks()
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_started = time.perf_counter()
+        g._metrics_queries = [0]
+        g._metrics_token = _unit_queries.set(g._metrics_queries)
+
+    @app.after_request
+    def _metrics_status(response):
+        g._metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _metrics_finish(exc):
+        started = g.pop('_metrics_started', None)
+        if started is None:
+            return
+        endpoint = request.endpoint or 'unmatched'
+        HTTP_LATENCY.observe(
+            time.perf_counter() - started,
+            app=name, endpoint=endpoint, method=request.method,
+            status=g.pop('_metrics_status', 500)
+        )
+        DB_QUERIES_PER_UNIT.observe(g.pop('_metrics_queries')[0], scope=endpoint)
+        _unit_queries.reset(g.pop('_metrics_token'))
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
+# -- Telegram bots ---------------------------------------------------------
+
+def _handler_label(handler):
+    commands = getattr(handler, 'commands', None)
+    if commands:
+        return '/' + sorted(commands)[0]
+    pattern = getattr(handler, 'pattern', None)
+    if pattern is not None:
+        return getattr(pattern, 'pattern', str(pattern))
+    callback = getattr(handler, 'callback', None)
+    return getattr(callback, '__name__', type(handler).__name__)
+
+
+def _timed(callback, bot, label):
+    @wraps(callback)
+    async def wrapper(update, context):
+        start = time.perf_counter()
+        with track_queries(label):
+            try:
+                return await callback(update, context)
+            except Exception:
+                HANDLER_ERRORS.inc(bot=bot, handler=label)
+                raise
+            finally:
+                HANDLER_LATENCY.observe(time.perf_counter() - start, bot=bot, handler=label)
+    return wrapper
+
+
+def _wrap_handlers(handlers, wrap):
+    for handler in handlers:
+        nested = [getattr(handler, 'entry_points', None), getattr(handler, 'fallbacks', None)]
+        states = getattr(handler, 'states', None)
+        if isinstance(states, dict):
+            nested.extend(states.values())
+        if any(nested):
+            # ConversationHandler: wrap the handlers it dispatches to
+            for group in nested:
+                _wrap_handlers(group or [], wrap)
+        elif getattr(handler, 'callback', None) is not None:
+            handler.callback = wrap(handler.callback, _handler_label(handler))
+
+
+def wrap_handlers(application, wrap):
+    """Replace every handler callback of an Application with wrap(callback, label)"""
+    for handlers in application.handlers.values():
+        _wrap_handlers(handlers, wrap)
+
+
+def instrument_application(application, bot):
+    """Time every registered handler of a python-telegram-bot Application.
+
+    Call after all handlers are added. Bot processes have no Flask app, so
+    when METRICS_PORT is set the metrics are served from a small HTTP
+    server on that port.
+    """
+    if not ENABLED:
+        return application
+    wrap_handlers(application, lambda callback, label: _timed(callback, bot, label))
+    port = os.getenv('METRICS_PORT')
+    if port:
+        serve(int(port))
+    return application
+
+
+def serve(port, host='0.0.0.0'):
+    """Serve /metrics from a daemon thread; returns the server"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = REGISTRY.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    logger.info(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
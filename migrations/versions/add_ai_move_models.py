@@ -0,0 +1,28 @@
+"""Add per-player move models for the AI opponents
+
+Revision ID: add_ai_move_models
+Revises: add_ai_opponents
+Create Date: 2026-10-20 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_ai_move_models'
+down_revision = 'add_ai_opponents'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'ai_move_models',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('counts', sa.LargeBinary(length=20), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+
+def downgrade():
+    op.drop_table('ai_move_models')
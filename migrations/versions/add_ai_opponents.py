@@ -0,0 +1,44 @@
+"""Add the bot flag for AI opponent accounts and the simulated games table
+
+Revision ID: add_ai_opponents
+Revises: add_collusion_flags
+Create Date: 2026-10-20 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_ai_opponents'
+down_revision = 'add_collusion_flags'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('is_bot', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+    # Accounts the old /simulate created for every game
+    op.execute("UPDATE users SET is_bot = true WHERE username LIKE '🤖 AI-%'")
+
+    op.create_table(
+        'simulated_games',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('bet_amount', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('move', sa.String(length=10), nullable=False),
+        sa.Column('opponent_moves', sa.String(length=64), nullable=False),
+        sa.Column('result', sa.String(length=10), nullable=False),
+        sa.Column('payout', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_simulated_games_user_id', 'simulated_games', ['user_id'])
+
+def downgrade():
+    op.drop_index('ix_simulated_games_user_id', table_name='simulated_games')
+    op.drop_table('simulated_games')
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('is_bot')
@@ -0,0 +1,49 @@
+"""Stop SQLite from reusing the ids of archived games and transactions
+
+Revision ID: add_archive_autoincrement
+Revises: add_ai_move_models
+Create Date: 2026-10-20 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_archive_autoincrement'
+down_revision = 'add_ai_move_models'
+branch_labels = None
+depends_on = None
+
+TABLES = ('games', 'game_participants', 'transactions')
+
+def upgrade():
+    # Postgres sequences never go back; SQLite rowids restart above the highest live row
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return
+    for table in TABLES:
+        with op.batch_alter_table(table, recreate='always', table_kwargs={'sqlite_autoincrement': True}):
+            pass
+
+    # Ids already archived from the top of a table must not be handed out either
+    for table in ('games', 'transactions'):
+        archived = bind.execute(
+            sa.text("SELECT MAX(max_id) FROM archive_segments WHERE table_name = :table"), {'table': table}
+        ).scalar()
+        if archived is None:
+            continue
+        bind.execute(sa.text("DELETE FROM sqlite_sequence WHERE name = :table AND seq < :seq"),
+                     {'table': table, 'seq': archived})
+        bind.execute(
+            sa.text("INSERT INTO sqlite_sequence (name, seq) "
+                    "SELECT :table, :seq WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :table)"),
+            {'table': table, 'seq': archived}
+        )
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return
+    for table in TABLES:
+        with op.batch_alter_table(table, recreate='always', table_kwargs={'sqlite_autoincrement': False}):
+            pass
@@ -0,0 +1,45 @@
+"""Add the archive segment and tombstone index for cold archival
+
+Revision ID: add_archive_index
+Revises: add_tournaments
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_archive_index'
+down_revision = 'add_tournaments'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'archive_segments',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('table_name', sa.String(length=32), nullable=False),
+        sa.Column('month', sa.String(length=7), nullable=False),
+        sa.Column('path', sa.String(length=255), nullable=False),
+        sa.Column('row_count', sa.Integer(), nullable=False),
+        sa.Column('min_id', sa.Integer(), nullable=False),
+        sa.Column('max_id', sa.Integer(), nullable=False),
+        sa.Column('max_created_at', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('path')
+    )
+    op.create_index('ix_archive_segments_table_max_id', 'archive_segments', ['table_name', 'max_id'])
+
+    op.create_table(
+        'archive_tombstones',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('segment_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['segment_id'], ['archive_segments.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'segment_id')
+    )
+
+def downgrade():
+    op.drop_table('archive_tombstones')
+    op.drop_index('ix_archive_segments_table_max_id', table_name='archive_segments')
+    op.drop_table('archive_segments')
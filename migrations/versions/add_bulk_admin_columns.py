@@ -0,0 +1,30 @@
+"""Add is_banned flag to users and game participant indexes
+
+Revision ID: add_bulk_admin_columns
+Revises: add_user_search_index
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_bulk_admin_columns'
+down_revision = 'add_user_search_index'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Bulk refunds and per-user lookups select participants by game and by user
+    op.create_index('ix_game_participants_game_id', 'game_participants', ['game_id'])
+    op.create_index('ix_game_participants_user_id', 'game_participants', ['user_id'])
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('is_banned', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('is_banned')
+
+    op.drop_index('ix_game_participants_user_id', table_name='game_participants')
+    op.drop_index('ix_game_participants_game_id', table_name='game_participants')
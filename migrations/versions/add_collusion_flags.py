@@ -0,0 +1,34 @@
+"""Add collusion flags raised by the streaming collusion monitor
+
+Revision ID: add_collusion_flags
+Revises: add_limit_buckets
+Create Date: 2026-10-19 23:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_collusion_flags'
+down_revision = 'add_limit_buckets'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'collusion_flags',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=10), nullable=False),
+        sa.Column('user_ids', sa.String(length=255), nullable=False),
+        sa.Column('games', sa.Integer(), nullable=False),
+        sa.Column('score', sa.Float(), nullable=False),
+        sa.Column('details', sa.Text(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_collusion_flags_status', 'collusion_flags', ['status'])
+
+def downgrade():
+    op.drop_index('ix_collusion_flags_status', table_name='collusion_flags')
+    op.drop_table('collusion_flags')
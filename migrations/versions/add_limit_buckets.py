@@ -0,0 +1,28 @@
+"""Add per-minute limit buckets for the rolling daily deposit and withdrawal limits
+
+Revision ID: add_limit_buckets
+Revises: add_payout_batches
+Create Date: 2026-10-19 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_limit_buckets'
+down_revision = 'add_payout_batches'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'limit_buckets',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=10), nullable=False),
+        sa.Column('minute', sa.Integer(), nullable=False),
+        sa.Column('amount', sa.Numeric(precision=12, scale=2), nullable=False),
+        sa.PrimaryKeyConstraint('user_id', 'kind', 'minute')
+    )
+
+def downgrade():
+    op.drop_table('limit_buckets')
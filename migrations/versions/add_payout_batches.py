@@ -0,0 +1,57 @@
+"""Add payout batches and per-request payout tracking to withdrawal requests
+
+Revision ID: add_payout_batches
+Revises: add_archive_index
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_payout_batches'
+down_revision = 'add_archive_index'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'payout_batches',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('provider', sa.String(length=20), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('reference', sa.String(length=100), nullable=True),
+        sa.Column('item_count', sa.Integer(), nullable=False),
+        sa.Column('total_amount', sa.Numeric(precision=12, scale=2), nullable=False),
+        sa.Column('failed_count', sa.Integer(), nullable=False),
+        sa.Column('created_by', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['created_by'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_payout_batches_status', 'payout_batches', ['status'])
+
+    with op.batch_alter_table('withdrawal_requests', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('tx_ref', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('provider', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('batch_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('reference', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('failure_reason', sa.String(length=255), nullable=True))
+        batch_op.create_index('ix_withdrawal_requests_tx_ref', ['tx_ref'])
+        batch_op.create_index('ix_withdrawal_requests_batch_id', ['batch_id'])
+        batch_op.create_foreign_key('fk_withdrawal_requests_batch_id', 'payout_batches', ['batch_id'], ['id'])
+
+def downgrade():
+    with op.batch_alter_table('withdrawal_requests', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_withdrawal_requests_batch_id', type_='foreignkey')
+        batch_op.drop_index('ix_withdrawal_requests_batch_id')
+        batch_op.drop_index('ix_withdrawal_requests_tx_ref')
+        batch_op.drop_column('failure_reason')
+        batch_op.drop_column('reference')
+        batch_op.drop_column('batch_id')
+        batch_op.drop_column('provider')
+        batch_op.drop_column('tx_ref')
+
+    op.drop_index('ix_payout_batches_status', table_name='payout_batches')
+    op.drop_table('payout_batches')
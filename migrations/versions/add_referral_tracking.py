@@ -0,0 +1,54 @@
+"""Add referral qualification tracking and per-referrer summaries
+
+Revision ID: add_referral_tracking
+Revises: add_bulk_admin_columns
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_referral_tracking'
+down_revision = 'add_bulk_admin_columns'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table('referrals', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('games_played', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('first_deposit_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('qualified_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('paid_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_referrals_referrer_id', ['referrer_id'])
+        batch_op.create_index('ix_referrals_payout', ['bonus_paid', 'qualified_at', 'id'])
+
+    op.create_table(
+        'referral_summaries',
+        sa.Column('referrer_id', sa.Integer(), nullable=False),
+        sa.Column('total_referrals', sa.Integer(), nullable=True),
+        sa.Column('qualified_referrals', sa.Integer(), nullable=True),
+        sa.Column('paid_referrals', sa.Integer(), nullable=True),
+        sa.Column('total_earned', sa.Numeric(precision=12, scale=2), nullable=True),
+        sa.ForeignKeyConstraint(['referrer_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('referrer_id')
+    )
+
+    # Existing referrals count toward their referrer's summary
+    op.execute('''
+        INSERT INTO referral_summaries (referrer_id, total_referrals, qualified_referrals, paid_referrals, total_earned)
+        SELECT referrer_id, COUNT(*), 0, 0, 0 FROM referrals
+        WHERE referrer_id IS NOT NULL
+        GROUP BY referrer_id
+    ''')
+
+def downgrade():
+    op.drop_table('referral_summaries')
+
+    with op.batch_alter_table('referrals', schema=None) as batch_op:
+        batch_op.drop_index('ix_referrals_payout')
+        batch_op.drop_index('ix_referrals_referrer_id')
+        batch_op.drop_column('paid_at')
+        batch_op.drop_column('qualified_at')
+        batch_op.drop_column('first_deposit_at')
+        batch_op.drop_column('games_played')
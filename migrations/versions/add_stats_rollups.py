@@ -0,0 +1,67 @@
+"""Add hourly/daily stats rollup tables and counters
+
+Revision ID: add_stats_rollups
+Revises: merge_heads
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_stats_rollups'
+down_revision = 'merge_heads'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Live dashboard counts filter on status only
+    op.create_index('ix_transactions_status', 'transactions', ['status'])
+    op.create_index('ix_games_status', 'games', ['status'])
+
+    # New counters on the existing daily rollup
+    with op.batch_alter_table('daily_stats', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('games_created', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('total_bets', sa.Numeric(precision=12, scale=2), nullable=True))
+        batch_op.add_column(sa.Column('deposit_volume', sa.Numeric(precision=12, scale=2), nullable=True))
+        batch_op.add_column(sa.Column('withdrawal_volume', sa.Numeric(precision=12, scale=2), nullable=True))
+        batch_op.create_unique_constraint('uq_daily_stats_date', ['date'])
+
+    op.create_table(
+        'hourly_stats',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('hour', sa.DateTime(), nullable=False),
+        sa.Column('total_games', sa.Integer(), nullable=True),
+        sa.Column('total_players', sa.Integer(), nullable=True),
+        sa.Column('total_volume', sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column('house_earnings', sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column('new_users', sa.Integer(), nullable=True),
+        sa.Column('games_created', sa.Integer(), nullable=True),
+        sa.Column('total_bets', sa.Numeric(precision=12, scale=2), nullable=True),
+        sa.Column('deposit_volume', sa.Numeric(precision=12, scale=2), nullable=True),
+        sa.Column('withdrawal_volume', sa.Numeric(precision=12, scale=2), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('hour')
+    )
+
+    op.create_table(
+        'daily_active_users',
+        sa.Column('date', sa.DateTime(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('date', 'user_id')
+    )
+
+def downgrade():
+    op.drop_table('daily_active_users')
+    op.drop_table('hourly_stats')
+
+    with op.batch_alter_table('daily_stats', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_daily_stats_date', type_='unique')
+        batch_op.drop_column('withdrawal_volume')
+        batch_op.drop_column('deposit_volume')
+        batch_op.drop_column('total_bets')
+        batch_op.drop_column('games_created')
+
+    op.drop_index('ix_games_status', table_name='games')
+    op.drop_index('ix_transactions_status', table_name='transactions')
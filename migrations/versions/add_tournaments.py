@@ -0,0 +1,70 @@
+"""Add tournaments, tournament entries and tournament tables on games
+
+Revision ID: add_tournaments
+Revises: add_referral_tracking
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_tournaments'
+down_revision = 'add_referral_tracking'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'tournaments',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('creator_id', sa.Integer(), nullable=True),
+        sa.Column('buy_in', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('max_entrants', sa.Integer(), nullable=True),
+        sa.Column('entrant_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('prize_pool', sa.Numeric(precision=12, scale=2), nullable=False, server_default='0'),
+        sa.Column('current_round', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('winner_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['creator_id'], ['users.id']),
+        sa.ForeignKeyConstraint(['winner_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_tournaments_status', 'tournaments', ['status'])
+
+    op.create_table(
+        'tournament_entries',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('tournament_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('eliminated_round', sa.Integer(), nullable=True),
+        sa.Column('prize', sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['tournament_id'], ['tournaments.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('tournament_id', 'user_id', name='uq_tournament_entries_user')
+    )
+    op.create_index('ix_tournament_entries_user_id', 'tournament_entries', ['user_id'])
+
+    with op.batch_alter_table('games', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('tournament_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('round', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_games_tournament_id', 'tournaments', ['tournament_id'], ['id'])
+        batch_op.create_index('ix_games_tournament_round', ['tournament_id', 'round', 'status'])
+
+def downgrade():
+    with op.batch_alter_table('games', schema=None) as batch_op:
+        batch_op.drop_index('ix_games_tournament_round')
+        batch_op.drop_constraint('fk_games_tournament_id', type_='foreignkey')
+        batch_op.drop_column('round')
+        batch_op.drop_column('tournament_id')
+
+    op.drop_index('ix_tournament_entries_user_id', table_name='tournament_entries')
+    op.drop_table('tournament_entries')
+    op.drop_index('ix_tournaments_status', table_name='tournaments')
+    op.drop_table('tournaments')
@@ -0,0 +1,30 @@
+"""Add user search index (FTS5 on SQLite, pg_trgm on Postgres)
+
+Revision ID: add_user_search_index
+Revises: add_stats_rollups
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'add_user_search_index'
+down_revision = 'add_stats_rollups'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    from user_search import UserSearchIndex
+    connection = op.get_bind()
+    if UserSearchIndex.install(connection):
+        # Index users that existed before the triggers, also in a table left empty by an earlier install
+        UserSearchIndex.rebuild(connection)
+
+def downgrade():
+    connection = op.get_bind()
+    if connection.dialect.name == 'sqlite':
+        for trigger in ('users_fts_ai', 'users_fts_ad', 'users_fts_au'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS users_fts")
+    elif connection.dialect.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_users_search_trgm")
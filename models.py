@@ -22,6 +22,8 @@ class User(db.Model):
     losses = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_admin = db.Column(db.Boolean, default=False)
+    is_banned = db.Column(db.Boolean, default=False, nullable=False, server_default=db.false())
+    is_bot = db.Column(db.Boolean, default=False, nullable=False, server_default=db.false())  # AI opponent account
     wallet_id = db.Column(db.String(255), unique=True, nullable=True)  # Capa wallet ID
     
     # Relationships
@@ -67,18 +69,19 @@ class RoomPlayer(db.Model):
 class Transaction(db.Model):
     """Transaction model for deposits and withdrawals"""
     __tablename__ = 'transactions'
+    # Never reuse ids on SQLite: archived rows keep theirs (see archive.py)
+    __table_args__ = {'sqlite_autoincrement': True}
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     tx_ref = db.Column(db.String(255), unique=True, nullable=False)
     type = db.Column(db.String(50), nullable=False)  # 'deposit' or 'withdrawal'
     amount = db.Column(db.Numeric(10, 2), nullable=False)
-    status = db.Column(db.String(50), nullable=False)  # 'pending', 'completed', 'failed'
+    status = db.Column(db.String(50), nullable=False, index=True)  # 'pending', 'completed', 'failed'
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     completed_at = db.Column(db.DateTime, nullable=True)
     
-    # Relationships
-    user = db.relationship('User', backref=db.backref('transactions', lazy=True))
+    # Transaction.user comes from the User.transactions backref
     
     def __repr__(self):
         return f'<Transaction {self.tx_ref}>'
@@ -90,22 +93,53 @@ class WithdrawalRequest(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     amount = db.Column(db.Float, nullable=False)
-    status = db.Column(db.String(20), default='pending')
+    status = db.Column(db.String(20), default='pending')  # pending, processing, completed, failed, rejected
     wallet_address = db.Column(db.String(100), nullable=False)
+    tx_ref = db.Column(db.String(100), index=True)  # the pending withdrawal Transaction
+    provider = db.Column(db.String(20))  # set when a payout batch picks it up
+    batch_id = db.Column(db.Integer, db.ForeignKey('payout_batches.id'), index=True)
+    reference = db.Column(db.String(100))  # the provider's reference for the transfer
+    failure_reason = db.Column(db.String(255))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     processed_at = db.Column(db.DateTime)
+    
+    # Relationships
+    user = db.relationship('User', backref=db.backref('withdrawal_requests', lazy=True))
+
+class PayoutBatch(db.Model):
+    """One bulk payout request to a provider (see admin/payouts.py)"""
+    __tablename__ = 'payout_batches'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    provider = db.Column(db.String(20), nullable=False)
+    status = db.Column(db.String(20), default='sending', index=True)  # sending, completed, partial, failed
+    reference = db.Column(db.String(100))
+    item_count = db.Column(db.Integer, default=0, nullable=False)
+    total_amount = db.Column(db.Numeric(12, 2), default=0, nullable=False)
+    failed_count = db.Column(db.Integer, default=0, nullable=False)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime)
+    
+    # Relationships
+    withdrawals = db.relationship('WithdrawalRequest', backref='batch', lazy=True)
 
 class DailyStats(db.Model):
+    """Per-day rollup of game and payment activity, kept up to date by stats_rollup"""
     __tablename__ = 'daily_stats'
     
     id = db.Column(db.Integer, primary_key=True)
-    date = db.Column(db.DateTime, nullable=False)
-    total_games = db.Column(db.Integer, default=0)
-    total_players = db.Column(db.Integer, default=0)
-    total_volume = db.Column(db.Numeric(10, 2), default=0.0)
+    date = db.Column(db.DateTime, nullable=False, unique=True)
+    total_games = db.Column(db.Integer, default=0)  # games settled
+    total_players = db.Column(db.Integer, default=0)  # seats in settled games
+    total_volume = db.Column(db.Numeric(10, 2), default=0.0)  # stakes in settled games
     house_earnings = db.Column(db.Numeric(10, 2), default=0.0)
     new_users = db.Column(db.Integer, default=0)
     active_users = db.Column(db.Integer, default=0)
+    games_created = db.Column(db.Integer, default=0)
+    total_bets = db.Column(db.Numeric(12, 2), default=0.0)  # bet amounts of games created
+    deposit_volume = db.Column(db.Numeric(12, 2), default=0.0)
+    withdrawal_volume = db.Column(db.Numeric(12, 2), default=0.0)
     
     @classmethod
     def get_or_create(cls, date):
@@ -116,6 +150,29 @@ class DailyStats(db.Model):
             db.session.commit()
         return stats
 
+class HourlyStats(db.Model):
+    """Per-hour rollup with the same counters as DailyStats (except active users)"""
+    __tablename__ = 'hourly_stats'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    hour = db.Column(db.DateTime, nullable=False, unique=True)
+    total_games = db.Column(db.Integer, default=0)
+    total_players = db.Column(db.Integer, default=0)
+    total_volume = db.Column(db.Numeric(10, 2), default=0.0)
+    house_earnings = db.Column(db.Numeric(10, 2), default=0.0)
+    new_users = db.Column(db.Integer, default=0)
+    games_created = db.Column(db.Integer, default=0)
+    total_bets = db.Column(db.Numeric(12, 2), default=0.0)
+    deposit_volume = db.Column(db.Numeric(12, 2), default=0.0)
+    withdrawal_volume = db.Column(db.Numeric(12, 2), default=0.0)
+
+class DailyActiveUser(db.Model):
+    """Marks a user as active on a day so DailyStats.active_users counts each user once"""
+    __tablename__ = 'daily_active_users'
+    
+    date = db.Column(db.DateTime, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+
 class Cooldown(db.Model):
     """Model for storing command cooldowns per user"""
     __tablename__ = 'cooldowns'
@@ -180,27 +237,57 @@ class Participant(db.Model):
 
 class Referral(db.Model):
     __tablename__ = 'referrals'
+    __table_args__ = (
+        # Payout batches walk qualified, unpaid referrals in id order
+        db.Index('ix_referrals_payout', 'bonus_paid', 'qualified_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    referrer_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'))
+    referrer_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), index=True)
     referred_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), unique=True)
     created_at = db.Column(db.DateTime, default=func.now())
     bonus_paid = db.Column(db.Boolean, default=False)
+    
+    # Qualifying activity of the referred user (see referrals.py)
+    games_played = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    first_deposit_at = db.Column(db.DateTime)
+    qualified_at = db.Column(db.DateTime)
+    paid_at = db.Column(db.DateTime)
+
+class ReferralSummary(db.Model):
+    """Per-referrer counters kept up to date by referrals.py, so "my referrals" is one row"""
+    __tablename__ = 'referral_summaries'
+    
+    referrer_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    total_referrals = db.Column(db.Integer, default=0)
+    qualified_referrals = db.Column(db.Integer, default=0)
+    paid_referrals = db.Column(db.Integer, default=0)
+    total_earned = db.Column(db.Numeric(12, 2), default=0.0)
 
 class Game(db.Model):
     """Game model for tracking individual games"""
     __tablename__ = 'games'
+    __table_args__ = (
+        # Finding a tournament round's open tables and winners
+        db.Index('ix_games_tournament_round', 'tournament_id', 'round', 'status'),
+        # Never reuse ids on SQLite: archived rows keep theirs (see archive.py)
+        {'sqlite_autoincrement': True},
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     creator_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     bet_amount = db.Column(db.Numeric(10, 2), nullable=False)
-    status = db.Column(db.String(20), default='waiting')  # waiting, in_progress, completed
+    status = db.Column(db.String(20), default='waiting', index=True)  # waiting, in_progress, completed
     min_players = db.Column(db.Integer, default=3)
     max_players = db.Column(db.Integer, default=3)
     winner_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     created_at = db.Column(db.DateTime, default=func.now())
     completed_at = db.Column(db.DateTime)
     
+    # Set for tournament tables (see tournaments.py)
+    tournament_id = db.Column(db.Integer, db.ForeignKey('tournaments.id'))
+    round = db.Column(db.Integer)
+    
     # Relationships
     creator = db.relationship('User', foreign_keys=[creator_id], backref=db.backref('created_games', lazy=True))
     winner = db.relationship('User', foreign_keys=[winner_id], backref=db.backref('won_games', lazy=True))
@@ -209,13 +296,120 @@ class Game(db.Model):
 class GameParticipant(db.Model):
     """Game participant model for tracking player moves and results"""
     __tablename__ = 'game_participants'
+    __table_args__ = {'sqlite_autoincrement': True}
     
     id = db.Column(db.Integer, primary_key=True)
-    game_id = db.Column(db.Integer, db.ForeignKey('games.id'), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    game_id = db.Column(db.Integer, db.ForeignKey('games.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     move = db.Column(db.String(10))  # rock, paper, scissors
     result = db.Column(db.String(10))  # win, lose, draw
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
-    user = db.relationship('User', backref=db.backref('game_participations', lazy=True))
\ No newline at end of file
+    user = db.relationship('User', backref=db.backref('game_participations', lazy=True))
+
+class Tournament(db.Model):
+    """Knockout tournament played on 3-player tables (see tournaments.py)"""
+    __tablename__ = 'tournaments'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(64), nullable=False)
+    creator_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    buy_in = db.Column(db.Numeric(10, 2), nullable=False)
+    status = db.Column(db.String(20), default='registering', index=True)  # registering, running, completed, cancelled
+    max_entrants = db.Column(db.Integer)
+    entrant_count = db.Column(db.Integer, default=0, nullable=False)
+    prize_pool = db.Column(db.Numeric(12, 2), default=0, nullable=False)
+    current_round = db.Column(db.Integer, default=0, nullable=False)
+    winner_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, default=func.now())
+    started_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
+    
+    # Relationships
+    winner = db.relationship('User', foreign_keys=[winner_id])
+    entries = db.relationship('TournamentEntry', backref='tournament', lazy=True)
+
+class TournamentEntry(db.Model):
+    """A registered player and how far they got"""
+    __tablename__ = 'tournament_entries'
+    __table_args__ = (
+        db.UniqueConstraint('tournament_id', 'user_id', name='uq_tournament_entries_user'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    tournament_id = db.Column(db.Integer, db.ForeignKey('tournaments.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    eliminated_round = db.Column(db.Integer)  # None while still playing
+    prize = db.Column(db.Numeric(10, 2))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    user = db.relationship('User')
+
+class ArchiveSegment(db.Model):
+    """One Parquet file of archived games or transactions (see archive.py)"""
+    __tablename__ = 'archive_segments'
+    __table_args__ = (
+        db.Index('ix_archive_segments_table_max_id', 'table_name', 'max_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(32), nullable=False)  # games, transactions
+    month = db.Column(db.String(7), nullable=False)  # YYYY-MM
+    path = db.Column(db.String(255), nullable=False, unique=True)
+    row_count = db.Column(db.Integer, nullable=False)
+    min_id = db.Column(db.Integer, nullable=False)
+    max_id = db.Column(db.Integer, nullable=False)
+    max_created_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ArchiveTombstone(db.Model):
+    """Marks that a user has rows in an archive segment, so reads only open their files"""
+    __tablename__ = 'archive_tombstones'
+    
+    user_id = db.Column(db.Integer, primary_key=True)
+    segment_id = db.Column(db.Integer, db.ForeignKey('archive_segments.id', ondelete='CASCADE'), primary_key=True)
+
+class LimitBucket(db.Model):
+    """Amount a user deposited or withdrew in one minute, for the rolling daily limits (see limits.py)"""
+    __tablename__ = 'limit_buckets'
+    
+    user_id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(10), primary_key=True)  # deposit, withdrawal
+    minute = db.Column(db.Integer, primary_key=True)  # minutes since the epoch
+    amount = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+
+class CollusionFlag(db.Model):
+    """Players the collusion monitor flagged for an admin to review (see collusion.py)"""
+    __tablename__ = 'collusion_flags'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(10), nullable=False)  # cluster, player
+    user_ids = db.Column(db.String(255), nullable=False)  # comma-separated, ascending
+    games = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)  # standard deviations above chance
+    details = db.Column(db.Text)  # JSON
+    status = db.Column(db.String(20), default='open', nullable=False, index=True)  # open, dismissed, confirmed
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class SimulatedGame(db.Model):
+    """A practice game against AI opponents, kept out of games (see ai_opponents.py)"""
+    __tablename__ = 'simulated_games'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    bet_amount = db.Column(db.Numeric(10, 2), nullable=False)
+    move = db.Column(db.String(10), nullable=False)
+    opponent_moves = db.Column(db.String(64), nullable=False)  # comma-separated, in seat order
+    result = db.Column(db.String(10), nullable=False)  # win, lose, draw
+    payout = db.Column(db.Numeric(10, 2), nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class AIMoveModel(db.Model):
+    """A player's move-to-move transition counts, for the AI opponents (see ai_strategy.py)"""
+    __tablename__ = 'ai_move_models'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    counts = db.Column(db.LargeBinary(20), nullable=False)  # 3x3 counts and the last move, little-endian uint16
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,187 @@
+"""
+Rendered page cache and conditional GET for the public web pages.
+
+A view wrapped in cached_page has its 200 responses kept in an in-process
+LRU, keyed by path and query string, with a strong ETag (a hash of the
+body). There are two kinds of page:
+
+- immutable (ttl=None), e.g. a completed game's result: kept until
+  evicted and sent with a long, immutable Cache-Control
+- semi-live, e.g. the leaderboard and the index stats: fresh for ttl
+  seconds, then served stale for up to stale seconds more while one
+  background render replaces it (stale-while-revalidate). Past that the
+  request renders it again itself.
+
+A request whose If-None-Match matches the cached page gets a 304 straight
+from memory, without a query or a render. Redirects, errors and
+responses that set cookies are passed through uncached.
+
+    @app.route('/leaderboard')
+    @cached_page(ttl=PAGE_CACHE_TTL)
+    @read_only_view
+    def leaderboard():
+        ...
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request
+
+from config import PAGE_CACHE_TTL, PAGE_CACHE_STALE, PAGE_CACHE_SIZE, PAGE_CACHE_IMMUTABLE_MAX_AGE
+
+logger = logging.getLogger(__name__)
+
+
+class Page:
+    """One rendered response body and how long it may be served"""
+    __slots__ = ('body', 'mimetype', 'etag', 'ttl', 'stale', 'private', 'rendered_at')
+
+    def __init__(self, body, mimetype, ttl=PAGE_CACHE_TTL, stale=PAGE_CACHE_STALE, private=False):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.ttl = ttl
+        self.stale = stale
+        self.private = private
+        self.rendered_at = time.monotonic()
+
+    @property
+    def age(self):
+        return time.monotonic() - self.rendered_at
+
+    def is_fresh(self):
+        return self.ttl is None or self.age < self.ttl
+
+    def is_usable(self):
+        return self.ttl is None or self.age < self.ttl + self.stale
+
+    @property
+    def cache_control(self):
+        scope = 'private' if self.private else 'public'
+        if self.ttl is None:
+            return f"{scope}, max-age={PAGE_CACHE_IMMUTABLE_MAX_AGE}, immutable"
+        return f"{scope}, max-age={max(math.ceil(self.ttl - self.age), 0)}, stale-while-revalidate={int(self.stale)}"
+
+    def response(self):
+        """The page for the current request: a 304 if If-None-Match has its ETag"""
+        response = current_app.response_class(self.body, mimetype=self.mimetype)
+        response.set_etag(self.etag)
+        response.headers['Cache-Control'] = self.cache_control
+        return response.make_conditional(request)
+
+
+class PageCache:
+    """LRU of rendered pages, with at most one background render per page"""
+
+    def __init__(self, max_size=PAGE_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self._pages = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """The cached page if it may still be served, else None"""
+        with self._lock:
+            page = self._pages.get(key)
+            if page is None or not page.is_usable():
+                self.misses += 1
+                return None
+            self._pages.move_to_end(key)
+            if page.is_fresh():
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+            return page
+
+    def put(self, key, page):
+        with self._lock:
+            self._pages[key] = page
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_size:
+                self._pages.popitem(last=False)
+
+    def start_refresh(self, key):
+        """Claim the background render of key; False if one is running"""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def end_refresh(self, key):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def invalidate(self, keys=None):
+        """Drop the given pages (everything when None)"""
+        with self._lock:
+            if keys is None:
+                self._pages.clear()
+                return
+            for key in keys:
+                self._pages.pop(key, None)
+
+    def __len__(self):
+        return len(self._pages)
+
+
+CACHE = PageCache()
+
+
+def _render(cache, key, view, args, kwargs, ttl, stale, private):
+    """Call the view; returns the cached Page, or the response when it can't be cached"""
+    response = current_app.make_response(view(*args, **kwargs))
+    if response.status_code != 200 or response.direct_passthrough or 'Set-Cookie' in response.headers:
+        return response
+    page = Page(response.get_data(), response.mimetype, ttl, stale, private)
+    cache.put(key, page)
+    return page
+
+
+def _refresh(app, environ, cache, key, view, args, kwargs, ttl, stale, private):
+    try:
+        with app.request_context(environ):
+            _render(cache, key, view, args, kwargs, ttl, stale, private)
+    except Exception as e:
+        logger.error(f"Error refreshing cached page {key}: {e}")
+    finally:
+        cache.end_refresh(key)
+
+
+def cached_page(ttl=PAGE_CACHE_TTL, stale=PAGE_CACHE_STALE, private=False, cache=None):
+    """Serve a GET view from the page cache; ttl=None marks its pages immutable"""
+    def decorator(view):
+        @wraps(view)
+        def decorated_function(*args, **kwargs):
+            page_cache = CACHE if cache is None else cache
+            if request.method != 'GET':
+                return view(*args, **kwargs)
+
+            key = request.full_path
+            page = page_cache.get(key)
+            if page is None:
+                page = _render(page_cache, key, view, args, kwargs, ttl, stale, private)
+                if not isinstance(page, Page):
+                    return page
+            elif not page.is_fresh() and page_cache.start_refresh(key):
+                threading.Thread(
+                    target=_refresh, daemon=True,
+                    args=(current_app._get_current_object(), dict(request.environ), page_cache, key,
+                          view, args, kwargs, ttl, stale, private)
+                ).start()
+
+            response = page.response()
+            if response.status_code == 304:
+                page_cache.not_modified += 1
+            return response
+        return decorated_function
+    return decorator
@@ -0,0 +1,72 @@
+"""Keyset (cursor) pagination helpers"""
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class Page:
+    """One page of results plus the cursor for the next page"""
+
+    def __init__(self, items, next_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_more(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(key):
+    """Encode the last seen key as an opaque, URL-safe cursor"""
+    raw = json.dumps({'k': key}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor back to its key, or None for the first page"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))['k']
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+def clamp_page_size(limit, default=DEFAULT_PAGE_SIZE):
+    """Keep a requested page size within sane bounds"""
+    try:
+        limit = int(limit) if limit is not None else default
+    except (TypeError, ValueError):
+        limit = default
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def keyset_paginate(query, key_column, cursor=None, limit=DEFAULT_PAGE_SIZE, descending=True):
+    """Fetch one page of query ordered by a unique, indexed key column.
+
+    Instead of OFFSET, the page starts strictly after the key in the cursor,
+    so every page is an index range scan no matter how deep it is, and rows
+    inserted meanwhile never shift or duplicate results.
+    """
+    limit = clamp_page_size(limit)
+    key = decode_cursor(cursor)
+    if key is not None:
+        query = query.filter(key_column < key if descending else key_column > key)
+
+    query = query.order_by(key_column.desc() if descending else key_column.asc())
+    rows = query.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(getattr(rows[-1], key_column.key))
+    return Page(rows, next_cursor)
@@ -1,9 +1,12 @@
 """Payment service for handling transactions"""
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
 from typing import Tuple, Dict, Union, Optional
 from extensions import db
 from models import User, Transaction
+from balances import debit, credit
+from limits import LIMITS
+from archive import ColdArchive
 from chapa_integration import ChapaPayment
 from capa_wallet import CapaWallet
 from config import (
@@ -11,7 +14,9 @@ from config import (
     MAX_DEPOSIT_AMOUNT,
     MIN_WITHDRAW_AMOUNT,
     MAX_WITHDRAW_AMOUNT,
-    TEST_MODE
+    TEST_MODE,
+    BANNED_MESSAGE,
+    DEPOSIT_CHECKOUT_MINUTES
 )
 
 logger = logging.getLogger(__name__)
@@ -83,6 +88,13 @@ class PaymentService:
             if not user:
                 logger.error(f"User not found: {user_id}")
                 return False, "User not found"
+            if user.is_banned:
+                return False, BANNED_MESSAGE
+
+            # Rolling 24-hour cap, from in-memory counters
+            allowed, message = LIMITS.check(user_id, 'deposit', amount)
+            if not allowed:
+                return False, message
 
             # Create transaction record
             tx_ref = f"DEP_{user_id}_{int(datetime.utcnow().timestamp())}"
@@ -94,6 +106,7 @@ class PaymentService:
                 status='pending'
             )
             db.session.add(transaction)
+            LIMITS.record_transaction(transaction)
             db.session.commit()
             logger.info(f"Created pending deposit transaction: {tx_ref}")
 
@@ -161,9 +174,18 @@ class PaymentService:
             user = User.query.get(user_id)
             if not user:
                 return False, "User not found"
+            if user.is_banned:
+                return False, BANNED_MESSAGE
+
+            # Rolling 24-hour cap, from in-memory counters
+            allowed, message = LIMITS.check(user_id, 'withdrawal', amount)
+            if not allowed:
+                return False, message
 
-            # Check balance
-            if user.balance < amount:
+            # Take the amount in one conditional UPDATE, so concurrent withdrawals
+            # and bets can't both spend the same balance
+            if not debit(user_id, amount):
+                db.session.rollback()
                 return False, "Insufficient balance"
 
             # Create transaction record
@@ -176,9 +198,7 @@ class PaymentService:
                 status='pending'
             )
             db.session.add(transaction)
-
-            # Update user balance
-            user.balance -= amount
+            LIMITS.record_transaction(transaction)
             db.session.commit()
 
             # Process withdrawal through Capa wallet
@@ -191,7 +211,7 @@ class PaymentService:
                 )
                 if not success:
                     # Refund user balance if withdrawal fails
-                    user.balance += amount
+                    credit(user_id, amount)
                     transaction.status = 'failed'
                     db.session.commit()
                     return False, message
@@ -218,11 +238,11 @@ class PaymentService:
 
             if status == "completed":
                 if transaction.type == "deposit":
-                    user.balance += transaction.amount
+                    credit(user.id, transaction.amount)
                 transaction.status = "completed"
             elif status == "rejected":
                 if transaction.type == "withdrawal":
-                    user.balance += transaction.amount  # Refund
+                    credit(user.id, transaction.amount)  # Refund
                 transaction.status = "rejected"
             else:
                 transaction.status = "failed"
@@ -267,12 +287,32 @@ class PaymentService:
         except Exception as e:
             return False, f"Error verifying payment: {str(e)}"
 
+    @staticmethod
+    def expire_abandoned_deposits(minutes: int = DEPOSIT_CHECKOUT_MINUTES) -> int:
+        """Cancel deposits still pending after their checkout window, releasing their daily limit"""
+        cutoff = datetime.utcnow() - timedelta(minutes=minutes)
+        try:
+            abandoned = Transaction.query.filter(
+                Transaction.type == 'deposit',
+                Transaction.status == 'pending',
+                Transaction.created_at < cutoff
+            ).with_for_update().all()
+            for transaction in abandoned:
+                transaction.status = 'cancelled'
+            db.session.commit()
+            return len(abandoned)
+        except Exception as e:
+            logger.error(f"Error expiring abandoned deposits: {str(e)}")
+            db.session.rollback()
+            return 0
+
     @staticmethod
     def get_transactions(user_id: int, limit: int = 10) -> list:
-        """Get user's recent transactions"""
-        return Transaction.query.filter_by(user_id=user_id).order_by(
+        """Get user's recent transactions, including archived ones"""
+        transactions = Transaction.query.filter_by(user_id=user_id).order_by(
             Transaction.created_at.desc()
         ).limit(limit).all()
+        return ColdArchive.user_transactions(user_id, transactions, limit)
 
     def get_wallet_balance(self, user_id: int) -> Tuple[bool, str, Optional[float]]:
         """Get user's Capa wallet balance"""
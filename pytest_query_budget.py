@@ -0,0 +1,100 @@
+"""
+pytest plugin: fail tests that run more SQL than their budget.
+
+Mark a test with ``@pytest.mark.query_budget(8)`` to allow at most eight
+statements during its call phase (fixtures are not counted). Pass
+``n_plus_one=3`` to also fail when any one statement shape repeats three
+or more times. ``--query-budget N`` applies a default budget to every
+unmarked test. Load with ``-p pytest_query_budget`` or by importing the
+hooks into a conftest.
+"""
+import pytest
+
+from sql_profiler import SQLProfiler
+
+_profiler = SQLProfiler(capture_stacks=True)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def check_budget(profile, max_queries=None, n_plus_one=None):
+    """Raise QueryBudgetExceeded if a profile is over budget or has repeated shapes"""
+    problems = []
+    if max_queries is not None and profile.queries > max_queries:
+        problems.append(f"ran {profile.queries} SQL statements, budget is {max_queries}")
+    if n_plus_one is not None and profile.repeated(n_plus_one):
+        problems.append(f"repeated a statement shape {n_plus_one}+ times")
+    if problems:
+        report = profile.format(n_plus_one or profile.queries + 1, top=10)
+        raise QueryBudgetExceeded('; '.join(problems) + '\n' + report)
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('query-budget')
+    group.addoption('--query-budget', type=int, default=None,
+                    help='default maximum SQL statements per test call')
+    group.addoption('--n-plus-one', type=int, default=None,
+                    help='fail tests that repeat one statement shape this many times')
+    group.addoption('--sql-flamegraph', default=None,
+                    help='write folded SQL stacks of budgeted tests to this path')
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        'markers',
+        'query_budget(max_queries, n_plus_one=None): fail if the test runs more SQL statements than allowed'
+    )
+
+
+def pytest_unconfigure(config):
+    path = config.getoption('sql_flamegraph', None)
+    if path:
+        _profiler.write_flamegraph(path)
+
+
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_call(item):
+    marker = item.get_closest_marker('query_budget')
+    max_queries = item.config.getoption('query_budget')
+    n_plus_one = item.config.getoption('n_plus_one')
+    if marker is not None:
+        max_queries = marker.args[0] if marker.args else marker.kwargs.get('max_queries', max_queries)
+        n_plus_one = marker.kwargs.get('n_plus_one', n_plus_one)
+    if max_queries is None and n_plus_one is None:
+        return (yield)
+
+    _profiler.install()
+    with _profiler.profile(item.nodeid) as profile:
+        result = yield
+    check_budget(profile, max_queries, n_plus_one)
+    return result
+
+
+@pytest.fixture
+def query_budget():
+    """Context manager for budgeting part of a test: ``with query_budget(3): ...``"""
+    _profiler.install()
+
+    def budget(max_queries=None, n_plus_one=None, name='query_budget'):
+        return _Budget(max_queries, n_plus_one, name)
+    return budget
+
+
+class _Budget:
+    def __init__(self, max_queries, n_plus_one, name):
+        self.max_queries = max_queries
+        self.n_plus_one = n_plus_one
+        self._context = _profiler.profile(name)
+        self.profile = None
+
+    def __enter__(self):
+        self.profile = self._context.__enter__()
+        return self.profile
+
+    def __exit__(self, exc_type, exc, tb):
+        self._context.__exit__(exc_type, exc, tb)
+        if exc_type is None:
+            check_budget(self.profile, self.max_queries, self.n_plus_one)
+        return False
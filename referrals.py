@@ -0,0 +1,309 @@
+"""
+Referral bonuses: qualification tracking, batched payouts and summaries.
+
+A referral qualifies once the referred user has made a first completed
+deposit (REFERRAL_REQUIRE_DEPOSIT) and played REFERRAL_MIN_GAMES settled
+games. Progress is recorded from the same flushes that settle games and
+complete deposits, as one or two set-based statements that only touch
+referral rows of the users involved; nobody's balance changes there.
+
+Bonuses are paid later by ReferralService.pay_pending in chunks: one
+credit per referrer, one executemany of bonus transactions and one UPDATE
+marking the chunk paid, committed together. The per-referrer
+ReferralSummary row is kept current by both steps, so "my referrals" is
+a primary-key lookup.
+"""
+import asyncio
+import logging
+from collections import Counter, defaultdict
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import bindparam, event, func, insert, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from extensions import db
+from models import User, Game, GameParticipant, Transaction, Referral, ReferralSummary
+from admin.bulk import BulkResult, DEFAULT_CHUNK_SIZE
+from config import REFERRAL_BONUS_AMOUNT, REFERRAL_MIN_GAMES, REFERRAL_REQUIRE_DEPOSIT
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_COUNTERS = ('total_referrals', 'qualified_referrals', 'paid_referrals', 'total_earned')
+
+
+def _add_to_summaries(connection, deltas):
+    """Add {referrer_id: {counter: delta}} to the summary rows, creating missing ones"""
+    if not deltas:
+        return
+    table = ReferralSummary.__table__
+    rows = [
+        {'referrer_id': referrer_id, **{name: counters.get(name, 0) for name in SUMMARY_COUNTERS}}
+        for referrer_id, counters in deltas.items()
+    ]
+    dialect = connection.dialect.name
+
+    if dialect in ('sqlite', 'postgresql'):
+        dialect_insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.referrer_id],
+            set_={name: func.coalesce(table.c[name], 0) + stmt.excluded[name] for name in SUMMARY_COUNTERS}
+        )
+        connection.execute(stmt, rows)
+        return
+
+    for row in rows:
+        result = connection.execute(
+            update(table)
+            .where(table.c.referrer_id == row['referrer_id'])
+            .values({name: func.coalesce(table.c[name], 0) + row[name] for name in SUMMARY_COUNTERS})
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(table).values(row))
+
+
+def _changed_to(obj, attr, value):
+    """Check whether this flush sets obj.attr to value"""
+    history = getattr(inspect(obj).attrs, attr).history
+    return value in (history.added or ())
+
+
+class ReferralActivity:
+    """Qualifying activity collected from one flush"""
+
+    def __init__(self):
+        self.new_referrals = Counter()  # referrer_id -> new referrals
+        self.depositors = set()
+        self.settled_games = []
+
+    def __bool__(self):
+        return bool(self.new_referrals or self.depositors or self.settled_games)
+
+    def apply(self, connection, now=None):
+        """Record progress and qualify referrals; returns the number newly qualified"""
+        now = now or datetime.utcnow()
+        referrals = Referral.__table__
+        deltas = defaultdict(dict)
+        for referrer_id, count in self.new_referrals.items():
+            deltas[referrer_id]['total_referrals'] = count
+
+        touched = set(self.depositors)
+        if self.depositors:
+            connection.execute(
+                update(referrals)
+                .where(referrals.c.referred_id.in_(self.depositors), referrals.c.first_deposit_at.is_(None))
+                .values(first_deposit_at=now)
+            )
+
+        if self.settled_games:
+            games = Counter(connection.execute(
+                select(GameParticipant.user_id)
+                .where(GameParticipant.game_id.in_(self.settled_games))
+            ).scalars())
+            # One UPDATE per distinct increment; almost always just "+1 for these players"
+            by_increment = defaultdict(list)
+            for user_id, count in games.items():
+                by_increment[count].append(user_id)
+            for increment, user_ids in by_increment.items():
+                result = connection.execute(
+                    update(referrals)
+                    .where(referrals.c.referred_id.in_(user_ids), referrals.c.qualified_at.is_(None))
+                    .values(games_played=referrals.c.games_played + increment)
+                )
+                if result.rowcount:
+                    touched.update(user_ids)
+
+        qualified = 0
+        if touched:
+            conditions = [
+                referrals.c.referred_id.in_(touched),
+                referrals.c.qualified_at.is_(None),
+                referrals.c.games_played >= REFERRAL_MIN_GAMES,
+            ]
+            if REFERRAL_REQUIRE_DEPOSIT:
+                conditions.append(referrals.c.first_deposit_at.isnot(None))
+            rows = connection.execute(select(referrals.c.id, referrals.c.referrer_id).where(*conditions)).all()
+            if rows:
+                connection.execute(
+                    update(referrals).where(referrals.c.id.in_([row.id for row in rows])).values(qualified_at=now)
+                )
+                for row in rows:
+                    counters = deltas[row.referrer_id]
+                    counters['qualified_referrals'] = counters.get('qualified_referrals', 0) + 1
+                qualified = len(rows)
+
+        _add_to_summaries(connection, {k: v for k, v in deltas.items() if k is not None})
+        return qualified
+
+
+def _collect_flush(session):
+    """Turn the pending flush into referral activity"""
+    activity = ReferralActivity()
+    for obj in session.new:
+        if isinstance(obj, Referral) and obj.referrer_id is not None:
+            activity.new_referrals[obj.referrer_id] += 1
+        elif isinstance(obj, Transaction) and obj.type == 'deposit' and obj.status == 'completed':
+            activity.depositors.add(obj.user_id)
+        elif isinstance(obj, Game) and obj.status == 'completed':
+            activity.settled_games.append(obj.id)
+
+    for obj in session.dirty:
+        if isinstance(obj, Transaction) and obj.type == 'deposit' and _changed_to(obj, 'status', 'completed'):
+            activity.depositors.add(obj.user_id)
+        elif isinstance(obj, Game) and _changed_to(obj, 'status', 'completed'):
+            activity.settled_games.append(obj.id)
+    return activity
+
+
+def _after_flush(session, flush_context):
+    """Record referral progress in the same transaction as the flush"""
+    try:
+        activity = _collect_flush(session)
+        if activity:
+            connection = session.connection()
+            with connection.begin_nested():
+                activity.apply(connection)
+    except Exception as e:
+        # Referral tracking must never break a game or payment commit
+        logger.error(f"Error recording referral activity: {e}")
+
+
+def register_referral_listeners(session=None):
+    """Track referral activity on every flush of the given session (db.session by default)"""
+    session = session or db.session
+    if not event.contains(session, 'after_flush', _after_flush):
+        event.listen(session, 'after_flush', _after_flush)
+
+
+class ReferralService:
+    """Create referrals, pay qualified bonuses and answer "my referrals\""""
+
+    @staticmethod
+    def record(referrer_id, referred_id):
+        """Record that referrer_id invited referred_id; returns the Referral or None"""
+        if referrer_id == referred_id:
+            return None
+        if db.session.execute(select(Referral.id).where(Referral.referred_id == referred_id)).first():
+            return None
+        referral = Referral(referrer_id=referrer_id, referred_id=referred_id, bonus_paid=False)
+        db.session.add(referral)
+        return referral
+
+    @staticmethod
+    def summary(user_id, recent=5):
+        """Counters from the precomputed summary plus the most recent referrals"""
+        row = db.session.get(ReferralSummary, user_id)
+        recent_rows = db.session.execute(
+            select(User.username, Referral.created_at, Referral.games_played,
+                   Referral.qualified_at, Referral.bonus_paid)
+            .join(User, User.id == Referral.referred_id)
+            .where(Referral.referrer_id == user_id)
+            .order_by(Referral.id.desc())
+            .limit(recent)
+        ).all() if recent else []
+        counts = {name: getattr(row, name) or 0 if row else 0 for name in SUMMARY_COUNTERS}
+        return {
+            'total_referrals': counts['total_referrals'],
+            'qualified_referrals': counts['qualified_referrals'],
+            'paid_referrals': counts['paid_referrals'],
+            'total_earned': float(counts['total_earned']),
+            'pending_bonus': (counts['qualified_referrals'] - counts['paid_referrals']) * REFERRAL_BONUS_AMOUNT,
+            'recent': [
+                {
+                    'username': username,
+                    'joined': created_at,
+                    'games_played': games_played,
+                    'qualified': qualified_at is not None,
+                    'paid': bool(bonus_paid),
+                }
+                for username, created_at, games_played, qualified_at, bonus_paid in recent_rows
+            ],
+        }
+
+    @staticmethod
+    def pay_pending(bonus=REFERRAL_BONUS_AMOUNT, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False, progress=None):
+        """Pay every qualified, unpaid referral, committing once per chunk"""
+        pending = [Referral.bonus_paid.is_(False), Referral.qualified_at.isnot(None)]
+        total = db.session.execute(select(func.count(Referral.id)).where(*pending)).scalar()
+        result = BulkResult('referral bonuses', dry_run, total)
+
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                select(Referral.id, Referral.referrer_id)
+                .where(*pending, Referral.id > last_id)
+                .order_by(Referral.id).limit(chunk_size).with_for_update()
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            try:
+                if not dry_run:
+                    ReferralService._pay_chunk(rows, bonus)
+                    db.session.commit()
+                else:
+                    db.session.rollback()
+            except Exception:
+                db.session.rollback()
+                raise
+
+            result.processed += len(rows)
+            result.affected += len({row.referrer_id for row in rows})
+            result.amount += Decimal(str(bonus)) * len(rows)
+            if progress:
+                progress(result)
+
+        if total:
+            logger.info(result.summary())
+        return result
+
+    @staticmethod
+    def _pay_chunk(rows, bonus):
+        """Credit, record and mark one chunk of referrals"""
+        now = datetime.utcnow()
+        per_referrer = Counter(row.referrer_id for row in rows if row.referrer_id is not None)
+        users = User.__table__
+        db.session.execute(
+            update(users)
+            .where(users.c.id == bindparam('b_user_id'))
+            .values(balance=users.c.balance + bindparam('b_bonus')),
+            [{'b_user_id': referrer_id, 'b_bonus': float(bonus) * count}
+             for referrer_id, count in per_referrer.items()]
+        )
+        db.session.execute(insert(Transaction.__table__), [
+            {
+                'user_id': row.referrer_id,
+                'tx_ref': f'referral_bonus_{row.id}',
+                'type': 'referral_bonus',
+                'amount': bonus,
+                'status': 'completed',
+                'created_at': now,
+                'completed_at': now,
+            }
+            for row in rows if row.referrer_id is not None
+        ])
+        db.session.execute(
+            update(Referral.__table__)
+            .where(Referral.__table__.c.id.in_([row.id for row in rows]))
+            .values(bonus_paid=True, paid_at=now)
+        )
+        _add_to_summaries(db.session.connection(), {
+            referrer_id: {'paid_referrals': count, 'total_earned': float(bonus) * count}
+            for referrer_id, count in per_referrer.items()
+        })
+
+
+def payout_job(app):
+    """Job handler that pays pending bonuses in a worker thread with its own app context"""
+    def pay():
+        with app.app_context():
+            try:
+                return ReferralService.pay_pending()
+            finally:
+                db.session.remove()
+
+    async def credit_referrals(bot, payload):
+        await asyncio.to_thread(pay)
+    return credit_referrals
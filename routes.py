@@ -1,17 +1,25 @@
-from flask import render_template, redirect, url_for, request, flash, jsonify, session
+from flask import Response, render_template, redirect, url_for, request, flash, jsonify, session
 from sqlalchemy import func
 from extensions import db
 from models import User, Game, GameParticipant, Transaction, WithdrawalRequest
 from utils import get_leaderboard
 from admin import AdminService
+from db_routing import read_only_view
+from page_cache import cached_page
+from live_events import BROKER, game_channel, transaction_channel
+from config import LIVE_MAX_CHANNELS
+from stats_rollup import StatsRollup
 import logging
 
 def register_routes(app):
     @app.route('/')
+    @cached_page()
+    @read_only_view
     def index():
-        total_users = User.query.count()
-        total_games = Game.query.count()
-        games_completed = Game.query.filter_by(status='completed').count()
+        totals = StatsRollup.totals()
+        total_users = totals['new_users']
+        total_games = totals['games_created']
+        games_completed = totals['total_games']
 
         recent_games = Game.query.filter_by(status='completed').order_by(Game.completed_at.desc()).limit(5).all()
         top_players = get_leaderboard(5)
@@ -21,6 +29,7 @@ def register_routes(app):
                                top_players=top_players)
 
     @app.route('/dashboard')
+    @read_only_view
     def dashboard():
         user_id = session.get('user_id')
         if not user_id:
@@ -42,6 +51,8 @@ def register_routes(app):
                                recent_users=recent_users, recent_games=recent_games)
 
     @app.route('/leaderboard')
+    @cached_page()
+    @read_only_view
     def leaderboard():
         top_players = get_leaderboard(20)
         return render_template('leaderboard.html', top_players=top_players)
@@ -94,21 +105,26 @@ def register_routes(app):
         users = AdminService.search_user(query)
         results = []
         for u in users:
-            win_rate = (u.games_won / u.games_played * 100) if u.games_played > 0 else 0
+            games_played = (u.wins or 0) + (u.losses or 0)
+            win_rate = (u.wins / games_played * 100) if games_played > 0 else 0
             results.append({
                 'id': u.id,
+                'telegram_id': u.telegram_id,
                 'username': u.username,
+                'full_name': u.full_name,
+                'email': u.email,
                 'balance': u.balance,
-                'games_played': u.games_played,
-                'games_won': u.games_won,
+                'games_played': games_played,
+                'games_won': u.wins or 0,
                 'win_rate': win_rate,
-                'created_at': u.created_at.strftime('%Y-%m-%d %H:%M'),
+                'created_at': u.created_at.strftime('%Y-%m-%d %H:%M') if u.created_at else None,
                 'is_admin': u.is_admin
             })
 
         return jsonify({'success': True, 'users': results})
 
     @app.route('/game/<int:game_id>/result')
+    @cached_page(ttl=None)  # only completed games render, and they never change
     def game_result(game_id):
         game = Game.query.get_or_404(game_id)
         if game.status != 'completed':
@@ -200,6 +216,28 @@ def register_routes(app):
 
         return jsonify({'success': True, 'status': 'completed' if is_paid else 'pending', 'payment_data': data})
 
+    @app.route('/events')
+    def events():
+        """Server-sent events for ?game=<id> and ?transaction=<tx_ref>, repeatable"""
+        channels = [game_channel(game_id) for game_id in request.args.getlist('game', type=int)]
+        channels += [transaction_channel(tx_ref) for tx_ref in request.args.getlist('transaction') if tx_ref]
+        channels = list(dict.fromkeys(channels))
+        if not channels or len(channels) > LIVE_MAX_CHANNELS:
+            return jsonify({'success': False,
+                            'message': f'Follow between 1 and {LIVE_MAX_CHANNELS} games or transactions'}), 400
+
+        subscription = BROKER.subscribe(channels)
+        if subscription is None:
+            return jsonify({'success': False, 'message': 'Too many live connections, try again later'}), 503, \
+                {'Retry-After': '30'}
+
+        last_event_id = request.headers.get('Last-Event-ID', default=0, type=int)
+        response = Response(BROKER.stream(subscription, last_event_id), mimetype='text/event-stream',
+                            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+        # Also covers a client that leaves before the stream starts
+        response.call_on_close(lambda: BROKER.unsubscribe(subscription))
+        return response
+
     @app.route('/payment/success')
     def payment_success():
         payment_id = request.args.get('payment_id', '')
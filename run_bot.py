@@ -3,6 +3,7 @@ import os
 import logging
 import random
 import string
+import secrets
 from datetime import datetime, timedelta
 import pytz
 import asyncio
@@ -22,8 +23,15 @@ from telegram.ext import (
 )
 from telegram.constants import ParseMode
 from dotenv import load_dotenv
+from werkzeug.security import generate_password_hash
 
 from app import create_app, init_db
+from config import BET_AMOUNT_DEFAULT
+from jobs import JobQueue
+from bot_persistence import SQLitePersistence, BOT_STATE_DB
+import metrics
+import sql_profiler
+from balances import credit
 from extensions import db
 from models import User, Room, RoomPlayer, Transaction
 
@@ -65,6 +73,8 @@ REGISTER_NAME, REGISTER_EMAIL, REGISTER_USERNAME, REGISTER_CONFIRM = range(4)
 # Configuration
 class Config:
     BOT_TOKEN = os.environ.get('BOT_TOKEN', 'YOUR_BOT_TOKEN_HERE')
+    # Bot API endpoint; point at a local fake server for load tests
+    API_URL = os.environ.get('TELEGRAM_API_URL', 'https://api.telegram.org/bot')
     DATABASE_URL = os.environ.get('DATABASE_URL', 'sqlite:///rps_game.db')
     ADMIN_IDS = json.loads(os.environ.get('ADMIN_IDS', '[]'))
     MAINTENANCE_MODE = os.environ.get('MAINTENANCE_MODE', 'false').lower() == 'true'
@@ -234,6 +244,8 @@ async def register_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE) -
                 username=context.user_data['username'],
                 email=context.user_data['email'],
                 full_name=context.user_data['name'],
+                # Telegram sign-ups have no web login; store an unusable password
+                password=generate_password_hash(secrets.token_urlsafe(32)),
                 balance=0.0,
                 created_at=datetime.utcnow()
             )
@@ -303,10 +315,12 @@ async def create_room(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
         room = Room(
             room_code=room_code,
             creator_id=user.id,
+            bet_amount=BET_AMOUNT_DEFAULT,
             status='waiting',
             created_at=datetime.utcnow()
         )
         db.session.add(room)
+        db.session.flush()
         
         # Add creator as first player
         player = RoomPlayer(
@@ -338,6 +352,7 @@ async def create_room(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
         )
 
     except Exception as e:
+        db.session.rollback()
         LOGGER.error(f"Error creating room: {e}")
         await update.message.reply_text(
             "Sorry, there was an error creating the room. Please try again later."
@@ -402,6 +417,7 @@ async def join_room(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         )
 
     except Exception as e:
+        db.session.rollback()
         LOGGER.error(f"Error joining room: {e}")
         await update.message.reply_text(
             "Sorry, there was an error joining the room. Please try again later."
@@ -513,7 +529,7 @@ async def verify_payment(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     
     try:
         # Extract transaction reference from callback data
-        tx_ref = query.data.split('_')[1]
+        tx_ref = query.data.split('_', 1)[1]
         
         # Get transaction
         transaction = Transaction.query.filter_by(tx_ref=tx_ref).first()
@@ -527,7 +543,7 @@ async def verify_payment(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         
         # Update user balance
         user = User.query.get(transaction.user_id)
-        user.balance += transaction.amount
+        credit(user.id, transaction.amount)
         
         db.session.commit()
         
@@ -550,6 +566,7 @@ async def verify_payment(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         )
             
     except Exception as e:
+        db.session.rollback()
         LOGGER.error(f"Error verifying payment: {str(e)}", exc_info=True)
         await query.edit_message_text(
             "❌ Error verifying payment. Please contact support."
@@ -608,6 +625,7 @@ async def handle_quick_deposit(update: Update, context: ContextTypes.DEFAULT_TYP
         )
 
     except Exception as e:
+        db.session.rollback()
         LOGGER.error(f"Error in quick deposit: {str(e)}", exc_info=True)
         await query.edit_message_text(
             "❌ An error occurred. Please try again later."
@@ -620,7 +638,7 @@ async def cancel_deposit(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     
     try:
         # Extract transaction reference from callback data
-        tx_ref = query.data.split('_')[1]
+        tx_ref = query.data.split('_', 1)[1]
         
         # Get transaction
         transaction = Transaction.query.filter_by(tx_ref=tx_ref).first()
@@ -644,86 +662,72 @@ async def cancel_deposit(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         )
             
     except Exception as e:
+        db.session.rollback()
         LOGGER.error(f"Error cancelling deposit: {str(e)}", exc_info=True)
         await query.edit_message_text(
             "❌ Error cancelling deposit. Please contact support."
         )
 
-async def show_game_animation(update: Update, context: ContextTypes.DEFAULT_TYPE, room: Room) -> None:
-    """Show animated game results"""
-    try:
-        # Get all players and their moves
-        players = RoomPlayer.query.filter_by(room_id=room.id).all()
-        moves = {}
-        for player in players:
-            moves[player.user_id] = player.move
-
-        # Create animation frames
-        frames = [
-            "🎮 Game in progress...",
-            "🎮 Game in progress... 🎲",
-            "🎮 Game in progress... 🎲 🎯",
-            "🎮 Game in progress... 🎲 🎯 🎪",
-            "🎮 Game in progress... 🎲 🎯 🎪 🎨",
-            "🎮 Game in progress... 🎲 🎯 🎪 🎨 🎭"
-        ]
-
-        # Send initial message
-        message = await update.callback_query.edit_message_text(
-            "🎮 *Game Results*\n\n"
-            "Calculating results...",
-            parse_mode='Markdown'
-        )
-
-        # Show animation
-        for frame in frames:
-            await message.edit_text(
-                f"🎮 *Game Results*\n\n{frame}",
-                parse_mode='Markdown'
-            )
-            await asyncio.sleep(0.5)
+# Frames played before the results are revealed
+GAME_FRAMES = [
+    "🎮 Game in progress...",
+    "🎮 Game in progress... 🎲",
+    "🎮 Game in progress... 🎲 🎯",
+    "🎮 Game in progress... 🎲 🎯 🎪",
+    "🎮 Game in progress... 🎲 🎯 🎪 🎨",
+    "🎮 Game in progress... 🎲 🎯 🎪 🎨 🎭"
+]
+CELEBRATIONS = ["🎉", "🎊", "🎈", "🎆", "🎇", "✨"]
+
+def game_result_text(players) -> str:
+    """Build the results text for a room whose players have all moved"""
+    moves = {player.user_id: player.move for player in players}
+    users = {user.id: user for user in User.query.filter(User.id.in_(list(moves))).all()}
+    results = calculate_game_results(moves)
+    
+    result_text = "🎮 *Game Results*\n\n"
+    for player_id, move in moves.items():
+        result_text += f"👤 {users[player_id].username}: {get_move_emoji(move)}\n"
+    
+    result_text += "\n"
+    for player_id, result in results.items():
+        username = users[player_id].username
+        if result == "win":
+            result_text += f"🏆 {username} wins!\n"
+        elif result == "lose":
+            result_text += f"😢 {username} loses\n"
+        else:
+            result_text += f"🤝 {username} draws\n"
+    return result_text
 
-        # Calculate results
-        results = calculate_game_results(moves)
-        
-        # Show results with animation
-        result_text = "🎮 *Game Results*\n\n"
-        for player_id, move in moves.items():
-            user = User.query.get(player_id)
-            result_text += f"👤 {user.username}: {get_move_emoji(move)}\n"
-        
-        result_text += "\n"
-        for player_id, result in results.items():
-            user = User.query.get(player_id)
-            if result == "win":
-                result_text += f"🏆 {user.username} wins!\n"
-            elif result == "lose":
-                result_text += f"😢 {user.username} loses\n"
-            else:
-                result_text += f"🤝 {user.username} draws\n"
-
-        # Show results with celebration animation
-        celebrations = ["🎉", "🎊", "🎈", "🎆", "🎇", "✨"]
-        for emoji in celebrations:
-            await message.edit_text(
-                f"{result_text}\n{emoji}",
-                parse_mode='Markdown'
-            )
-            await asyncio.sleep(0.3)
-
-        # Final result message
-        await message.edit_text(
-            f"{result_text}\n\n"
-            "Game completed! 🎮\n"
-            "Use /create_room to start a new game!",
-            parse_mode='Markdown'
-        )
+async def play_game_animation(bot, payload) -> None:
+    """Animate the results into the room message ('result_image' job)"""
+    chat_id, message_id = payload['chat_id'], payload['message_id']
+    result_text = payload['result_text']
+    
+    async def show(text):
+        await bot.edit_message_text(text, chat_id=chat_id, message_id=message_id, parse_mode='Markdown')
+    
+    await show("🎮 *Game Results*\n\nCalculating results...")
+    for frame in GAME_FRAMES:
+        await show(f"🎮 *Game Results*\n\n{frame}")
+        await asyncio.sleep(0.5)
+    
+    # Show results with celebration animation
+    for emoji in CELEBRATIONS:
+        await show(f"{result_text}\n{emoji}")
+        await asyncio.sleep(0.3)
+    
+    await show(
+        f"{result_text}\n\n"
+        "Game completed! 🎮\n"
+        "Use /create_room to start a new game!"
+    )
 
-    except Exception as e:
-        LOGGER.error(f"Error showing game animation: {str(e)}", exc_info=True)
-        await update.callback_query.edit_message_text(
-            "❌ Error showing game results. Please try again."
-        )
+# Deferred side effects of finished games (see jobs.py). Room games move no money and write no Game rows, so the animation is their only
+# slow side effect; rollups and referral progress follow Game settlement elsewhere
+JOBS = JobQueue('run_bot')
+JOBS.register('result_image', play_game_animation, concurrency=4)
 
 def get_move_emoji(move: str) -> str:
     """Get emoji for player's move"""
@@ -792,13 +796,20 @@ async def make_move(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         all_moved = all(p.move for p in room.players)
         
         if all_moved:
-            # Show game animation and results
-            await show_game_animation(update, context, room)
+            players = room.players.all()
+            result_text = game_result_text(players)
             
             # Reset room for next game
-            for p in room.players:
+            for p in players:
                 p.move = None
             db.session.commit()
+            
+            # The animation takes several seconds of message edits; run it from the job queue
+            JOBS.enqueue('result_image', {
+                'chat_id': query.message.chat_id,
+                'message_id': query.message.message_id,
+                'result_text': result_text
+            })
         else:
             # Show waiting message
             await query.edit_message_text(
@@ -808,6 +819,7 @@ async def make_move(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             )
             
     except Exception as e:
+        db.session.rollback()
         LOGGER.error(f"Error processing move: {str(e)}", exc_info=True)
         await query.edit_message_text(
             "❌ Error processing your move. Please try again."
@@ -915,10 +927,12 @@ async def handle_create_room_callback(update: Update, context: ContextTypes.DEFA
         room = Room(
             room_code=room_code,
             creator_id=user.id,
+            bet_amount=BET_AMOUNT_DEFAULT,
             status='waiting',
             created_at=datetime.utcnow()
         )
         db.session.add(room)
+        db.session.flush()
         
         # Add creator as first player
         player = RoomPlayer(
@@ -948,6 +962,7 @@ async def handle_create_room_callback(update: Update, context: ContextTypes.DEFA
             parse_mode=ParseMode.MARKDOWN
         )
     except Exception as e:
+        db.session.rollback()
         LOGGER.error(f"Error in create room callback: {str(e)}", exc_info=True)
         await query.edit_message_text(
             "❌ An error occurred. Please try again later."
@@ -1059,12 +1074,14 @@ async def handle_cancel_room_callback(update: Update, context: ContextTypes.DEFA
             
         room = Room.query.filter_by(room_code=room_code).first()
         if room and room.creator_id == user.id:
+            room.players.delete(synchronize_session=False)
             db.session.delete(room)
             db.session.commit()
             await query.edit_message_text("✅ Room cancelled successfully!")
         else:
             await query.edit_message_text("❌ You can't cancel this room!")
     except Exception as e:
+        db.session.rollback()
         LOGGER.error(f"Error in cancel room callback: {str(e)}", exc_info=True)
         await query.edit_message_text(
             "❌ An error occurred. Please try again later."
@@ -1093,7 +1110,14 @@ def main():
     Config.validate()
     
     # Create the Application
-    application = Application.builder().token(Config.BOT_TOKEN).build()
+    # Conversations and user_data survive restarts (see bot_persistence.py)
+    application = (
+        Application.builder()
+        .token(Config.BOT_TOKEN)
+        .base_url(Config.API_URL)
+        .persistence(SQLitePersistence(BOT_STATE_DB))
+        .build()
+    )
 
     # Add conversation handler for registration
     conv_handler = ConversationHandler(
@@ -1104,7 +1128,9 @@ def main():
             REGISTER_USERNAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, register_username)],
             REGISTER_CONFIRM: [CallbackQueryHandler(register_confirm, pattern='^confirm_|restart_')]
         },
-        fallbacks=[CommandHandler('cancel', cancel)]
+        fallbacks=[CommandHandler('cancel', cancel)],
+        name='registration',
+        persistent=True
     )
     application.add_handler(conv_handler)
 
@@ -1125,6 +1151,9 @@ def main():
     application.add_handler(CallbackQueryHandler(handle_quick_deposit, pattern='^quick_deposit_'))
     application.add_handler(CallbackQueryHandler(verify_payment, pattern='^verify_'))
     application.add_handler(CallbackQueryHandler(cancel_deposit, pattern='^cancel_'))
+    JOBS.attach(application)
+    metrics.instrument_application(application, 'run_bot')
+    sql_profiler.instrument_application(application, 'run_bot')
 
     # Start the Bot
     LOGGER.info("Starting bot...")
@@ -0,0 +1,570 @@
+"""
+Horizontal sharding of users and games over several SQLite files.
+
+A user lives on the shard picked by a hash of their id, and their
+transactions, withdrawal requests and cooldowns live with them. A game
+lives on its creator's shard together with its participants. Everything
+else (stats, referrals, tournaments, ...) stays on shard 0.
+
+Rows that live with a user or a game are numbered per shard so that
+``id % shard_count`` is the shard they are on, and a primary key lookup
+goes straight to one file; user ids come from a sequence in the
+coordinator database. Queries whose WHERE clause pins a shard key with
+``==`` or ``in_`` (``User.id``, ``Transaction.user_id``, ``Game.id``,
+``GameParticipant.game_id``, ...) run on the shards the keys map to;
+other queries run on every shard and the results are concatenated.
+Joins only see rows on the same shard.
+
+Joining or settling a game whose players live on other shards changes
+several files at once. TwoPhaseCommit does that: every shard applies its
+part and keeps its write lock (prepare), the decision is logged in the
+coordinator database, then every shard commits. recover(), run at
+startup, re-applies the parts of committed transactions that a crash
+kept from reaching their shard.
+
+    shards = ShardSet(SHARD_URLS, SHARD_COORDINATOR_URL)
+    shards.create_all()
+    games = ShardedGames(shards)
+    games.xact.recover()
+    with shards.session() as session:
+        session.add(User(...))
+        session.commit()
+    game_id = games.create_game(creator_id, 50)
+    games.join_game(game_id, user_id)
+
+The shard count is fixed when the files are created. Rows don't move
+when it changes, so ShardSet refuses to open files made for another count.
+
+Nothing in the app runs on this yet: the web app, the bot and the admin
+tools all use db.session on the one DATABASE_URL, and SHARD_URLS is read
+only here. ShardedGames carries the game flow, with RPSGame's rules, so
+the layout and TwoPhaseCommit can be exercised and load-tested; moving
+the other services onto a ShardSet is separate work.
+"""
+import json
+import logging
+import os
+import threading
+import uuid
+import zlib
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import (
+    Column, DateTime, Integer, MetaData, String, Table, Text,
+    create_engine, delete, event, insert, select, update
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, BooleanClauseList, Grouping
+
+from db_routing import enable_sqlite_wal
+from extensions import db
+from game import RPSGame
+from models import User, Transaction, WithdrawalRequest, Cooldown, Game, GameParticipant
+
+logger = logging.getLogger(__name__)
+
+SHARD_URLS = [url for url in os.getenv('SHARD_URLS', '').split(',') if url]
+SHARD_COORDINATOR_URL = os.getenv('SHARD_COORDINATOR_URL', 'sqlite:///shard_coordinator.db')
+GLOBAL_SHARD = '0'
+USER_ID_BLOCK = 100
+
+# Rows that live with a user, and the column holding the user's id
+USER_ROWS = {User: 'id', Transaction: 'user_id', WithdrawalRequest: 'user_id', Cooldown: 'user_id'}
+# Rows that live with a game; a game lives with its creator
+GAME_ROWS = (Game, GameParticipant)
+# Numbering order within a flush: a participant's shard comes from its game's id
+_NUMBERED = (Transaction, WithdrawalRequest, Cooldown, Game, GameParticipant)
+
+users = User.__table__
+games = Game.__table__
+participants = GameParticipant.__table__
+
+shard_metadata = MetaData()
+
+# Which shard of how many a file is, checked on every start
+shard_info = Table(
+    'shard_info', shard_metadata,
+    Column('shard_id', String(16), primary_key=True),
+    Column('shard_count', Integer, nullable=False),
+)
+shard_sequences = Table(
+    'shard_sequences', shard_metadata,
+    Column('name', String(64), primary_key=True),
+    Column('next_value', Integer, nullable=False),
+)
+# On every shard: two-phase transactions whose part the shard committed
+shard_xacts = Table(
+    'shard_xacts', shard_metadata,
+    Column('xid', String(32), primary_key=True),
+    Column('committed_at', DateTime, default=datetime.utcnow),
+)
+# On the coordinator: the decision log
+xact_log = Table(
+    'xact_log', shard_metadata,
+    Column('xid', String(32), primary_key=True),
+    Column('state', String(16), nullable=False),  # preparing, committed, aborted
+    Column('parts', Text, nullable=False),  # JSON {shard_id: [[op, params], ...]}
+    Column('created_at', DateTime, default=datetime.utcnow),
+)
+
+
+def reserve(conn, name, count=1):
+    """Take count consecutive values of a sequence in conn's transaction; returns the first"""
+    last = conn.execute(
+        update(shard_sequences)
+        .where(shard_sequences.c.name == name)
+        .values(next_value=shard_sequences.c.next_value + count)
+        .returning(shard_sequences.c.next_value)
+    ).scalar()
+    if last is None:
+        raise LookupError(f"No sequence {name!r}, run ShardSet.create_all() first")
+    return last - count
+
+
+def _conjuncts(clause):
+    """The terms of a WHERE clause that must all hold"""
+    if clause is None:
+        return []
+    if isinstance(clause, Grouping):
+        return _conjuncts(clause.element)
+    if isinstance(clause, BooleanClauseList) and clause.operator is operators.and_:
+        return [term for sub in clause.clauses for term in _conjuncts(sub)]
+    return [clause]
+
+
+def _pinned_values(term):
+    """(column, values) for ``column == value`` or ``column IN (values)``, else None"""
+    if not isinstance(term, BinaryExpression):
+        return None
+    left, right = term.left, term.right
+    if isinstance(left, BindParameter):
+        left, right = right, left
+    if not isinstance(right, BindParameter) or not hasattr(left, 'table'):
+        return None
+    value = right.effective_value
+    if value is None:
+        return None
+    if term.operator is operators.eq:
+        return left, [value]
+    if term.operator is operators.in_op:
+        return left, list(value)
+    return None
+
+
+def _key(obj, attr, relation=None):
+    value = getattr(obj, attr)
+    if value is None and relation is not None:
+        related = getattr(obj, relation)
+        value = related.id if related is not None else None
+    if value is None:
+        raise ValueError(f"{type(obj).__name__} has no {attr} to place it on a shard")
+    return value
+
+
+class ShardSet:
+    """The shard engines and the coordinator, with a session that routes over them"""
+
+    def __init__(self, urls, coordinator_url=SHARD_COORDINATOR_URL):
+        if not urls:
+            raise ValueError("No shard URLs configured (SHARD_URLS)")
+        options = {'connect_args': {'check_same_thread': False, 'timeout': 30}}
+        self.count = len(urls)
+        self.engines = {str(n): create_engine(url, **options) for n, url in enumerate(urls)}
+        self.coordinator = create_engine(coordinator_url, **options)
+        for engine in (*self.engines.values(), self.coordinator):
+            enable_sqlite_wal(engine)
+
+        # Shard key columns per model, and how a value maps to a shard
+        self._keys = {
+            User: {'id': self.shard_for_user},
+            Game: {'id': self.shard_for_id, 'creator_id': self.shard_for_user},
+            GameParticipant: {'id': self.shard_for_id, 'game_id': self.shard_for_id},
+        }
+        for model in (Transaction, WithdrawalRequest, Cooldown):
+            self._keys[model] = {'id': self.shard_for_id, 'user_id': self.shard_for_user}
+
+        self._user_ids = iter(())
+        self._user_ids_lock = threading.Lock()
+        self.Session = sessionmaker(
+            class_=ShardedSession,
+            shards=self.engines,
+            shard_chooser=self._shard_chooser,
+            identity_chooser=self._identity_chooser,
+            execute_chooser=self._execute_chooser,
+        )
+        event.listen(self.Session, 'before_flush', self._number_new_rows)
+
+    def session(self, **kwargs):
+        return self.Session(**kwargs)
+
+    def create_all(self):
+        """Create the model tables on every shard and the sequences and logs sharding needs"""
+        for shard_id, engine in self.engines.items():
+            db.metadata.create_all(engine)
+            shard_metadata.create_all(engine, tables=[shard_info, shard_sequences, shard_xacts])
+            self._init_file(engine, shard_id, [model.__tablename__ for model in _NUMBERED])
+        shard_metadata.create_all(self.coordinator, tables=[shard_info, shard_sequences, xact_log])
+        self._init_file(self.coordinator, 'coordinator', [User.__tablename__])
+
+    def _init_file(self, engine, shard_id, sequences):
+        with engine.begin() as conn:
+            info = conn.execute(select(shard_info.c.shard_id, shard_info.c.shard_count)).first()
+            if info is None:
+                conn.execute(insert(shard_info).values(shard_id=shard_id, shard_count=self.count))
+            elif tuple(info) != (shard_id, self.count):
+                raise RuntimeError(
+                    f"{engine.url} was created as shard {info.shard_id} of {info.shard_count}, "
+                    f"not {shard_id} of {self.count}"
+                )
+            existing = set(conn.execute(select(shard_sequences.c.name)).scalars())
+            missing = [{'name': name, 'next_value': 1} for name in sequences if name not in existing]
+            if missing:
+                conn.execute(insert(shard_sequences), missing)
+
+    def shard_for_user(self, user_id):
+        return str(zlib.crc32(str(user_id).encode()) % self.count)
+
+    def shard_for_id(self, row_id):
+        """Shard of a row numbered by this set (anything but a user)"""
+        return str(row_id % self.count)
+
+    def shard_for(self, obj):
+        model = type(obj)
+        if model in USER_ROWS:
+            return self.shard_for_user(_key(obj, USER_ROWS[model], None if model is User else 'user'))
+        if model is Game:
+            return self.shard_for_user(_key(obj, 'creator_id', 'creator'))
+        if model is GameParticipant:
+            return self.shard_for_id(_key(obj, 'game_id', 'game'))
+        return GLOBAL_SHARD
+
+    def number(self, conn, shard_id, table, count=1):
+        """Ids for count new rows of table on shard_id, reserved in conn's transaction"""
+        first = reserve(conn, table, count)
+        return [(first + n) * self.count + int(shard_id) for n in range(count)]
+
+    def next_user_id(self):
+        with self._user_ids_lock:
+            user_id = next(self._user_ids, None)
+            if user_id is None:
+                with self.coordinator.begin() as conn:
+                    first = reserve(conn, User.__tablename__, USER_ID_BLOCK)
+                self._user_ids = iter(range(first, first + USER_ID_BLOCK))
+                user_id = next(self._user_ids)
+            return user_id
+
+    def _number_new_rows(self, session, flush_context, instances):
+        """Give new rows their ids before the flush: the id (or the user's) decides the shard"""
+        new = defaultdict(list)
+        for obj in session.new:
+            if (type(obj) in USER_ROWS or type(obj) in GAME_ROWS) and obj.id is None:
+                new[type(obj)].append(obj)
+        for user in new[User]:
+            user.id = self.next_user_id()
+        for model in _NUMBERED:
+            by_shard = defaultdict(list)
+            for obj in new[model]:
+                by_shard[self.shard_for(obj)].append(obj)
+            for shard_id, objs in by_shard.items():
+                conn = session.connection(bind_arguments={'shard_id': shard_id})
+                for obj, row_id in zip(objs, self.number(conn, shard_id, model.__tablename__, len(objs))):
+                    obj.id = row_id
+
+    def _shard_chooser(self, mapper, instance, clause=None):
+        if instance is None:
+            return GLOBAL_SHARD
+        return self.shard_for(instance)
+
+    def _identity_chooser(self, mapper, primary_key, *, lazy_loaded_from, execution_options,
+                          bind_arguments, **kw):
+        model = mapper.class_
+        if model is User:
+            return [self.shard_for_user(primary_key[0])]
+        if model in self._keys:
+            return [self.shard_for_id(primary_key[0])]
+        return [GLOBAL_SHARD]
+
+    def _execute_chooser(self, orm_context):
+        mapper = orm_context.bind_mapper
+        keys = self._keys.get(mapper.class_) if mapper is not None else None
+        if keys is None:
+            return [GLOBAL_SHARD]
+        table = mapper.local_table
+        shards = None
+        for term in _conjuncts(getattr(orm_context.statement, 'whereclause', None)):
+            pinned = _pinned_values(term)
+            if pinned is None:
+                continue
+            column, values = pinned
+            if column.table is not table and getattr(column.table, 'name', None) != table.name:
+                continue
+            to_shard = keys.get(column.key)
+            if to_shard is not None:
+                found = {to_shard(value) for value in values}
+                shards = found if shards is None else shards & found
+        if shards is None:
+            return list(self.engines)
+        return sorted(shards) or [GLOBAL_SHARD]
+
+
+def _mark(conn, xid):
+    """Record that conn's shard committed its part of xid; False if it already had"""
+    dialect = conn.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        dialect_insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        return conn.execute(dialect_insert(shard_xacts).on_conflict_do_nothing().values(xid=xid)).rowcount == 1
+    if conn.execute(select(shard_xacts.c.xid).where(shard_xacts.c.xid == xid)).first():
+        return False
+    conn.execute(insert(shard_xacts).values(xid=xid))
+    return True
+
+
+class TwoPhaseCommit:
+    """Apply changes to several shards atomically.
+
+    A transaction is a dict of shard id to a list of (op, params). ops maps
+    op names to ``fn(conn, shard_id, params, redo)``: the function makes its
+    change on conn and returns False to vote no. With redo=True it is
+    replaying a committed transaction during recover() and must apply the
+    change without checking anything. Params are stored as JSON.
+    """
+
+    def __init__(self, shards, ops):
+        self.shards = shards
+        self.ops = ops
+
+    def run(self, parts):
+        """Apply every part or none; True when committed"""
+        parts = {shard_id: [[op, params] for op, params in ops] for shard_id, ops in parts.items() if ops}
+        if len(parts) == 1:
+            [(shard_id, ops)] = parts.items()
+            return self._run_local(shard_id, ops)
+
+        xid = uuid.uuid4().hex
+        with self.shards.coordinator.begin() as log:
+            log.execute(insert(xact_log).values(xid=xid, state='preparing', parts=json.dumps(parts)))
+
+        prepared = []
+        decided = False
+        try:
+            # Shards are always locked in the same order, so two coordinators can't wait on each other
+            for shard_id in sorted(parts):
+                conn = self.shards.engines[shard_id].connect()
+                prepared.append(conn)
+                # The marker goes first: it takes the shard's write lock before any check reads
+                conn.execute(insert(shard_xacts).values(xid=xid))
+                if not self._apply(conn, shard_id, parts[shard_id], redo=False):
+                    break
+            else:
+                self._decide(xid, 'committed')
+                decided = True
+        finally:
+            if not decided:
+                for conn in prepared:
+                    conn.rollback()
+                    conn.close()
+                self._decide(xid, 'aborted')
+        if not decided:
+            return False
+
+        # Past the decision a failed commit is repaired by recover(), not undone
+        for conn in prepared:
+            try:
+                conn.commit()
+            except Exception as e:
+                logger.error(f"Shard commit of {xid} failed, recover() will redo it: {e}")
+            finally:
+                conn.close()
+        with self.shards.coordinator.begin() as log:
+            log.execute(delete(xact_log).where(xact_log.c.xid == xid))
+        return True
+
+    def _run_local(self, shard_id, ops):
+        with self.shards.engines[shard_id].connect() as conn:
+            if self._apply(conn, shard_id, ops, redo=False):
+                conn.commit()
+                return True
+            conn.rollback()
+            return False
+
+    def _apply(self, conn, shard_id, ops, redo):
+        return all(self.ops[op](conn, shard_id, params, redo) for op, params in ops)
+
+    def _decide(self, xid, state):
+        with self.shards.coordinator.begin() as log:
+            log.execute(update(xact_log).where(xact_log.c.xid == xid).values(state=state))
+
+    def recover(self):
+        """Finish what a crash interrupted; returns how many shard parts were redone.
+
+        Undecided transactions never committed anywhere and are aborted.
+        Committed ones are re-applied on every shard without their marker.
+        Run it before the coordinators start.
+        """
+        with self.shards.coordinator.connect() as log:
+            pending = log.execute(
+                select(xact_log.c.xid, xact_log.c.state, xact_log.c.parts)
+                .where(xact_log.c.state.in_(('preparing', 'committed')))
+            ).all()
+
+        redone = 0
+        for xid, state, parts in pending:
+            if state == 'committed':
+                for shard_id, ops in json.loads(parts).items():
+                    with self.shards.engines[shard_id].begin() as conn:
+                        if _mark(conn, xid):
+                            self._apply(conn, shard_id, ops, redo=True)
+                            redone += 1
+            with self.shards.coordinator.begin() as log:
+                if state == 'committed':
+                    log.execute(delete(xact_log).where(xact_log.c.xid == xid))
+                else:
+                    log.execute(update(xact_log).where(xact_log.c.xid == xid).values(state='aborted'))
+        if pending:
+            logger.info(f"Recovered {len(pending)} two-phase transactions, {redone} shard parts redone")
+        return redone
+
+
+class ShardedGames:
+    """RPSGame's create/join/move/settle flow over a ShardSet.
+
+    Creating a game and making a move touch one shard. Joining debits the
+    player on their shard and seats them on the game's; settling updates
+    the game and pays every player on theirs, by RPSGame.outcomes. When those are different
+    shards the change goes through TwoPhaseCommit.
+    """
+
+    def __init__(self, shards):
+        self.shards = shards
+        self.xact = TwoPhaseCommit(shards, self.ops)
+
+    @property
+    def ops(self):
+        return {'debit': self._debit, 'seat': self._seat, 'finish': self._finish, 'pay': self._pay}
+
+    def create_game(self, creator_id, bet_amount, max_players=3):
+        """Take the creator's bet and open a game on their shard; the game id, or None if they can't pay"""
+        shard_id = self.shards.shard_for_user(creator_id)
+        with self.shards.session() as session:
+            conn = session.connection(bind_arguments={'shard_id': shard_id})
+            if not self._debit(conn, shard_id, {'user_id': creator_id, 'amount': float(bet_amount)}, False):
+                session.rollback()
+                return None
+            game = Game(creator_id=creator_id, bet_amount=bet_amount, status='waiting',
+                        min_players=max_players, max_players=max_players)
+            session.add(game)
+            session.add(GameParticipant(game=game, user_id=creator_id))
+            session.flush()
+            game_id = game.id
+            session.commit()
+        return game_id
+
+    def join_game(self, game_id, user_id):
+        """Take the bet and seat the user; False if they can't pay or the game isn't open"""
+        game_shard = self.shards.shard_for_id(game_id)
+        with self.shards.engines[game_shard].connect() as conn:
+            bet_amount = conn.execute(select(games.c.bet_amount).where(games.c.id == game_id)).scalar()
+        if bet_amount is None:
+            return False
+        parts = defaultdict(list)
+        parts[self.shards.shard_for_user(user_id)].append(('debit', {'user_id': user_id, 'amount': float(bet_amount)}))
+        parts[game_shard].append(('seat', {'game_id': game_id, 'user_id': user_id}))
+        return self.xact.run(parts)
+
+    def make_move(self, game_id, user_id, move):
+        """Record a move; the last one settles the game"""
+        if move not in ('rock', 'paper', 'scissors'):
+            return False
+        with self.shards.engines[self.shards.shard_for_id(game_id)].begin() as conn:
+            in_progress = select(games.c.status).where(games.c.id == game_id).scalar_subquery() == 'in_progress'
+            recorded = conn.execute(
+                update(participants)
+                .where(participants.c.game_id == game_id, participants.c.user_id == user_id,
+                       participants.c.move.is_(None), in_progress)
+                .values(move=move)
+            ).rowcount
+        if not recorded:
+            return False
+        self.settle(game_id)
+        return True
+
+    def settle(self, game_id):
+        """Settle a game whose players have all moved; False if it isn't ready or was settled already"""
+        with self.shards.engines[self.shards.shard_for_id(game_id)].connect() as conn:
+            game = conn.execute(select(games.c.status, games.c.bet_amount).where(games.c.id == game_id)).first()
+            moves = conn.execute(
+                select(participants.c.user_id, participants.c.move).where(participants.c.game_id == game_id)
+            ).all()
+        if game is None or game.status != 'in_progress' or not all(move for _, move in moves):
+            return False
+
+        winner_id, outcomes = RPSGame.outcomes(moves, game.bet_amount)
+        parts = defaultdict(list)
+        for user_id, result, payout in outcomes:
+            parts[self.shards.shard_for_user(user_id)].append(
+                ('pay', {'user_id': user_id, 'payout': payout, 'result': result})
+            )
+        results = [[user_id, result] for user_id, result, _ in outcomes]
+        parts[self.shards.shard_for_id(game_id)].insert(
+            0, ('finish', {'game_id': game_id, 'winner_id': winner_id, 'results': results})
+        )
+        return self.xact.run(parts)
+
+    @staticmethod
+    def _debit(conn, shard_id, params, redo):
+        amount = params['amount']
+        stmt = update(users).where(users.c.id == params['user_id']).values(balance=users.c.balance - amount)
+        if not redo:
+            stmt = stmt.where(users.c.balance >= amount)
+        return conn.execute(stmt).rowcount == 1
+
+    def _seat(self, conn, shard_id, params, redo):
+        game_id, user_id = params['game_id'], params['user_id']
+        game = conn.execute(select(games.c.status, games.c.max_players).where(games.c.id == game_id)).first()
+        seated = conn.execute(
+            select(participants.c.user_id).where(participants.c.game_id == game_id)
+        ).scalars().all()
+        if not redo and (game is None or game.status != 'waiting' or user_id in seated
+                         or len(seated) >= game.max_players):
+            return False
+        [participant_id] = self.shards.number(conn, shard_id, participants.name)
+        conn.execute(insert(participants).values(
+            id=participant_id, game_id=game_id, user_id=user_id, created_at=datetime.utcnow()
+        ))
+        if len(seated) + 1 >= game.max_players:
+            conn.execute(update(games).where(games.c.id == game_id).values(status='in_progress'))
+        return True
+
+    @staticmethod
+    def _finish(conn, shard_id, params, redo):
+        game_id = params['game_id']
+        stmt = update(games).where(games.c.id == game_id).values(
+            status='completed', winner_id=params['winner_id'], completed_at=datetime.utcnow()
+        )
+        if not redo:
+            stmt = stmt.where(games.c.status == 'in_progress')
+        if conn.execute(stmt).rowcount != 1 and not redo:
+            return False
+        for user_id, result in params['results']:
+            conn.execute(
+                update(participants)
+                .where(participants.c.game_id == game_id, participants.c.user_id == user_id)
+                .values(result=result)
+            )
+        return True
+
+    @staticmethod
+    def _pay(conn, shard_id, params, redo):
+        result = params['result']
+        done = conn.execute(
+            update(users).where(users.c.id == params['user_id']).values(
+                balance=users.c.balance + params['payout'],
+                wins=users.c.wins + (1 if result == 'win' else 0),
+                losses=users.c.losses + (1 if result == 'lose' else 0),
+            )
+        ).rowcount
+        return done == 1 or redo
@@ -0,0 +1,243 @@
+"""
+Per-request SQL profiler with N+1 detection, for development and CI.
+
+Statements are grouped by normalized shape (literals and parameters
+replaced by ``?``) for each Flask request or Telegram update. A shape
+that repeats at least ``threshold`` times in one unit is flagged as a
+likely N+1 and logged with the code that issued it. Every statement is
+also added to a folded-stack profile (``unit;caller;...;shape
+microseconds``) that flamegraph.pl and speedscope render as a flame
+graph.
+
+Enable with SQL_PROFILE=true (or app.config['SQL_PROFILE']); set
+SQL_PROFILE_OUTPUT to write the folded stacks on exit.
+"""
+import atexit
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD = int(os.getenv('SQL_PROFILE_THRESHOLD', '5'))
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NAMED_PARAM = re.compile(r"%\(\w+\)s|(?<![:\w]):\w+|\$\d+|%s")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_VALUES_LIST = re.compile(r"(VALUES\s*\([?,\s]+\))(?:\s*,\s*\([?,\s]+\))+", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+
+_current = ContextVar('sql_profile', default=None)
+
+
+def normalize(statement):
+    """Reduce a statement to its shape so repeats with different values group together"""
+    shape = _STRING.sub('?', statement)
+    shape = _NAMED_PARAM.sub('?', shape)
+    shape = _NUMBER.sub('?', shape)
+    shape = _SPACE.sub(' ', shape).strip()
+    shape = _VALUES_LIST.sub(r'\1, ...', shape)
+    return _IN_LIST.sub('(?, ...)', shape)
+
+
+def _caller_stack(limit=12):
+    """Repo frames (outermost first) that led to the statement, as 'file:function'"""
+    frames = []
+    frame = sys._getframe(2)
+    while frame is not None and len(frames) < limit:
+        path = frame.f_code.co_filename
+        if path.startswith(REPO_DIR) and 'site-packages' not in path and path != __file__:
+            relative = os.path.relpath(path, REPO_DIR)
+            frames.append(f"{relative}:{frame.f_code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    frames.reverse()
+    return tuple(frames)
+
+
+class ShapeStats:
+    """How often one statement shape ran in a unit, and from where"""
+    __slots__ = ('count', 'seconds', 'callers')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.callers = Counter()
+
+
+class QueryProfile:
+    """Statements run while handling one Flask request or Telegram update"""
+
+    def __init__(self, name, capture_stacks=True):
+        self.name = name
+        self.capture_stacks = capture_stacks
+        self.shapes = {}
+        self.folded = Counter()
+        self.queries = 0
+        self.seconds = 0.0
+
+    def record(self, statement, seconds, stack=()):
+        shape = normalize(statement)
+        stats = self.shapes.get(shape)
+        if stats is None:
+            stats = self.shapes[shape] = ShapeStats()
+        stats.count += 1
+        stats.seconds += seconds
+        stats.callers[stack] += 1
+        self.queries += 1
+        self.seconds += seconds
+        self.folded[(self.name,) + stack + (shape,)] += max(1, int(seconds * 1_000_000))
+
+    def repeated(self, threshold=DEFAULT_THRESHOLD):
+        """Shapes run at least threshold times, most frequent first"""
+        hits = [(shape, stats) for shape, stats in self.shapes.items() if stats.count >= threshold]
+        return sorted(hits, key=lambda item: item[1].count, reverse=True)
+
+    def format(self, threshold=DEFAULT_THRESHOLD, top=5):
+        lines = [f"{self.name}: {self.queries} queries in {self.seconds * 1000:.1f}ms"]
+        for shape, stats in self.repeated(threshold)[:top]:
+            lines.append(f"  N+1? {stats.count}x {stats.seconds * 1000:.1f}ms  {shape[:160]}")
+            stack, _ = stats.callers.most_common(1)[0]
+            if stack:
+                lines.append(f"        from {stack[-1]}")
+        return '\n'.join(lines)
+
+
+def _fold_line(frames, value):
+    # Folded-stack format separates frames with ';', so keep them out of SQL
+    return ';'.join(frame.replace(';', ',') for frame in frames) + f" {value}"
+
+
+class SQLProfiler:
+    """Profiles statements per unit of work and collects folded stacks"""
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, capture_stacks=True):
+        self.threshold = threshold
+        self.capture_stacks = capture_stacks
+        self.folded = Counter()
+        self.flagged = []
+        self._lock = threading.Lock()
+        self._installed = False
+
+    def install(self):
+        """Hook every SQLAlchemy engine (idempotent)"""
+        if self._installed:
+            return self
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        self._installed = True
+        return self
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        profile = _current.get()
+        if profile is None:
+            return
+        stack = _caller_stack() if profile.capture_stacks else ()
+        conn.info['sql_profile_started'] = (time.perf_counter(), stack)
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop('sql_profile_started', None)
+        profile = _current.get()
+        if started is None or profile is None:
+            return
+        start, stack = started
+        profile.record(statement, time.perf_counter() - start, stack)
+
+    @contextmanager
+    def profile(self, name):
+        """Profile the statements run inside the block as one unit"""
+        profile = QueryProfile(name, self.capture_stacks)
+        token = _current.set(profile)
+        try:
+            yield profile
+        finally:
+            _current.reset(token)
+            self._finish(profile)
+
+    def _finish(self, profile):
+        repeated = profile.repeated(self.threshold)
+        with self._lock:
+            self.folded.update(profile.folded)
+            if repeated:
+                self.flagged.append(profile.name)
+        if repeated:
+            logger.warning(f"Repeated query shapes (possible N+1)\n{profile.format(self.threshold)}")
+
+    def folded_lines(self):
+        with self._lock:
+            items = sorted(self.folded.items())
+        return [_fold_line(frames, value) for frames, value in items]
+
+    def write_flamegraph(self, path):
+        """Write the folded stacks collected so far (flamegraph.pl / speedscope input)"""
+        lines = self.folded_lines()
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines) + ('\n' if lines else ''))
+        logger.info(f"Wrote {len(lines)} SQL stacks to {path}")
+
+
+PROFILER = None
+
+
+def enable(threshold=DEFAULT_THRESHOLD, output=None):
+    """Create and install the process-wide profiler (idempotent)"""
+    global PROFILER
+    if PROFILER is None:
+        PROFILER = SQLProfiler(threshold).install()
+        output = output or os.getenv('SQL_PROFILE_OUTPUT')
+        if output:
+            atexit.register(PROFILER.write_flamegraph, output)
+    return PROFILER
+
+
+def _env_enabled():
+    return os.getenv('SQL_PROFILE', 'false').lower() == 'true'
+
+
+def init_app(app):
+    """Profile each Flask request when app.config['SQL_PROFILE'] (or SQL_PROFILE) is set"""
+    if not app.config.get('SQL_PROFILE', _env_enabled()):
+        return
+    from flask import g, request
+
+    profiler = enable(app.config.get('SQL_PROFILE_THRESHOLD', DEFAULT_THRESHOLD))
+
+    @app.before_request
+    def _sql_profile_start():
+        g._sql_profile = profiler.profile(f"{request.method} {request.url_rule or request.path}")
+        g._sql_profile.__enter__()
+
+    @app.teardown_request
+    def _sql_profile_finish(exc):
+        unit = g.pop('_sql_profile', None)
+        if unit is not None:
+            unit.__exit__(None, None, None)
+
+
+def instrument_application(application, bot):
+    """Profile each Telegram update per handler when SQL_PROFILE is set"""
+    if not _env_enabled():
+        return application
+    from metrics import wrap_handlers
+
+    profiler = enable()
+
+    def wrap(callback, label):
+        @wraps(callback)
+        async def wrapper(update, context):
+            with profiler.profile(f"{bot} {label}"):
+                return await callback(update, context)
+        return wrapper
+
+    wrap_handlers(application, wrap)
+    return application
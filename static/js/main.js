@@ -27,8 +27,58 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Initialize any charts if they exist on the page
     initializeCharts();
+    
+    // Follow live games and payments shown on the page
+    setupLiveUpdates();
 });
 
+/**
+ * Follow the games and transactions on the page over server-sent events.
+ * Elements with data-live-game="<id>" or data-live-transaction="<tx_ref>"
+ * get their [data-live-status] text updated, and a 'live:update' event
+ * with the event data is dispatched on them for page-specific handling.
+ */
+function setupLiveUpdates() {
+    const elements = document.querySelectorAll('[data-live-game], [data-live-transaction]');
+    if (elements.length === 0 || !window.EventSource) return;
+    
+    const params = new URLSearchParams();
+    const targets = {};
+    elements.forEach(element => {
+        const channel = element.dataset.liveGame
+            ? `game:${element.dataset.liveGame}`
+            : `transaction:${element.dataset.liveTransaction}`;
+        if (!targets[channel]) {
+            targets[channel] = [];
+            if (element.dataset.liveGame) {
+                params.append('game', element.dataset.liveGame);
+            } else {
+                params.append('transaction', element.dataset.liveTransaction);
+            }
+        }
+        targets[channel].push(element);
+    });
+    
+    // EventSource reconnects on its own and resumes from the last event id
+    const source = new EventSource(`/events?${params.toString()}`);
+    ['joined', 'move', 'status'].forEach(name => {
+        source.addEventListener(name, function(event) {
+            const data = JSON.parse(event.data);
+            (targets[data.channel] || []).forEach(element => {
+                if (name === 'status') {
+                    element.querySelectorAll('[data-live-status]').forEach(status => {
+                        status.textContent = data.status.charAt(0).toUpperCase() + data.status.slice(1);
+                    });
+                }
+                element.dispatchEvent(new CustomEvent('live:update', {detail: {type: name, ...data}}));
+            });
+        });
+    });
+    
+    // Close the stream when leaving the page rather than waiting for the server to notice
+    window.addEventListener('pagehide', () => source.close());
+}
+
 /**
  * Set up withdrawal approval/rejection handling
  */
@@ -0,0 +1,320 @@
+"""Incremental daily and hourly stats rollups"""
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import event, func, inspect, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+import metrics
+from extensions import db
+from models import User, Game, GameParticipant, Transaction, DailyStats, HourlyStats, DailyActiveUser
+
+logger = logging.getLogger(__name__)
+
+# Counters shared by DailyStats and HourlyStats
+ROLLUP_COUNTERS = (
+    'total_games', 'total_players', 'total_volume', 'house_earnings', 'new_users',
+    'games_created', 'total_bets', 'deposit_volume', 'withdrawal_volume'
+)
+
+
+def day_start(ts):
+    """Truncate a timestamp to the start of its day"""
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def hour_start(ts):
+    """Truncate a timestamp to the start of its hour"""
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def _event_time(value):
+    """Use a stored timestamp if it is loaded, otherwise now"""
+    return value if isinstance(value, datetime) else datetime.utcnow()
+
+
+def _upsert_counters(connection, model, key_name, key, deltas):
+    """Add deltas to the rollup row for key, creating it if needed"""
+    table = model.__table__
+    dialect = connection.dialect.name
+
+    if dialect in ('sqlite', 'postgresql'):
+        dialect_insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = dialect_insert(table).values({key_name: key, **deltas})
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c[key_name]],
+            set_={name: func.coalesce(table.c[name], 0) + stmt.excluded[name] for name in deltas}
+        )
+        connection.execute(stmt)
+        return
+
+    result = connection.execute(
+        update(table)
+        .where(table.c[key_name] == key)
+        .values({name: func.coalesce(table.c[name], 0) + delta for name, delta in deltas.items()})
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(table).values({key_name: key, **deltas}))
+
+
+def _mark_active(connection, day, user_ids):
+    """Record users as active on a day and return how many were new"""
+    if not user_ids:
+        return 0
+    table = DailyActiveUser.__table__
+    rows = [{'date': day, 'user_id': user_id} for user_id in user_ids]
+    dialect = connection.dialect.name
+
+    if dialect in ('sqlite', 'postgresql'):
+        dialect_insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        return connection.execute(dialect_insert(table).on_conflict_do_nothing(), rows).rowcount
+
+    existing = set(connection.execute(
+        select(table.c.user_id).where(table.c.date == day, table.c.user_id.in_(user_ids))
+    ).scalars())
+    new_rows = [row for row in rows if row['user_id'] not in existing]
+    if new_rows:
+        connection.execute(insert(table), new_rows)
+    return len(new_rows)
+
+
+class RollupBatch:
+    """Accumulates rollup deltas in memory and applies them in one pass"""
+
+    def __init__(self):
+        self.daily = defaultdict(lambda: defaultdict(int))
+        self.hourly = defaultdict(lambda: defaultdict(int))
+        self.active = defaultdict(set)
+
+    def _add(self, ts, **deltas):
+        day, hour = day_start(ts), hour_start(ts)
+        for name, value in deltas.items():
+            self.daily[day][name] += value
+            self.hourly[hour][name] += value
+
+    def game_created(self, ts, bet_amount):
+        self._add(ts, games_created=1, total_bets=Decimal(str(bet_amount or 0)))
+
+    def game_settled(self, ts, bet_amount, user_ids):
+        # Settlement pays the whole pot to the winner (or back on a draw), so a game earns the house nothing
+        stakes = Decimal(str(bet_amount or 0)) * len(user_ids)
+        self._add(ts, total_games=1, total_players=len(user_ids), total_volume=stakes)
+        self.active[day_start(ts)].update(user_ids)
+
+    def transaction_completed(self, ts, tx_type, amount):
+        amount = abs(Decimal(str(amount or 0)))
+        if tx_type == 'deposit':
+            self._add(ts, deposit_volume=amount)
+        elif tx_type in ('withdrawal', 'withdraw'):
+            self._add(ts, withdrawal_volume=amount)
+
+    def user_created(self, ts):
+        self._add(ts, new_users=1)
+
+    def __bool__(self):
+        return bool(self.daily or self.active)
+
+    def apply(self, connection):
+        """Write all accumulated deltas through the given connection"""
+        for day in set(self.daily) | set(self.active):
+            deltas = dict(self.daily.get(day, {}))
+            new_active = _mark_active(connection, day, sorted(self.active.get(day, ())))
+            if new_active:
+                deltas['active_users'] = new_active
+            if deltas:
+                _upsert_counters(connection, DailyStats, 'date', day, deltas)
+
+        for hour, deltas in self.hourly.items():
+            _upsert_counters(connection, HourlyStats, 'hour', hour, dict(deltas))
+
+
+def _status_changed_to(obj, status):
+    """Check whether this flush moves obj.status to the given value"""
+    history = inspect(obj).attrs.status.history
+    return status in (history.added or ())
+
+
+def _collect_flush(session):
+    """Turn the pending flush into rollup deltas"""
+    batch = RollupBatch()
+    settled = []
+
+    for obj in session.new:
+        if isinstance(obj, User):
+            if not obj.is_bot:
+                batch.user_created(_event_time(obj.created_at))
+        elif isinstance(obj, Game):
+            batch.game_created(_event_time(obj.created_at), obj.bet_amount)
+            if obj.status == 'completed':
+                settled.append(obj)
+        elif isinstance(obj, Transaction) and obj.status == 'completed':
+            batch.transaction_completed(_event_time(obj.completed_at), obj.type, obj.amount)
+
+    for obj in session.dirty:
+        if isinstance(obj, Game) and _status_changed_to(obj, 'completed'):
+            settled.append(obj)
+        elif isinstance(obj, Transaction) and _status_changed_to(obj, 'completed'):
+            batch.transaction_completed(_event_time(obj.completed_at), obj.type, obj.amount)
+
+    if settled:
+        metrics.GAMES_SETTLED.inc(len(settled))
+        connection = session.connection()
+        participants = defaultdict(list)
+        rows = connection.execute(
+            select(GameParticipant.game_id, GameParticipant.user_id)
+            .join(User, User.id == GameParticipant.user_id)
+            .where(GameParticipant.game_id.in_([g.id for g in settled]), User.is_bot.is_(False))
+        )
+        for game_id, user_id in rows:
+            participants[game_id].append(user_id)
+        for game in settled:
+            batch.game_settled(_event_time(game.completed_at), game.bet_amount, participants[game.id])
+
+    return batch
+
+
+def _after_flush(session, flush_context):
+    """Apply rollup deltas in the same transaction as the flush"""
+    try:
+        batch = _collect_flush(session)
+        if batch:
+            connection = session.connection()
+            with connection.begin_nested():
+                batch.apply(connection)
+    except Exception as e:
+        # Rollups must never break a game or payment commit; backfill repairs drift
+        logger.error(f"Error updating stats rollups: {e}")
+
+
+def register_rollup_listeners(session=None):
+    """Keep rollups updated on every flush of the given session (db.session by default)"""
+    session = session or db.session
+    if not event.contains(session, 'after_flush', _after_flush):
+        event.listen(session, 'after_flush', _after_flush)
+
+
+class StatsRollup:
+    """Read and rebuild the precomputed stats rollups"""
+
+    @staticmethod
+    def day(date=None):
+        """Get the rollup for a day (today by default), or an empty one"""
+        day = day_start(date or datetime.utcnow())
+        return DailyStats.query.filter_by(date=day).first() or DailyStats(
+            date=day, **{name: 0 for name in ROLLUP_COUNTERS + ('active_users',)}
+        )
+
+    @staticmethod
+    def totals():
+        """All-time totals, summed over one row per day"""
+        row = db.session.query(
+            *[func.coalesce(func.sum(getattr(DailyStats, name)), 0) for name in ROLLUP_COUNTERS]
+        ).one()
+        return dict(zip(ROLLUP_COUNTERS, row))
+
+    @staticmethod
+    def last_hours(hours=24):
+        """Totals over the trailing window, summed over one row per hour"""
+        since = hour_start(datetime.utcnow()) - timedelta(hours=hours - 1)
+        row = db.session.query(
+            *[func.coalesce(func.sum(getattr(HourlyStats, name)), 0) for name in ROLLUP_COUNTERS]
+        ).filter(HourlyStats.hour >= since).one()
+        return dict(zip(ROLLUP_COUNTERS, row))
+
+    @staticmethod
+    def backfill(start=None, end=None, chunk_days=31, progress=None):
+        """Rebuild rollups from the raw tables for [start, end), one chunk of days at a time.
+
+        Rows are streamed with yield_per so memory stays bounded by the chunk,
+        not by the table. Returns the number of days rebuilt.
+        """
+        if start is None:
+            first = db.session.query(func.min(User.created_at)).scalar()
+            start = first or datetime.utcnow()
+        if end is None:
+            end = datetime.utcnow() + timedelta(days=1)
+        start, end = day_start(start), day_start(end)
+
+        days = 0
+        chunk_start = start
+        while chunk_start < end:
+            chunk_end = min(chunk_start + timedelta(days=chunk_days), end)
+            StatsRollup._backfill_chunk(chunk_start, chunk_end)
+            days += (chunk_end - chunk_start).days
+            if progress:
+                progress(chunk_start, chunk_end)
+            chunk_start = chunk_end
+
+        logger.info(f"Backfilled stats rollups for {days} days")
+        return days
+
+    @staticmethod
+    def backfill_if_empty(progress=None):
+        """Backfill everything when the rollups are empty but the raw tables are not.
+
+        hourly_stats is checked because it is new with the rollups, while an old
+        database may already have daily_stats rows. Returns the days rebuilt.
+        """
+        if db.session.query(HourlyStats.id).first() is not None:
+            return 0
+        if db.session.query(User.id).first() is None and db.session.query(Game.id).first() is None:
+            return 0
+        return StatsRollup.backfill(progress=progress)
+
+    @staticmethod
+    def _backfill_chunk(start, end):
+        """Recompute one chunk of days and replace its rollup rows"""
+        batch = RollupBatch()
+
+        for (created_at,) in db.session.execute(
+            select(User.created_at).where(User.created_at >= start, User.created_at < end, User.is_bot.is_(False))
+            .execution_options(yield_per=10000)
+        ):
+            batch.user_created(created_at)
+
+        for created_at, bet_amount in db.session.execute(
+            select(Game.created_at, Game.bet_amount).where(Game.created_at >= start, Game.created_at < end)
+            .execution_options(yield_per=10000)
+        ):
+            batch.game_created(created_at, bet_amount)
+
+        current, players = None, []
+        for game_id, completed_at, bet_amount, user_id in db.session.execute(
+            select(Game.id, Game.completed_at, Game.bet_amount, GameParticipant.user_id)
+            .join(GameParticipant, GameParticipant.game_id == Game.id)
+            .join(User, User.id == GameParticipant.user_id)
+            .where(Game.status == 'completed', Game.completed_at >= start, Game.completed_at < end,
+                   User.is_bot.is_(False))
+            .order_by(Game.id)
+            .execution_options(yield_per=10000)
+        ):
+            if current is not None and current[0] != game_id:
+                batch.game_settled(current[1], current[2], players)
+                players = []
+            current = (game_id, completed_at, bet_amount)
+            players.append(user_id)
+        if current is not None:
+            batch.game_settled(current[1], current[2], players)
+
+        completed_at = func.coalesce(Transaction.completed_at, Transaction.created_at)
+        for ts, tx_type, amount in db.session.execute(
+            select(completed_at, Transaction.type, Transaction.amount)
+            .where(Transaction.status == 'completed', completed_at >= start, completed_at < end)
+            .execution_options(yield_per=10000)
+        ):
+            batch.transaction_completed(ts, tx_type, amount)
+
+        try:
+            db.session.execute(DailyActiveUser.__table__.delete().where(
+                DailyActiveUser.date >= start, DailyActiveUser.date < end))
+            db.session.execute(DailyStats.__table__.delete().where(
+                DailyStats.date >= start, DailyStats.date < end))
+            db.session.execute(HourlyStats.__table__.delete().where(
+                HourlyStats.hour >= start, HourlyStats.hour < end))
+            batch.apply(db.session.connection())
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
@@ -10,16 +10,16 @@ from telegram.ext import (
 )
 from datetime import datetime
 import os
-import asyncio
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 import json
+import secrets
 import pytz
 from typing import Optional, List, Dict, Any
-import random
 import time
 
-from app import db
-from models import User, Game, GameParticipant, Transaction, WithdrawalRequest
+from app import app as flask_app, db
+from balances import debit, credit
+from models import User, Game, GameParticipant, Transaction, WithdrawalRequest, Tournament
 from utils import (
     get_user_by_telegram_id,
     format_currency,
@@ -30,7 +30,16 @@ from utils import (
     get_leaderboard,
     validate_username
 )
-from admin import AdminService
+from admin import AdminService, BulkOperations
+from admin.bulk import parse_adjustments
+from game_status import CACHE as game_status_cache
+from jobs import JobQueue, send_notification
+from referrals import ReferralService, payout_job
+from game import RPSGame
+from tournaments import TournamentService
+from ai_opponents import SIMULATOR
+import metrics
+import sql_profiler
 from config import (
     BOT_TOKEN,
     ADMIN_USERS,
@@ -39,7 +48,11 @@ from config import (
     MIN_DEPOSIT_AMOUNT,
     MAX_DEPOSIT_AMOUNT,
     MIN_WITHDRAW_AMOUNT,
-    MAX_WITHDRAW_AMOUNT
+    MAX_WITHDRAW_AMOUNT,
+    REFERRAL_BONUS_AMOUNT,
+    REFERRAL_MIN_GAMES,
+    REFERRAL_PAYOUT_INTERVAL,
+    BANNED_MESSAGE
 )
 
 # Platform fee percentage for game winnings
@@ -56,7 +69,10 @@ async def create_account(update: Update, context: CallbackContext) -> None:
         LOGGER.info(f"Account creation request from Telegram ID: {telegram_id}, Username: {telegram_username}")
     
         # Check if user already exists
-        existing_user = get_user_by_telegram_id(telegram_id)
+        existing_user = get_user_by_telegram_id(telegram_id, include_banned=True)
+        if existing_user and existing_user.is_banned:
+            await update.message.reply_text(f"🚫 {BANNED_MESSAGE}")
+            return
         if existing_user:
             await update.message.reply_text(
                 "❌ You already have an account.\n"
@@ -124,6 +140,16 @@ async def create_account(update: Update, context: CallbackContext) -> None:
             )
             
             db.session.add(user)
+            db.session.flush()
+
+            # Optional second argument: who invited this user
+            if len(context.args or []) > 1:
+                referrer = User.query.filter_by(username=context.args[1].lstrip('@')).first()
+                if referrer:
+                    ReferralService.record(referrer.id, user.id)
+                else:
+                    LOGGER.info(f"Unknown referrer '{context.args[1]}' for {username}")
+
             db.session.commit()
             
             # Create welcome bonus transaction
@@ -168,7 +194,10 @@ async def start(update: Update, context: CallbackContext) -> None:
     """Send a welcome message when the command /start is issued."""
     try:
         telegram_id = update.effective_user.id
-        user = get_user_by_telegram_id(telegram_id)
+        user = get_user_by_telegram_id(telegram_id, include_banned=True)
+        if user and user.is_banned:
+            await update.message.reply_text(f"🚫 {BANNED_MESSAGE}")
+            return
         
         if user:
             # User exists - show main menu
@@ -520,13 +549,20 @@ async def admin_user(update: Update, context: CallbackContext):
     await update.message.reply_text(message, parse_mode='Markdown')
 
 async def admin_adjust(update: Update, context: CallbackContext):
-    """Adjust a user's balance (admin only)"""
+    """Adjust a user's balance, or many from a replied-to CSV file (admin only)"""
     if not await is_admin(update, context):
         return
     
+    replied = update.message.reply_to_message
+    if replied and replied.document:
+        await admin_adjust_csv(update, context, replied.document)
+        return
+    
     if len(context.args) < 3:
         await update.message.reply_text(
-            "Usage: /admin_adjust <user_id> <amount> <reason>"
+            "Usage: /admin_adjust <user_id> <amount> <reason>\n"
+            "Or reply to a CSV file (telegram_id,amount[,reason]) with "
+            "/admin_adjust <reason> [dry]"
         )
         return
     
@@ -546,28 +582,58 @@ async def admin_adjust(update: Update, context: CallbackContext):
     else:
         await update.message.reply_text("Failed to adjust balance")
 
+async def admin_adjust_csv(update: Update, context: CallbackContext, document):
+    """Apply a CSV of balance adjustments; 'dry' in the arguments only reports"""
+    args = list(context.args or [])
+    dry_run = 'dry' in args
+    reason = ' '.join(arg for arg in args if arg != 'dry') or 'bulk adjustment'
+    
+    try:
+        file = await document.get_file()
+        data = await file.download_as_bytearray()
+        key, rows = parse_adjustments(data.decode('utf-8-sig').splitlines())
+    except (UnicodeDecodeError, ValueError) as e:
+        await update.message.reply_text(f"Invalid CSV: {e}")
+        return
+    
+    result = BulkOperations.adjust_balances(rows, key=key, reason=reason, dry_run=dry_run)
+    
+    message = result.summary()
+    if result.errors:
+        message += "\n\nSkipped:\n" + "\n".join(result.errors[:20])
+        if len(result.errors) > 20:
+            message += f"\n... and {len(result.errors) - 20} more"
+    await update.message.reply_text(message)
+
 async def admin_withdrawals(update: Update, context: CallbackContext):
     """List pending withdrawal requests (admin only)"""
     if not await is_admin(update, context):
         return
     
-    withdrawals = AdminService.get_pending_withdrawals()
+    cursor = context.args[0] if context.args else None
+    try:
+        withdrawals = AdminService.get_pending_withdrawals(cursor, limit=10)
+    except ValueError:
+        await update.message.reply_text("Invalid page cursor")
+        return
+    
     if not withdrawals:
         await update.message.reply_text("No pending withdrawals")
         return
     
     message = "⏳ *Pending Withdrawals*\n\n"
     for w in withdrawals:
-        user = User.query.get(w.user_id)
         message += (
             f"*Request #{w.id}*\n"
-            f"User: @{user.username}\n"
+            f"User: @{w.user.username if w.user else 'unknown'}\n"
             f"Amount: ETB {float(w.amount):,.2f}\n"
-            f"Bank: {w.bank_name}\n"
-            f"Account: {w.account_number}\n"
+            f"Wallet: {w.wallet_address}\n"
             f"Requested: {w.created_at.strftime('%Y-%m-%d %H:%M:%S')}\n\n"
         )
     
+    if withdrawals.has_more:
+        message += f"More: `/admin_withdrawals {withdrawals.next_cursor}`"
+    
     await update.message.reply_text(message, parse_mode='Markdown')
 
 async def admin_cancel_game(update: Update, context: CallbackContext):
@@ -646,20 +712,14 @@ def register_admin_handlers(application: Application):
     application.add_handler(CommandHandler('admin_cancel_game', admin_cancel_game))
     application.add_handler(CommandHandler('admin_toggle', admin_toggle))
 
-async def send_battle_animation(context, chat_id, moves_data):
-    """Send battle animation to a chat."""
-    try:
-        # Get the appropriate animation based on moves
-        animation_path = get_rps_animation(moves_data)
-        
-        with open(animation_path, 'rb') as animation:
-            await context.bot.send_animation(
-                chat_id=chat_id,
-                animation=animation,
-                caption="🎥 Simulating Battle..."
-            )
-    except Exception as e:
-        LOGGER.error(f"Error sending battle animation: {e}")
+async def send_battle_animation(bot, payload):
+    """Send battle animation to a chat ('result_image' job, retried on failure)."""
+    with open(payload['animation'], 'rb') as animation:
+        await bot.send_animation(
+            chat_id=payload['chat_id'],
+            animation=animation,
+            caption="🎥 Simulating Battle..."
+        )
 
 def get_rps_animation(moves_data):
     """Get the appropriate animation file based on moves."""
@@ -680,6 +740,13 @@ def get_rps_animation(moves_data):
     
     return animations.get(moves_key, 'static/animations/rps-battle-default.gif')
 
+# Deferred side effects of settled games (see jobs.py)
+JOBS = JobQueue('telegram_bot_v13')
+JOBS.register('notify', send_notification, concurrency=8)
+JOBS.register('result_image', send_battle_animation, concurrency=4)
+JOBS.register('referral_credit', payout_job(flask_app), concurrency=1, max_attempts=1)
+JOBS.every('referral_credit', REFERRAL_PAYOUT_INTERVAL)
+
 @cooldown()
 def wallet(update: Update, context: CallbackContext) -> None:
     """Handle wallet command - shows different options for users and admins."""
@@ -741,6 +808,12 @@ async def button_callback(update: Update, context: CallbackContext) -> None:
     await query.answer()
     
     try:
+        # Banned users get nothing from the buttons of messages sent before the ban
+        user = get_user_by_telegram_id(query.from_user.id, include_banned=True)
+        if user and user.is_banned:
+            await query.message.edit_text(f"🚫 {BANNED_MESSAGE}")
+            return
+        
         # Admin panel handling
         if query.data == "admin_panel":
             user = get_user_by_telegram_id(query.from_user.id)
@@ -874,6 +947,38 @@ async def button_callback(update: Update, context: CallbackContext) -> None:
                 parse_mode='Markdown'
             )
         
+        elif query.data.startswith("sim_"):
+            # Practice game against the AI pool, settled in one transaction. The bet comes
+            # from /simulate's user_data, never from the callback data the client sends
+            _, nonce, move = query.data.split("_")
+            pending = context.user_data.pop('simulation', None)
+            if not pending or pending[0] != nonce:
+                await query.message.edit_text("⌛ This practice game has expired. Use /simulate to start a new one.")
+                return
+            user = get_user_by_telegram_id(query.from_user.id)
+            result = SIMULATOR.play(user.id, pending[1], move)
+            
+            if result is None:
+                await query.message.edit_text("❌ Insufficient balance. Use /deposit to add funds.")
+                return
+            
+            move_emojis = {"rock": "🪨", "paper": "🧻", "scissors": "✂️"}
+            moves_summary = "\n".join(
+                [f"{move_emojis[move]} You chose {move.title()}"] +
+                [f"{move_emojis[ai_move]} {name} chose {ai_move.title()}" for name, ai_move in result.opponents]
+            )
+            outcome = {
+                'win': f"🎉 You won ETB {float(result.payout):,.2f}!",
+                'lose': f"😢 You lost ETB {float(result.bet_amount):,.2f}.",
+                'draw': "🤝 It's a draw! Your bet has been refunded."
+            }[result.result]
+            
+            await query.message.edit_text(
+                f"🎮 *Practice Game Result*\n\n{moves_summary}\n\n{outcome}\n\n"
+                f"💰 Balance: ETB {float(get_user_by_telegram_id(query.from_user.id).balance):,.2f}",
+                parse_mode='Markdown'
+            )
+        
         elif query.data.startswith("move_"):
             # Handle game moves
             _, game_id, move = query.data.split("_")
@@ -920,7 +1025,8 @@ async def button_callback(update: Update, context: CallbackContext) -> None:
             if moves_made == 3:
                 # All players have moved - determine winner
                 moves = {p.user_id: p.move for p in all_participants}
-                usernames = {p.user_id: User.query.get(p.user_id).username for p in all_participants}
+                players = {u.id: u for u in User.query.filter(User.id.in_(list(moves))).all()}
+                usernames = {uid: u.username for uid, u in players.items()}
                 
                 # Get unique moves
                 unique_moves = set(moves.values())
@@ -931,13 +1037,7 @@ async def button_callback(update: Update, context: CallbackContext) -> None:
                     for uid, move in moves.items()
                 )
                 
-                # Send battle animation to all participants
-                for p in all_participants:
-                    user_id = User.query.get(p.user_id).telegram_id
-                    await send_battle_animation(context, user_id, moves)
-                
-                # Calculate results after a short delay for animation
-                await asyncio.sleep(2)  # Wait for animation to play
+                bet_amount = float(game.bet_amount)
                 
                 if len(unique_moves) == 1:
                     # It's a tie - refund everyone
@@ -947,16 +1047,15 @@ async def button_callback(update: Update, context: CallbackContext) -> None:
                     )
                     
                     for p in all_participants:
-                        user = User.query.get(p.user_id)
-                        user.balance += game.bet_amount
+                        credit(p.user_id, bet_amount)
                         
                         # Create refund transaction
                         transaction = Transaction(
                             user_id=p.user_id,
-                            amount=game.bet_amount,
-                            transaction_type='game_refund',
+                            amount=bet_amount,
+                            type='game_refund',
                             status='completed',
-                            reference_id=f'tie_refund_{game_id}',
+                            tx_ref=f'tie_refund_{game_id}_{p.user_id}',
                             created_at=datetime.utcnow(),
                             completed_at=datetime.utcnow()
                         )
@@ -970,16 +1069,15 @@ async def button_callback(update: Update, context: CallbackContext) -> None:
                     )
                     
                     for p in all_participants:
-                        user = User.query.get(p.user_id)
-                        user.balance += game.bet_amount
+                        credit(p.user_id, bet_amount)
                         
                         # Create refund transaction
                         transaction = Transaction(
                             user_id=p.user_id,
-                            amount=game.bet_amount,
-                            transaction_type='game_refund',
+                            amount=bet_amount,
+                            type='game_refund',
                             status='completed',
-                            reference_id=f'tie_refund_{game_id}',
+                            tx_ref=f'tie_refund_{game_id}_{p.user_id}',
                             created_at=datetime.utcnow(),
                             completed_at=datetime.utcnow()
                         )
@@ -988,7 +1086,7 @@ async def button_callback(update: Update, context: CallbackContext) -> None:
                 else:
                     # Determine winner based on moves
                     winners = []
-                    total_pot = game.bet_amount * 3
+                    total_pot = bet_amount * 3
                     win_reason = ""
                     
                     if 'rock' in unique_moves and 'scissors' in unique_moves:
@@ -1006,15 +1104,14 @@ async def button_callback(update: Update, context: CallbackContext) -> None:
                     
                     # Update balances and create transactions
                     for winner_id in winners:
-                        winner = User.query.get(winner_id)
-                        winner.balance += winnings_per_player
+                        credit(winner_id, winnings_per_player)
                         
                         transaction = Transaction(
                             user_id=winner_id,
                             amount=winnings_per_player,
-                            transaction_type='game_win',
+                            type='game_win',
                             status='completed',
-                            reference_id=f'win_{game_id}',
+                            tx_ref=f'win_{game_id}_{winner_id}',
                             created_at=datetime.utcnow(),
                             completed_at=datetime.utcnow()
                         )
@@ -1038,11 +1135,14 @@ async def button_callback(update: Update, context: CallbackContext) -> None:
                     f"{result_message}"
                 )
                 
-                for p in all_participants:
-                    context.bot.send_message(
-                        User.query.get(p.user_id).telegram_id,
-                        final_message
-                    )
+                # Animations and results go out from the job queue so the callback returns now;
+                # results are delayed so they land after the animation
+                animation = get_rps_animation(moves)
+                for player in players.values():
+                    if not player.telegram_id:
+                        continue
+                    JOBS.enqueue('result_image', {'chat_id': player.telegram_id, 'animation': animation})
+                    JOBS.enqueue('notify', {'chat_id': player.telegram_id, 'text': final_message}, delay=2)
         
         elif query.data == "create_account":
             # Show username input instructions
@@ -1149,6 +1249,12 @@ def join_game(update: Update, context: CallbackContext) -> None:
                     update.message.reply_text("❌ You are already in this game.")
                     return
             
+            # Deduct bet amount: one conditional UPDATE, so a concurrent bet can't spend it too
+            if not debit(user.id, bet_amount):
+                db.session.rollback()
+                update.message.reply_text("❌ Insufficient balance. Use /deposit to add funds.")
+                return
+            
             # Add user to game
             participant = GameParticipant(
                 game_id=waiting_game.id,
@@ -1157,9 +1263,6 @@ def join_game(update: Update, context: CallbackContext) -> None:
                 joined_at=datetime.utcnow()
             )
             
-            # Deduct bet amount
-            user.balance -= bet_amount
-            
             db.session.add(participant)
             db.session.commit()
             
@@ -1217,6 +1320,12 @@ def join_game(update: Update, context: CallbackContext) -> None:
                     )
         
         else:
+            # Deduct bet amount first: one conditional UPDATE, so a concurrent bet can't spend it too
+            if not debit(user.id, bet_amount):
+                db.session.rollback()
+                update.message.reply_text("❌ Insufficient balance. Use /deposit to add funds.")
+                return
+            
             # Create new game
             game = Game(
                 bet_amount=bet_amount,
@@ -1225,7 +1334,7 @@ def join_game(update: Update, context: CallbackContext) -> None:
                 created_by=user.id
             )
             db.session.add(game)
-            db.session.commit()
+            db.session.flush()
             
             # Add creator as first participant
             participant = GameParticipant(
@@ -1235,9 +1344,6 @@ def join_game(update: Update, context: CallbackContext) -> None:
                 joined_at=datetime.utcnow()
             )
             
-            # Deduct bet amount
-            user.balance -= bet_amount
-            
             db.session.add(participant)
             db.session.commit()
             
@@ -1265,35 +1371,31 @@ async def game_status(update: Update, context: CallbackContext) -> None:
         telegram_id = update.effective_user.id
         user = get_user_by_telegram_id(telegram_id)
         
-        # Find active game participation
-        participant = GameParticipant.query.join(Game).filter(
-            GameParticipant.user_id == user.id,
-            Game.status.in_(['waiting', 'active'])
-        ).first()
+        # One joined query (or none when cached) for the game, players and moves
+        game = game_status_cache.get_active(user.id, ('waiting', 'active'))
         
-        if not participant:
+        if not game:
             await update.message.reply_text(
                 "❌ You are not in any active game.\n"
                 "Use /join_game to start or join a game!"
             )
             return
         
-        game = participant.game
-        all_participants = GameParticipant.query.filter_by(game_id=game.id).all()
+        participant = game.player(user.id)
+        all_participants = game.players
         
         # Format participant list
         participant_list = []
         for p in all_participants:
-            p_user = User.query.get(p.user_id)
             status = "✅" if p.move else "⏳"
-            participant_list.append(f"{status} @{p_user.username}")
+            participant_list.append(f"{status} @{p.username}")
         
         participants_text = "\n".join(participant_list)
         
         if game.status == 'waiting':
             message = (
-                f"🎮 *Game #{game.id} Status*\n\n"
-                f"💰 Bet amount: ETB {float(game.bet_amount):,.2f}\n\n"
+                f"🎮 *Game #{game.game_id} Status*\n\n"
+                f"💰 Bet amount: ETB {game.bet_amount:,.2f}\n\n"
                 f"👥 Current players ({len(all_participants)}/3):\n"
                 f"{participants_text}\n\n"
                 f"Waiting for {3 - len(all_participants)} more players..."
@@ -1302,8 +1404,8 @@ async def game_status(update: Update, context: CallbackContext) -> None:
             # Show game status with moves
             moves_made = sum(1 for p in all_participants if p.move)
             message = (
-                f"🎮 *Game #{game.id} Status*\n\n"
-                f"💰 Bet amount: ETB {float(game.bet_amount):,.2f}\n\n"
+                f"🎮 *Game #{game.game_id} Status*\n\n"
+                f"💰 Bet amount: ETB {game.bet_amount:,.2f}\n\n"
                 f"👥 Players ({moves_made}/3 moved):\n"
                 f"{participants_text}\n\n"
             )
@@ -1311,9 +1413,9 @@ async def game_status(update: Update, context: CallbackContext) -> None:
             # If user hasn't moved yet, show move buttons
             if not participant.move:
                 keyboard = [[
-                    InlineKeyboardButton("🪨 Rock", callback_data=f"move_{game.id}_rock"),
-                    InlineKeyboardButton("🧻 Paper", callback_data=f"move_{game.id}_paper"),
-                    InlineKeyboardButton("✂️ Scissors", callback_data=f"move_{game.id}_scissors")
+                    InlineKeyboardButton("🪨 Rock", callback_data=f"move_{game.game_id}_rock"),
+                    InlineKeyboardButton("🧻 Paper", callback_data=f"move_{game.game_id}_paper"),
+                    InlineKeyboardButton("✂️ Scissors", callback_data=f"move_{game.game_id}_scissors")
                 ]]
                 reply_markup = InlineKeyboardMarkup(keyboard)
                 
@@ -1341,30 +1443,21 @@ async def simulate_rps(update: Update, context: CallbackContext) -> None:
         telegram_id = update.effective_user.id
         user = get_user_by_telegram_id(telegram_id)
         
-        # Check if user is already in a game
-        active_game = GameParticipant.query.filter_by(
-            user_id=user.id,
-            status='active'
-        ).first()
-        
-        if active_game:
-            await update.message.reply_text(
-                "❌ You are already in an active game.\n"
-                "Use /game_status to check your current game."
-            )
-            return
-        
         # Get or set bet amount
         bet_amount = BET_AMOUNT_DEFAULT
         if context.args:
             try:
-                bet_amount = float(context.args[0])
-                if bet_amount <= 0:
+                bet_amount = Decimal(context.args[0])
+                if not bet_amount.is_finite() or bet_amount <= 0:
                     await update.message.reply_text("❌ Bet amount must be greater than 0 ETB.")
                     return
-            except ValueError:
+            except InvalidOperation:
                 await update.message.reply_text("❌ Invalid bet amount. Please enter a valid number.")
                 return
+        valid, message = RPSGame.validate_bet_amount(bet_amount)
+        if not valid:
+            await update.message.reply_text(f"❌ {message}.")
+            return
         
         # Check user balance
         if user.balance < bet_amount:
@@ -1376,109 +1469,23 @@ async def simulate_rps(update: Update, context: CallbackContext) -> None:
             )
             return
         
-        # Create AI players
-        ai_names = ["🤖 AI-Alpha", "🤖 AI-Beta"]
-        ai_users = []
-        
-        for ai_name in ai_names:
-            ai_user = User(
-                telegram_id=random.randint(1000000, 9999999),
-                username=ai_name,
-                balance=1000000,  # Large balance for AI
-                is_admin=False,
-                created_at=datetime.utcnow(),
-                last_active=datetime.utcnow()
-            )
-            db.session.add(ai_user)
-            ai_users.append(ai_user)
-        
-        try:
-            db.session.commit()
-        except Exception as e:
-            LOGGER.error(f"Error creating AI users: {e}")
-            db.session.rollback()
-            await update.message.reply_text("❌ Error creating game. Please try again.")
-            return
-        
-        # Create game
-        game = Game(
-            bet_amount=bet_amount,
-            status='active',  # Start immediately
-            created_at=datetime.utcnow(),
-            created_by=user.id
-        )
-        db.session.add(game)
-        
-        try:
-            db.session.commit()
-        except Exception as e:
-            LOGGER.error(f"Error creating game: {e}")
-            db.session.rollback()
-            await update.message.reply_text("❌ Error creating game. Please try again.")
-            return
-        
-        # Add participants (user and AI)
-        participants = []
-        
-        # Add human player
-        human = GameParticipant(
-            game_id=game.id,
-            user_id=user.id,
-            status='active',
-            joined_at=datetime.utcnow()
-        )
-        participants.append(human)
-        
-        # Deduct bet amount from human
-        user.balance -= bet_amount
-        
-        # Add AI players
-        for ai_user in ai_users:
-            ai_participant = GameParticipant(
-                game_id=game.id,
-                user_id=ai_user.id,
-                status='active',
-                joined_at=datetime.utcnow(),
-                # AI makes move immediately
-                move=random.choice(['rock', 'paper', 'scissors']),
-                move_time=datetime.utcnow()
-            )
-            participants.append(ai_participant)
-        
-        # Add all participants
-        for participant in participants:
-            db.session.add(participant)
-        
-        try:
-            db.session.commit()
-        except Exception as e:
-            LOGGER.error(f"Error adding participants: {e}")
-            db.session.rollback()
-            # Refund human player
-            user.balance += bet_amount
-            db.session.commit()
-            await update.message.reply_text("❌ Error creating game. Please try again.")
-            return
-        
-        # Create keyboard for moves
+        # Opponents come from the AI pool and nothing is written until the move is made.
+        # The buttons carry a one-use nonce; the bet stays here, where the client can't change it
+        nonce = secrets.token_hex(4)
+        context.user_data['simulation'] = (nonce, bet_amount)
         keyboard = [[
-            InlineKeyboardButton("🪨 Rock", callback_data=f"move_{game.id}_rock"),
-            InlineKeyboardButton("🧻 Paper", callback_data=f"move_{game.id}_paper"),
-            InlineKeyboardButton("✂️ Scissors", callback_data=f"move_{game.id}_scissors")
+            InlineKeyboardButton("🪨 Rock", callback_data=f"sim_{nonce}_rock"),
+            InlineKeyboardButton("🧻 Paper", callback_data=f"sim_{nonce}_paper"),
+            InlineKeyboardButton("✂️ Scissors", callback_data=f"sim_{nonce}_scissors")
         ]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        # Format participant list
-        participant_list = "\n".join(
-            f"{'✅' if p.move else '⏳'} @{User.query.get(p.user_id).username}"
-            for p in participants
-        )
-        
+        opponents = "\n".join(f"⏳ {name}" for name in SIMULATOR.pool.bots().values())
         await update.message.reply_text(
-            f"🎮 *Game #{game.id} Created!*\n\n"
-            f"💰 Bet amount: ETB {bet_amount:,.2f}\n\n"
-            f"👥 Players:\n{participant_list}\n\n"
-            "Make your move!",
+            f"🎮 *Practice Game vs AI*\n\n"
+            f"💰 Bet amount: ETB {float(bet_amount):,.2f}\n\n"
+            f"🤖 AI pool:\n{opponents}\n\n"
+            f"{SIMULATOR.opponents} of them will take a seat. Make your move!",
             reply_markup=reply_markup,
             parse_mode='Markdown'
         )
@@ -1532,6 +1539,136 @@ async def leaderboard(update: Update, context: CallbackContext) -> None:
         LOGGER.error(f"Error showing leaderboard: {e}")
         await update.message.reply_text("❌ An error occurred. Please try again later.")
 
+@cooldown()
+async def referrals(update: Update, context: CallbackContext) -> None:
+    """Show referral progress and bonuses earned."""
+    if not user_exists(update):
+        return
+
+    try:
+        user = get_user_by_telegram_id(update.effective_user.id)
+        summary = ReferralService.summary(user.id)
+
+        message = (
+            f"🤝 *Referrals*\n\n"
+            f"Invite friends with: `/create_account <name> {user.username}`\n"
+            f"You earn ETB {REFERRAL_BONUS_AMOUNT:,.2f} once they deposit and play {REFERRAL_MIN_GAMES} games.\n\n"
+            f"👥 Invited: {summary['total_referrals']}\n"
+            f"✅ Qualified: {summary['qualified_referrals']}\n"
+            f"💸 Paid: {summary['paid_referrals']}\n"
+            f"💰 Earned: ETB {summary['total_earned']:,.2f}\n"
+            f"⏳ Pending: ETB {summary['pending_bonus']:,.2f}\n"
+        )
+
+        if summary['recent']:
+            message += "\n*Recent:*\n"
+            for referral in summary['recent']:
+                state = "Paid 💸" if referral['paid'] else "Qualified ✅" if referral['qualified'] else f"{referral['games_played']}/{REFERRAL_MIN_GAMES} games"
+                message += f"• @{referral['username']}: {state}\n"
+
+        await update.message.reply_text(message, parse_mode='Markdown')
+
+    except Exception as e:
+        LOGGER.error(f"Error showing referrals: {e}")
+        await update.message.reply_text("❌ An error occurred. Please try again later.")
+
+async def tournament(update: Update, context: CallbackContext) -> None:
+    """List tournaments open for registration, or show one's standings and your table."""
+    if not user_exists(update):
+        return
+
+    try:
+        user = get_user_by_telegram_id(update.effective_user.id)
+        if not context.args:
+            open_tournaments = Tournament.query.filter(
+                Tournament.status.in_(('registering', 'running'))
+            ).order_by(Tournament.id.desc()).limit(10).all()
+            if not open_tournaments:
+                await update.message.reply_text("🏆 No tournaments right now. Check back later!")
+                return
+            message = "🏆 *Tournaments*\n\n"
+            for t in open_tournaments:
+                message += (
+                    f"#{t.id} {t.name}: ETB {float(t.buy_in):,.2f} buy-in, "
+                    f"{t.entrant_count} players, {t.status}\n"
+                )
+            message += "\nJoin with `/tournament_join <id>`"
+            await update.message.reply_text(message, parse_mode='Markdown')
+            return
+
+        tournament_id = int(context.args[0])
+        t = db.session.get(Tournament, tournament_id)
+        if not t:
+            await update.message.reply_text("❌ Tournament not found.")
+            return
+
+        message = f"🏆 *{t.name}* ({t.status}, round {t.current_round})\n\n"
+        for n, standing in enumerate(TournamentService.standings(tournament_id)[:20], 1):
+            state = f"out in round {standing['eliminated_round']}" if standing['eliminated_round'] else "playing"
+            prize = f", won ETB {standing['prize']:,.2f}" if standing['prize'] else ""
+            message += f"{n}. @{standing['username']}: {state}{prize}\n"
+        table = TournamentService.current_table(tournament_id, user.id)
+        if table:
+            message += f"\nYour table is ready: `/tournament_move {tournament_id} rock|paper|scissors`"
+        await update.message.reply_text(message, parse_mode='Markdown')
+
+    except ValueError:
+        await update.message.reply_text("❌ Usage: /tournament [id]")
+    except Exception as e:
+        LOGGER.error(f"Error showing tournament: {e}")
+        await update.message.reply_text("❌ An error occurred. Please try again later.")
+
+@cooldown()
+async def tournament_join(update: Update, context: CallbackContext) -> None:
+    """Pay the buy-in and register for a tournament."""
+    if not user_exists(update):
+        return
+
+    try:
+        tournament_id = int(context.args[0])
+    except (IndexError, ValueError):
+        await update.message.reply_text("❌ Usage: /tournament_join <id>")
+        return
+
+    try:
+        user = get_user_by_telegram_id(update.effective_user.id)
+        entry, message = TournamentService.register(tournament_id, user.id)
+        if entry:
+            message = f"✅ You are registered for tournament #{tournament_id}. Good luck!"
+        else:
+            message = f"❌ {message}"
+        await update.message.reply_text(message)
+    except Exception as e:
+        LOGGER.error(f"Error registering for tournament: {e}")
+        await update.message.reply_text("❌ An error occurred. Please try again later.")
+
+async def tournament_move(update: Update, context: CallbackContext) -> None:
+    """Play your move at your current tournament table."""
+    if not user_exists(update):
+        return
+
+    try:
+        tournament_id = int(context.args[0])
+        move = context.args[1].lower()
+    except (IndexError, ValueError):
+        await update.message.reply_text("❌ Usage: /tournament_move <id> rock|paper|scissors")
+        return
+
+    try:
+        user = get_user_by_telegram_id(update.effective_user.id)
+        table = TournamentService.current_table(tournament_id, user.id)
+        if not table:
+            await update.message.reply_text("⏳ You have no open table in this tournament right now.")
+        elif RPSGame.make_choice(table.id, user.id, move):
+            await update.message.reply_text(
+                f"✅ You played {move}. Check `/tournament {tournament_id}` for the result.", parse_mode='Markdown'
+            )
+        else:
+            await update.message.reply_text("❌ That move can't be played (already moved, or not rock, paper or scissors).")
+    except Exception as e:
+        LOGGER.error(f"Error playing tournament move: {e}")
+        await update.message.reply_text("❌ An error occurred. Please try again later.")
+
 @cooldown()
 async def profile(update: Update, context: CallbackContext) -> None:
     """Show user profile and stats."""
@@ -1695,6 +1832,10 @@ def main():
         application.add_handler(CommandHandler("join_game", join_game))
         application.add_handler(CommandHandler("simulate", simulate_rps))
         application.add_handler(CommandHandler("profile", profile))
+        application.add_handler(CommandHandler("referrals", referrals))
+        application.add_handler(CommandHandler("tournament", tournament))
+        application.add_handler(CommandHandler("tournament_join", tournament_join))
+        application.add_handler(CommandHandler("tournament_move", tournament_move))
         application.add_handler(CommandHandler("leaderboard", leaderboard))
         application.add_handler(CommandHandler("stats", admin_stats))
         application.add_handler(CommandHandler("cancel", admin_cancel_game))
@@ -1706,6 +1847,9 @@ def main():
         application.add_handler(MessageHandler(filters.Regex("^(🎮 Join Game|💰 Balance|📊 Leaderboard|👤 Profile|❓ Help|ℹ️ About)$"), handle_menu_button))
 
         LOGGER.info("All command handlers registered successfully")
+        JOBS.attach(application)
+        metrics.instrument_application(application, 'telegram_bot_v13')
+        sql_profiler.instrument_application(application, 'telegram_bot_v13')
         LOGGER.info("Starting bot...")
 
         # Start the Bot
@@ -12,6 +12,8 @@ from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardMarkup, InlineKe
 from telegram.ext import Application, CommandHandler, ContextTypes, CallbackQueryHandler
 from dotenv import load_dotenv
 
+import metrics
+
 def create_battle_animation(choices):
     """Placeholder for battle animation."""
     return None
@@ -36,7 +38,10 @@ load_dotenv()
 CHAPA_SECRET_KEY = os.getenv('CHAPA_SECRET_KEY')
 CHAPA_PUBLIC_KEY = os.getenv('CHAPA_PUBLIC_KEY')
 CHAPA_WEBHOOK_URL = os.getenv('CHAPA_WEBHOOK_URL')
-CHAPA_API_URL = "https://api.chapa.co/v1"
+CHAPA_API_URL = os.getenv('CHAPA_API_URL', "https://api.chapa.co/v1")
+
+# Bot API endpoint; point at a local fake server for load tests
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org/bot')
 
 # Payment limits
 MIN_DEPOSIT = 10  # Minimum deposit amount in ETB
@@ -64,10 +69,12 @@ def verify_chapa_payment(tx_ref):
     """Verify a Chapa payment transaction."""
     try:
         headers = {"Authorization": f"Bearer {CHAPA_SECRET_KEY}"}
-        response = requests.get(
-            f"{CHAPA_API_URL}/transaction/verify/{tx_ref}",
-            headers=headers
-        )
+        with metrics.gateway_call('chapa', 'verify') as call:
+            response = requests.get(
+                f"{CHAPA_API_URL}/transaction/verify/{tx_ref}",
+                headers=headers
+            )
+            call.ok = response.status_code == 200
         
         if response.status_code == 200:
             return response.json()
@@ -91,7 +98,7 @@ def get_db_connection():
         # Set synchronous mode to NORMAL for better performance while maintaining safety
         conn.execute('PRAGMA synchronous = NORMAL')
         
-        return conn
+        return metrics.trace_connection(conn)
     except sqlite3.Error as e:
         logger.error(f"Database connection error: {e}\n{traceback.format_exc()}")
         return None
@@ -556,11 +563,13 @@ async def deposit(update: Update, context: ContextTypes.DEFAULT_TYPE):
         }
 
         try:
-            response = requests.post(
-                f"{CHAPA_API_URL}/transaction/initialize",
-                headers=headers,
-                json=payload
-            )
+            with metrics.gateway_call('chapa', 'initialize') as call:
+                response = requests.post(
+                    f"{CHAPA_API_URL}/transaction/initialize",
+                    headers=headers,
+                    json=payload
+                )
+                call.ok = response.status_code == 200
             
             if response.status_code == 200:
                 payment_data = response.json()
@@ -793,11 +802,13 @@ async def withdraw(update: Update, context: ContextTypes.DEFAULT_TYPE):
             }
             
             try:
-                response = requests.post(
-                    f"{CHAPA_API_URL}/transfers",
-                    headers=headers,
-                    json=payload
-                )
+                with metrics.gateway_call('chapa', 'transfer') as call:
+                    response = requests.post(
+                        f"{CHAPA_API_URL}/transfers",
+                        headers=headers,
+                        json=payload
+                    )
+                    call.ok = response.status_code == 200
                 
                 if response.status_code == 200:
                     # Start transaction
@@ -1018,27 +1029,6 @@ def add_participant(game_id, user_id):
         logger.error(f"Error adding participant: {e}\n{traceback.format_exc()}")
         return False, None, None
 
-def get_game_participants(game_id):
-    """Get participants of a game."""
-    try:
-        conn = get_db_connection()
-        if conn is None:
-            return None
-            
-        c = conn.cursor()
-        c.execute('''
-            SELECT u.user_id, u.username
-            FROM game_participants gp
-            JOIN users u ON gp.user_id = u.user_id
-            WHERE gp.game_id = ?
-        ''', (game_id,))
-        participants = c.fetchall()
-        conn.close()
-        return participants
-    except Exception as e:
-        logger.error(f"Error getting game participants: {e}\n{traceback.format_exc()}")
-        return None
-
 async def join_game(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle the join_game command."""
     try:
@@ -1196,8 +1186,8 @@ async def join_game(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Join game error: {e}\n{traceback.format_exc()}")
         await update.message.reply_text("❌ An unexpected error occurred. Please try again.")
 
-def get_user_active_game(user_id):
-    """Get user's active game if any."""
+def get_game_status_view(user_id):
+    """Get whether the user exists, their active game and its participants in one query."""
     try:
         conn = get_db_connection()
         if conn is None:
@@ -1205,23 +1195,38 @@ def get_user_active_game(user_id):
             
         c = conn.cursor()
         c.execute('''
-            SELECT g.id, g.bet_amount, g.status, g.created_at,
-                   COUNT(gp.id) as player_count
-            FROM games g
-            JOIN game_participants gp ON g.id = gp.game_id
-            WHERE g.id IN (
-                SELECT game_id 
-                FROM game_participants 
-                WHERE user_id = ?
+            SELECT g.id, g.bet_amount, g.status, g.created_at, u.user_id, u.username
+            FROM users me
+            LEFT JOIN games g ON g.id = (
+                SELECT mine.game_id
+                FROM game_participants mine
+                JOIN games active ON active.id = mine.game_id
+                WHERE mine.user_id = me.user_id
+                AND active.status IN ('waiting', 'ready')
+                ORDER BY mine.game_id
+                LIMIT 1
             )
-            AND g.status IN ('waiting', 'ready')
-            GROUP BY g.id
+            LEFT JOIN game_participants gp ON gp.game_id = g.id
+            LEFT JOIN users u ON u.user_id = gp.user_id
+            WHERE me.user_id = ?
+            ORDER BY gp.id
         ''', (user_id,))
-        game = c.fetchone()
+        rows = c.fetchall()
         conn.close()
-        return game
+        
+        if not rows:
+            return {'exists': False, 'game': None, 'participants': []}
+        game_id, bet_amount, status, created_at = rows[0][:4]
+        if game_id is None:
+            return {'exists': True, 'game': None, 'participants': []}
+        participants = [(row[4], row[5]) for row in rows]
+        return {
+            'exists': True,
+            'game': (game_id, bet_amount, status, created_at, len(participants)),
+            'participants': participants
+        }
     except Exception as e:
-        logger.error(f"Error getting user active game: {e}\n{traceback.format_exc()}")
+        logger.error(f"Error getting game status view: {e}\n{traceback.format_exc()}")
         return None
 
 async def game_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1230,24 +1235,19 @@ async def game_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user = update.effective_user
         user_id = user.id
         
-        # Check if user exists
-        exists = user_exists(user_id)
-        if exists is None:
+        # Account, active game and participants come from one query
+        view = get_game_status_view(user_id)
+        if view is None:
             await update.message.reply_text("❌ System error. Please try again later.")
             return
-        if not exists:
+        if not view['exists']:
             await update.message.reply_text(
                 "❌ You don't have an account!\n"
                 "Use /create_account to create one."
             )
             return
 
-        # Get user's active game
-        game = get_user_active_game(user_id)
-        if game is None:
-            await update.message.reply_text("❌ Failed to check game status. Please try again later.")
-            return
-        
+        game = view['game']
         if not game:
             await update.message.reply_text(
                 "You're not in any active game.\n"
@@ -1256,12 +1256,7 @@ async def game_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         
         game_id, bet_amount, status, created_at, player_count = game
-        
-        # Get participants
-        participants = get_game_participants(game_id)
-        if participants is None:
-            await update.message.reply_text("❌ Failed to get game participants. Please try again later.")
-            return
+        participants = view['participants']
         
         # Format status message
         status_text = (
@@ -1764,6 +1759,8 @@ def record_choice(game_id, user_id, choice):
                          ('completed', winner_id, game_id))
             
             conn.commit()
+            if all_chosen:
+                metrics.GAMES_SETTLED.inc()
             return True, (all_chosen, players, winner_id if all_chosen else None, bet_amount if all_chosen else None)
             
         except Exception as e:
@@ -1975,7 +1972,7 @@ def main():
         init_db()
         
         # Create application with custom timeouts
-        app = Application.builder().token(token).read_timeout(30).write_timeout(30).build()
+        app = Application.builder().token(token).base_url(TELEGRAM_API_URL).read_timeout(30).write_timeout(30).build()
         
         # Add handlers
         app.add_handler(CommandHandler("start", start))
@@ -2000,6 +1997,7 @@ def main():
         
         # Add error handler
         app.add_error_handler(error_handler)
+        metrics.instrument_application(app, 'test_bot')
         
         logger.info("Starting bot...")
         # Run the bot until the user presses Ctrl-C
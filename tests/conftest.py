@@ -1,20 +1,27 @@
 """Test configuration and fixtures"""
 import pytest
-from app import create_app, db
+from flask import Flask
+from extensions import db
 from models import User
 from decimal import Decimal
 
+# SQL query budgets: @pytest.mark.query_budget(n) and the query_budget fixture
+pytest_plugins = ['pytest_query_budget']
+
 @pytest.fixture
 def app():
-    """Create and configure a Flask app for testing"""
-    app = create_app('testing')
-    
-    # Create test database
+    """A Flask app on an in-memory SQLite database with every table created.
+
+    Modules that need routes, blueprints or session listeners extend it with
+    an app fixture of their own that takes this one.
+    """
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
     with app.app_context():
         db.create_all()
         yield app
         db.session.remove()
-        db.drop_all()
 
 @pytest.fixture
 def client(app):
@@ -24,19 +31,20 @@ def client(app):
 @pytest.fixture
 def test_user(app):
     """Create a test user"""
-    with app.app_context():
-        user = User(
-            username='testuser',
-            email='test@example.com',
-            balance=Decimal('0.00')
-        )
-        db.session.add(user)
-        db.session.commit()
-        return user
+    user = User(
+        username='testuser',
+        full_name='Test User',
+        email='test@example.com',
+        password='x',
+        balance=Decimal('0.00')
+    )
+    db.session.add(user)
+    db.session.commit()
+    return user
 
 @pytest.fixture
 def auth_headers(test_user):
     """Create authentication headers for test user"""
     return {
         'Authorization': f'Bearer {test_user.generate_token()}'
-    } 
\ No newline at end of file
+    }
@@ -0,0 +1,125 @@
+"""Tests for the AI opponent pool and simulated games"""
+import pytest
+from sqlalchemy import event
+
+from ai_opponents import OpponentPool, Simulator
+from balances import credit, debit
+from extensions import db
+from models import User, Game, GameParticipant, SimulatedGame, DailyStats
+from stats_rollup import register_rollup_listeners
+from utils import get_leaderboard
+
+
+@pytest.fixture
+def app(app):
+    register_rollup_listeners()
+    return app
+
+
+class ScriptedStrategy:
+    """Bots play the given moves in seat order"""
+
+    def __init__(self, moves):
+        self.moves = list(moves)
+        self.observed = []
+
+    def choose(self, user_id, seats=1):
+        return [self.moves.pop(0) for _ in range(seats)]
+
+    def observe(self, user_id, move):
+        self.observed.append((user_id, move))
+
+
+class Scripted(Simulator):
+    def __init__(self, *moves, **kwargs):
+        super().__init__(OpponentPool(size=2), strategy=ScriptedStrategy(moves), **kwargs)
+
+
+def make_user(balance=100):
+    user = User(username='ann', full_name='Ann', email='ann@example.com', password='x', balance=balance)
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def test_pool_is_created_once_and_kept_out_of_user_stats(app):
+    user = make_user()
+    first = Simulator(OpponentPool(size=3))
+    bots = first.pool.bots()
+
+    assert sorted(bots.values()) == ['🤖 AI-Alpha', '🤖 AI-Beta', '🤖 AI-Gamma']
+    assert User.query.filter_by(is_bot=True).count() == 3
+    for _ in range(5):
+        first.play(user.id, 10, 'rock')
+    # Another process finds the same accounts
+    assert Simulator(OpponentPool(size=3)).pool.bots() == bots
+    assert User.query.count() == 4
+
+    assert DailyStats.query.one().new_users == 1
+    assert [u.id for u in User.query.filter(User.is_bot.is_(False))] == [user.id]
+
+
+def test_simulation_settles_in_one_transaction_off_the_games_table(app):
+    user = make_user()
+    commits = []
+    event.listen(db.session, 'after_commit', lambda session: commits.append(1))
+
+    simulator = Scripted('scissors', 'scissors', 'rock', 'scissors', 'rock', 'rock', 'paper', 'paper')
+    simulator.pool.bots()
+    commits.clear()
+    win = simulator.play(user.id, 10, 'rock')
+    lose = simulator.play(user.id, 10, 'scissors')
+    draw = simulator.play(user.id, 10, 'rock')
+
+    assert [r.result for r in (win, lose, draw)] == ['win', 'lose', 'draw']
+    assert (win.payout, lose.payout, draw.payout) == (30, 0, 10)
+    assert [move for _, move in win.opponents] == ['scissors', 'scissors']
+    assert len(commits) == 3
+    assert db.session.get(User, user.id).balance == 100 + 20 - 10
+    assert [(g.move, g.opponent_moves, g.result) for g in SimulatedGame.query.order_by(SimulatedGame.id)] == [
+        ('rock', 'scissors,scissors', 'win'), ('scissors', 'rock,scissors', 'lose'), ('rock', 'rock,rock', 'draw')
+    ]
+    assert Game.query.count() == 0
+
+    assert simulator.strategy.observed == [(user.id, 'rock'), (user.id, 'scissors'), (user.id, 'rock')]
+
+    assert simulator.play(user.id, 500, 'rock') is None
+    assert len(simulator.strategy.observed) == 3
+    assert SimulatedGame.query.count() == 3 and db.session.get(User, user.id).balance == 110
+    with pytest.raises(ValueError):
+        simulator.play(user.id, 10, 'lizard')
+
+
+@pytest.mark.parametrize('bet_amount', [-1000, 0, 5, 1001, 'NaN', 'Infinity'])
+def test_bets_outside_the_game_limits_are_refused(app, bet_amount):
+    user = make_user()
+    simulator = Scripted('scissors', 'scissors')
+    with pytest.raises(ValueError):
+        simulator.play(user.id, bet_amount, 'paper')
+    assert db.session.get(User, user.id).balance == 100 and SimulatedGame.query.count() == 0
+
+
+def test_balance_changes_must_be_positive(app):
+    user = make_user()
+    for change in (debit, credit):
+        for amount in (-1000, 0, float('nan')):
+            with pytest.raises(ValueError):
+                change(user.id, amount)
+    assert db.session.get(User, user.id).balance == 100
+
+
+def test_persisted_simulations_count_only_the_human_seat(app):
+    user = make_user()
+    simulator = Scripted('scissors', 'scissors', persist_games=True)
+
+    result = simulator.play(user.id, 10, 'rock')
+
+    game = db.session.get(Game, result.game_id)
+    assert (game.status, game.winner_id) == ('completed', user.id)
+    assert sorted(p.result for p in GameParticipant.query.filter_by(game_id=game.id)) == ['lose', 'lose', 'win']
+    stats = DailyStats.query.one()
+    assert (stats.total_games, stats.total_players, stats.active_users) == (1, 1, 1)
+    assert SimulatedGame.query.count() == 0
+
+    db.session.execute(db.update(User).where(User.is_bot.is_(True)).values(wins=5))
+    assert get_leaderboard() == []
@@ -0,0 +1,98 @@
+"""Tests for the AI move strategies"""
+import random
+
+import pytest
+
+from ai_strategy import MAX_COUNT, STATE_SIZE, MarkovStrategy, RandomStrategy, get_strategy, _unpack
+from extensions import db
+from models import User, AIMoveModel
+
+
+def make_users(count):
+    users = [User(username=f"user{i}", full_name=f"User {i}", email=f"user{i}@example.com", password='x')
+             for i in range(count)]
+    db.session.add_all(users)
+    db.session.commit()
+    return [user.id for user in users]
+
+
+def test_markov_counters_a_repeating_pattern(app):
+    user_id, = make_users(1)
+    strategy = MarkovStrategy(difficulty=1.0, batch_size=1000, rng=random.Random(1))
+    assert strategy.predict(user_id) is None
+
+    for move in ['rock', 'paper', 'scissors'] * 5:
+        strategy.observe(user_id, move)
+
+    # After scissors comes rock: one seat plays paper, the other copies rock
+    assert strategy.predict(user_id) == 'rock'
+    assert strategy.choose(user_id, 2) == ['paper', 'rock']
+    strategy.observe(user_id, 'rock')
+    assert strategy.choose(user_id, 1) == ['scissors']
+
+
+def test_difficulty_blends_with_random_play(app):
+    user_id, = make_users(1)
+    easy = MarkovStrategy(difficulty=0.0, batch_size=1000, rng=random.Random(2))
+    for _ in range(10):
+        easy.observe(user_id, 'rock')
+
+    counts = {move: 0 for move in ('rock', 'paper', 'scissors')}
+    for _ in range(300):
+        counts[easy.choose(user_id)[0]] += 1
+    assert min(counts.values()) > 60
+
+    assert isinstance(get_strategy('random'), RandomStrategy)
+    with pytest.raises(ValueError):
+        get_strategy('minimax')
+
+
+def test_counts_are_halved_at_the_cap(app):
+    user_id, = make_users(1)
+    strategy = MarkovStrategy(batch_size=10000)
+    strategy.observe(user_id, 'paper')
+    for _ in range(MAX_COUNT + 1):
+        strategy.observe(user_id, 'scissors')
+        strategy.observe(user_id, 'paper')
+
+    slot = strategy._slots[user_id]
+    counts = strategy._state[slot:slot + 9]
+    # paper -> scissors is row 1, column 2; scissors -> paper row 2, column 1
+    assert counts[5] == counts[7] == MAX_COUNT // 2 + 1
+    assert sum(counts) == counts[5] + counts[7]
+
+
+def test_lru_bounds_memory_and_keeps_evicted_learning(app):
+    user_ids = make_users(5)
+    strategy = MarkovStrategy(difficulty=1.0, max_users=2, batch_size=1000, rng=random.Random(3))
+
+    for user_id in user_ids:
+        for move in ('rock', 'paper', 'rock', 'paper'):
+            strategy.observe(user_id, move)
+
+    assert len(strategy) == 2
+    assert len(strategy._state) == 2 * STATE_SIZE
+    # Evicted before it was written, and read back from memory
+    assert strategy.predict(user_ids[0]) == 'rock'
+    assert strategy.flush() == 5
+    assert AIMoveModel.query.count() == 5
+
+
+def test_models_are_written_in_batches_and_reloaded(app):
+    user_ids = make_users(4)
+    strategy = MarkovStrategy(difficulty=1.0, batch_size=3)
+
+    for user_id in user_ids[:2]:
+        strategy.observe(user_id, 'scissors')
+        strategy.observe(user_id, 'scissors')
+    assert AIMoveModel.query.count() == 0
+    strategy.observe(user_ids[2], 'paper')
+    assert AIMoveModel.query.count() == 3
+    assert strategy.flush() == 0
+
+    model = db.session.get(AIMoveModel, user_ids[0])
+    assert list(_unpack(model.counts)) == [0, 0, 0, 0, 0, 0, 0, 0, 1, 2]
+
+    fresh = MarkovStrategy(difficulty=1.0)
+    assert fresh.predict(user_ids[0]) == 'scissors'
+    assert fresh.predict(user_ids[3]) is None
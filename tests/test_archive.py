@@ -0,0 +1,132 @@
+"""Tests for the cold archive of settled games and transactions"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+pytest.importorskip('pyarrow')
+
+from admin.service import AdminService
+from archive import ColdArchive
+from extensions import db
+from game import RPSGame
+from models import User, Game, GameParticipant, Transaction, ArchiveSegment, ArchiveTombstone
+from payment_service import PaymentService
+
+NOW = datetime(2026, 10, 1)
+
+
+def make_users(count):
+    db.session.execute(insert(User), [
+        {'username': f"player{n}", 'full_name': f"Player {n}", 'email': f"player{n}@example.com",
+         'password': 'x', 'balance': 100}
+        for n in range(count)
+    ])
+    db.session.commit()
+    return [user.id for user in User.query.order_by(User.id)]
+
+
+def make_history(user_ids, days_ago, status='completed'):
+    """One game between the users and one deposit each per day in days_ago"""
+    for days in days_ago:
+        created_at = NOW - timedelta(days=days)
+        game = Game(creator_id=user_ids[0], bet_amount=10, status=status, winner_id=user_ids[0],
+                    created_at=created_at, completed_at=created_at)
+        db.session.add(game)
+        db.session.flush()
+        for user_id in user_ids:
+            db.session.add(GameParticipant(game_id=game.id, user_id=user_id, move='rock', created_at=created_at))
+            db.session.add(Transaction(user_id=user_id, tx_ref=f"tx-{user_id}-{days}", type='deposit',
+                                       amount=25, status='completed', created_at=created_at))
+    db.session.commit()
+
+
+def test_old_settled_rows_move_to_monthly_files(app, tmp_path):
+    alice, bob, carol = make_users(3)
+    make_history([alice, bob], days_ago=[10, 200, 230, 260])
+    make_history([carol], days_ago=[300], status='waiting')  # never settled: stays
+
+    moved = ColdArchive.archive(older_than_days=180, now=NOW, directory=str(tmp_path), batch_size=2)
+
+    assert moved == {'games': 3, 'transactions': 7}
+    assert Game.query.count() == 2
+    assert GameParticipant.query.count() == 3
+    assert Transaction.query.count() == 2
+    months = sorted((s.table_name, s.month) for s in ArchiveSegment.query)
+    assert months == [('games', '2026-01'), ('games', '2026-02'), ('games', '2026-03'),
+                      ('transactions', '2025-12'), ('transactions', '2026-01'), ('transactions', '2026-02'),
+                      ('transactions', '2026-03')]
+    assert all(s.path.startswith(str(tmp_path)) for s in ArchiveSegment.query)
+    # One tombstone per user per file they have rows in
+    assert ArchiveTombstone.query.filter_by(user_id=carol).count() == 1
+    assert ArchiveTombstone.query.filter_by(user_id=alice).count() == 6
+
+    # A second run finds nothing new
+    assert ColdArchive.archive(older_than_days=180, now=NOW, directory=str(tmp_path)) == \
+        {'games': 0, 'transactions': 0}
+
+
+def test_user_reads_span_live_and_archived_rows(app, tmp_path):
+    alice, bob = make_users(2)
+    make_history([alice, bob], days_ago=[10, 200, 230, 260])
+    ColdArchive.archive(older_than_days=180, now=NOW, directory=str(tmp_path))
+
+    games = RPSGame.get_user_games(bob, limit=3)
+    assert [g.created_at for g in games] == [NOW - timedelta(days=d) for d in (10, 200, 230)]
+    assert [getattr(g, 'archived', False) for g in games] == [False, True, True]
+    assert [p.user_id for p in games[1].participants] == [alice, bob]
+
+    transactions = PaymentService.get_transactions(alice, limit=10)
+    assert [t.tx_ref for t in transactions] == [f"tx-{alice}-{d}" for d in (10, 200, 230, 260)]
+    assert transactions[-1].amount == 25
+
+    # A full live page doesn't open any file
+    assert len(RPSGame.get_user_games(bob, limit=1)) == 1
+
+
+def test_admin_pages_page_through_both_tiers(app, tmp_path):
+    alice, bob = make_users(2)
+    make_history([alice, bob], days_ago=[1, 2, 200, 210, 220])
+    ColdArchive.archive(older_than_days=180, now=NOW, directory=str(tmp_path))
+
+    seen, cursor = [], None
+    while True:
+        page = AdminService.list_transactions(cursor=cursor, limit=3)
+        seen += [(tx.id, tx.user.username) for tx in page.items]
+        if not page.has_more:
+            break
+        cursor = page.next_cursor
+    assert [tx_id for tx_id, _ in seen] == sorted(range(1, 11), reverse=True)
+    assert dict(seen)[1] == 'player0'
+
+    games = AdminService.list_games(limit=10, status='completed').items
+    assert [getattr(g, 'archived', False) for g in games] == [True, True, True, False, False]
+    assert games[0].participants[1].user.username == 'player1'
+    assert [tx.id for tx in AdminService.list_transactions(limit=10, user_id=bob).items] == [10, 8, 6, 4, 2]
+
+    archived_game = ColdArchive.get_game(games[0].id)
+    assert archived_game.archived and archived_game.status == 'completed'
+    assert ColdArchive.get_game(10_000) is None
+
+
+def test_a_full_live_page_still_leads_to_the_archive(app, tmp_path):
+    alice, bob = make_users(2)
+    make_history([alice, bob], days_ago=[200, 210])
+    ColdArchive.archive(older_than_days=180, now=NOW, directory=str(tmp_path))
+    make_history([alice, bob], days_ago=[1])
+
+    page = AdminService.list_transactions(limit=2)
+    assert [tx.id for tx in page.items] == [6, 5] and page.has_more
+    rest = AdminService.list_transactions(cursor=page.next_cursor, limit=10)
+    assert [tx.id for tx in rest.items] == [4, 3, 2, 1] and not rest.has_more
+
+
+def test_archived_ids_are_not_reused(app, tmp_path):
+    alice, bob = make_users(2)
+    make_history([alice, bob], days_ago=[200, 210])
+    ColdArchive.archive(older_than_days=180, now=NOW, directory=str(tmp_path))
+    assert Game.query.count() == Transaction.query.count() == 0
+
+    make_history([alice, bob], days_ago=[1])
+    assert [game.id for game in Game.query] == [3]
+    assert sorted(tx.id for tx in Transaction.query) == [5, 6]
@@ -0,0 +1,105 @@
+"""Tests for the SQLite bot state persistence"""
+import asyncio
+import sqlite3
+
+from bot_persistence import SQLitePersistence
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def rows(path, table):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_state_survives_a_restart(tmp_path):
+    path = str(tmp_path / 'state.db')
+
+    async def before_restart():
+        persistence = SQLitePersistence(path)
+        await persistence.get_user_data()
+        await persistence.update_user_data(42, {'full_name': 'Abebe', 'email': 'abebe@example.com'})
+        await persistence.update_chat_data(-100, {'room': 7})
+        await persistence.update_bot_data({'started': True})
+        await persistence.update_conversation('registration', (42, 42), 2)
+        await persistence.update_conversation('withdraw', (42, 42), 1)
+        await persistence.update_conversation('withdraw', (42, 42), None)
+        await persistence.flush()
+
+    async def after_restart():
+        persistence = SQLitePersistence(path)
+        return (
+            await persistence.get_user_data(),
+            await persistence.get_chat_data(),
+            await persistence.get_bot_data(),
+            await persistence.get_conversations('registration'),
+            await persistence.get_conversations('withdraw'),
+        )
+
+    run(before_restart())
+    user_data, chat_data, bot_data, registration, withdraw = run(after_restart())
+    assert user_data == {42: {'full_name': 'Abebe', 'email': 'abebe@example.com'}}
+    assert chat_data == {-100: {'room': 7}}
+    assert bot_data == {'started': True}
+    assert registration == {(42, 42): 2}
+    assert withdraw == {}
+
+
+def test_updates_are_coalesced_into_one_delayed_write(tmp_path):
+    path = str(tmp_path / 'state.db')
+    persistence = SQLitePersistence(path, flush_delay=0.05)
+
+    async def main():
+        await persistence.get_user_data()
+        for step in range(50):
+            for user_id in range(10):
+                await persistence.update_user_data(user_id, {'step': step})
+        assert rows(path, 'deltas') == 0  # nothing written per update
+        await asyncio.sleep(0.2)
+        return rows(path, 'deltas')
+
+    assert run(main()) == 10
+    persistence.log.close()
+
+
+def test_restart_replays_deltas_after_the_snapshot(tmp_path):
+    path = str(tmp_path / 'state.db')
+
+    async def write():
+        persistence = SQLitePersistence(path, flush_delay=0, snapshot_every=3)
+        await persistence.get_user_data()
+        for user_id in range(4):
+            await persistence.update_user_data(user_id, {'n': user_id})
+        await asyncio.sleep(0.05)  # 4 deltas: compacted into a snapshot
+        await persistence.update_user_data(9, {'n': 9})
+        await persistence.drop_user_data(0)
+        await asyncio.sleep(0.05)
+        persistence.log.close()  # crash: no final flush()
+
+    run(write())
+    assert rows(path, 'snapshots') == 1
+    assert rows(path, 'deltas') == 2
+
+    restarted = SQLitePersistence(path)
+    assert run(restarted.get_user_data()) == {1: {'n': 1}, 2: {'n': 2}, 3: {'n': 3}, 9: {'n': 9}}
+    assert restarted._since_snapshot == 2
+    restarted.log.close()
+
+
+def test_unchanged_data_is_not_logged(tmp_path):
+    path = str(tmp_path / 'state.db')
+    persistence = SQLitePersistence(path)
+
+    async def main():
+        await persistence.update_user_data(1, {'amount': 50})
+        await persistence.flush()
+        await persistence.update_user_data(1, {'amount': 50})
+        await persistence.update_conversation('deposit', (1, 1), None)
+        return dict(persistence._pending)
+
+    assert run(main()) == {}
@@ -0,0 +1,131 @@
+"""Tests for bulk admin operations"""
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import insert
+
+from admin.bulk import BulkOperations, BulkResult, _chunks, parse_adjustments
+from admin.routes import admin_bp
+from extensions import db
+from game import RPSGame
+from models import User, Game, GameParticipant, Transaction, Tournament
+from payment_service import PaymentService
+from utils import get_user_by_telegram_id
+
+
+@pytest.fixture
+def app(app):
+    app.register_blueprint(admin_bp)
+    return app
+
+
+def test_adjustments_csv_by_telegram_id():
+    key, rows = parse_adjustments([
+        'Telegram_ID,Amount,Reason',
+        '1001,25.50,promo',
+        '@1002,-5,'
+    ])
+    assert key == 'telegram_id'
+    assert rows == [(2, 1001, Decimal('25.50'), 'promo'), (3, 1002, Decimal('-5'), '')]
+
+
+def test_adjustments_csv_by_username():
+    key, rows = parse_adjustments(['username,amount', '@kebede,10'])
+    assert key == 'username'
+    assert rows[0][1] == 'kebede'
+
+
+def test_adjustments_csv_rejects_bad_rows():
+    with pytest.raises(ValueError):
+        parse_adjustments(['amount', '10'])
+    with pytest.raises(ValueError, match='Line 3'):
+        parse_adjustments(['telegram_id,amount', '1,10', '2,lots'])
+
+
+def test_chunks_cover_every_row():
+    assert list(_chunks(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(_chunks([], 2)) == []
+
+
+def test_dry_run_summary_is_marked():
+    result = BulkResult('refund games', dry_run=True, total=10)
+    result.processed = 10
+    assert result.summary().startswith('[dry run] refund games: 10/10 processed')
+
+
+def make_games(*statuses, tournament_id=None):
+    """One 3-seat game per status between the same three players; returns their ids"""
+    if not User.query.count():
+        db.session.execute(insert(User), [
+            {'username': f"p{n}", 'full_name': f"P{n}", 'email': f"p{n}@example.com", 'password': 'x'}
+            for n in range(3)
+        ])
+    user_ids = [user.id for user in User.query.order_by(User.id)]
+    games = [Game(creator_id=user_ids[0], bet_amount=10, status=status, tournament_id=tournament_id)
+             for status in statuses]
+    db.session.add_all(games)
+    db.session.flush()
+    db.session.add_all(GameParticipant(game_id=game.id, user_id=user_id) for game in games for user_id in user_ids)
+    db.session.commit()
+    return [game.id for game in games]
+
+
+def test_only_games_cancelled_by_the_chunk_are_refunded(app):
+    waiting, settled = make_games('waiting', 'completed')
+
+    cancelled, seats, stakes = BulkOperations._cancel_chunk(
+        [waiting, settled], ['waiting', 'in_progress'], refund=True, dry_run=False, ref_prefix='test'
+    )
+    db.session.commit()
+    assert (cancelled, seats, stakes) == (1, 3, 30)
+    assert [game.status for game in Game.query.order_by(Game.id)] == ['cancelled', 'completed']
+    assert {tx.tx_ref.split('_')[1] for tx in Transaction.query} == {str(waiting)}
+    assert [user.balance for user in User.query] == [10, 10, 10]
+
+
+def test_tournament_tables_are_not_cancelled(app):
+    tournament = Tournament(name='Cup', buy_in=10)
+    db.session.add(tournament)
+    db.session.commit()
+    [table] = make_games('in_progress', tournament_id=tournament.id)
+    [game] = make_games('in_progress')
+
+    result = BulkOperations.cancel_games()
+    assert (result.total, result.processed, result.affected) == (1, 1, 3)
+    assert db.session.get(Game, table).status == 'in_progress'
+    assert db.session.get(Game, game).status == 'cancelled'
+
+
+def test_cancel_rooms_api_validates_its_input(app):
+    make_games('waiting', 'waiting')
+    client = app.test_client()
+    for body in ({'statuses': 'waiting'}, {'statuses': [1]}, {'ids': 'abc'}, {'before': '1/2/2026'}):
+        assert client.post('/admin/api/rooms/cancel?admin=1', json=body).status_code == 400
+    response = client.post('/admin/api/rooms/cancel?admin=1', json={'statuses': ['waiting'], 'dry_run': True})
+    assert response.get_json()['processed'] == 2
+    assert Game.query.filter_by(status='waiting').count() == 2
+
+
+def test_banned_users_cannot_play_or_move_money(app):
+    db.session.add_all([
+        User(username=name, full_name=name, email=f"{name}@example.com", password='x',
+             telegram_id=telegram_id, balance=500)
+        for name, telegram_id in (('abebe', 101), ('kebede', 102))
+    ])
+    db.session.commit()
+    abebe, kebede = (get_user_by_telegram_id(telegram_id).id for telegram_id in (101, 102))
+    game = RPSGame.create_game(kebede, 10)
+
+    assert BulkOperations.set_banned([101]).affected == 1
+    assert get_user_by_telegram_id(101) is None
+    assert get_user_by_telegram_id(101, include_banned=True).is_banned
+    assert RPSGame.create_game(abebe, 10) is None
+    assert RPSGame.join_game(game.id, abebe) is False
+    assert RPSGame.find_or_create_game(abebe, 10)[0] is None
+    assert PaymentService().create_deposit(abebe, 100)[0] is False
+    assert PaymentService.create_withdrawal(abebe, 100, {'account_number': '0911000000'})[0] is False
+    assert db.session.get(User, abebe).balance == 500
+    assert GameParticipant.query.filter_by(user_id=abebe).count() == 0
+
+    BulkOperations.set_banned([101], banned=False)
+    assert RPSGame.join_game(game.id, abebe) is True
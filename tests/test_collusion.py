@@ -0,0 +1,123 @@
+"""Tests for streaming collusion detection"""
+import json
+import random
+
+import pytest
+
+import collusion
+from collusion import CollusionMonitor, CountMinSketch, register_collusion_listeners
+from extensions import db
+from game import RPSGame
+from models import User, Game, GameParticipant, CollusionFlag
+
+MOVES = ('rock', 'paper', 'scissors')
+
+
+@pytest.fixture
+def app(app):
+    register_collusion_listeners()
+    return app
+
+
+def winner(moves):
+    """The player whose move beats every other move, as RPSGame decides it"""
+    for user_id, move in moves.items():
+        if all(RPSGame._is_winner(move, other) for other_id, other in moves.items() if other_id != user_id):
+            return user_id
+    return None
+
+
+def play(monitor, moves):
+    return monitor.observe(moves, winner(moves))
+
+
+def test_sketch_never_undercounts():
+    sketch = CountMinSketch(width=64, depth=3, fields=2)
+    exact = {}
+    rng = random.Random(1)
+    for _ in range(2000):
+        key = (rng.randrange(200), rng.randrange(200))
+        sketch.add(key, (1, 2))
+        exact[key] = exact.get(key, 0) + 1
+    assert all(sketch.estimate(key)[0] >= count and sketch.estimate(key)[1] >= 2 * count
+               for key, count in exact.items())
+    assert sketch.estimate((999, 999)) <= max(sketch.estimate(key) for key in exact)
+
+
+def test_honest_tables_are_not_flagged_but_colluders_are():
+    rng = random.Random(7)
+    monitor = CollusionMonitor(min_games=30)
+    honest = list(range(10, 40))
+
+    for _ in range(3000):
+        table = rng.sample(honest, 3)
+        assert play(monitor, {user_id: rng.choice(MOVES) for user_id in table}) == []
+
+    # 1 and 2 always sit together and never play the same move
+    findings = []
+    for _ in range(120):
+        split = rng.sample(MOVES, 2)
+        findings += play(monitor, {1: split[0], 2: split[1], rng.choice(honest): rng.choice(MOVES)})
+
+    clusters = [f for f in findings if f.kind == 'cluster']
+    assert [f.user_ids for f in clusters] == [[1, 2]]
+    assert clusters[0].details['split_rate'] == 1.0 and clusters[0].details['share'] == 1.0
+    assert monitor.pair_stats(2, 1)['together'] >= 120
+
+    # A third account joining them grows the cluster and is reported again
+    for _ in range(60):
+        a, b = rng.sample(MOVES, 2)
+        findings = play(monitor, {2: a, 3: b, rng.choice(honest): rng.choice(MOVES)})
+        if findings:
+            break
+    assert [f.user_ids for f in findings if f.kind == 'cluster'] == [[1, 2, 3]]
+
+
+def test_players_winning_far_above_chance_are_flagged():
+    monitor = CollusionMonitor(min_games=20)
+    findings = []
+    for n in range(40):
+        findings += monitor.observe({5: 'rock', 100 + n: 'scissors', 200 + n: 'scissors'}, winner_id=5)
+
+    assert [(f.kind, f.user_ids) for f in findings] == [('player', [5])]
+    stats = monitor.player_stats(5)
+    assert stats['wins'] == 40
+    assert stats['moves'] == {'rock': 40, 'paper': 0, 'scissors': 0} and stats['move_chi_square'] == 80.0
+
+
+def test_games_settled_on_commit_are_fed_and_flags_stored(app, monkeypatch):
+    monitor = CollusionMonitor(min_games=3, split_rate=0.9)
+    monkeypatch.setattr(collusion, 'COLLUSION', monitor)
+    users = [User(username=f"p{n}", full_name=f"P{n}", email=f"p{n}@example.com", password='x', balance=100)
+             for n in range(3)]
+    db.session.add_all(users)
+    db.session.commit()
+
+    def settle(moves, commit=True):
+        game = Game(creator_id=users[0].id, bet_amount=10, status='in_progress')
+        db.session.add(game)
+        db.session.flush()
+        db.session.add_all(GameParticipant(game_id=game.id, user_id=user.id, move=move)
+                           for user, move in zip(users, moves))
+        db.session.commit()
+        if commit:
+            RPSGame._determine_winner(game)
+        else:
+            game.status = 'completed'
+            db.session.flush()
+            db.session.rollback()
+
+    settle(('rock', 'paper', 'scissors'), commit=False)
+    assert monitor.games == 0
+
+    for _ in range(3):
+        settle(('rock', 'paper', 'rock'))
+    assert monitor.games == 3
+
+    # Both split pairs cross the threshold in the third game: 0 and 1, then 1 and 2 join them
+    ids = [str(user.id) for user in users]
+    flags = CollusionFlag.query.filter_by(kind='cluster').order_by(CollusionFlag.id).all()
+    assert [flag.user_ids for flag in flags] == [','.join(ids[:2]), ','.join(ids)]
+    assert all(flag.status == 'open' for flag in flags)
+    assert json.loads(flags[0].details)['together'] == 3
+    assert CollusionFlag.query.filter_by(kind='player').count() == 0
@@ -0,0 +1,80 @@
+"""Tests for the streaming transaction export"""
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from admin.export import COLUMNS, TransactionExport, resume_point
+from archive import ColdArchive
+from extensions import db
+from models import User, Transaction
+
+NOW = datetime(2026, 10, 1)
+
+
+def make_transactions(days_ago):
+    user = User(username='payer', full_name='Payer', email='payer@example.com', password='x', balance=0)
+    db.session.add(user)
+    db.session.flush()
+    for n, days in enumerate(days_ago):
+        created_at = NOW - timedelta(days=days)
+        db.session.add(Transaction(user_id=user.id, tx_ref=f"tx-{n}", type='deposit', amount='12.50',
+                                   status='completed', created_at=created_at, completed_at=created_at))
+    db.session.commit()
+
+
+def export(fmt, start=NOW - timedelta(days=400), end=NOW, **kwargs):
+    return b''.join(TransactionExport(start, end, batch_size=2, **kwargs).stream(fmt))
+
+
+def test_csv_and_jsonl_cover_the_range_in_id_order(app):
+    make_transactions([1, 2, 3, 40, 50])
+
+    rows = list(csv.reader(io.StringIO(export('csv', start=NOW - timedelta(days=30)).decode())))
+    assert rows[0] == COLUMNS
+    assert [row[COLUMNS.index('tx_ref')] for row in rows[1:]] == ['tx-0', 'tx-1', 'tx-2']
+    assert rows[1][COLUMNS.index('amount')] == '12.50'
+
+    lines = export('jsonl').decode().splitlines()
+    assert [json.loads(line)['id'] for line in lines] == [1, 2, 3, 4, 5]
+    assert json.loads(lines[0])['created_at'] == (NOW - timedelta(days=1)).isoformat()
+
+    with pytest.raises(ValueError):
+        TransactionExport(NOW, NOW)
+
+
+def test_resume_continues_after_the_last_complete_row(app, tmp_path):
+    make_transactions([1, 2, 3, 4, 5])
+    path = tmp_path / 'out.csv'
+    full = export('csv')
+    # An interrupted download: the third row is cut off halfway
+    path.write_bytes(full[:full.index(b'tx-2') + 2])
+
+    after_id = resume_point(path, 'csv')
+    assert after_id == 2
+    with open(path, 'ab') as out:
+        for chunk in TransactionExport(NOW - timedelta(days=400), NOW, after_id).stream('csv', header=False):
+            out.write(chunk)
+    assert path.read_bytes() == full
+
+    assert resume_point(path, 'csv') == 5
+    with pytest.raises(ValueError):
+        resume_point(path, 'parquet')
+
+
+def test_parquet_export_includes_archived_rows(app, tmp_path):
+    pa = pytest.importorskip('pyarrow')
+    import pyarrow.parquet as pq
+    make_transactions([1, 200, 2, 230])
+    ColdArchive.archive(older_than_days=180, now=NOW, directory=str(tmp_path))
+    assert Transaction.query.count() == 2
+
+    table = pq.read_table(pa.BufferReader(export('parquet')))
+    assert table.column('id').to_pylist() == [1, 2, 3, 4]
+    assert table.column('tx_ref').to_pylist() == ['tx-0', 'tx-1', 'tx-2', 'tx-3']
+
+    exporter = TransactionExport(NOW - timedelta(days=400), NOW, after_id=2)
+    assert [row['id'] for row in exporter.rows()] == [3, 4]
+    assert exporter.summary() == '2 transactions exported, last id 4'
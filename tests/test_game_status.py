@@ -0,0 +1,95 @@
+"""Tests for the game status read model"""
+import pytest
+
+import game_status
+from extensions import db
+from game import RPSGame
+from models import User, Game, GameParticipant
+from sql_profiler import SQLProfiler
+
+_profiler = SQLProfiler(capture_stacks=False).install()
+
+
+@pytest.fixture
+def app(app):
+    game_status.register_status_listeners()
+    game_status.CACHE.invalidate()
+    return app
+
+
+@pytest.fixture
+def game(app):
+    users = [
+        User(username=name, full_name=name, email=f"{name}@example.com", password='x', balance=100)
+        for name in ('abebe', 'kebede', 'almaz')
+    ]
+    db.session.add_all(users)
+    db.session.flush()
+    game = Game(creator_id=users[0].id, bet_amount=10, status='in_progress')
+    db.session.add(game)
+    db.session.flush()
+    db.session.add_all([GameParticipant(game_id=game.id, user_id=user.id) for user in users])
+    db.session.commit()
+    return game.id, [user.id for user in users]
+
+
+def queries(fn, *args):
+    with _profiler.profile('status') as profile:
+        result = fn(*args)
+    return result, profile.queries
+
+
+def test_moves_are_hidden_until_completed(game):
+    game_id, (abebe, kebede, almaz) = game
+    assert RPSGame.make_choice(game_id, abebe, 'rock')
+
+    status = RPSGame.get_game_status(game_id, kebede)
+    players = {p['user_id']: p for p in status['players']}
+    assert status['players_ready'] == 1
+    assert players[abebe]['has_chosen'] and 'choice' not in players[abebe]
+    assert not players[kebede]['has_chosen'] and players[kebede]['choice'] is None
+
+    assert RPSGame.get_game_status(game_id, abebe)['players'][0]['choice'] == 'rock'
+
+
+def test_refresh_costs_one_query_then_none(game):
+    game_id, (abebe, kebede, almaz) = game
+    status, count = queries(RPSGame.get_game_status, game_id, abebe)
+    assert count == 1
+    assert [p['username'] for p in status['players']] == ['abebe', 'kebede', 'almaz']
+
+    _, count = queries(RPSGame.get_game_status, game_id, kebede)
+    assert count == 0
+
+
+def test_moves_and_settlement_invalidate_the_cache(game):
+    game_id, (abebe, kebede, almaz) = game
+    RPSGame.get_game_status(game_id)
+
+    RPSGame.make_choice(game_id, abebe, 'rock')
+    status, count = queries(RPSGame.get_game_status, game_id)
+    assert count == 1
+    assert status['players_ready'] == 1
+
+    RPSGame.make_choice(game_id, kebede, 'scissors')
+    RPSGame.make_choice(game_id, almaz, 'scissors')
+    status = RPSGame.get_game_status(game_id)
+    assert status['is_completed']
+    assert status['winner'] == {'user_id': abebe, 'username': 'abebe', 'winnings': 30.0}
+    assert {p['choice'] for p in status['players']} == {'rock', 'scissors'}
+
+
+def test_active_game_lookup_is_one_joined_query(game):
+    game_id, (abebe, kebede, almaz) = game
+    snapshot, count = queries(game_status.CACHE.get_active, kebede, ('in_progress',))
+    assert count == 1
+    assert snapshot.game_id == game_id
+    assert snapshot.player(kebede).username == 'kebede'
+
+    _, count = queries(game_status.CACHE.get_active, almaz, ('in_progress',))
+    assert count == 0
+    assert game_status.CACHE.get_active(almaz, ('waiting',)) is None
+
+
+def test_missing_game(app):
+    assert RPSGame.get_game_status(12345) is None
@@ -0,0 +1,162 @@
+"""Tests for the async job queue"""
+import asyncio
+import time
+
+import pytest
+
+from jobs import JobQueue, MemoryJobStore, SQLiteJobStore
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrency_is_bounded_per_type():
+    queue = JobQueue('t', MemoryJobStore())
+    active = {'now': 0, 'max': 0}
+    done = []
+
+    async def slow(bot, payload):
+        active['now'] += 1
+        active['max'] = max(active['max'], active['now'])
+        await asyncio.sleep(0.01)
+        active['now'] -= 1
+        done.append(payload['n'])
+
+    queue.register('slow', slow, concurrency=2)
+
+    async def main():
+        await queue.start()
+        for n in range(6):
+            queue.enqueue('slow', {'n': n})
+        await queue.join()
+        await queue.stop()
+
+    run(main())
+    assert sorted(done) == list(range(6))
+    assert active['max'] == 2
+
+
+def test_failed_jobs_are_retried_then_dead_lettered():
+    queue = JobQueue('t', MemoryJobStore())
+    calls = {'flaky': 0, 'broken': 0}
+
+    async def flaky(bot, payload):
+        calls['flaky'] += 1
+        if calls['flaky'] < 2:
+            raise ConnectionError('timed out')
+
+    async def broken(bot, payload):
+        calls['broken'] += 1
+        raise ValueError('bad chat')
+
+    queue.register('flaky', flaky, backoff=0.01)
+    queue.register('broken', broken, max_attempts=3, backoff=0.01)
+
+    async def main():
+        await queue.start()
+        queue.enqueue('flaky')
+        queue.enqueue('broken', {'chat_id': 1})
+        await queue.join()
+        await queue.stop()
+
+    run(main())
+    assert calls == {'flaky': 2, 'broken': 3}
+    [dead] = queue.dead_letters()
+    assert dead.type == 'broken'
+    assert dead.attempts == 3
+    assert dead.last_error == 'ValueError: bad chat'
+
+
+def test_durable_jobs_survive_a_restart(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    sent = []
+
+    async def notify(bot, payload):
+        sent.append((bot, payload['chat_id']))
+
+    # Enqueued but never started, as if the bot died before sending
+    first = JobQueue('bot', SQLiteJobStore(path, 'bot'))
+    first.register('notify', notify)
+    first.enqueue('notify', {'chat_id': 1})
+    first.enqueue('notify', {'chat_id': 2})
+    first.store.close()
+
+    # Another queue in the same file does not see them
+    other = SQLiteJobStore(path, 'other')
+    assert other.load() == []
+
+    second = JobQueue('bot', SQLiteJobStore(path, 'bot'))
+    second.register('notify', notify)
+
+    async def main():
+        await second.start(bot='bot')
+        await second.join()
+        await second.stop()
+
+    run(main())
+    assert sorted(sent) == [('bot', 1), ('bot', 2)]
+    assert second.store.load() == []
+
+
+def test_dead_letters_can_be_retried(tmp_path):
+    store = SQLiteJobStore(str(tmp_path / 'jobs.db'), 'bot')
+    queue = JobQueue('bot', store)
+    attempts = []
+
+    async def notify(bot, payload):
+        attempts.append(payload['chat_id'])
+        if len(attempts) == 1:
+            raise RuntimeError('telegram down')
+
+    queue.register('notify', notify, max_attempts=1)
+
+    async def main():
+        await queue.start()
+        queue.enqueue('notify', {'chat_id': 7})
+        await queue.join()
+        assert [job.payload for job in queue.dead_letters()] == [{'chat_id': 7}]
+        assert queue.retry_dead() == 1
+        await queue.join()
+        await queue.stop()
+
+    run(main())
+    assert attempts == [7, 7]
+    assert queue.dead_letters() == []
+
+
+def test_enqueue_is_fast_and_rejects_unknown_types(tmp_path):
+    queue = JobQueue('t', SQLiteJobStore(str(tmp_path / 'jobs.db'), 't'))
+
+    async def noop(bot, payload):
+        pass
+
+    queue.register('notify', noop)
+    with pytest.raises(ValueError):
+        queue.enqueue('telepathy')
+
+    started = time.perf_counter()
+    for n in range(100):
+        queue.enqueue('notify', {'chat_id': n, 'text': 'You won!'}, delay=60)
+    assert (time.perf_counter() - started) / 100 < 0.05
+
+
+def test_periodic_jobs_run_while_started():
+    queue = JobQueue('t', MemoryJobStore())
+    ticks = []
+
+    async def tick(bot, payload):
+        ticks.append(payload['n'])
+
+    queue.register('tick', tick)
+    queue.every('tick', 0.01, {'n': 1})
+
+    async def main():
+        await queue.start()
+        await asyncio.sleep(0.05)
+        await queue.stop()
+
+    run(main())
+    assert len(ticks) >= 2
+    with pytest.raises(ValueError):
+        queue.every('telepathy', 1)
@@ -0,0 +1,141 @@
+"""Tests for rolling 24-hour deposit and withdrawal limits"""
+import time
+
+import limits as limits_module
+import payment_service
+from extensions import db
+from limits import LimitCounters, WINDOW_MINUTES, register_limit_listeners
+from models import User, LimitBucket, Transaction
+from payment_service import PaymentService
+
+
+class Clock:
+    def __init__(self, now=1_700_000_000):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_counters(clock, deposit=500, withdrawal=1500, reload_seconds=3600):
+    return LimitCounters({'deposit': deposit, 'withdrawal': withdrawal}, reload_seconds=reload_seconds, clock=clock)
+
+
+def test_window_rolls_over_24_hours(app):
+    clock = Clock()
+    limits = make_counters(clock)
+
+    limits.record(1, 'deposit', 300)
+    db.session.commit()
+    clock.now += 10 * 60
+    limits.record(1, 'deposit', 150)
+    db.session.commit()
+
+    assert limits.used(1, 'deposit') == 450
+    assert limits.check(1, 'deposit', 50) == (True, "")
+    allowed, message = limits.check(1, 'deposit', 100)
+    assert not allowed and message == "Daily deposit limit of 500.00 ETB exceeded. Remaining: 50.00 ETB"
+    assert limits.check(1, 'deposit', 100, limit=600) == (True, "")  # a caller with a cap of its own
+    assert limits.used(2, 'deposit') == 0 and limits.used(1, 'withdrawal') == 0
+
+    # The first deposit leaves the window a day after it was made, the second ten minutes later
+    clock.now += WINDOW_MINUTES * 60 - 10 * 60
+    assert limits.used(1, 'deposit') == 150
+    clock.now += 10 * 60
+    assert limits.remaining(1, 'deposit') == 500
+
+    assert limits.prune() == 2 and LimitBucket.query.count() == 0
+
+
+def test_counts_move_on_commit_only(app):
+    clock = Clock()
+    limits = make_counters(clock)
+    limits.used(1, 'withdrawal')
+
+    limits.record(1, 'withdrawal', 1000)
+    assert limits.used(1, 'withdrawal') == 0  # not until it commits
+    db.session.rollback()
+    assert limits.used(1, 'withdrawal') == 0 and LimitBucket.query.count() == 0
+
+    minute = limits.record(1, 'withdrawal', 1000)
+    limits.record(1, 'withdrawal', 200)
+    db.session.commit()
+    assert limits.used(1, 'withdrawal') == 1200
+    assert LimitBucket.query.count() == 1  # one row per minute
+
+    limits.release(1, 'withdrawal', 1000, minute)
+    db.session.commit()
+    assert limits.used(1, 'withdrawal') == 200
+
+
+def test_windows_recover_from_the_table(app):
+    clock = Clock()
+    limits = make_counters(clock)
+    for user_id, amount in ((1, 100), (2, 250), (2, 50)):
+        limits.record(user_id, 'deposit', amount)
+        clock.now += 60
+    db.session.commit()
+
+    # A restarted process warms its windows from limit_buckets
+    restarted = make_counters(clock)
+    assert restarted.recover() == 2
+    assert restarted.used(2, 'deposit') == 300
+
+    # Another process's deposit shows up once the cached window is reload_seconds old
+    limits.record(2, 'deposit', 150)
+    db.session.commit()
+    assert restarted.used(2, 'deposit') == 300
+    clock.now += 3601
+    assert restarted.used(2, 'deposit') == 450
+
+
+def test_withdrawals_over_the_daily_limit_are_refused(app, monkeypatch):
+    monkeypatch.setattr(payment_service, 'LIMITS', make_counters(Clock()))
+    user = User(username='erin', full_name='Erin', email='erin@example.com', password='x', balance=3000)
+    db.session.add(user)
+    db.session.commit()
+
+    assert PaymentService.create_withdrawal(user.id, 1000, {})[0]
+    success, message = PaymentService.create_withdrawal(user.id, 600, {})
+
+    assert not success and message == "Daily withdrawal limit of 1,500.00 ETB exceeded. Remaining: 500.00 ETB"
+    assert db.session.get(User, user.id).balance == 2000
+
+
+def test_failed_transactions_give_their_limit_back(app, monkeypatch):
+    clock = Clock(time.time() - 2 * 3600)
+    limits = make_counters(clock)
+    monkeypatch.setattr(limits_module, 'LIMITS', limits)
+    monkeypatch.setattr(payment_service, 'LIMITS', limits)
+    register_limit_listeners()
+    user = User(username='erin', full_name='Erin', email='erin@example.com', password='x', balance=3000)
+    db.session.add(user)
+    db.session.commit()
+
+    assert PaymentService.create_withdrawal(user.id, 1000, {})[0]
+    deposit = Transaction(user_id=user.id, tx_ref='deposit-1', type='deposit', amount=400, status='pending')
+    db.session.add(deposit)
+    limits.record_transaction(deposit)
+    db.session.commit()
+    assert (limits.used(user.id, 'withdrawal'), limits.used(user.id, 'deposit')) == (1000, 400)
+
+    # Rejecting the withdrawal hands its amount back, once
+    withdrawal = Transaction.query.filter_by(type='withdrawal').one()
+    withdrawal.status = 'rejected'
+    db.session.commit()
+    withdrawal.status = 'failed'
+    db.session.commit()
+    assert limits.used(user.id, 'withdrawal') == 0
+
+    # An abandoned checkout is cancelled and released; a late callback completing it counts again
+    assert PaymentService.expire_abandoned_deposits() == 1
+    assert limits.used(user.id, 'deposit') == 0
+    deposit.status = 'completed'
+    db.session.commit()
+    assert limits.used(user.id, 'deposit') == 400
+    restarted = make_counters(clock)
+    assert (restarted.used(user.id, 'withdrawal'), restarted.used(user.id, 'deposit')) == (0, 400)
+
+    # Once it has left the window there is nothing left to release
+    clock.now += WINDOW_MINUTES * 60
+    assert not limits.release_transaction(deposit)
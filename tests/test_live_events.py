@@ -0,0 +1,158 @@
+"""Tests for live game and transaction events"""
+import json
+
+import pytest
+
+import live_events
+import routes
+from admin.bulk import BulkOperations
+from extensions import db
+from live_events import Broker, register_live_listeners
+from models import User, Game, GameParticipant, Transaction
+from routes import register_routes
+from tournaments import TournamentService
+
+
+@pytest.fixture
+def app(app):
+    register_routes(app)
+    register_live_listeners()
+    return app
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    broker = Broker(max_subscribers=2, queue_size=3)
+    monkeypatch.setattr(live_events, 'BROKER', broker)
+    monkeypatch.setattr(routes, 'BROKER', broker)
+    return broker
+
+
+def received(subscription):
+    """[(event name, data)] queued for a subscription"""
+    events = []
+    while not subscription.queue.empty():
+        _, name, data = subscription.queue.get_nowait().text.splitlines()[:3]
+        events.append((name[len('event: '):], json.loads(data[len('data: '):])))
+    return events
+
+
+def make_users():
+    users = [User(username=name, full_name=name, email=f"{name}@example.com", password='x', balance=100)
+             for name in ('abebe', 'kebede', 'almaz')]
+    db.session.add_all(users)
+    db.session.commit()
+    return [user.id for user in users]
+
+
+def test_game_changes_are_published_on_commit_without_moves(app, broker):
+    abebe, kebede, almaz = make_users()
+    game = Game(creator_id=abebe, bet_amount=10, status='waiting')
+    db.session.add(game)
+    db.session.commit()
+    follower = broker.subscribe([live_events.game_channel(game.id)])
+
+    db.session.add_all([GameParticipant(game_id=game.id, user_id=user_id) for user_id in (abebe, kebede)])
+    db.session.flush()
+    assert received(follower) == []
+    db.session.rollback()
+    assert received(follower) == []
+
+    db.session.add(GameParticipant(game_id=game.id, user_id=abebe))
+    db.session.commit()
+    participant = GameParticipant.query.filter_by(user_id=abebe).one()
+    participant.move = 'rock'
+    game.status = 'completed'
+    game.winner_id = abebe
+    db.session.commit()
+
+    events = received(follower)
+    assert [name for name, _ in events] == ['joined', 'move', 'status']
+    assert events[1][1] == {'channel': f"game:{game.id}", 'game_id': game.id, 'user_id': abebe}
+    assert events[2][1]['status'] == 'completed' and events[2][1]['winner_id'] == abebe
+    assert 'rock' not in json.dumps(events)
+
+
+def test_transaction_status_reaches_the_stream(app, broker):
+    abebe, _, _ = make_users()
+    transaction = Transaction(user_id=abebe, tx_ref='TX-1', type='deposit', amount=50, status='pending')
+    db.session.add(transaction)
+    db.session.commit()
+
+    response = app.test_client().get('/events?transaction=TX-1&transaction=TX-1')
+    assert response.mimetype == 'text/event-stream'
+    stream = iter(response.response)
+    assert next(stream) == b'retry: 3000\n\n'
+    # Published before the browser connected, so it is replayed
+    assert b'"status": "pending"' in next(stream)
+    assert len(broker) == 1
+
+    transaction.status = 'completed'
+    db.session.commit()
+    assert b'event: status' in next(stream) and len(broker) == 1
+    response.close()
+    assert len(broker) == 0
+
+
+def test_core_statements_publish_on_commit(app, broker):
+    abebe, kebede, almaz = make_users()
+    game = Game(creator_id=abebe, bet_amount=10, status='waiting')
+    db.session.add(game)
+    db.session.flush()
+    db.session.add_all([GameParticipant(game_id=game.id, user_id=user_id) for user_id in (abebe, kebede)])
+    db.session.commit()
+    refund = live_events.transaction_channel(f"admin_cancel_{game.id}_{kebede}")
+    follower = broker.subscribe([live_events.game_channel(game.id), refund])
+
+    BulkOperations.cancel_games(ref_prefix='admin_cancel')
+    assert received(follower) == [
+        ('status', {'channel': f"game:{game.id}", 'game_id': game.id, 'status': 'cancelled', 'winner_id': None}),
+        ('status', {'channel': refund, 'tx_ref': refund.split(':')[1], 'status': 'completed'}),
+    ]
+
+    tournament = TournamentService.create('Cup', buy_in=0)
+    for user_id in (abebe, kebede, almaz):
+        TournamentService.register(tournament.id, user_id)
+    TournamentService.start(tournament.id)
+    [table] = Game.query.filter_by(tournament_id=tournament.id).all()
+    assert broker.last_events([live_events.game_channel(table.id)])[0].text.count('"in_progress"') == 1
+
+    cancelled = TournamentService.create('Cancelled', buy_in=5)
+    TournamentService.register(cancelled.id, abebe)
+    TournamentService.cancel(cancelled.id)
+    [event] = broker.last_events([live_events.transaction_channel(f"tournament_{cancelled.id}_refund_{abebe}")])
+    assert '"completed"' in event.text
+
+
+def test_broker_bounds_connections_and_drops_slow_ones(broker):
+    first = broker.subscribe(['game:1'])
+    second = broker.subscribe(['game:1', 'game:2'])
+    assert broker.subscribe(['game:3']) is None
+
+    for status in ('waiting', 'in_progress', 'in_progress', 'completed'):
+        assert broker.publish('game:1', 'status', {'status': status}) <= 2
+    assert first.closed and second.closed and broker.dropped == 2
+    assert len(broker) == 0
+
+    assert [item.id for item in broker.last_events(['game:1', 'game:2'])] == [4]
+    assert broker.last_events(['game:1'], after=4) == []
+
+    stream = broker.stream(broker.subscribe(['game:2']), heartbeat=0.01)
+    assert next(stream).startswith('retry')
+    assert next(stream) == ': keep-alive\n\n'
+    broker.publish('game:2', 'joined', {'user_id': 7})
+    assert '"user_id": 7' in next(stream)
+    stream.close()
+    assert len(broker) == 0
+
+
+def test_events_endpoint_validates_channels(app, broker):
+    client = app.test_client()
+    assert client.get('/events').status_code == 400
+    assert client.get('/events?game=abc').status_code == 400
+    assert client.get('/events?' + '&'.join(f"game={i}" for i in range(21))).status_code == 400
+
+    broker.subscribe(['game:1'])
+    broker.subscribe(['game:1'])
+    full = client.get('/events?game=1')
+    assert (full.status_code, full.headers['Retry-After']) == (503, '30')
@@ -0,0 +1,49 @@
+"""Tests for the load-testing harness pieces that run without a bot"""
+import json
+import urllib.request
+
+from loadtest.fake_telegram import FakeTelegramServer
+from loadtest.report import LatencyRecorder, percentiles
+
+
+def _call(server, method, **params):
+    request = urllib.request.Request(
+        f"{server.bot_api_url}123:TOKEN/{method}",
+        data=json.dumps(params).encode(),
+        headers={'Content-Type': 'application/json'}
+    )
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return json.loads(response.read())['result']
+
+
+def test_percentiles():
+    assert percentiles([])['p50'] is None
+    stats = percentiles([i / 1000 for i in range(1, 101)])
+    assert stats['p50'] == 50.5
+    assert stats['max'] == 100.0
+    assert percentiles([0.002])['p99'] == 2.0
+
+
+def test_fake_server_round_trip():
+    latencies = LatencyRecorder()
+    server = FakeTelegramServer(on_handled=latencies.record).start()
+    user = {'id': 42, 'is_bot': False, 'first_name': 'Abebe'}
+    try:
+        server.send_text(user, '/deposit 100')
+        updates = _call(server, 'getUpdates', offset=0, timeout=1)
+        assert updates[0]['message']['entities'][0]['type'] == 'bot_command'
+
+        keyboard = {'inline_keyboard': [[{'text': 'Verify', 'callback_data': 'verify_tx1'}]]}
+        _call(server, 'sendMessage', chat_id=42, text='Pay here', reply_markup=keyboard)
+        reply = server.wait_for(42, lambda call: 'Pay' in call.text, timeout=1)
+        assert reply.buttons() == ['verify_tx1']
+        assert list(latencies.snapshot()) == ['/deposit']
+
+        server.press_button(user, 'verify_tx1')
+        updates = _call(server, 'getUpdates', offset=updates[-1]['update_id'] + 1, timeout=1)
+        assert updates[0]['callback_query']['data'] == 'verify_tx1'
+        assert server.wait_for(42, timeout=0.05) is None
+        server.abandon(42)
+        assert server.unhandled == 1
+    finally:
+        server.stop()
@@ -0,0 +1,102 @@
+"""Tests for the Prometheus-style metrics module"""
+import asyncio
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, text
+from telegram.ext import Application, CallbackQueryHandler, CommandHandler
+
+import metrics
+
+
+@pytest.fixture
+def enabled():
+    metrics.enable()
+    yield
+    metrics.enable(False)
+
+
+def test_disabled_instruments_record_nothing():
+    registry = metrics.Registry()
+    counter = metrics.Counter('t_disabled_total', 'Test counter', registry=registry)
+    metrics.enable(False)
+    counter.inc()
+    assert counter.value() is None
+
+
+def test_histogram_renders_cumulative_buckets(enabled):
+    registry = metrics.Registry()
+    histogram = metrics.Histogram('t_latency_seconds', 'Test latency', ('handler',), buckets=(0.1, 1.0), registry=registry)
+    for value in (0.05, 0.5, 2.0):
+        histogram.observe(value, handler='/join_game')
+
+    output = registry.render()
+    assert '# TYPE t_latency_seconds histogram' in output
+    assert 't_latency_seconds_bucket{handler="/join_game",le="0.1"} 1' in output
+    assert 't_latency_seconds_bucket{handler="/join_game",le="1"} 2' in output
+    assert 't_latency_seconds_bucket{handler="/join_game",le="+Inf"} 3' in output
+    assert 't_latency_seconds_count{handler="/join_game"} 3' in output
+
+
+def test_gauge_function_and_label_escaping(enabled):
+    registry = metrics.Registry()
+    gauge = metrics.Gauge('t_waiting', 'Test gauge', ('bet_amount',), registry=registry)
+    gauge.set_function(lambda: {('10',): 3, ('a"b',): 1})
+    output = registry.render()
+    assert 't_waiting{bet_amount="10"} 3' in output
+    assert 't_waiting{bet_amount="a\\"b"} 1' in output
+
+
+def test_track_gateway_counts_failures(enabled):
+    @metrics.track_gateway('chapa', 't_verify')
+    def verify(ok):
+        return ok, 'message', None
+
+    verify(True)
+    verify(False)
+    assert metrics.GATEWAY_LATENCY.count(provider='chapa', operation='t_verify') == 2
+    assert metrics.GATEWAY_ERRORS.value(provider='chapa', operation='t_verify') == 1
+
+
+def test_flask_endpoint_and_query_counts(enabled):
+    app = Flask(__name__)
+    app.config['METRICS_ENABLED'] = True
+    metrics.init_app(app, name='t_app')
+    engine = create_engine('sqlite://')
+
+    @app.route('/t_queries')
+    def run_queries():
+        with engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+            conn.execute(text('SELECT 2'))
+        return 'ok'
+
+    client = app.test_client()
+    assert client.get('/t_queries').status_code == 200
+    assert metrics.HTTP_LATENCY.count(app='t_app', endpoint='run_queries', method='GET', status=200) == 1
+    assert metrics.DB_QUERIES_PER_UNIT.value(scope='run_queries')[-1] == 2
+
+    response = client.get('/metrics')
+    assert response.content_type == metrics.CONTENT_TYPE
+    assert 'rps_http_request_seconds_count{app="t_app",endpoint="run_queries",method="GET",status="200"} 1' in response.get_data(as_text=True)
+
+
+def test_instrument_application_labels_handlers(enabled):
+    async def join_game(update, context):
+        return 'joined'
+
+    async def verify(update, context):
+        raise RuntimeError('boom')
+
+    application = Application.builder().token('123:TEST').build()
+    application.add_handler(CommandHandler('join_game', join_game))
+    application.add_handler(CallbackQueryHandler(verify, pattern='^t_verify_'))
+    metrics.instrument_application(application, 't_bot')
+
+    command, callback = application.handlers[0]
+    assert asyncio.run(command.callback(None, None)) == 'joined'
+    with pytest.raises(RuntimeError):
+        asyncio.run(callback.callback(None, None))
+
+    assert metrics.HANDLER_LATENCY.count(bot='t_bot', handler='/join_game') == 1
+    assert metrics.HANDLER_ERRORS.value(bot='t_bot', handler='^t_verify_') == 1
@@ -0,0 +1,127 @@
+"""Tests for the public page cache and conditional GET"""
+import os
+import time
+
+import pytest
+from flask import Flask
+
+import page_cache
+from extensions import db
+from models import User, Game, GameParticipant, Transaction
+from page_cache import PageCache, cached_page
+from routes import register_routes
+from sql_profiler import SQLProfiler
+from webhooks import webhooks
+
+_profiler = SQLProfiler(capture_stacks=False).install()
+
+TEMPLATES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates')
+
+
+@pytest.fixture
+def app(app):
+    app.template_folder = TEMPLATES
+    app.secret_key = 'test'
+    register_routes(app)
+    app.register_blueprint(webhooks, url_prefix='/webhooks')
+    page_cache.CACHE.invalidate()
+    return app
+
+
+def get(client, path, **headers):
+    with _profiler.profile('page') as profile:
+        response = client.get(path, headers=headers)
+    return response, profile.queries
+
+
+def make_game(status):
+    users = [User(username=name, full_name=name, email=f"{name}@example.com", password='x', wins=i + 1)
+             for i, name in enumerate(('abebe', 'kebede', 'almaz'))]
+    db.session.add_all(users)
+    db.session.flush()
+    game = Game(creator_id=users[0].id, bet_amount=10, status=status, winner_id=users[0].id)
+    db.session.add(game)
+    db.session.flush()
+    db.session.add_all([GameParticipant(game_id=game.id, user_id=user.id, move='rock') for user in users])
+    db.session.commit()
+    return game
+
+
+def test_leaderboard_is_served_from_memory_and_revalidated_by_etag(client):
+    make_game('completed')
+
+    first, queries = get(client, '/leaderboard')
+    assert first.status_code == 200 and queries > 0
+    assert b'almaz' in first.data
+    assert first.headers['Cache-Control'] == 'public, max-age=10, stale-while-revalidate=60'
+    etag = first.headers['ETag']
+
+    again, queries = get(client, '/leaderboard')
+    assert (again.data, again.headers['ETag'], queries) == (first.data, etag, 0)
+
+    not_modified, queries = get(client, '/leaderboard', **{'If-None-Match': etag})
+    assert (not_modified.status_code, not_modified.data, queries) == (304, b'', 0)
+    assert page_cache.CACHE.not_modified == 1
+
+    changed, _ = get(client, '/leaderboard', **{'If-None-Match': '"other"'})
+    assert changed.status_code == 200
+
+
+def test_completed_results_are_immutable_and_others_pass_through(client):
+    game = make_game('in_progress')
+    path = f"/game/{game.id}/result"
+
+    pending, _ = get(client, path)
+    assert pending.status_code == 302 and 'ETag' not in pending.headers
+
+    game.status = 'completed'
+    db.session.commit()
+    result, _ = get(client, path)
+    assert result.status_code == 200
+    assert result.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+
+    not_modified, queries = get(client, path, **{'If-None-Match': result.headers['ETag']})
+    assert (not_modified.status_code, queries) == (304, 0)
+    assert get(client, '/game/999/result')[0].status_code == 404
+
+
+def test_payment_receipts_are_private(client):
+    user = User(username='abebe', full_name='Abebe', email='abebe@example.com', password='x', balance=150)
+    db.session.add(user)
+    db.session.flush()
+    db.session.add(Transaction(user_id=user.id, tx_ref='TX-1', type='deposit', amount=50, status='completed'))
+    db.session.commit()
+
+    receipt, _ = get(client, '/webhooks/success?tx_ref=TX-1')
+    assert receipt.status_code == 200 and b'150' in receipt.data
+    assert receipt.headers['Cache-Control'].startswith('private, ')
+    assert get(client, '/webhooks/success?tx_ref=TX-2')[0].status_code == 404
+    assert get(client, '/webhooks/success?tx_ref=TX-1', **{'If-None-Match': receipt.headers['ETag']})[1] == 0
+
+
+def test_stale_pages_are_served_while_one_render_replaces_them():
+    app = Flask(__name__)
+    cache = PageCache()
+    renders = []
+
+    @app.route('/stats')
+    @cached_page(ttl=0.05, stale=60, cache=cache)
+    def stats():
+        renders.append(1)
+        return f"render {len(renders)}"
+
+    client = app.test_client()
+    assert client.get('/stats').data == b'render 1'
+    time.sleep(0.06)
+
+    stale = client.get('/stats')
+    assert stale.data == b'render 1'
+    assert stale.headers['Cache-Control'] == 'public, max-age=0, stale-while-revalidate=60'
+    deadline = time.monotonic() + 2
+    while client.get('/stats').data != b'render 2' and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(renders) == 2 and cache.stale_hits >= 1
+
+    cache.invalidate()
+    assert client.get('/stats').data == b'render 3'
+    assert client.post('/stats').status_code == 405
@@ -0,0 +1,36 @@
+"""Tests for keyset pagination helpers"""
+import pytest
+
+from pagination import MAX_PAGE_SIZE, Page, clamp_page_size, decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    """Cursors decode back to the key they were built from"""
+    cursor = encode_cursor(123456789)
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == 123456789
+
+
+def test_empty_cursor_is_first_page():
+    assert decode_cursor(None) is None
+    assert decode_cursor('') is None
+
+
+def test_garbage_cursor_is_rejected():
+    with pytest.raises(ValueError):
+        decode_cursor('not-a-cursor')
+
+
+def test_page_size_is_clamped():
+    assert clamp_page_size(None) == 50
+    assert clamp_page_size('abc') == 50
+    assert clamp_page_size(0) == 1
+    assert clamp_page_size(10 ** 6) == MAX_PAGE_SIZE
+
+
+def test_page_behaves_like_a_list():
+    page = Page([1, 2, 3], next_cursor='abc')
+    assert list(page) == [1, 2, 3]
+    assert len(page) == 3
+    assert page.has_more
+    assert not Page([])
@@ -0,0 +1,157 @@
+"""Tests for batched withdrawal payouts"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+import live_events
+from admin import payouts
+from admin.payouts import PayoutPipeline, PayoutProvider
+from extensions import db
+from live_events import Broker, register_live_listeners
+from models import User, Transaction, WithdrawalRequest, PayoutBatch
+from stats_rollup import StatsRollup, register_rollup_listeners
+
+
+def fake_provider(monkeypatch, name, batch_size=2, fail=(), error=None, delay=0.0):
+    """Replace a provider; records the batches it is sent"""
+    sent = []
+
+    def send(items, timeout):
+        sent.append([item['id'] for item in items])
+        time.sleep(delay)
+        if error:
+            raise error
+        return f"{name}-batch", {
+            item['id']: (item['id'] not in fail, 'declined' if item['id'] in fail else f"{name}-{item['id']}")
+            for item in items
+        }
+
+    monkeypatch.setitem(payouts.PROVIDERS, name, PayoutProvider(name, send, batch_size))
+    return sent
+
+
+def request_withdrawals(user, amounts, days_ago=1, linked=True):
+    """Pending requests as the bot makes them: balance already taken, one pending transaction each"""
+    ids = []
+    for n, amount in enumerate(amounts):
+        tx_ref = f"WD_{user.id}_{n}_{amount}"
+        db.session.add(Transaction(user_id=user.id, tx_ref=tx_ref, type='withdrawal', amount=amount, status='pending'))
+        withdrawal = WithdrawalRequest(user_id=user.id, amount=amount, wallet_address='0911000000',
+                                       tx_ref=tx_ref if linked else None,
+                                       created_at=datetime.utcnow() - timedelta(days=days_ago))
+        db.session.add(withdrawal)
+        db.session.flush()
+        ids.append(withdrawal.id)
+    db.session.commit()
+    return ids
+
+
+def make_user(name, wallet_id=None):
+    user = User(username=name, full_name=name.title(), email=f"{name}@example.com", password='x',
+                balance=0, wallet_id=wallet_id)
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def test_bulk_approval_pays_per_provider_and_refunds_failures(app, monkeypatch):
+    capa_sent = fake_provider(monkeypatch, 'capa', fail={2})
+    chapa_sent = fake_provider(monkeypatch, 'chapa')
+    alice, bob = make_user('alice', wallet_id='capa-1'), make_user('bob')
+    alice_ids = request_withdrawals(alice, [100, 200, 300])
+    bob_ids = request_withdrawals(bob, [50, 60], linked=False)
+    recent = request_withdrawals(bob, [70], days_ago=0)
+
+    result = PayoutPipeline.approve(created_before=datetime.utcnow() - timedelta(hours=12), concurrency=2)
+
+    assert sorted(capa_sent) == [[1, 2], [3]]
+    assert chapa_sent == [bob_ids]
+    assert (result.total, result.processed, result.affected, result.failed) == (5, 5, 4, 1)
+    assert (result.amount, result.refunded, result.batches) == (510, 200, 3)
+    assert result.errors == ['Withdrawal 2: declined']
+
+    statuses = {w.id: (w.status, w.provider, w.reference) for w in WithdrawalRequest.query}
+    assert statuses[alice_ids[0]] == ('completed', 'capa', 'capa-1')
+    assert statuses[alice_ids[1]][0] == 'failed'
+    assert statuses[bob_ids[0]] == ('completed', 'chapa', 'chapa-4')
+    assert statuses[recent[0]] == ('pending', None, None)
+    assert db.session.get(User, alice.id).balance == 200  # the failed payout came back
+    assert db.session.get(User, bob.id).balance == 0
+
+    # Requests without a tx_ref were matched to their transaction
+    tx_status = {tx.tx_ref: tx.status for tx in Transaction.query}
+    assert tx_status[f"WD_{bob.id}_0_50"] == 'completed'
+    assert tx_status[f"WD_{alice.id}_1_200"] == 'failed'
+    assert tx_status[f"WD_{bob.id}_0_70"] == 'pending'
+    assert sorted(b.status for b in PayoutBatch.query) == ['completed', 'completed', 'partial']
+
+    # Nothing is paid twice
+    assert PayoutPipeline.approve(withdrawal_ids=alice_ids).processed == 0
+
+
+def test_provider_errors_fail_the_batch_and_concurrency_is_bounded(app, monkeypatch):
+    in_flight, peak, lock = [0], [0], threading.Lock()
+
+    def send(items, timeout):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.05)
+        with lock:
+            in_flight[0] -= 1
+        if 7 in [item['id'] for item in items]:
+            raise TimeoutError('provider timed out')
+        return None, {item['id']: (True, 'ok') for item in items}
+
+    monkeypatch.setitem(payouts.PROVIDERS, 'chapa', PayoutProvider('chapa', send, 2))
+    carol = make_user('carol')
+    request_withdrawals(carol, [10] * 12)
+
+    result = PayoutPipeline.approve(concurrency=3)
+
+    assert peak[0] == 3
+    assert (result.batches, result.affected, result.failed) == (6, 10, 2)
+    assert db.session.get(User, carol.id).balance == 20
+    failed = WithdrawalRequest.query.filter_by(status='failed').all()
+    assert [(w.id, w.failure_reason) for w in failed] == [(7, 'Error: provider timed out'),
+                                                         (8, 'Error: provider timed out')]
+    assert 'items/s' in result.summary()
+
+
+def test_dry_run_and_reject(app, monkeypatch):
+    sent = fake_provider(monkeypatch, 'chapa')
+    dave = make_user('dave')
+    ids = request_withdrawals(dave, [100, 250, 400])
+
+    preview = PayoutPipeline.approve(max_amount=300, dry_run=True)
+    assert (preview.processed, preview.amount) == (2, 350)
+    assert sent == [] and WithdrawalRequest.query.filter_by(status='pending').count() == 3
+
+    result = PayoutPipeline.reject(ids[:2] + [999], reason='KYC')
+    assert (result.affected, result.amount) == (2, 350)
+    assert db.session.get(User, dave.id).balance == 350
+    assert [w.status for w in WithdrawalRequest.query.order_by(WithdrawalRequest.id)] == \
+        ['rejected', 'rejected', 'pending']
+    assert Transaction.query.filter_by(status='rejected').count() == 2
+    assert PayoutPipeline.reject(ids[:1]).affected == 0
+
+
+def test_settled_transactions_reach_the_rollup_and_live_events(app, monkeypatch):
+    register_rollup_listeners()
+    register_live_listeners()
+    broker = Broker()
+    monkeypatch.setattr(live_events, 'BROKER', broker)
+    fake_provider(monkeypatch, 'chapa', fail={2})
+    erin = make_user('erin')
+    ids = request_withdrawals(erin, [100, 40, 25])
+    follower = broker.subscribe([live_events.transaction_channel(f"WD_{erin.id}_{n}_{amount}")
+                                 for n, amount in enumerate((100, 40, 25))])
+
+    PayoutPipeline.approve(withdrawal_ids=ids[:2])
+    PayoutPipeline.reject(ids[2:])
+
+    assert StatsRollup.day().withdrawal_volume == 100
+    statuses = []
+    while not follower.queue.empty():
+        statuses.append(follower.queue.get_nowait().text.split('"status": "')[1].split('"')[0])
+    assert statuses == ['completed', 'failed', 'rejected']
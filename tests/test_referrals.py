@@ -0,0 +1,107 @@
+"""Tests for referral qualification and batched bonus payouts"""
+import pytest
+
+from extensions import db
+from game import RPSGame
+from models import User, Game, GameParticipant, Transaction, Referral
+from referrals import ReferralService, register_referral_listeners
+from config import REFERRAL_BONUS_AMOUNT, REFERRAL_MIN_GAMES
+
+
+@pytest.fixture
+def app(app):
+    register_referral_listeners()
+    return app
+
+
+def make_user(name, balance=100):
+    user = User(username=name, full_name=name, email=f"{name}@example.com", password='x', balance=balance)
+    db.session.add(user)
+    db.session.flush()
+    return user
+
+
+def deposit(user, amount=50):
+    db.session.add(Transaction(user_id=user.id, tx_ref=f"dep_{user.id}_{amount}",
+                               type='deposit', amount=amount, status='pending'))
+    db.session.commit()
+    tx = Transaction.query.filter_by(user_id=user.id, type='deposit').first()
+    tx.status = 'completed'
+    db.session.commit()
+
+
+def play(players, moves=('rock', 'scissors', 'scissors')):
+    game = Game(creator_id=players[0].id, bet_amount=10, status='in_progress')
+    db.session.add(game)
+    db.session.flush()
+    db.session.add_all([GameParticipant(game_id=game.id, user_id=p.id) for p in players])
+    db.session.commit()
+    for player, move in zip(players, moves):
+        RPSGame.make_choice(game.id, player.id, move)
+    return game.id
+
+
+@pytest.fixture
+def players(app):
+    referrer = make_user('abebe')
+    friend = make_user('kebede')
+    other = make_user('almaz')
+    ReferralService.record(referrer.id, friend.id)
+    db.session.commit()
+    return referrer, friend, other
+
+
+def test_record_ignores_self_and_repeat_referrals(players):
+    referrer, friend, other = players
+    assert ReferralService.record(other.id, other.id) is None
+    assert ReferralService.record(other.id, friend.id) is None
+    assert ReferralService.summary(referrer.id)['total_referrals'] == 1
+
+
+def test_qualifies_after_deposit_and_enough_games(players):
+    referrer, friend, other = players
+    for _ in range(REFERRAL_MIN_GAMES):
+        play([friend, referrer, other])
+    referral = Referral.query.filter_by(referred_id=friend.id).one()
+    assert referral.games_played == REFERRAL_MIN_GAMES
+    assert referral.qualified_at is None  # no deposit yet
+
+    deposit(friend)
+    db.session.refresh(referral)
+    assert referral.qualified_at is not None
+
+    summary = ReferralService.summary(referrer.id)
+    assert summary['qualified_referrals'] == 1
+    assert summary['pending_bonus'] == REFERRAL_BONUS_AMOUNT
+    assert summary['recent'][0]['username'] == 'kebede'
+    assert summary['recent'][0]['qualified']
+
+
+def test_pay_pending_credits_once(players):
+    referrer, friend, other = players
+    deposit(friend)
+    for _ in range(REFERRAL_MIN_GAMES):
+        play([friend, other, referrer], moves=('rock', 'paper', 'paper'))
+    balance = db.session.get(User, referrer.id).balance
+
+    preview = ReferralService.pay_pending(dry_run=True)
+    assert preview.processed == 1
+    assert db.session.get(User, referrer.id).balance == balance
+
+    result = ReferralService.pay_pending()
+    assert (result.processed, result.affected) == (1, 1)
+    db.session.expire_all()
+    assert db.session.get(User, referrer.id).balance == balance + REFERRAL_BONUS_AMOUNT
+    assert Transaction.query.filter_by(user_id=referrer.id, type='referral_bonus').count() == 1
+
+    assert ReferralService.pay_pending().processed == 0
+    summary = ReferralService.summary(referrer.id)
+    assert (summary['paid_referrals'], summary['total_earned'], summary['pending_bonus']) == (1, REFERRAL_BONUS_AMOUNT, 0)
+    assert summary['recent'][0]['paid']
+
+
+def test_summary_for_user_without_referrals(app):
+    user = make_user('lonely')
+    summary = ReferralService.summary(user.id)
+    assert summary['total_referrals'] == 0
+    assert summary['recent'] == []
@@ -0,0 +1,74 @@
+"""Tests for game settlement payouts and the leaderboard"""
+import pytest
+
+from extensions import db
+from game import RPSGame
+from models import User, GameParticipant
+from utils import get_leaderboard
+
+
+@pytest.mark.parametrize('moves, winner, payouts', [
+    (['rock', 'scissors', 'scissors'], 1, [30, 0, 0]),
+    (['paper', 'rock', 'paper'], None, [10, 10, 10]),  # two players beat the third, neither beats both
+    (['rock', 'paper', 'scissors'], None, [10, 10, 10]),
+    (['rock', 'rock', 'rock'], None, [10, 10, 10]),
+])
+def test_only_a_move_beating_every_other_takes_the_pot(moves, winner, payouts):
+    winner_id, results = RPSGame.outcomes(list(enumerate(moves, start=1)), 10)
+    assert winner_id == winner
+    assert [payout for _, _, payout in results] == payouts
+    assert {result for _, result, _ in results} == ({'win', 'lose'} if winner else {'draw'})
+
+
+def make_users(*names, balance=100):
+    users = [User(username=name, full_name=name, email=f"{name}@example.com", password='x', balance=balance)
+             for name in names]
+    db.session.add_all(users)
+    db.session.commit()
+    return [user.id for user in users]
+
+
+def play(user_ids, moves, bet_amount=10):
+    game = RPSGame.create_game(user_ids[0], bet_amount)
+    for user_id in user_ids[1:]:
+        assert RPSGame.join_game(game.id, user_id)
+    for user_id, move in zip(user_ids, moves):
+        assert RPSGame.make_choice(game.id, user_id, move)
+    return db.session.get(type(game), game.id)
+
+
+def test_the_winner_is_paid_the_pot_once(app):
+    abebe, kebede, almaz = make_users('abebe', 'kebede', 'almaz')
+    game = play([abebe, kebede, almaz], ['rock', 'scissors', 'scissors'])
+
+    assert (game.status, game.winner_id) == ('completed', abebe)
+    users = {user.id: user for user in User.query}
+    assert [users[user_id].balance for user_id in (abebe, kebede, almaz)] == [120, 90, 90]
+    assert (users[abebe].wins, users[kebede].losses, users[almaz].losses) == (1, 1, 1)
+    assert sorted(p.result for p in GameParticipant.query.filter_by(game_id=game.id)) == ['lose', 'lose', 'win']
+
+
+def test_a_draw_refunds_every_bet(app):
+    players = make_users('abebe', 'kebede', 'almaz')
+    game = play(players, ['rock', 'paper', 'scissors'])
+
+    assert (game.status, game.winner_id) == ('completed', None)
+    assert [user.balance for user in User.query.order_by(User.id)] == [100, 100, 100]
+    assert [(user.wins, user.losses) for user in User.query] == [(0, 0)] * 3
+
+
+def test_leaderboard_ranks_players_by_wins_then_fewest_games(app):
+    make_users('abebe', 'kebede', 'almaz', 'idle')
+    bot = User(username='bot', full_name='Bot', email='bot@example.com', password='x', is_bot=True, wins=50)
+    db.session.add(bot)
+    for name, wins, losses in (('abebe', 3, 3), ('kebede', 3, 1), ('almaz', 1, 0)):
+        user = User.query.filter_by(username=name).one()
+        user.wins, user.losses = wins, losses
+    db.session.commit()
+
+    assert get_leaderboard() == [
+        {'username': 'kebede', 'games_played': 4, 'games_won': 3, 'win_rate': 75.0},
+        {'username': 'abebe', 'games_played': 6, 'games_won': 3, 'win_rate': 50.0},
+        {'username': 'almaz', 'games_played': 1, 'games_won': 1, 'win_rate': 100.0},
+    ]
+    assert [player['username'] for player in get_leaderboard(limit=1)] == ['kebede']
@@ -0,0 +1,165 @@
+"""Tests for sharding users and games over several SQLite files"""
+import json
+import sqlite3
+
+import pytest
+from sqlalchemy import insert, select, update
+
+from models import User, Transaction, Game, GameParticipant
+from sharding import ShardSet, ShardedGames, shard_xacts, xact_log
+
+SHARDS = 3
+
+
+@pytest.fixture
+def shards(tmp_path):
+    shards = ShardSet([f"sqlite:///{tmp_path / f'shard{n}.db'}" for n in range(SHARDS)],
+                      f"sqlite:///{tmp_path / 'coordinator.db'}")
+    shards.create_all()
+    yield shards
+    for engine in (*shards.engines.values(), shards.coordinator):
+        engine.dispose()
+
+
+def make_users(shards, count, balance=100):
+    with shards.session() as session:
+        created = [User(username=f"player{n}", full_name=f"Player {n}", email=f"player{n}@example.com",
+                        password='x', balance=balance) for n in range(count)]
+        session.add_all(created)
+        session.commit()
+        return [user.id for user in created]
+
+
+def on_other_shards(shards, user_ids, count):
+    """count users whose shards all differ"""
+    picked = {}
+    for user_id in user_ids:
+        picked.setdefault(shards.shard_for_user(user_id), user_id)
+    assert len(picked) >= count
+    return list(picked.values())[:count]
+
+
+def rows(shards, shard_id, table):
+    path = shards.engines[shard_id].url.database
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(f'SELECT id FROM {table}').fetchall()
+    finally:
+        conn.close()
+
+
+def balances(shards, user_ids):
+    with shards.session() as session:
+        return {user.id: user.balance for user in session.scalars(select(User).where(User.id.in_(user_ids)))}
+
+
+def test_users_and_their_rows_share_a_shard(shards):
+    user_ids = make_users(shards, 30)
+    with shards.session() as session:
+        for user_id in user_ids:
+            session.add(Transaction(user_id=user_id, tx_ref=f"tx-{user_id}", type='deposit',
+                                    amount=10, status='completed'))
+        session.commit()
+
+    for shard_id in shards.engines:
+        stored_users = {user_id for (user_id,) in rows(shards, shard_id, 'users')}
+        assert stored_users == {u for u in user_ids if shards.shard_for_user(u) == shard_id}
+        assert all(shards.shard_for_id(tx_id) == shard_id for (tx_id,) in rows(shards, shard_id, 'transactions'))
+    assert sum(len(rows(shards, s, 'users')) for s in shards.engines) == 30
+
+    with shards.session() as session:
+        # Lookups by key go to one shard, the rest are gathered from all of them
+        user = session.get(User, user_ids[7])
+        assert user.username == 'player7'
+        assert [t.tx_ref for t in session.scalars(select(Transaction).where(Transaction.user_id == user.id))] \
+            == [f"tx-{user.id}"]
+        assert len(session.scalars(select(User)).all()) == 30
+
+
+def test_queries_only_visit_the_shards_their_keys_map_to(shards):
+    user_id = make_users(shards, 1)[0]
+    chooser = shards._execute_chooser
+
+    class Context:
+        def __init__(self, statement):
+            self.statement = statement
+            self.bind_mapper = statement.column_descriptions[0]['entity'].__mapper__
+
+    assert chooser(Context(select(User).where(User.id == user_id))) == [shards.shard_for_user(user_id)]
+    assert chooser(Context(select(Game).where(Game.id.in_([3, 6]), Game.status == 'waiting'))) == ['0']
+    assert chooser(Context(select(User).where((User.id == user_id) | (User.balance > 0)))) \
+        == sorted(shards.engines)
+    assert chooser(Context(select(User))) == sorted(shards.engines)
+
+
+def test_reopening_with_another_shard_count_is_refused(shards, tmp_path):
+    fewer = ShardSet([f"sqlite:///{tmp_path / 'shard0.db'}"], f"sqlite:///{tmp_path / 'other.db'}")
+    with pytest.raises(RuntimeError):
+        fewer.create_all()
+
+
+def test_cross_shard_game_is_committed_on_every_shard(shards):
+    creator, second, third = on_other_shards(shards, make_users(shards, 12), 3)
+    games = ShardedGames(shards)
+
+    game_id = games.create_game(creator, 10)
+    assert shards.shard_for_id(game_id) == shards.shard_for_user(creator)
+    assert games.join_game(game_id, second)
+    assert games.join_game(game_id, third)
+    assert not games.join_game(game_id, creator)  # full
+
+    assert games.make_move(game_id, creator, 'rock')
+    assert games.make_move(game_id, second, 'scissors')
+    assert games.make_move(game_id, third, 'scissors')
+
+    with shards.session() as session:
+        game = session.get(Game, game_id)
+        assert (game.status, game.winner_id) == ('completed', creator)
+        seats = session.scalars(select(GameParticipant).where(GameParticipant.game_id == game_id)).all()
+        assert {p.user_id: p.result for p in seats} == {creator: 'win', second: 'lose', third: 'lose'}
+        assert session.get(User, creator).wins == 1
+    assert balances(shards, [creator, second, third]) == {creator: 120, second: 90, third: 90}
+    with shards.coordinator.connect() as conn:
+        assert conn.execute(select(xact_log)).all() == []
+
+
+def test_a_no_vote_leaves_every_shard_untouched(shards):
+    creator, broke = on_other_shards(shards, make_users(shards, 12), 2)
+    with shards.session() as session:
+        session.execute(update(User).where(User.id == broke).values(balance=5))
+        session.commit()
+    games = ShardedGames(shards)
+    game_id = games.create_game(creator, 10)
+
+    assert not games.join_game(game_id, broke)
+    assert balances(shards, [broke]) == {broke: 5}
+    with shards.session() as session:
+        assert session.scalars(select(GameParticipant.user_id).where(GameParticipant.game_id == game_id)).all() \
+            == [creator]
+    with shards.coordinator.connect() as conn:
+        assert conn.execute(select(xact_log.c.state)).scalars().all() == ['aborted']
+
+
+def test_recover_redoes_committed_parts_exactly_once(shards):
+    first, second = on_other_shards(shards, make_users(shards, 12), 2)
+    first_shard, second_shard = shards.shard_for_user(first), shards.shard_for_user(second)
+    parts = {
+        first_shard: [['pay', {'user_id': first, 'payout': 30, 'result': 'win'}]],
+        second_shard: [['pay', {'user_id': second, 'payout': 0, 'result': 'lose'}]],
+    }
+    # Crash after the decision: the first shard committed its part, the second didn't
+    with shards.coordinator.begin() as conn:
+        conn.execute(insert(xact_log).values(xid='a' * 32, state='committed', parts=json.dumps(parts)))
+        conn.execute(insert(xact_log).values(xid='b' * 32, state='preparing', parts=json.dumps(parts)))
+    with shards.engines[first_shard].begin() as conn:
+        conn.execute(insert(shard_xacts).values(xid='a' * 32))
+        conn.execute(update(User.__table__).where(User.id == first).values(balance=130, wins=1))
+
+    games = ShardedGames(shards)
+    assert games.xact.recover() == 1
+    assert games.xact.recover() == 0
+    assert balances(shards, [first, second]) == {first: 130, second: 100}
+    with shards.session() as session:
+        assert session.get(User, second).losses == 1
+    with shards.coordinator.connect() as conn:
+        assert conn.execute(select(xact_log.c.xid, xact_log.c.state)).all() == [('b' * 32, 'aborted')]
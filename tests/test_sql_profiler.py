@@ -0,0 +1,130 @@
+"""Tests for the SQL profiler and the query budget pytest plugin"""
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, text
+
+import sql_profiler
+from pytest_query_budget import QueryBudgetExceeded, check_budget
+
+pytest_plugins = ['pytester']
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine('sqlite://')
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT)'))
+        conn.execute(text("INSERT INTO users (username) VALUES ('a'), ('b'), ('c')"))
+    return engine
+
+
+@pytest.fixture
+def profiler():
+    return sql_profiler.SQLProfiler(threshold=3).install()
+
+
+def test_normalize_groups_statements_by_shape():
+    assert sql_profiler.normalize("SELECT * FROM users WHERE id = 42 AND username = 'o''neil'") == \
+        'SELECT * FROM users WHERE id = ? AND username = ?'
+    assert sql_profiler.normalize('SELECT * FROM users WHERE id IN (?, ?, ?)') == \
+        'SELECT * FROM users WHERE id IN (?, ...)'
+    assert sql_profiler.normalize('SELECT * FROM users WHERE id = :id_1') == \
+        'SELECT * FROM users WHERE id = ?'
+    assert sql_profiler.normalize('INSERT INTO t (a, b) VALUES (?, ?), (?, ?)') == \
+        'INSERT INTO t (a, b) VALUES (?, ...), ...'
+
+
+def test_profile_flags_repeated_shapes(engine, profiler):
+    with profiler.profile('GET /leaderboard') as profile:
+        with engine.connect() as conn:
+            conn.execute(text('SELECT id FROM users'))
+            for user_id in (1, 2, 3):
+                conn.execute(text('SELECT username FROM users WHERE id = :id'), {'id': user_id})
+
+    assert profile.queries == 4
+    [(shape, stats)] = profile.repeated(3)
+    assert shape == 'SELECT username FROM users WHERE id = ?'
+    assert stats.count == 3
+    assert 'test_sql_profiler.py:test_profile_flags_repeated_shapes' in stats.callers.most_common(1)[0][0][-1]
+    assert profiler.flagged == ['GET /leaderboard']
+
+
+def test_statements_outside_a_profile_are_ignored(engine, profiler):
+    with engine.connect() as conn:
+        conn.execute(text('SELECT 1'))
+    assert profiler.folded_lines() == []
+
+
+def test_folded_stacks_for_flamegraph(engine, profiler, tmp_path):
+    with profiler.profile('bot /balance'):
+        with engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+
+    path = tmp_path / 'sql.folded'
+    profiler.write_flamegraph(str(path))
+    [line] = path.read_text().splitlines()
+    frames, value = line.rsplit(' ', 1)
+    assert frames.startswith('bot /balance;')
+    assert frames.endswith(';SELECT ?')
+    assert int(value) >= 1
+
+
+def test_flask_requests_are_profiled(engine, monkeypatch):
+    profiler = sql_profiler.SQLProfiler(threshold=2).install()
+    monkeypatch.setattr(sql_profiler, 'PROFILER', profiler)
+    app = Flask(__name__)
+    app.config['SQL_PROFILE'] = True
+    sql_profiler.init_app(app)
+
+    @app.route('/users/<int:user_id>')
+    def user(user_id):
+        with engine.connect() as conn:
+            for _ in range(2):
+                conn.execute(text('SELECT username FROM users WHERE id = :id'), {'id': user_id})
+        return 'ok'
+
+    assert app.test_client().get('/users/1').status_code == 200
+    assert profiler.flagged == ['GET /users/<int:user_id>']
+
+
+def test_check_budget(engine, profiler):
+    with profiler.profile('budget') as profile:
+        with engine.connect() as conn:
+            for user_id in (1, 2):
+                conn.execute(text('SELECT username FROM users WHERE id = :id'), {'id': user_id})
+
+    check_budget(profile, max_queries=2)
+    with pytest.raises(QueryBudgetExceeded, match='ran 2 SQL statements, budget is 1'):
+        check_budget(profile, max_queries=1)
+    with pytest.raises(QueryBudgetExceeded, match='repeated a statement shape'):
+        check_budget(profile, n_plus_one=2)
+
+
+def test_query_budget_marker_and_fixture(pytester):
+    pytester.makeconftest('from pytest_query_budget import *  # noqa')
+    pytester.makepyfile("""
+        import pytest
+        from sqlalchemy import create_engine, text
+
+        engine = create_engine('sqlite://')
+
+        def run(n):
+            with engine.connect() as conn:
+                for i in range(n):
+                    conn.execute(text('SELECT :i'), {'i': i})
+
+        @pytest.mark.query_budget(3)
+        def test_within_budget():
+            run(3)
+
+        @pytest.mark.query_budget(3)
+        def test_over_budget():
+            run(4)
+
+        def test_fixture(query_budget):
+            with query_budget(n_plus_one=2):
+                run(2)
+    """)
+    result = pytester.runpytest('-p', 'no:cacheprovider')
+    result.assert_outcomes(passed=1, failed=2)
+    result.stdout.fnmatch_lines(['*ran 4 SQL statements, budget is 3*', '*repeated a statement shape 2+ times*'])
@@ -0,0 +1,122 @@
+"""Tests for incremental stats rollups"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import insert
+
+from extensions import db
+from models import User, Game, GameParticipant, Transaction, DailyStats, HourlyStats
+from stats_rollup import RollupBatch, StatsRollup, day_start, hour_start, register_rollup_listeners
+
+
+def test_game_settled_updates_day_and_hour():
+    """Settling a game adds stakes, seats and active players"""
+    batch = RollupBatch()
+    ts = datetime(2026, 1, 2, 13, 45)
+    batch.game_settled(ts, Decimal('10.00'), [1, 2, 3])
+
+    day = batch.daily[day_start(ts)]
+    hour = batch.hourly[hour_start(ts)]
+    assert day['total_games'] == 1
+    assert day['total_players'] == 3
+    assert day['total_volume'] == Decimal('30.00')
+    assert hour['total_volume'] == Decimal('30.00')
+    assert batch.active[day_start(ts)] == {1, 2, 3}
+
+
+def test_transactions_split_by_type():
+    """Deposits and withdrawals go to separate volume counters"""
+    batch = RollupBatch()
+    ts = datetime(2026, 1, 2, 8, 0)
+    batch.transaction_completed(ts, 'deposit', 100)
+    batch.transaction_completed(ts, 'withdrawal', -40)
+    batch.transaction_completed(ts, 'refund', 10)
+
+    day = batch.daily[day_start(ts)]
+    assert day['deposit_volume'] == Decimal('100')
+    assert day['withdrawal_volume'] == Decimal('40')
+
+
+def test_empty_batch_is_falsy():
+    """Flushes with nothing to roll up skip the database"""
+    assert not RollupBatch()
+
+
+def play(users, created_at=None):
+    """A 10.00 game between users, committed open and then settled"""
+    game = Game(creator_id=users[0].id, bet_amount=10, status='in_progress', created_at=created_at)
+    db.session.add(game)
+    db.session.flush()
+    db.session.add_all(GameParticipant(game_id=game.id, user_id=user.id) for user in users)
+    db.session.commit()
+    game.status = 'completed'
+    game.winner_id = users[0].id
+    game.completed_at = datetime.utcnow()
+    db.session.commit()
+    return game
+
+
+def test_flushes_upsert_the_rollups(app):
+    """Every commit adds its deltas to the day and hour rows, timed by the rows' own timestamps"""
+    register_rollup_listeners()
+    users = [User(username=name, full_name=name, email=f"{name}@example.com", password='x', is_bot=name == 'bot')
+             for name in ('abebe', 'kebede', 'bot')]
+    db.session.add_all(users)
+    db.session.flush()
+    db.session.add(Transaction(user_id=users[0].id, tx_ref='TX-1', type='deposit', amount=50, status='completed'))
+    db.session.commit()
+    two_days_ago = datetime.utcnow() - timedelta(days=2)
+    play(users, created_at=two_days_ago)
+    play(users[:2])
+
+    earlier, today = StatsRollup.day(two_days_ago), StatsRollup.day()
+    assert (earlier.games_created, earlier.total_bets, earlier.total_games) == (1, 10, 0)
+    assert (today.games_created, today.total_games, today.total_players) == (1, 2, 4)
+    assert (today.total_volume, today.house_earnings, today.deposit_volume) == (40, 0, 50)
+    assert (today.new_users, today.active_users) == (2, 2)
+    assert DailyStats.query.count() == 2
+    assert HourlyStats.query.filter_by(hour=hour_start(datetime.utcnow())).one().total_games == 2
+
+    assert StatsRollup.totals()['games_created'] == 2
+    last_day = StatsRollup.last_hours(24)
+    assert (last_day['games_created'], last_day['total_games'], last_day['new_users']) == (1, 2, 2)
+
+
+def test_backfill_rebuilds_what_the_flushes_recorded(app):
+    """A backfill from the raw tables reproduces the incremental rollups"""
+    register_rollup_listeners()
+    users = [User(username=name, full_name=name, email=f"{name}@example.com", password='x')
+             for name in ('abebe', 'kebede')]
+    db.session.add_all(users)
+    db.session.commit()
+    play(users, created_at=datetime.utcnow() - timedelta(days=3))
+    play(users)
+    incremental = StatsRollup.totals()
+    active = StatsRollup.day().active_users
+
+    db.session.execute(DailyStats.__table__.delete())
+    db.session.execute(HourlyStats.__table__.delete())
+    db.session.commit()
+    assert StatsRollup.totals()['total_games'] == 0
+
+    assert StatsRollup.backfill(datetime.utcnow() - timedelta(days=3), chunk_days=1) == 4
+    assert StatsRollup.totals() == incremental
+    assert StatsRollup.day().active_users == active == 2
+
+
+def test_an_existing_database_is_backfilled_once(app):
+    """Rows written before the rollups existed are counted on first start"""
+    assert StatsRollup.backfill_if_empty() == 0
+    db.session.execute(insert(User), [
+        {'username': name, 'full_name': name, 'email': f"{name}@example.com", 'password': 'x',
+         'created_at': datetime.utcnow() - timedelta(days=2)}
+        for name in ('abebe', 'kebede')
+    ])
+    db.session.execute(insert(Game), [{'creator_id': 1, 'bet_amount': 10, 'status': 'waiting'}])
+    db.session.commit()
+    assert StatsRollup.totals()['new_users'] == 0
+
+    assert StatsRollup.backfill_if_empty() == 3
+    totals = StatsRollup.totals()
+    assert (totals['new_users'], totals['games_created']) == (2, 1)
+    assert StatsRollup.backfill_if_empty() == 0
@@ -0,0 +1,204 @@
+"""Tests for knockout tournaments"""
+import random
+
+import pytest
+from sqlalchemy import insert
+
+from admin.routes import admin_bp
+from extensions import db
+from game import RPSGame
+from models import User, Game, GameParticipant, Transaction, Tournament, TournamentEntry
+from sql_profiler import SQLProfiler
+from tournaments import TournamentService, pair, survivors
+
+_profiler = SQLProfiler(capture_stacks=False).install()
+
+
+@pytest.fixture
+def app(app):
+    app.register_blueprint(admin_bp)
+    return app
+
+
+def make_users(count, balance=100):
+    db.session.execute(insert(User), [
+        {'username': f"player{n}", 'full_name': f"Player {n}", 'email': f"player{n}@example.com",
+         'password': 'x', 'balance': balance}
+        for n in range(count)
+    ])
+    db.session.commit()
+    return [user.id for user in User.query.order_by(User.id)]
+
+
+def open_tables(tournament_id):
+    return Game.query.filter(Game.tournament_id == tournament_id, Game.status == 'in_progress').all()
+
+
+def play_out(tournament_id):
+    """The first seat at every table throws rock, everyone else scissors"""
+    while open_tables(tournament_id):
+        for game in open_tables(tournament_id):
+            seats = GameParticipant.query.filter_by(game_id=game.id).order_by(GameParticipant.id).all()
+            for n, seat in enumerate(seats):
+                RPSGame.make_choice(game.id, seat.user_id, 'rock' if n == 0 else 'scissors')
+    return db.session.get(Tournament, tournament_id)
+
+
+@pytest.mark.parametrize('players, sizes', [
+    (3, [3]), (4, [2, 2]), (5, [3, 2]), (7, [3, 2, 2]), (9, [3, 3, 3]),
+])
+def test_pairings_never_leave_a_player_alone(players, sizes):
+    tables = pair(range(players), rng=random.Random(1))
+    assert [len(table) for table in tables] == sizes
+    assert sorted(p for table in tables for p in table) == list(range(players))
+
+
+def test_draws_are_replayed_by_unbeaten_players():
+    assert survivors({1: 'rock', 2: 'rock', 3: 'scissors'}) == [1, 2]
+    assert survivors({1: 'rock', 2: 'paper', 3: 'scissors'}) == [1, 2, 3]
+    assert survivors({1: 'paper', 2: 'paper', 3: 'paper'}) == [1, 2, 3]
+
+
+def test_tournament_runs_to_a_single_batch_payout(app):
+    user_ids = make_users(9)
+    tournament = TournamentService.create('Friday cup', buy_in=10)
+    for user_id in user_ids:
+        entry, message = TournamentService.register(tournament.id, user_id)
+        assert entry, message
+    assert TournamentService.register(tournament.id, user_ids[0]) == (None, "You are already registered.")
+
+    started, message = TournamentService.start(tournament.id, rng=random.Random(7))
+    assert started, message
+    assert len(open_tables(tournament.id)) == 3
+
+    tournament = play_out(tournament.id)
+    assert tournament.status == 'completed'
+    assert tournament.current_round == 2
+    assert float(tournament.prize_pool) == 90
+
+    # 90 less the 2% fee: 70% to the champion, 30% shared by the two other finalists
+    prizes = {tx.user_id: float(tx.amount) for tx in Transaction.query.filter_by(type='tournament_prize')}
+    assert prizes[tournament.winner_id] == pytest.approx(61.74)
+    assert sorted(prizes.values()) == pytest.approx([13.23, 13.23, 61.74])
+    assert db.session.get(User, tournament.winner_id).balance == pytest.approx(90 + 61.74)
+
+    standings = TournamentService.standings(tournament.id)
+    assert standings[0]['eliminated_round'] is None
+    assert [s['eliminated_round'] for s in standings[1:3]] == [2, 2]
+    assert all(s['eliminated_round'] == 1 for s in standings[3:])
+
+
+def test_drawn_table_is_replayed(app):
+    a, b, c = make_users(3)
+    tournament = TournamentService.create('Draws', buy_in=0)
+    for user_id in (a, b, c):
+        TournamentService.register(tournament.id, user_id)
+    TournamentService.start(tournament.id, rng=random.Random(0))
+
+    [table] = open_tables(tournament.id)
+    for user_id in (a, b, c):
+        RPSGame.make_choice(table.id, user_id, 'rock')
+    [replay] = open_tables(tournament.id)
+    assert replay.id != table.id and replay.round == 1
+    # Settling the drawn table again deals nothing more
+    TournamentService.table_settled(db.session.get(Game, table.id))
+    assert open_tables(tournament.id) == [replay]
+
+    RPSGame.make_choice(replay.id, a, 'rock')
+    RPSGame.make_choice(replay.id, b, 'rock')
+    RPSGame.make_choice(replay.id, c, 'scissors')
+    [final] = open_tables(tournament.id)
+    assert {p.user_id for p in final.participants} == {a, b}
+    assert TournamentService.current_table(tournament.id, c) is None
+
+    RPSGame.make_choice(final.id, a, 'paper')
+    RPSGame.make_choice(final.id, b, 'scissors')
+    tournament = db.session.get(Tournament, tournament.id)
+    assert (tournament.status, tournament.winner_id) == ('completed', b)
+
+
+def test_registration_checks_balance_and_capacity(app):
+    rich, poor, late = make_users(3)
+    db.session.get(User, poor).balance = 5
+    db.session.commit()
+    tournament = TournamentService.create('Small', buy_in=10, max_entrants=1)
+
+    entry, _ = TournamentService.register(tournament.id, poor)
+    assert entry is None
+    assert db.session.get(User, poor).balance == 5
+
+    assert TournamentService.register(tournament.id, rich)[0]
+    assert TournamentService.register(tournament.id, late) == (None, "This tournament is full.")
+    assert db.session.get(User, rich).balance == 90
+
+
+def test_a_concurrent_duplicate_registration_is_refused(app, monkeypatch):
+    [user_id] = make_users(1)
+    tournament = TournamentService.create('Twice', buy_in=10)
+    assert TournamentService.register(tournament.id, user_id)[0]
+
+    class NotYetCommitted:
+        """The other request's entry, invisible to this one's check"""
+        def filter_by(self, **kwargs):
+            return self
+
+        def first(self):
+            return None
+
+    monkeypatch.setattr(TournamentEntry, 'query', NotYetCommitted())
+    assert TournamentService.register(tournament.id, user_id) == (None, "You are already registered.")
+    assert db.session.get(User, user_id).balance == 90
+    assert db.session.get(Tournament, tournament.id).entrant_count == 1
+
+
+def test_admins_run_tournaments_through_the_api(app):
+    user_ids = make_users(3)
+    client = app.test_client()
+    assert client.post('/admin/api/tournaments?admin=1', json={'name': '', 'buy_in': 5}).status_code == 400
+    assert client.post('/admin/api/tournaments?admin=1', json={'name': 'Cup', 'buy_in': 'x'}).status_code == 400
+    assert client.post('/admin/api/tournaments?admin=1', json={'name': 'Cup', 'buy_in': -1}).status_code == 400
+
+    created = client.post('/admin/api/tournaments?admin=1', json={'name': 'Cup', 'buy_in': 5}).get_json()
+    for user_id in user_ids:
+        TournamentService.register(created['id'], user_id)
+    assert client.post(f"/admin/api/tournament/{created['id']}/start?admin=1").status_code == 200
+    assert client.post(f"/admin/api/tournament/{created['id']}/start?admin=1").status_code == 400
+    assert client.post(f"/admin/api/tournament/{created['id']}/cancel?admin=1").status_code == 400
+
+    state = client.get(f"/admin/api/tournament/{created['id']}?admin=1").get_json()
+    assert (state['status'], state['round'], state['prize_pool']) == ('running', 1, 15.0)
+    assert len(state['standings']) == 3
+
+    other = client.post('/admin/api/tournaments?admin=1', json={'name': 'Later', 'buy_in': 5}).get_json()
+    TournamentService.register(other['id'], user_ids[0])
+    cancelled = client.post(f"/admin/api/tournament/{other['id']}/cancel?admin=1").get_json()
+    assert cancelled['message'] == 'Tournament cancelled, 1 buy-ins refunded'
+    assert client.get('/admin/api/tournament/999?admin=1').status_code == 404
+
+
+def test_too_few_entrants_cancels_and_refunds(app):
+    a, b = make_users(2)
+    tournament = TournamentService.create('Empty', buy_in=25)
+    TournamentService.register(tournament.id, a)
+    TournamentService.register(tournament.id, b)
+
+    started, _ = TournamentService.start(tournament.id)
+    assert not started
+    assert db.session.get(Tournament, tournament.id).status == 'cancelled'
+    assert [u.balance for u in User.query.order_by(User.id)] == [100, 100]
+    assert Transaction.query.filter_by(type='tournament_refund').count() == 2
+
+
+def test_rounds_are_dealt_in_constant_queries(app):
+    user_ids = make_users(3000)
+    tournament = TournamentService.create('Big', buy_in=0, max_entrants=None)
+    db.session.execute(insert(TournamentEntry), [
+        {'tournament_id': tournament.id, 'user_id': user_id} for user_id in user_ids
+    ])
+    db.session.commit()
+
+    with _profiler.profile('start') as profile:
+        started, _ = TournamentService.start(tournament.id)
+    assert started
+    assert profile.queries <= 6
+    assert len(open_tables(tournament.id)) == 1000
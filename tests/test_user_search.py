@@ -0,0 +1,70 @@
+"""Tests for user search ranking and the search index"""
+from sqlalchemy import insert, text
+
+import user_search
+from extensions import db
+from models import User
+from user_search import UserSearchIndex, score, similarity, trigrams
+
+
+def test_trigrams_are_lowercased():
+    assert trigrams('AbcD') == {'abc', 'bcd'}
+    assert trigrams('ab') == set()
+
+
+def test_similarity_tolerates_a_typo():
+    """One wrong character still leaves most trigrams shared"""
+    assert similarity('kebede42', 'kebede42') == 1.0
+    assert similarity('kebede42', 'kebxde42') > 0.2
+    assert similarity('kebede42', 'almaz') == 0.0
+
+
+def test_exact_beats_prefix_beats_substring():
+    exact = score(('hana', 'Hana Girma', 'hana@example.com', 1001), 'hana')
+    prefix = score(('hana_g', 'Hana Girma', 'g@example.com', 1002), 'hana')
+    substring = score(('liyahana', 'Liya Desta', 'l@example.com', 1003), 'hana')
+    fuzzy = score(('hanx', None, 'x@example.com', 1004), 'hana')
+    assert exact > prefix > substring > fuzzy
+
+
+def test_telegram_id_matches_exactly():
+    assert score(('someone', None, 's@example.com', 123456789), '123456789') == 4.0
+
+
+def make_users(*names, first_id=1000):
+    db.session.execute(insert(User), [
+        {'username': name, 'full_name': f"{name.title()} Tadesse", 'email': f"{name}@example.com",
+         'password': 'x', 'telegram_id': first_id + n}
+        for n, name in enumerate(names)
+    ])
+    db.session.commit()
+
+
+def test_install_indexes_existing_users_and_follows_changes(app):
+    make_users('kebede', 'almaz', 'kebedech')
+    assert UserSearchIndex.install()
+    assert UserSearchIndex.install()  # idempotent
+    db.session.commit()
+
+    assert [user.username for user in UserSearchIndex.search('kebede')] == ['kebede', 'kebedech']
+    assert [user.username for user in UserSearchIndex.search('@almaz')] == ['almaz']
+    assert UserSearchIndex.search('1001')[0].username == 'almaz'
+
+    User.query.filter_by(username='almaz').one().username = 'almaz_b'
+    make_users('hana', first_id=2000)
+    assert [user.username for user in UserSearchIndex.search('almaz')] == ['almaz_b']
+    assert [user.username for user in UserSearchIndex.search('hana')] == ['hana']
+    assert db.session.execute(text("SELECT count(*) FROM users_fts WHERE users_fts MATCH 'keb'")).scalar() == 2
+
+
+def test_search_scans_when_the_index_cannot_be_installed(app, monkeypatch):
+    make_users('kebede', 'almaz')
+    monkeypatch.setattr(user_search, '_SQLITE_DDL', [
+        "CREATE VIRTUAL TABLE users_fts USING fts5(username, tokenize='no_such_tokenizer')"
+    ])
+    assert not UserSearchIndex.install()
+    db.session.commit()
+
+    assert not UserSearchIndex.is_installed(db.engine)
+    assert [user.username for user in UserSearchIndex.search('kebe')] == ['kebede']
+    assert UserSearchIndex.search('nobody') == []
@@ -0,0 +1,393 @@
+"""
+Tournament mode: knockout rounds of 3-player tables.
+
+Players pay the buy-in when they register. start() deals the entrants
+into tables, and every table is an ordinary Game (no bet, tournament_id
+and round set), so moves and the status read model work unchanged.
+RPSGame.make_choice hands each settled table to table_settled(): the
+winner stays in, the others are out, and a drawn table is replayed by
+the players nobody beat.
+
+Pairings are computed in memory (shuffle, deal, fix up the remainder)
+and a whole round is written with two executemany inserts, so a round of
+thousands of tables starts in two statements. The table that settles
+last sees the round is over with one indexed count and deals the next
+one; a compare-and-set on current_round keeps two concurrent
+settlements from dealing it twice.
+
+The pot, buy-ins less PLATFORM_FEE_PERCENT, is paid once, when the final
+table settles, in a single transaction: TOURNAMENT_PRIZE_SPLIT[0]% to the
+champion and TOURNAMENT_PRIZE_SPLIT[1]% shared by the other finalists.
+"""
+import logging
+import random
+from datetime import datetime
+from decimal import Decimal, ROUND_DOWN
+
+from sqlalchemy import bindparam, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from balances import debit
+from live_events import game_status, publish_on_commit, transaction_status
+from models import User, Game, GameParticipant, Transaction, Tournament, TournamentEntry
+from config import (
+    PLATFORM_FEE_PERCENT, TOURNAMENT_TABLE_SIZE, TOURNAMENT_MIN_ENTRANTS,
+    TOURNAMENT_MAX_ENTRANTS, TOURNAMENT_PRIZE_SPLIT
+)
+
+logger = logging.getLogger(__name__)
+
+BEATS = {'rock': 'scissors', 'scissors': 'paper', 'paper': 'rock'}
+OPEN_STATUSES = ('waiting', 'in_progress')
+CENT = Decimal('0.01')
+
+
+def pair(players, table_size=TOURNAMENT_TABLE_SIZE, rng=random):
+    """Deal players into tables of table_size; a single leftover player gets a bye table"""
+    players = list(players)
+    rng.shuffle(players)
+    tables = [players[i:i + table_size] for i in range(0, len(players), table_size)]
+    if len(tables) > 1 and len(tables[-1]) == 1 and len(tables[-2]) > 2:
+        # Two short tables instead of a bye: 3 + 1 becomes 2 + 2
+        tables[-1].insert(0, tables[-2].pop())
+    return tables
+
+
+def survivors(moves):
+    """Players of a drawn table who replay it: those whose move nobody beat, else everyone"""
+    played = set(moves.values())
+    unbeaten = [user_id for user_id, move in moves.items() if not any(BEATS[other] == move for other in played)]
+    return unbeaten or list(moves)
+
+
+class TournamentService:
+    """Registration, rounds and settlement of knockout tournaments"""
+
+    @staticmethod
+    def create(name, buy_in, creator_id=None, max_entrants=TOURNAMENT_MAX_ENTRANTS):
+        """Open a tournament for registration"""
+        if buy_in < 0:
+            return None
+        tournament = Tournament(
+            name=name,
+            buy_in=buy_in,
+            creator_id=creator_id,
+            max_entrants=max_entrants,
+            status='registering'
+        )
+        db.session.add(tournament)
+        db.session.commit()
+        return tournament
+
+    @staticmethod
+    def register(tournament_id, user_id):
+        """Take the buy-in and enter the user; returns (entry, message)"""
+        tournament = db.session.get(Tournament, tournament_id)
+        if not tournament or tournament.status != 'registering':
+            return None, "Registration for this tournament is closed."
+
+        existing = TournamentEntry.query.filter_by(tournament_id=tournament_id, user_id=user_id).first()
+        if existing:
+            return None, "You are already registered."
+
+        buy_in = tournament.buy_in
+        tournaments = Tournament.__table__
+        seat = update(tournaments).where(
+            tournaments.c.id == tournament_id,
+            tournaments.c.status == 'registering'
+        ).values(
+            entrant_count=tournaments.c.entrant_count + 1,
+            prize_pool=tournaments.c.prize_pool + buy_in
+        )
+        if tournament.max_entrants:
+            seat = seat.where(tournaments.c.entrant_count < tournament.max_entrants)
+        if not db.session.execute(seat).rowcount:
+            db.session.rollback()
+            return None, "This tournament is full."
+
+        if buy_in:
+            if not debit(user_id, buy_in):
+                db.session.rollback()
+                return None, f"Insufficient balance. The buy-in is ETB {float(buy_in):,.2f}."
+            db.session.add(Transaction(
+                user_id=user_id,
+                tx_ref=f"tournament_{tournament_id}_buy_in_{user_id}",
+                type='tournament_buy_in',
+                amount=float(buy_in),
+                status='completed',
+                completed_at=datetime.utcnow()
+            ))
+
+        entry = TournamentEntry(tournament_id=tournament_id, user_id=user_id)
+        db.session.add(entry)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # A concurrent registration of the same user got in first; this one's buy-in is rolled back
+            db.session.rollback()
+            return None, "You are already registered."
+        return entry, "Registered"
+
+    @staticmethod
+    def start(tournament_id, rng=random):
+        """Close registration and deal round 1; cancels (and refunds) when too few entered"""
+        tournament = db.session.get(Tournament, tournament_id)
+        if not tournament or tournament.status != 'registering':
+            return False, "Tournament is not open."
+
+        entrants = db.session.execute(
+            select(TournamentEntry.user_id)
+            .where(TournamentEntry.tournament_id == tournament_id)
+            .order_by(TournamentEntry.id)
+        ).scalars().all()
+        if len(entrants) < TOURNAMENT_MIN_ENTRANTS:
+            TournamentService.cancel(tournament_id)
+            return False, f"Cancelled: at least {TOURNAMENT_MIN_ENTRANTS} players are needed."
+
+        tournament.status = 'running'
+        tournament.started_at = datetime.utcnow()
+        tournament.current_round = 1
+        tables = pair(entrants, rng=rng)
+        TournamentService._deal(tournament_id, 1, tables)
+        db.session.commit()
+        return True, f"Round 1 started: {len(entrants)} players at {len(tables)} tables"
+
+    @staticmethod
+    def _deal(tournament_id, round_number, tables):
+        """Insert one round's tables and seats with two executemany statements"""
+        games = Game.__table__
+        now = datetime.utcnow()
+        # A player sits at one table per round, so the creator identifies the table;
+        # RETURNING without a guaranteed order keeps this a single batched INSERT
+        created = dict(db.session.execute(
+            insert(games).returning(games.c.creator_id, games.c.id),
+            [
+                {
+                    'creator_id': table[0],
+                    'bet_amount': 0,
+                    'status': 'in_progress' if len(table) > 1 else 'completed',
+                    'min_players': len(table),
+                    'max_players': len(table),
+                    'winner_id': None if len(table) > 1 else table[0],
+                    'tournament_id': tournament_id,
+                    'round': round_number,
+                    'created_at': now,
+                }
+                for table in tables
+            ]
+        ).all())
+        game_ids = [created[table[0]] for table in tables]
+        publish_on_commit([
+            game_status(game_id, 'in_progress') if len(table) > 1 else game_status(game_id, 'completed', table[0])
+            for game_id, table in zip(game_ids, tables)
+        ])
+        db.session.execute(insert(GameParticipant.__table__), [
+            {'game_id': game_id, 'user_id': user_id, 'result': None if len(table) > 1 else 'bye'}
+            for game_id, table in zip(game_ids, tables)
+            for user_id in table
+        ])
+        return game_ids
+
+    @staticmethod
+    def table_settled(game):
+        """Advance a settled tournament table; returns the champion's id when it ended the tournament.
+
+        Calling it again for the same table changes nothing.
+        """
+        tournament_id, round_number = game.tournament_id, game.round
+        moves = dict(db.session.execute(
+            select(GameParticipant.user_id, GameParticipant.move).where(GameParticipant.game_id == game.id)
+        ).all())
+        staying = [game.winner_id] if game.winner_id else survivors(moves)
+
+        out = [user_id for user_id in moves if user_id not in staying]
+        if out:
+            entries = TournamentEntry.__table__
+            db.session.execute(
+                update(entries)
+                .where(entries.c.tournament_id == tournament_id, entries.c.user_id.in_(out))
+                .values(eliminated_round=round_number)
+            )
+        if len(staying) > 1:
+            # Draw: the players nobody beat play the table again, unless that was already dealt.
+            # A player sits at one table at a time, so a later table of theirs in the round is it
+            replayed = db.session.execute(
+                select(Game.id)
+                .join(GameParticipant, GameParticipant.game_id == Game.id)
+                .where(Game.tournament_id == tournament_id, Game.round == round_number,
+                       Game.id > game.id, GameParticipant.user_id == staying[0])
+                .limit(1)
+            ).first()
+            if not replayed:
+                TournamentService._deal(tournament_id, round_number, [staying])
+            db.session.commit()
+            return None
+        db.session.commit()
+        return TournamentService._close_round(tournament_id, round_number)
+
+    @staticmethod
+    def _close_round(tournament_id, round_number):
+        """Deal the next round, or settle, once the round's last table is done"""
+        open_tables = db.session.execute(
+            select(func.count(Game.id))
+            .where(Game.tournament_id == tournament_id, Game.round == round_number, Game.status.in_(OPEN_STATUSES))
+        ).scalar()
+        if open_tables:
+            return None
+
+        tournaments = Tournament.__table__
+        claimed = db.session.execute(
+            update(tournaments)
+            .where(tournaments.c.id == tournament_id,
+                   tournaments.c.status == 'running',
+                   tournaments.c.current_round == round_number)
+            .values(current_round=round_number + 1)
+        ).rowcount
+        if not claimed:
+            # Another settlement already moved the tournament on
+            db.session.rollback()
+            return None
+
+        winners = db.session.execute(
+            select(GameParticipant.user_id)
+            .join(Game, Game.id == GameParticipant.game_id)
+            .where(Game.tournament_id == tournament_id, Game.round == round_number,
+                   GameParticipant.result.in_(('win', 'bye')))
+        ).scalars().all()
+
+        if len(winners) > 1:
+            TournamentService._deal(tournament_id, round_number + 1, pair(winners))
+            db.session.commit()
+            return None
+        return TournamentService._settle(tournament_id, round_number, winners[0] if winners else None)
+
+    @staticmethod
+    def prizes(prize_pool, champion_id, finalists):
+        """Split the pot after the platform fee: {user_id: Decimal amount}"""
+        pot = Decimal(str(prize_pool)) * (100 - Decimal(str(PLATFORM_FEE_PERCENT))) / 100
+        champion_share, finalist_share = (Decimal(str(share)) for share in TOURNAMENT_PRIZE_SPLIT)
+        if not finalists:
+            champion_share += finalist_share
+        prizes = {champion_id: (pot * champion_share / 100).quantize(CENT, ROUND_DOWN)}
+        for user_id in finalists:
+            prizes[user_id] = (pot * finalist_share / 100 / len(finalists)).quantize(CENT, ROUND_DOWN)
+        return {user_id: amount for user_id, amount in prizes.items() if amount > 0}
+
+    @staticmethod
+    def _settle(tournament_id, final_round, champion_id):
+        """Pay every prize and close the tournament in one transaction"""
+        tournament = db.session.get(Tournament, tournament_id)
+        now = datetime.utcnow()
+        finalists = sorted(set(db.session.execute(
+            select(GameParticipant.user_id)
+            .join(Game, Game.id == GameParticipant.game_id)
+            .where(Game.tournament_id == tournament_id, Game.round == final_round)
+        ).scalars()) - {champion_id})
+        prizes = TournamentService.prizes(tournament.prize_pool, champion_id, finalists) if champion_id else {}
+
+        if prizes:
+            users = User.__table__
+            db.session.execute(
+                update(users)
+                .where(users.c.id == bindparam('b_user_id'))
+                .values(balance=users.c.balance + bindparam('b_amount')),
+                [{'b_user_id': user_id, 'b_amount': float(amount)} for user_id, amount in prizes.items()]
+            )
+            db.session.execute(insert(Transaction.__table__), [
+                {
+                    'user_id': user_id,
+                    'tx_ref': f"tournament_{tournament_id}_prize_{user_id}",
+                    'type': 'tournament_prize',
+                    'amount': float(amount),
+                    'status': 'completed',
+                    'created_at': now,
+                    'completed_at': now,
+                }
+                for user_id, amount in prizes.items()
+            ])
+            publish_on_commit([
+                transaction_status(f"tournament_{tournament_id}_prize_{user_id}", 'completed') for user_id in prizes
+            ])
+            entries = TournamentEntry.__table__
+            db.session.execute(
+                update(entries)
+                .where(entries.c.tournament_id == tournament_id, entries.c.user_id == bindparam('b_user_id'))
+                .values(prize=bindparam('b_amount')),
+                [{'b_user_id': user_id, 'b_amount': amount} for user_id, amount in prizes.items()]
+            )
+
+        tournament.status = 'completed'
+        tournament.current_round = final_round
+        tournament.winner_id = champion_id
+        tournament.completed_at = now
+        db.session.commit()
+        logger.info(f"Tournament {tournament_id} won by user {champion_id}; paid {len(prizes)} prizes")
+        return champion_id
+
+    @staticmethod
+    def cancel(tournament_id):
+        """Cancel a tournament that has not started and refund every buy-in in one transaction"""
+        tournament = db.session.get(Tournament, tournament_id)
+        if not tournament or tournament.status != 'registering':
+            return 0
+        entrants = db.session.execute(
+            select(TournamentEntry.user_id).where(TournamentEntry.tournament_id == tournament_id)
+        ).scalars().all()
+
+        buy_in = float(tournament.buy_in)
+        if entrants and buy_in:
+            now = datetime.utcnow()
+            users = User.__table__
+            db.session.execute(
+                update(users)
+                .where(users.c.id == bindparam('b_user_id'))
+                .values(balance=users.c.balance + buy_in),
+                [{'b_user_id': user_id} for user_id in entrants]
+            )
+            db.session.execute(insert(Transaction.__table__), [
+                {
+                    'user_id': user_id,
+                    'tx_ref': f"tournament_{tournament_id}_refund_{user_id}",
+                    'type': 'tournament_refund',
+                    'amount': buy_in,
+                    'status': 'completed',
+                    'created_at': now,
+                    'completed_at': now,
+                }
+                for user_id in entrants
+            ])
+            publish_on_commit([
+                transaction_status(f"tournament_{tournament_id}_refund_{user_id}", 'completed') for user_id in entrants
+            ])
+
+        tournament.status = 'cancelled'
+        tournament.completed_at = datetime.utcnow()
+        db.session.commit()
+        return len(entrants)
+
+    @staticmethod
+    def current_table(tournament_id, user_id):
+        """The user's open table in the tournament, or None when they are waiting or out"""
+        return db.session.execute(
+            select(Game)
+            .join(GameParticipant, GameParticipant.game_id == Game.id)
+            .where(Game.tournament_id == tournament_id, Game.status.in_(OPEN_STATUSES),
+                   GameParticipant.user_id == user_id)
+        ).scalars().first()
+
+    @staticmethod
+    def standings(tournament_id):
+        """Entrants still playing first, then by the round they went out in"""
+        rows = db.session.execute(
+            select(User.username, TournamentEntry.eliminated_round, TournamentEntry.prize)
+            .join(User, User.id == TournamentEntry.user_id)
+            .where(TournamentEntry.tournament_id == tournament_id)
+            .order_by(TournamentEntry.eliminated_round.is_(None).desc(),
+                      TournamentEntry.eliminated_round.desc(), TournamentEntry.id)
+        ).all()
+        return [
+            {'username': username, 'eliminated_round': eliminated_round,
+             'prize': float(prize) if prize is not None else 0.0}
+            for username, eliminated_round, prize in rows
+        ]
@@ -0,0 +1,254 @@
+"""User search index over username, full name, email and Telegram ID.
+
+SQLite uses an external-content FTS5 table with the trigram tokenizer,
+kept in sync with ``users`` by triggers. Postgres uses a pg_trgm GIN
+expression index, which the database maintains by itself. Any other
+backend, and a database the index couldn't be installed in (e.g. a
+SQLite built without the trigram tokenizer), falls back to LIKE scans.
+"""
+import logging
+import weakref
+
+from sqlalchemy import or_, text
+
+from extensions import db
+from models import User
+
+logger = logging.getLogger(__name__)
+
+# Candidates fetched from the index per requested result, before re-ranking
+CANDIDATE_FACTOR = 10
+
+# Whether each engine's database has the index, checked once per process
+_has_index = weakref.WeakKeyDictionary()
+
+_SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+        username, full_name, email, telegram_id,
+        content='users', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON users BEGIN
+        INSERT INTO users_fts(rowid, username, full_name, email, telegram_id)
+        VALUES (new.id, new.username, new.full_name, new.email, new.telegram_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, username, full_name, email, telegram_id)
+        VALUES ('delete', old.id, old.username, old.full_name, old.email, old.telegram_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS users_fts_au AFTER UPDATE OF username, full_name, email, telegram_id ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, username, full_name, email, telegram_id)
+        VALUES ('delete', old.id, old.username, old.full_name, old.email, old.telegram_id);
+        INSERT INTO users_fts(rowid, username, full_name, email, telegram_id)
+        VALUES (new.id, new.username, new.full_name, new.email, new.telegram_id);
+    END""",
+]
+
+_PG_DOCUMENT = (
+    "lower(coalesce(username, '') || ' ' || coalesce(full_name, '') || ' ' || "
+    "coalesce(email, '') || ' ' || coalesce(telegram_id::text, ''))"
+)
+
+_PG_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX IF NOT EXISTS ix_users_search_trgm ON users USING gin (({_PG_DOCUMENT}) gin_trgm_ops)",
+]
+
+
+def trigrams(value):
+    """Lowercased 3-character substrings of a string"""
+    value = (value or '').lower()
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+def similarity(a, b):
+    """Trigram (Jaccard) similarity between two strings, 0..1"""
+    return _jaccard(trigrams(a), trigrams(b))
+
+
+def _jaccard(ta, tb):
+    if not ta or not tb:
+        return 0.0
+    return len(ta & tb) / len(ta | tb)
+
+
+def score(fields, query):
+    """Rank a candidate's searchable fields: exact > prefix > substring > fuzzy, best field wins"""
+    return _scorer(query)(fields)
+
+
+def _scorer(query):
+    """Build a score function with the query's trigrams computed once"""
+    query = query.lower()
+    query_trigrams = trigrams(query)
+
+    def rank(fields):
+        best = 0.0
+        for field in fields:
+            value = str(field).lower() if field is not None else ''
+            if not value:
+                continue
+            if value == query:
+                return 4.0
+            if value.startswith(query):
+                best = max(best, 3.0 + len(query) / len(value))
+            elif query in value:
+                best = max(best, 2.0 + len(query) / len(value))
+            elif best < 1.0:
+                best = max(best, _jaccard(trigrams(value), query_trigrams))
+        return best
+
+    return rank
+
+
+def _index_exists(connection):
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        statement = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users_fts'"
+    elif dialect == 'postgresql':
+        statement = "SELECT 1 FROM pg_indexes WHERE indexname = 'ix_users_search_trgm'"
+    else:
+        return False
+    return connection.execute(text(statement)).first() is not None
+
+
+def _fts_phrase(fragment):
+    """Quote a fragment as an FTS5 phrase (a substring match under trigram)"""
+    return '"' + fragment.replace('"', '""') + '"'
+
+
+class UserSearchIndex:
+    """Install, rebuild and query the user search index"""
+
+    @staticmethod
+    def install(connection=None):
+        """Create the index structures for the current backend (idempotent); False if search will scan"""
+        connection = connection or db.session.connection()
+        dialect = connection.dialect.name
+        if dialect not in ('sqlite', 'postgresql'):
+            logger.info(f"No search index for {dialect}, user search will scan")
+            _has_index[connection.engine] = False
+            return False
+
+        try:
+            with connection.begin_nested():
+                created = not _index_exists(connection)
+                for statement in _SQLITE_DDL if dialect == 'sqlite' else _PG_DDL:
+                    connection.execute(text(statement))
+                if created and dialect == 'sqlite':
+                    # An external-content table starts empty: index the users already there
+                    UserSearchIndex.rebuild(connection)
+        except Exception as e:
+            logger.warning(f"Could not install user search index, user search will scan: {e}")
+            _has_index[connection.engine] = False
+            return False
+        _has_index[connection.engine] = True
+        return True
+
+    @staticmethod
+    def is_installed(engine):
+        """Whether the database behind engine has the search index"""
+        installed = _has_index.get(engine)
+        if installed is None:
+            with engine.connect() as connection:
+                installed = _has_index[engine] = _index_exists(connection)
+        return installed
+
+    @staticmethod
+    def rebuild(connection=None):
+        """Re-index every user, e.g. after rows were loaded with triggers missing"""
+        connection = connection or db.session.connection()
+        if connection.dialect.name == 'sqlite':
+            connection.execute(text("INSERT INTO users_fts(users_fts) VALUES ('rebuild')"))
+        elif connection.dialect.name == 'postgresql':
+            connection.execute(text("REINDEX INDEX ix_users_search_trgm"))
+
+    @staticmethod
+    def search(query, limit=20):
+        """Find users by prefix, substring or approximate match, best first"""
+        query = (query or '').strip().lstrip('@')
+        if not query:
+            return []
+
+        ids = []
+        if query.isdigit():
+            ids = list(db.session.execute(
+                db.select(User.id).where(User.telegram_id == int(query))
+            ).scalars())
+
+        # A full Telegram ID hit is unambiguous; digit trigrams are too common to be worth scanning
+        if not (ids and len(query) >= 6):
+            engine = db.session.get_bind(User)
+            dialect = engine.dialect.name if UserSearchIndex.is_installed(engine) else None
+            if dialect == 'sqlite':
+                ids += UserSearchIndex._sqlite_candidates(query, limit * CANDIDATE_FACTOR, limit)
+            elif dialect == 'postgresql':
+                ids += UserSearchIndex._postgres_candidates(query, limit * CANDIDATE_FACTOR)
+            else:
+                ids += UserSearchIndex._like_candidates(query, limit * CANDIDATE_FACTOR)
+
+        if not ids:
+            return []
+        # Rank on plain rows and only build User objects for the page we return
+        rows = db.session.execute(
+            db.select(User.id, User.username, User.full_name, User.email, User.telegram_id)
+            .where(User.id.in_(set(ids)))
+        ).all()
+        rank = _scorer(query)
+        scores = {row.id: rank(row[1:]) for row in rows}
+        top = sorted((i for i in scores if scores[i] > 0), key=lambda i: (-scores[i], i))[:limit]
+        if not top:
+            return []
+        users = {u.id: u for u in User.query.filter(User.id.in_(top))}
+        return [users[i] for i in top if i in users]
+
+    @staticmethod
+    def _sqlite_candidates(query, limit, wanted):
+        """Substring matches first, then typo-tolerant matches on either half if they fall short"""
+        def match(expression, n):
+            return list(db.session.execute(
+                text("SELECT rowid FROM users_fts WHERE users_fts MATCH :m LIMIT :n"),
+                {'m': expression, 'n': n}
+            ).scalars())
+
+        if len(query) < 3:
+            # Too short for trigrams; prefix range scan on the username index
+            return list(db.session.execute(
+                db.select(User.id)
+                .where(User.username >= query, User.username < query + '\U0010ffff')
+                .limit(limit)
+            ).scalars())
+
+        ids = match(_fts_phrase(query), limit)
+        if len(ids) < wanted and len(query) >= 5:
+            # A single typo can't break both halves, so their substring
+            # matches cover near misses without an OR over every trigram
+            middle = len(query) // 2
+            halves = [query[:middle], query[middle:]]
+            expression = ' OR '.join(_fts_phrase(h) for h in halves if len(h) >= 3)
+            seen = set(ids)
+            ids += [i for i in match(expression, limit) if i not in seen]
+        return ids
+
+    @staticmethod
+    def _postgres_candidates(query, limit):
+        """Trigram similarity or substring matches through the GIN index"""
+        return list(db.session.execute(
+            text(
+                f"SELECT id FROM users "
+                f"WHERE {_PG_DOCUMENT} % lower(:q) OR {_PG_DOCUMENT} LIKE lower(:like) "
+                f"ORDER BY similarity({_PG_DOCUMENT}, lower(:q)) DESC LIMIT :n"
+            ),
+            {'q': query, 'like': f"%{query}%", 'n': limit}
+        ).scalars())
+
+    @staticmethod
+    def _like_candidates(query, limit):
+        """Fallback for databases without a search index"""
+        pattern = f"%{query}%"
+        return list(db.session.execute(
+            db.select(User.id).where(or_(
+                User.username.ilike(pattern),
+                User.full_name.ilike(pattern),
+                User.email.ilike(pattern)
+            )).limit(limit)
+        ).scalars())
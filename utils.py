@@ -10,7 +10,7 @@ from decimal import Decimal
 # from telegram import Update
 # from telegram.ext import CallbackContext
 
-from config import LOGGER, CREATE_ACCOUNT_COOLDOWN, DELETE_ACCOUNT_COOLDOWN, DEPOSIT_COOLDOWN, WITHDRAW_COOLDOWN, JOIN_GAME_COOLDOWN
+from config import LOGGER, BANNED_MESSAGE, CREATE_ACCOUNT_COOLDOWN, DELETE_ACCOUNT_COOLDOWN, DEPOSIT_COOLDOWN, WITHDRAW_COOLDOWN, JOIN_GAME_COOLDOWN
 from models import User, Cooldown, Game, GameParticipant, Transaction
 from extensions import db  # ✅ Fixed circular import
 
@@ -32,9 +32,12 @@ class CallbackContext:
     pass
 
 
-def get_user_by_telegram_id(telegram_id: int) -> Optional[User]:
-    """Get a user by their Telegram ID."""
-    return User.query.filter_by(telegram_id=telegram_id).first()
+def get_user_by_telegram_id(telegram_id: int, include_banned: bool = False) -> Optional[User]:
+    """Get a user by their Telegram ID; banned users are only found with include_banned."""
+    query = User.query.filter_by(telegram_id=telegram_id)
+    if not include_banned:
+        query = query.filter(User.is_banned.is_(False))
+    return query.first()
 
 
 def get_user_by_username(username):
@@ -47,9 +50,9 @@ def format_currency(amount: float) -> str:
 
 
 def user_exists(update) -> bool:
-    """Check if user exists and send message if not."""
+    """Check if user exists and isn't banned, and send message if not."""
     telegram_id = update.effective_user.id
-    user = get_user_by_telegram_id(telegram_id)
+    user = get_user_by_telegram_id(telegram_id, include_banned=True)
     
     if not user:
         update.message.reply_text(
@@ -57,6 +60,9 @@ def user_exists(update) -> bool:
             "Use /create_account to create one."
         )
         return False
+    if user.is_banned:
+        update.message.reply_text(f"🚫 {BANNED_MESSAGE}")
+        return False
     return True
 
 
@@ -133,19 +139,22 @@ def update_user_activity(user_id: int):
 def get_leaderboard(limit: int = 10) -> List[Dict[str, Any]]:
     """Get global leaderboard data."""
     try:
-        top_players = User.query.filter(
-            User.games_played > 0
+        games_played = User.wins + User.losses
+        top_players = db.session.query(
+            User.username, User.wins, games_played.label('games_played')
+        ).filter(
+            games_played > 0,
+            User.is_bot.is_(False)
         ).order_by(
-            User.total_winnings.desc()
+            User.wins.desc(), games_played.asc()
         ).limit(limit).all()
         
         return [
             {
                 'username': player.username,
                 'games_played': player.games_played,
-                'games_won': player.games_won,
-                'total_winnings': float(player.total_winnings),
-                'win_rate': (player.games_won / player.games_played * 100) if player.games_played > 0 else 0
+                'games_won': player.wins,
+                'win_rate': player.wins / player.games_played * 100
             }
             for player in top_players
         ]
@@ -6,6 +6,8 @@ import sqlite3
 from flask import Flask, request, jsonify
 from dotenv import load_dotenv
 
+import metrics
+
 # Load environment variables
 load_dotenv()
 
@@ -17,6 +19,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+metrics.init_app(app, name='webhook_api')
 
 def get_db_connection():
     """Create a database connection."""
@@ -26,7 +29,7 @@ def get_db_connection():
         conn.execute('PRAGMA foreign_keys = ON')
         conn.execute('PRAGMA journal_mode = WAL')
         conn.execute('PRAGMA synchronous = NORMAL')
-        return conn
+        return metrics.trace_connection(conn)
     except Exception as e:
         logger.error(f"Database connection error: {e}")
         return None
@@ -227,6 +230,23 @@ def handle_withdrawal_webhook(tx_ref, status, amount):
         logger.error(f"Withdrawal webhook error: {e}")
         return jsonify({"status": "error", "message": "Internal server error"}), 500
 
+def waiting_games_by_bet():
+    """Matchmaking queue depth of the bot's games table, for /metrics"""
+    conn = get_db_connection()
+    if not conn:
+        return {}
+    try:
+        rows = conn.execute('''
+            SELECT bet_amount, COUNT(*) FROM games
+            WHERE status = 'waiting'
+            GROUP BY bet_amount
+        ''').fetchall()
+        return {(f"{float(bet_amount):g}",): count for bet_amount, count in rows}
+    finally:
+        conn.close()
+
+metrics.MATCHMAKING_WAITING.set_function(waiting_games_by_bet)
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint."""
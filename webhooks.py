@@ -4,6 +4,7 @@ from payment_service import PaymentService
 from chapa_integration import ChapaPayment
 from extensions import db
 from models import Transaction, User
+from page_cache import cached_page
 import logging
 
 # Configure logging
@@ -52,6 +53,7 @@ def chapa_callback():
         return jsonify({"status": "error", "message": str(e)}), 500
 
 @webhooks.route('/success', methods=['GET'])
+@cached_page(private=True)
 def payment_success():
     """Handle successful payment redirect"""
     try: